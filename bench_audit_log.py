@@ -0,0 +1,91 @@
+"""Benchmark del historial de auditoría: lectura de consultas.jsonl anterior frente a utils.audit_log.
+Ejecutar: python bench_audit_log.py [n_eventos]
+
+Genera n eventos (búsquedas y consultas de 20 usuarios repartidos en dos
+años) en un consultas.jsonl temporal y mide: la carga anterior de la
+pantalla de Backups (readlines, últimas 1000 líneas, filtros en Python),
+la importación única al almacén por meses y, ya importado, abrir la
+pantalla (conteo + primera página) y filtrar por usuario, acción, rango de
+fechas y texto sobre todo el historial.
+"""
+import json
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+from datetime import date, datetime, timedelta
+
+from utils.audit_log import AuditLog, AuditQuery
+
+args = [a for a in sys.argv[1:] if not a.startswith("--")]
+N = int(args[0]) if args else 1_000_000
+
+
+def generate(path: str, n: int):
+    rnd = random.Random(3)
+    start = datetime(2024, 10, 1)
+    step = timedelta(days=730) / n
+    users = [f"usuario{k}" for k in range(20)]
+    with open(path, "w", encoding="utf-8") as f:
+        for i in range(n):
+            rec = {"ts": (start + step * i).isoformat(), "id_usuario": 1, "usuario": rnd.choice(users), "rol": "Operador"}
+            if rnd.random() < 0.5:
+                rec.update(accion="busqueda", query=f"PEREZ {rnd.randrange(10_000)}", resultados=rnd.randrange(50))
+            else:
+                rec.update(accion="consulta_ciudadano", id_ciudadano=i, dni=f"{rnd.randrange(10**8):08d}",
+                           apellidos=f"APELLIDO{rnd.randrange(997)}", nombres="NOMBRE")
+            f.write(json.dumps(rec, ensure_ascii=False) + "\n")
+
+
+def anterior(path: str, q: str = "", kind: str = "todo"):
+    # Réplica de load_logs() antes de utils.audit_log
+    items = []
+    with open(path, "r", encoding="utf-8") as f:
+        lines = f.readlines()[-1000:]
+    for ln in reversed(lines):
+        rec = json.loads(ln)
+        accion = (rec.get("accion") or "").lower()
+        if kind == "busquedas" and accion != "busqueda":
+            continue
+        blob = " ".join(str(rec.get(k) or "") for k in ("usuario", "rol", "query", "dni", "apellidos", "nombres", "accion")).lower()
+        if q and q not in blob:
+            continue
+        items.append(rec)
+    return items
+
+
+def timed(fn):
+    t0 = time.perf_counter()
+    out = fn()
+    return out, (time.perf_counter() - t0) * 1000
+
+
+if __name__ == "__main__":
+    tmp = tempfile.mkdtemp(prefix="bench_audit_")
+    path = os.path.join(tmp, "consultas.jsonl")
+    generate(path, N)
+    print(f"{N:,} eventos, consultas.jsonl de {os.path.getsize(path) / 2**20:.0f} MB")
+
+    items, ms = timed(lambda: anterior(path))
+    print(f"{'anterior: abrir':<34} {ms:9.1f} ms  ({len(items)} eventos visibles de {N:,})")
+    items, ms = timed(lambda: anterior(path, "usuario7", "busquedas"))
+    print(f"{'anterior: usuario7 + búsquedas':<34} {ms:9.1f} ms  ({len(items)} encontrados, solo en las últimas 1000 líneas)")
+
+    log = AuditLog(tmp)
+    added, ms = timed(log.import_legacy)
+    print(f"{'importación única':<34} {ms:9.1f} ms  ({added:,} eventos, {len(log.segments())} segmentos)")
+
+    cases = [
+        ("abrir (conteo + 1ª página)", AuditQuery()),
+        ("usuario7 + búsquedas", AuditQuery(acciones=("busqueda",), usuario="usuario7")),
+        ("rango de una semana", AuditQuery(desde=date(2025, 3, 3), hasta=date(2025, 3, 9))),
+        ("texto 'apellido42'", AuditQuery(texto="apellido42")),
+    ]
+    for label, q in cases:
+        (total, (events, cursor)), ms = timed(lambda: (log.count(q), log.query(q)))
+        _, next_ms = timed(lambda: log.query(q, cursor)) if cursor else (None, 0.0)
+        print(f"{'almacén: ' + label:<34} {ms:9.1f} ms  ({total:,}{'+' if total >= 10_000 else ''} eventos; página siguiente {next_ms:.1f} ms)")
+    log.close()
+    shutil.rmtree(tmp, ignore_errors=True)
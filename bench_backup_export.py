@@ -0,0 +1,111 @@
+"""Benchmark de la exportación de respaldos: backup.json anterior frente a database.backup_io.
+Ejecutar: python bench_backup_export.py [n_ciudadanos] [--url DATABASE_URL]
+
+Genera (SQLite en un archivo temporal por defecto) n ciudadanos con su
+documento, servicio y vínculos, y mide tiempo, memoria máxima de Python
+(tracemalloc) y tamaño en disco de: la exportación anterior (objetos ORM,
+vars() y un único json.dump) y la exportación por tablas en NDJSON.gz.
+"""
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+
+from sqlalchemy import create_engine, insert, select
+from sqlalchemy.orm import Session
+
+from database import backup_io, models
+from database.models import Base
+from database.name_keys import name_keys
+
+args = [a for a in sys.argv[1:] if not a.startswith("--")]
+N = int(args[0]) if args else 100_000
+URL = sys.argv[sys.argv.index("--url") + 1] if "--url" in sys.argv else None
+
+
+def generate(engine, n: int):
+    Base.metadata.create_all(engine)
+    base = datetime(2020, 1, 1)
+    with engine.begin() as conn:
+        conn.execute(insert(models.Rol), [{"id_rol": 1, "nombre_rol": "admin"}])
+        conn.execute(insert(models.Usuario), [{"id_usuario": 1, "nombre_usuario": "bench", "contrasena_hash": "x", "id_rol": 1}])
+        for lo in range(0, n, 20_000):
+            ks = range(lo + 1, min(n, lo + 20_000) + 1)
+            conn.execute(insert(models.Ciudadano), [
+                {"id_ciudadano": k, "dni": f"{k:08d}", "apellidos": f"APELLIDO{k % 997}", "nombres": f"NOMBRE {k}",
+                 **dict(zip(("nombre_normalizado", "nombre_fonetico"), name_keys(f"APELLIDO{k % 997}", f"NOMBRE {k}"))),
+                 "fecha_nacimiento": (base - timedelta(days=7000 + k % 9000)).date(), "fecha_creacion": base + timedelta(minutes=k),
+                 "id_usuario_creacion": 1} for k in ks])
+            conn.execute(insert(models.Documento), [
+                {"id_documento": k, "nombre_archivo": f"{k}.pdf", "ruta_almacenamiento": f"storage/data/{k}.pdf",
+                 "fecha_extraccion": base + timedelta(minutes=k), "id_usuario_extraccion": 1} for k in ks])
+            conn.execute(insert(models.DatosServicioMilitar), [
+                {"id_servicio": k, "id_ciudadano": k, "clase": str(1950 + k % 50), "libro": str(k % 300), "folio": str(k % 200),
+                 "fecha_alta": (base - timedelta(days=k % 5000)).date()} for k in ks])
+            conn.execute(insert(models.CiudadanoDocumento), [{"id_ciudadano": k, "id_documento": k} for k in ks])
+            conn.execute(insert(models.DocumentoServicio), [{"id_documento": k, "id_servicio": k} for k in ks])
+
+
+def anterior(engine, out_dir: str):
+    # Réplica de export_backup() antes de backup_io
+    session = Session(engine)
+    try:
+        payload = {
+            "roles": [vars(x) for x in session.execute(select(models.Rol)).scalars().all()],
+            "usuarios": [vars(x) for x in session.execute(select(models.Usuario)).scalars().all()],
+            "ciudadanos": [vars(x) for x in session.execute(select(models.Ciudadano)).scalars().all()],
+            "documentos": [vars(x) for x in session.execute(select(models.Documento)).scalars().all()],
+            "servicios": [vars(x) for x in session.execute(select(models.DatosServicioMilitar)).scalars().all()],
+            "ciudadano_documento": [{"id_ciudadano": x.id_ciudadano, "id_documento": x.id_documento} for x in session.execute(select(models.CiudadanoDocumento)).scalars().all()],
+            "documento_servicio": [{"id_documento": x.id_documento, "id_servicio": x.id_servicio} for x in session.execute(select(models.DocumentoServicio)).scalars().all()],
+        }
+        clean = {k: [{a: b for a, b in d.items() if not a.startswith("_")} for d in v] for k, v in payload.items()}
+        os.makedirs(out_dir, exist_ok=True)
+        with open(os.path.join(out_dir, "backup.json"), "w", encoding="utf-8") as f:
+            json.dump(clean, f, ensure_ascii=False, default=str)
+    finally:
+        session.close()
+    return out_dir
+
+
+def measure(fn):
+    tracemalloc.start()
+    t0 = time.perf_counter()
+    out = fn()
+    secs = time.perf_counter() - t0
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return out, secs, peak
+
+
+def dir_size(path: str) -> int:
+    return sum(os.path.getsize(os.path.join(r, f)) for r, _, fs in os.walk(path) for f in fs)
+
+
+if __name__ == "__main__":
+    if URL:
+        engine = create_engine(URL, future=True)
+    else:
+        path = os.path.join(tempfile.gettempdir(), f"bench_backup_{N}.sqlite3")
+        fresh = not os.path.exists(path)
+        engine = create_engine(f"sqlite:///{path}", future=True)
+        if fresh:
+            generate(engine, N)
+            print(f"generados {N} ciudadanos (+documento, servicio y vínculos) -> {path}")
+
+    tmp = tempfile.mkdtemp(prefix="bench_backup_out_")
+    old_dir, old_s, old_peak = measure(lambda: anterior(engine, os.path.join(tmp, "anterior")))
+    (new_dir, manifest), new_s, new_peak = measure(lambda: backup_io.export_backup(engine, tmp))
+    errors = backup_io.verify_backup(new_dir)
+
+    print(f"{manifest['rows']:,} filas en {len(manifest['tables'])} tablas; verificación: {errors or 'ok'}")
+    print(f"{'':<22} {'tiempo':>9} {'pico memoria':>14} {'disco':>10}")
+    print(f"{'backup.json anterior':<22} {old_s:8.2f}s {old_peak / 2**20:12.1f}MB {dir_size(old_dir) / 2**20:8.1f}MB")
+    print(f"{'NDJSON.gz por tabla':<22} {new_s:8.2f}s {new_peak / 2**20:12.1f}MB {dir_size(new_dir) / 2**20:8.1f}MB")
+    shutil.rmtree(tmp, ignore_errors=True)
@@ -0,0 +1,96 @@
+"""Benchmark de la importación de respaldos: upsert fila a fila anterior frente a database.backup_io.
+Ejecutar: python bench_backup_import.py [n_ciudadanos]
+
+Genera una base SQLite temporal con n ciudadanos (documento, servicio y
+vínculos por cada uno; ver bench_backup_export.py), la exporta en los dos
+formatos y restaura cada uno en una base vacía: el camino anterior (SELECT por
+clave primaria y session.add por fila) y backup_io.import_backup (claves en
+bloque e INSERT ... ON CONFLICT DO NOTHING). Luego repite ambas sobre la base
+ya restaurada, el caso de reimportar un respaldo. En PostgreSQL remoto cada
+SELECT del camino anterior es además un viaje de red.
+"""
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+
+from sqlalchemy import create_engine, select
+from sqlalchemy.orm import Session
+
+from bench_backup_export import anterior as export_anterior, generate
+from database import backup_io, models
+
+args = [a for a in sys.argv[1:] if not a.startswith("--")]
+N = int(args[0]) if args else 20_000
+
+
+def anterior(engine, path: str):
+    # Réplica de confirmar_importacion() antes de backup_io
+    with open(path, "r", encoding="utf-8") as f:
+        data = json.load(f)
+    # backup.json trae fechas como texto: PostgreSQL las acepta, el tipo Date
+    # de SQLite no; se convierten antes para medir solo el upsert
+    for name, rows in data.items():
+        decode = backup_io._decoder(backup_io.MODELS[name].__table__)
+        data[name] = [decode(r) for r in rows]
+    session = Session(engine, autoflush=False)
+    try:
+        def _upsert(model, rows, keys):
+            for r in rows:
+                filt = [getattr(model, k) == r.get(k) for k in keys]
+                exist = session.execute(select(model).where(*filt)).scalar_one_or_none()
+                if not exist:
+                    session.add(model(**{k: r.get(k) for k in r.keys()}))
+        _upsert(models.Rol, data.get("roles", []), ["id_rol"])
+        _upsert(models.Usuario, data.get("usuarios", []), ["id_usuario"])
+        _upsert(models.Ciudadano, data.get("ciudadanos", []), ["id_ciudadano"])
+        _upsert(models.Documento, data.get("documentos", []), ["id_documento"])
+        _upsert(models.DatosServicioMilitar, data.get("servicios", []), ["id_servicio"])
+        for r in data.get("ciudadano_documento", []):
+            exist = session.execute(select(models.CiudadanoDocumento).where((models.CiudadanoDocumento.id_ciudadano == r.get("id_ciudadano")) & (models.CiudadanoDocumento.id_documento == r.get("id_documento")))).first()
+            if not exist:
+                session.add(models.CiudadanoDocumento(id_ciudadano=r.get("id_ciudadano"), id_documento=r.get("id_documento")))
+        for r in data.get("documento_servicio", []):
+            exist = session.execute(select(models.DocumentoServicio).where((models.DocumentoServicio.id_documento == r.get("id_documento")) & (models.DocumentoServicio.id_servicio == r.get("id_servicio")))).first()
+            if not exist:
+                session.add(models.DocumentoServicio(id_documento=r.get("id_documento"), id_servicio=r.get("id_servicio")))
+        session.commit()
+    finally:
+        session.close()
+
+
+def empty_db(path: str):
+    engine = create_engine(f"sqlite:///{path}", future=True)
+    models.Base.metadata.create_all(engine)
+    return engine
+
+
+def seconds(fn) -> float:
+    t0 = time.perf_counter()
+    fn()
+    return time.perf_counter() - t0
+
+
+if __name__ == "__main__":
+    tmp = tempfile.mkdtemp(prefix="bench_import_")
+    src = create_engine(f"sqlite:///{os.path.join(tmp, 'src.sqlite3')}", future=True)
+    generate(src, N)
+    legacy = os.path.join(export_anterior(src, os.path.join(tmp, "anterior")), "backup.json")
+    new_dir, manifest = backup_io.export_backup(src, tmp)
+    print(f"{manifest['rows']:,} filas")
+
+    old_db = empty_db(os.path.join(tmp, "old.sqlite3"))
+    new_db = empty_db(os.path.join(tmp, "new.sqlite3"))
+
+    print(f"{'':<24} {'base vacía':>12} {'reimportar':>12}")
+    for label, run in (
+        ("SELECT + add por fila", lambda: anterior(old_db, legacy)),
+        ("backup_io (en bloque)", lambda: backup_io.import_backup(new_db, new_dir)),
+    ):
+        first, again = seconds(run), seconds(run)
+        print(f"{label:<24} {first:10.2f} s {again:10.2f} s  ({manifest['rows'] / first:,.0f} filas/s)")
+    shutil.rmtree(tmp, ignore_errors=True)
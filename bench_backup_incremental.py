@@ -0,0 +1,79 @@
+"""Benchmark de respaldos incrementales: completo frente a incremental tras un día de trabajo.
+Ejecutar: python bench_backup_incremental.py [n_ciudadanos] [--cambios N]
+
+Genera (SQLite temporal; ver bench_backup_export.py) n ciudadanos con su
+documento, servicio y vínculos, hace un respaldo completo, simula un día
+(N ciudadanos editados, N/2 altas con documento y N/10 documentos borrados)
+y compara un segundo respaldo completo con el incremental. Por último
+restaura la cadena en una base vacía y comprueba que coincide con el origen.
+"""
+import os
+import shutil
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+
+from sqlalchemy import create_engine, delete, insert, update
+
+from bench_backup_export import generate
+from database import backup_io, models
+from database.migrate import _table_digest
+from database.name_keys import name_keys
+
+args = [a for a in sys.argv[1:] if not a.startswith("--")]
+N = int(args[0]) if args else 100_000
+CAMBIOS = int(sys.argv[sys.argv.index("--cambios") + 1]) if "--cambios" in sys.argv else 500
+
+
+def simulate_day(engine, n: int, cambios: int):
+    now = datetime.now()
+    C, D = models.Ciudadano, models.Documento
+    with engine.begin() as conn:
+        conn.execute(update(C).where(C.id_ciudadano <= cambios).values(fecha_nacimiento=now.date(), fecha_ultima_modificacion=now))
+        conn.execute(update(models.DatosServicioMilitar).where(models.DatosServicioMilitar.id_ciudadano <= cambios).values(folio="F2"))
+        nuevos = range(n + 1, n + cambios // 2 + 1)
+        conn.execute(insert(C), [{"id_ciudadano": k, "apellidos": "NUEVO", "nombres": str(k), "fecha_creacion": now, "id_usuario_creacion": 1,
+                                  **dict(zip(("nombre_normalizado", "nombre_fonetico"), name_keys("NUEVO", str(k))))} for k in nuevos])
+        conn.execute(insert(D), [{"id_documento": k, "nombre_archivo": f"{k}.pdf", "fecha_extraccion": now, "id_usuario_extraccion": 1} for k in nuevos])
+        conn.execute(insert(models.CiudadanoDocumento), [{"id_ciudadano": k, "id_documento": k} for k in nuevos])
+        borrar = list(range(n // 2, n // 2 + cambios // 10))
+        conn.execute(delete(models.DocumentoServicio).where(models.DocumentoServicio.id_documento.in_(borrar)))
+        conn.execute(delete(models.CiudadanoDocumento).where(models.CiudadanoDocumento.id_documento.in_(borrar)))
+        conn.execute(delete(D).where(D.id_documento.in_(borrar)))
+
+
+def size_mb(path: str) -> float:
+    return sum(os.path.getsize(os.path.join(r, f)) for r, _, fs in os.walk(path) for f in fs) / 2**20
+
+
+def timed(fn):
+    t0 = time.perf_counter()
+    out = fn()
+    return out, time.perf_counter() - t0
+
+
+if __name__ == "__main__":
+    tmp = tempfile.mkdtemp(prefix="bench_incremental_")
+    src = create_engine(f"sqlite:///{os.path.join(tmp, 'src.sqlite3')}", future=True)
+    generate(src, N)
+    base = os.path.join(tmp, "backups")
+    (full_dir, full), full_s = timed(lambda: backup_io.export_backup(src, base))
+    time.sleep(1)
+    simulate_day(src, N, CAMBIOS)
+
+    (inc_dir, inc), inc_s = timed(lambda: backup_io.export_backup(src, base, incremental=True))
+    (full2_dir, _), full2_s = timed(lambda: backup_io.export_backup(src, os.path.join(tmp, "full2")))
+
+    print(f"{full['rows']:,} filas; día simulado: {CAMBIOS} ediciones, {CAMBIOS // 2} altas, {CAMBIOS // 10} bajas")
+    print(f"{'completo':<14} {full2_s:8.2f} s {size_mb(full2_dir):8.2f} MB")
+    print(f"{'incremental':<14} {inc_s:8.2f} s {size_mb(inc_dir):8.2f} MB  ({inc['rows']:,} filas, {inc['deleted']:,} borradas)")
+
+    dst = create_engine(f"sqlite:///{os.path.join(tmp, 'dst.sqlite3')}", future=True)
+    models.Base.metadata.create_all(dst)
+    res, restore_s = timed(lambda: backup_io.import_backup(dst, inc_dir))
+    diff = [n for n, m in backup_io.TABLES if _table_digest(src, m.__table__, 5000) != _table_digest(dst, m.__table__, 5000)]
+    print(f"{'restaurar cadena':<14} {restore_s:8.2f} s  {'idéntica al origen' if not diff else 'DIFERENCIAS: ' + ', '.join(diff)}")
+    shutil.rmtree(tmp, ignore_errors=True)
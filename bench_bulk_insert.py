@@ -0,0 +1,100 @@
+"""Benchmark del alta masiva frente al bucle de create_full_digital_record.
+Ejecutar: python bench_bulk_insert.py [n_registros] [--rtt MS] [--url DATABASE_URL]
+
+Por defecto usa SQLite en memoria (esquema creado con create_all). Con --rtt
+se suma una espera por sentencia para simular la latencia de red hacia el
+Postgres remoto de docker-compose.yml; con --url se mide contra una base
+real (¡escribe datos de prueba en ella!).
+
+Nota: en Postgres cada flush del alta masiva es un INSERT multi-fila por
+tabla (insertmanyvalues con RETURNING). SQLite no tiene centinela implícito
+para PK autoincrementales, así que ahí esos INSERT van fila a fila y el
+conteo de sentencias del modo masivo es pesimista.
+"""
+import os
+import sys
+import time
+
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from database.catalog_cache import catalog_cache
+from database.crud import create_full_digital_record, create_full_digital_records_bulk
+from database.models import Base, Rol, Usuario
+
+args = [a for a in sys.argv[1:] if not a.startswith("--")]
+N = int(args[0]) if args else 500
+RTT = float(sys.argv[sys.argv.index("--rtt") + 1]) / 1000 if "--rtt" in sys.argv else 0.0
+URL = sys.argv[sys.argv.index("--url") + 1] if "--url" in sys.argv else None
+
+GRADOS = ["SOLDADO", "CABO", "SARGENTO 2DO", "SARGENTO 1RO"]
+MOTIVOS = ["TIEMPO CUMPLIDO", "LICENCIADO", "DESERCION"]
+UNIDADES = [f"BIM {i}" for i in range(1, 16)]
+
+
+def make_engine():
+    if URL:
+        return create_engine(URL, future=True)
+    return create_engine("sqlite://", future=True, connect_args={"check_same_thread": False}, poolclass=StaticPool)
+
+
+def records(offset: int, n: int):
+    out = []
+    for i in range(n):
+        k = offset + i
+        out.append(({
+            "dni": f"{70000000 + k:011d}", "lm": None, "or": "025A", "clase": "1980", "libro": "12", "folio": str(k % 300),
+            "apellidos": f"APELLIDO{k}", "nombres": f"NOMBRE{k}", "fecha_nacimiento": "12/01/1960",
+            "presto_servicio": "SI", "gran_unidad": "1RA DE", "unidad_alta": UNIDADES[k % len(UNIDADES)],
+            "unidad_baja": UNIDADES[(k + 3) % len(UNIDADES)], "fecha_alta": "01/02/1978", "fecha_baja": "01/02/1980",
+            "grado": GRADOS[k % len(GRADOS)], "motivo_baja": MOTIVOS[k % len(MOTIVOS)],
+        }, {"name": f"doc{k}.pdf", "path": f"storage/data/doc{k}.pdf"}))
+    return out
+
+
+def run(label, fn):
+    engine = make_engine()
+    catalog_cache.invalidate()  # cada pasada usa una base nueva
+    if not URL:
+        Base.metadata.create_all(engine)
+    stmts = {"n": 0}
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def _count(*_a, **_k):
+        stmts["n"] += 1
+        if RTT:
+            time.sleep(RTT)
+
+    Session = sessionmaker(bind=engine, autoflush=False)
+    with Session() as db:
+        if not URL:
+            db.add(Rol(id_rol=1, nombre_rol="admin"))
+            db.add(Usuario(id_usuario=1, nombre_usuario="bench", contrasena_hash="x", id_rol=1))
+            db.commit()
+        stmts["n"] = 0
+        t0 = time.perf_counter()
+        fn(db)
+        dt = time.perf_counter() - t0
+    print(f"{label:<10} {N:>6} registros  {dt:8.2f} s  {N / dt:8.1f} reg/s  {stmts['n']:>7} sentencias ({stmts['n'] / N:.1f}/reg)")
+    engine.dispose()
+
+
+if __name__ == "__main__":
+    # Registros distintos en cada pasada para que ambas inserten (no actualicen)
+    loop_items, bulk_items = records(0, N), records(N, N)
+
+    def loop(db):
+        for data, info in loop_items:
+            create_full_digital_record(db, data, info, 1)
+
+    def bulk(db):
+        rep = create_full_digital_records_bulk(db, bulk_items, 1)
+        if rep["errors"]:
+            print(f"errores: {rep['errors']}  primero: {next(r for r in rep['results'] if not r['ok'])}")
+
+    print(f"RTT simulado por sentencia: {RTT * 1000:.1f} ms" + (f"  ({URL})" if URL else "  (SQLite en memoria)"))
+    run("bucle", loop)
+    run("masivo", bulk)
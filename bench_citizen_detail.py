@@ -0,0 +1,97 @@
+"""Benchmark de la apertura de un ciudadano en Gestión de Datos (pick()).
+Ejecutar: python bench_citizen_detail.py [n_documentos] [--rtt MS]
+
+Compara el camino anterior (sesión para documentos, otra para el servicio y
+una carga perezosa por unidad alta/baja, grado y motivo) con
+database.detail.load_citizen_detail (un solo SELECT con joinedload).
+Cuenta sentencias con database.instrumentation.count_queries; --rtt suma
+una espera por sentencia para simular la latencia hacia el Postgres remoto.
+"""
+import os
+import sys
+import time
+from datetime import date, datetime
+
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+
+from sqlalchemy import create_engine, event, select
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from database import models
+from database.detail import load_citizen_detail
+from database.instrumentation import count_queries
+
+args = [a for a in sys.argv[1:] if not a.startswith("--")]
+N_DOCS = int(args[0]) if args else 5
+RTT = float(sys.argv[sys.argv.index("--rtt") + 1]) / 1000 if "--rtt" in sys.argv else 0.0
+REPS = 20
+
+engine = create_engine("sqlite://", future=True, connect_args={"check_same_thread": False}, poolclass=StaticPool)
+Session = sessionmaker(bind=engine, autoflush=False)
+
+
+@event.listens_for(engine, "before_cursor_execute")
+def _latency(*_a, **_k):
+    if RTT:
+        time.sleep(RTT)
+
+
+def seed() -> int:
+    models.Base.metadata.create_all(engine)
+    now = datetime.utcnow()
+    with Session() as db:
+        db.add(models.Rol(id_rol=1, nombre_rol="admin"))
+        db.add(models.Usuario(id_usuario=1, nombre_usuario="bench", contrasena_hash="x", id_rol=1))
+        ua, ub = models.UnidadMilitar(nombre_unidad="BIM 1"), models.UnidadMilitar(nombre_unidad="BIM 2")
+        gr, mb = models.Grado(descripcion="CABO"), models.MotivoBaja(descripcion="TIEMPO CUMPLIDO")
+        c = models.Ciudadano(dni="40000001", apellidos="QUISPE MAMANI", nombres="JUAN", fecha_nacimiento=date(1960, 1, 12),
+                             fecha_creacion=now, id_usuario_creacion=1)
+        db.add_all([ua, ub, gr, mb, c])
+        db.flush()
+        db.add(models.DatosServicioMilitar(id_ciudadano=c.id_ciudadano, clase="1960", libro="12", folio="34",
+                                           unidad_alta=ua, unidad_baja=ub, grado=gr, motivo_baja=mb))
+        for i in range(N_DOCS):
+            d = models.Documento(nombre_archivo=f"doc{i}.pdf", ruta_almacenamiento=f"storage/data/doc{i}.pdf",
+                                 fecha_extraccion=now, id_usuario_extraccion=1)
+            db.add(d)
+            db.flush()
+            db.add(models.CiudadanoDocumento(id_ciudadano=c.id_ciudadano, id_documento=d.id_documento))
+        db.commit()
+        return c.id_ciudadano
+
+
+def anterior(cid: int):
+    # Réplica de pick() antes del cargador único
+    with Session() as s:
+        docs = s.execute(
+            select(models.Documento)
+            .join(models.CiudadanoDocumento, models.CiudadanoDocumento.id_documento == models.Documento.id_documento)
+            .where(models.CiudadanoDocumento.id_ciudadano == cid)
+        ).scalars().all()
+    with Session() as s:
+        sv = s.execute(select(models.DatosServicioMilitar).where(models.DatosServicioMilitar.id_ciudadano == cid)).scalar_one_or_none()
+        names = (sv.unidad_alta.nombre_unidad, sv.unidad_baja.nombre_unidad, sv.grado.descripcion, sv.motivo_baja.descripcion)
+    return docs, names
+
+
+def nuevo(cid: int):
+    with Session() as s:
+        return load_citizen_detail(s, cid)
+
+
+def run(label, fn, cid):
+    fn(cid)  # calentar
+    with count_queries(engine) as qc:
+        for _ in range(REPS):
+            fn(cid)
+    print(f"{label:<10} {qc.count / REPS:5.1f} consultas  {qc.elapsed_ms / REPS:8.2f} ms por apertura")
+
+
+if __name__ == "__main__":
+    cid = seed()
+    d = nuevo(cid)
+    assert len(d.documentos) == N_DOCS and d.grado == "CABO" and d.unidad_baja == "BIM 2"
+    print(f"{N_DOCS} documentos, RTT simulado {RTT * 1000:.1f} ms por sentencia")
+    run("anterior", anterior, cid)
+    run("único", nuevo, cid)
@@ -0,0 +1,99 @@
+"""Benchmark de las estadísticas de Inicio: COUNT(*) frente a database.stats.
+Ejecutar: python bench_dashboard_stats.py [n_registros] [--url DATABASE_URL]
+
+Genera (SQLite en un archivo temporal por defecto) n ciudadanos y n
+documentos repartidos en 36 meses y mide por render de Inicio: los dos
+COUNT(*) anteriores, el GROUP BY mensual que haría falta para graficar datos
+reales sin tabla de agregados, y dashboard_stats.get() leyendo la tabla
+(instantánea vencida) o la instantánea en memoria.
+"""
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+
+from sqlalchemy import create_engine, func, insert, select
+
+from database.models import Base, Ciudadano, Documento, Rol, Usuario
+from database.stats import dashboard_stats
+
+args = [a for a in sys.argv[1:] if not a.startswith("--")]
+N = int(args[0]) if args else 200_000
+URL = sys.argv[sys.argv.index("--url") + 1] if "--url" in sys.argv else None
+REPS = 20
+
+
+def generate(engine, n: int):
+    rnd = random.Random(3)
+    Base.metadata.create_all(engine)
+    start = datetime.now() - timedelta(days=36 * 30)
+    with engine.begin() as conn:
+        conn.execute(insert(Rol), [{"id_rol": 1, "nombre_rol": "admin"}])
+        conn.execute(insert(Usuario), [{"id_usuario": 1, "nombre_usuario": "bench", "contrasena_hash": "x", "id_rol": 1}])
+        for lo in range(0, n, 20_000):
+            hi = min(n, lo + 20_000)
+            fechas = [start + timedelta(minutes=rnd.randrange(36 * 30 * 24 * 60)) for _ in range(lo, hi)]
+            conn.execute(insert(Ciudadano), [
+                {"id_ciudadano": k + 1, "apellidos": "BENCH", "nombres": str(k), "fecha_creacion": f, "id_usuario_creacion": 1}
+                for k, f in zip(range(lo, hi), fechas)
+            ])
+            conn.execute(insert(Documento), [
+                {"id_documento": k + 1, "nombre_archivo": f"{k}.pdf", "fecha_extraccion": f, "id_usuario_extraccion": 1}
+                for k, f in zip(range(lo, hi), fechas)
+            ])
+
+
+def timed(fn) -> float:
+    best = float("inf")
+    for _ in range(REPS):
+        t0 = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - t0)
+    return best * 1000
+
+
+def counts(engine):
+    with engine.connect() as conn:
+        conn.execute(select(func.count()).select_from(Ciudadano)).scalar()
+        conn.execute(select(func.count()).select_from(Documento)).scalar()
+
+
+def group_by(engine):
+    with engine.connect() as conn:
+        for col in (Ciudadano.fecha_creacion, Documento.fecha_extraccion):
+            y, m = func.extract("year", col), func.extract("month", col)
+            conn.execute(select(y, m, func.count()).group_by(y, m)).all()
+
+
+def table(engine):
+    dashboard_stats.invalidate()
+    dashboard_stats.get(engine)
+
+
+if __name__ == "__main__":
+    if URL:
+        engine = create_engine(URL, future=True)
+    else:
+        path = os.path.join(tempfile.gettempdir(), f"bench_stats_{N}.sqlite3")
+        fresh = not os.path.exists(path)
+        engine = create_engine(f"sqlite:///{path}", future=True)
+        if fresh:
+            generate(engine, N)
+            print(f"generados {N} ciudadanos y documentos -> {path}")
+    t0 = time.perf_counter()
+    dashboard_stats.ensure(engine)
+    print(f"tabla mensual lista en {(time.perf_counter() - t0) * 1000:.0f} ms")
+    t0 = time.perf_counter()
+    dashboard_stats.reconcile(engine)
+    print(f"reconciliación completa: {(time.perf_counter() - t0) * 1000:.0f} ms")
+
+    s = dashboard_stats.get(engine)
+    print(f"{s.ciudadanos} ciudadanos, {s.documentos} documentos, {len(s.meses)} meses; últimos 6: {s.ultimos_meses()}")
+    print(f"{'COUNT(*) x2':<26} {timed(lambda: counts(engine)):9.2f} ms")
+    print(f"{'GROUP BY mensual':<26} {timed(lambda: group_by(engine)):9.2f} ms")
+    print(f"{'stats (lee tabla)':<26} {timed(lambda: table(engine)):9.2f} ms")
+    print(f"{'stats (en memoria)':<26} {timed(lambda: dashboard_stats.get(engine)):9.3f} ms")
@@ -0,0 +1,100 @@
+"""Benchmark del almacén por contenido: copia por subida anterior frente a utils.file_store.
+Ejecutar: python bench_file_store.py [n_subidas] [--repetidos 0.3] [--kb 300]
+
+Genera n archivos de --kb KB de los que una fracción --repetidos son copias
+de otros (el mismo escaneo subido dos veces, con otro nombre) y los guarda
+como antes (copy2 a storage/data con marca de tiempo) y con
+file_store.store. Luego exporta un respaldo completo con un Documento por
+subida y compara el tamaño de los archivos copiados al respaldo con lo que
+ocuparían copiando uno por documento.
+"""
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+
+from sqlalchemy import create_engine, insert
+
+from database import backup_io, models
+from utils import file_store
+
+args = [a for a in sys.argv[1:] if not a.startswith("--")]
+N = int(args[0]) if args else 1000
+REPETIDOS = float(sys.argv[sys.argv.index("--repetidos") + 1]) if "--repetidos" in sys.argv else 0.3
+KB = int(sys.argv[sys.argv.index("--kb") + 1]) if "--kb" in sys.argv else 300
+
+
+def dir_size(path: str) -> int:
+    return sum(os.path.getsize(os.path.join(r, f)) for r, _, fs in os.walk(path) for f in fs)
+
+
+def uploads(folder: str, n: int):
+    os.makedirs(folder)
+    unique = max(1, int(n * (1 - REPETIDOS)))
+    rnd = random.Random(7)
+    out = []
+    for k in range(n):
+        path = os.path.join(folder, f"escaneo_{k}.pdf")
+        if k < unique:
+            with open(path, "wb") as f:
+                f.write(rnd.randbytes(KB * 1024))
+        else:
+            shutil.copyfile(out[rnd.randrange(unique)], path)
+        out.append(path)
+    return out
+
+
+def anterior(files, storage: str):
+    # Réplica de add_files()/save_indices() antes del almacén
+    os.makedirs(storage)
+    out = []
+    for src in files:
+        ts = datetime.now().strftime("%Y%m%d_%H%M%S_%f")
+        dst = os.path.join(storage, f"{ts}_{os.path.basename(src)}")
+        shutil.copy2(src, dst)
+        out.append((dst, None))
+    return out
+
+
+def almacen(files):
+    return [file_store.store(src)[:2] for src in files]
+
+
+if __name__ == "__main__":
+    tmp = tempfile.mkdtemp(prefix="bench_file_store_")
+    files = uploads(os.path.join(tmp, "escaneos"), N)
+    file_store.OBJECTS_DIR = os.path.join(tmp, "objects")
+
+    results = {}
+    for label, run, folder in (
+        ("copia por subida", lambda: anterior(files, os.path.join(tmp, "data")), os.path.join(tmp, "data")),
+        ("almacén por hash", lambda: almacen(files), file_store.OBJECTS_DIR),
+    ):
+        t0 = time.perf_counter()
+        stored = run()
+        secs = time.perf_counter() - t0
+        results[label] = stored
+        print(f"{label:<18} {secs:7.2f} s {dir_size(folder) / 2**20:9.1f} MB en disco")
+
+    engine = create_engine(f"sqlite:///{os.path.join(tmp, 'db.sqlite3')}", future=True)
+    models.Base.metadata.create_all(engine)
+    now = datetime.now()
+    with engine.begin() as conn:
+        conn.execute(insert(models.Rol), [{"id_rol": 1, "nombre_rol": "admin"}])
+        conn.execute(insert(models.Usuario), [{"id_usuario": 1, "nombre_usuario": "bench", "contrasena_hash": "x", "id_rol": 1}])
+        conn.execute(insert(models.Documento), [
+            {"id_documento": k + 1, "nombre_archivo": os.path.basename(src), "ruta_almacenamiento": path,
+             "hash_contenido": sha, "fecha_extraccion": now, "id_usuario_extraccion": 1}
+            for k, (src, (path, sha)) in enumerate(zip(files, results["almacén por hash"]))])
+    t0 = time.perf_counter()
+    out_dir, manifest = backup_io.export_backup(engine, os.path.join(tmp, "backups"))
+    secs = time.perf_counter() - t0
+    info = manifest["files"]
+    print(f"respaldo: {info['count']:,} documentos, {info['payloads']:,} archivos copiados "
+          f"({info['payload_bytes'] / 2**20:.1f} MB, uno por documento serían {N * KB / 1024:.1f} MB) en {secs:.2f} s")
+    shutil.rmtree(tmp, ignore_errors=True)
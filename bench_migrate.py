@@ -0,0 +1,79 @@
+"""Benchmark de la migración de base de datos: copia fila a fila anterior frente a database.migrate.
+Ejecutar: python bench_migrate.py [n_ciudadanos]
+
+Genera una base SQLite temporal con n ciudadanos (documento, servicio y
+vínculos por cada uno; ver bench_backup_export.py) y la migra a otra base
+SQLite vacía con el camino anterior (todas las filas como objetos ORM,
+SELECT por clave en el destino y un único commit) y con migrate() con y sin
+verificación. Reporta tiempo y memoria máxima de Python (tracemalloc).
+"""
+import os
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+
+from sqlalchemy import create_engine, select
+from sqlalchemy.orm import Session
+
+from bench_backup_export import generate
+from database import models
+from database.migrate import migrate
+
+args = [a for a in sys.argv[1:] if not a.startswith("--")]
+N = int(args[0]) if args else 20_000
+
+
+def anterior(src_engine, dst_engine):
+    # Réplica de confirmar_migracion() antes de database.migrate
+    models.Base.metadata.create_all(dst_engine)
+    src, dst = Session(src_engine), Session(dst_engine, autoflush=False)
+
+    def _copy(model):
+        rows = src.execute(select(model)).scalars().all()
+        for r in rows:
+            data = {c.name: getattr(r, c.name) for c in model.__table__.columns}
+            pk_cols = [c.name for c in model.__table__.primary_key.columns]
+            filt = [getattr(model, k) == data.get(k) for k in pk_cols]
+            ex = dst.execute(select(model).where(*filt)).scalar_one_or_none()
+            if not ex:
+                dst.add(model(**data))
+    for m in [models.MotivoBaja, models.UnidadMilitar, models.Grado, models.Rol, models.Usuario, models.Documento, models.Ciudadano, models.DatosServicioMilitar]:
+        _copy(m)
+    for m in [models.CiudadanoDocumento, models.DocumentoServicio]:
+        _copy(m)
+    dst.commit()
+    src.close(); dst.close()
+
+
+def measure(fn):
+    tracemalloc.start()
+    t0 = time.perf_counter()
+    fn()
+    secs = time.perf_counter() - t0
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return secs, peak
+
+
+if __name__ == "__main__":
+    tmp = tempfile.mkdtemp(prefix="bench_migrate_")
+    src = create_engine(f"sqlite:///{os.path.join(tmp, 'src.sqlite3')}", future=True)
+    generate(src, N)
+    print(f"{N * 5 + 2:,} filas")
+
+    def target(name):
+        return create_engine(f"sqlite:///{os.path.join(tmp, name)}", future=True)
+
+    ck = os.path.join(tmp, "ck.json")
+    for label, run in (
+        ("fila a fila (anterior)", lambda: anterior(src, target("old.sqlite3"))),
+        ("migrate sin verificar", lambda: migrate(src, target("new.sqlite3"), checkpoint=ck, verify=False)),
+        ("migrate + verificación", lambda: migrate(src, target("new2.sqlite3"), checkpoint=ck)),
+    ):
+        secs, peak = measure(run)
+        print(f"{label:<24} {secs:8.2f} s {peak / 2**20:10.1f} MB")
+    shutil.rmtree(tmp, ignore_errors=True)
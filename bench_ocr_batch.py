@@ -0,0 +1,41 @@
+"""Benchmark del motor de OCR en lote con un extractor falso (sin Vertex).
+Ejecutar: python bench_ocr_batch.py [n_archivos] [latencia_ms]
+
+Simula la latencia de red de la llamada al modelo con un sleep y compara el
+tiempo total del lote para distintos límites de concurrencia.
+"""
+import os
+import sys
+import time
+import tempfile
+
+from utils.ocr_batch import OCRBatchEngine
+
+N_FILES = int(sys.argv[1]) if len(sys.argv) > 1 else 40
+LATENCY_S = (int(sys.argv[2]) if len(sys.argv) > 2 else 250) / 1000.0
+
+
+def fake_extractor(path: str) -> dict:
+    time.sleep(LATENCY_S)
+    return {"dni": "00012345678", "apellidos": "PRUEBA", "nombres": os.path.basename(path)}
+
+
+def run(paths, workers: int) -> None:
+    engine = OCRBatchEngine(fake_extractor, max_workers=workers)
+    engine.start(list(enumerate(paths)))
+    engine.wait()
+    st = engine.stats
+    print(f"workers={workers:>2}  archivos={st.processed:>4}  tiempo={st.elapsed:6.2f} s  throughput={st.throughput:6.1f} arch/s")
+
+
+if __name__ == "__main__":
+    with tempfile.TemporaryDirectory() as tmp:
+        paths = []
+        for i in range(N_FILES):
+            p = os.path.join(tmp, f"{i}.pdf")
+            with open(p, "wb") as f:
+                f.write(b"%PDF-1.4\n")
+            paths.append(p)
+        print(f"{N_FILES} archivos, latencia simulada {LATENCY_S * 1000:.0f} ms")
+        for workers in (1, 2, 4, 8):
+            run(paths, workers)
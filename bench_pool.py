@@ -0,0 +1,102 @@
+"""Benchmark del pool de conexiones: sesión retenida frente a session_scope.
+Ejecutar: python bench_pool.py [hilos] [--pool N] [--rtt MS] [--ui MS]
+
+Cada hilo repite "consultar y luego trabajar en la interfaz". El patrón
+anterior (sesión abierta a mano y cerrada al final del handler, o nunca)
+retiene la conexión durante el trabajo de interfaz; con session_scope la
+conexión vuelve al pool al terminar la consulta. Usa TimedQueuePool sobre un
+SQLite temporal e imprime pool_metrics.snapshot() de cada variante.
+"""
+import os
+import sys
+import tempfile
+import threading
+import time
+
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+
+from contextlib import contextmanager
+
+from sqlalchemy import create_engine, event, text
+from sqlalchemy.orm import sessionmaker
+
+from database.instrumentation import TimedQueuePool, pool_metrics
+
+
+def _arg(name, default):
+    return float(sys.argv[sys.argv.index(name) + 1]) if name in sys.argv else default
+
+
+args = [a for a in sys.argv[1:] if not a.startswith("--")]
+THREADS = int(args[0]) if args and args[0].isdigit() else 12
+POOL = int(_arg("--pool", 3))
+RTT = _arg("--rtt", 5) / 1000
+UI = _arg("--ui", 20) / 1000
+OPS = 15
+
+path = os.path.join(tempfile.gettempdir(), "bench_pool.sqlite3")
+engine = create_engine(f"sqlite:///{path}", future=True, poolclass=TimedQueuePool,
+                       pool_size=POOL, max_overflow=0, pool_timeout=30,
+                       connect_args={"check_same_thread": False})
+pool_metrics.attach(engine)
+Session = sessionmaker(bind=engine, autoflush=False)
+
+
+@event.listens_for(engine, "before_cursor_execute")
+def _latency(*_a, **_k):
+    time.sleep(RTT)
+
+
+@contextmanager
+def scope():
+    # Igual que database.connection.session_scope, sobre el engine del benchmark
+    db = Session(expire_on_commit=False)
+    try:
+        yield db
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+
+def retenida():
+    db = Session()
+    try:
+        db.execute(text("SELECT 1")).scalar()
+        time.sleep(UI)  # refrescar tabla, abrir diálogo... con la conexión tomada
+    finally:
+        db.close()
+
+
+def con_scope():
+    with scope() as db:
+        db.execute(text("SELECT 1")).scalar()
+    time.sleep(UI)
+
+
+def run(label, fn):
+    pool_metrics.reset()
+
+    def worker():
+        for _ in range(OPS):
+            fn()
+
+    threads = [threading.Thread(target=worker) for _ in range(THREADS)]
+    t0 = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - t0
+    snap = pool_metrics.snapshot()
+    print(f"{label:<10} {THREADS * OPS / elapsed:7.1f} ops/s  esperas {snap['waits']:>4}  "
+          f"media {snap['wait_avg_ms']:7.1f} ms  máx {snap['wait_max_ms']:7.1f} ms  pico {snap['peak_in_use']}")
+
+
+if __name__ == "__main__":
+    print(f"{THREADS} hilos, pool {POOL}, RTT {RTT * 1000:.0f} ms, interfaz {UI * 1000:.0f} ms")
+    run("retenida", retenida)
+    run("scope", con_scope)
+    print(pool_metrics.snapshot())
@@ -0,0 +1,97 @@
+"""Benchmark del preprocesado de imágenes antes del envío al modelo.
+Ejecutar: python bench_preprocess.py [carpeta] [--accuracy] [--truth verdad.json]
+
+Compara, sobre las fotos de muestra (prueba_archivos/IMG_*.jpg), el pipeline
+anterior (resolución completa, PNG de 8 bits) con el actual (recorte de bordes,
+reducción a TARGET_LONG_EDGE, PNG de 1 bit): bytes enviados y tiempo de
+preprocesado.
+
+Con --accuracy además envía ambas versiones al modelo y reporta la
+coincidencia campo a campo. Si se pasa --truth (JSON {archivo: {campo: valor}})
+la precisión se mide contra esa verdad; si no, contra la salida del pipeline
+anterior.
+"""
+import glob
+import json
+import os
+import sys
+import time
+
+import cv2
+import numpy as np
+
+import jpg
+
+FIELDS = ["dni", "lm", "or", "clase", "libro", "folio", "apellidos", "nombres", "fecha_nacimiento"]
+
+
+def legacy_preprocess(image_path: str) -> bytes:
+    """Pipeline previo: resolución completa, binarizado y PNG de 8 bits."""
+    img = cv2.imread(image_path)
+    h, w = img.shape[:2]
+    if w > h:
+        img = cv2.rotate(img, cv2.ROTATE_90_CLOCKWISE)
+    gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
+    enhanced = cv2.createCLAHE(clipLimit=2.0, tileGridSize=(8, 8)).apply(gray)
+    _, binary = cv2.threshold(enhanced, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)
+    binary = cv2.dilate(binary, np.ones((1, 1), np.uint8), iterations=1)
+    return cv2.imencode(".png", binary)[1].tobytes()
+
+
+def timed(fn, path):
+    t0 = time.perf_counter()
+    out = fn(path)
+    return out, time.perf_counter() - t0
+
+
+def field_hits(result: dict, reference: dict) -> tuple[int, int]:
+    ok = total = 0
+    for k in FIELDS:
+        ref = (reference or {}).get(k)
+        if ref in (None, ""):
+            continue
+        total += 1
+        ok += int(str((result or {}).get(k) or "").strip().upper() == str(ref).strip().upper())
+    return ok, total
+
+
+if __name__ == "__main__":
+    args = [a for a in sys.argv[1:] if not a.startswith("--")]
+    folder = args[0] if args else "prueba_archivos"
+    check_accuracy = "--accuracy" in sys.argv
+    truth = {}
+    if "--truth" in sys.argv:
+        with open(sys.argv[sys.argv.index("--truth") + 1], "r", encoding="utf-8") as f:
+            truth = json.load(f)
+
+    paths = sorted(glob.glob(os.path.join(folder, "IMG_*.jpg")))
+    if not paths:
+        print(f"No hay imágenes IMG_*.jpg en {folder}")
+        sys.exit(1)
+
+    tot = {"orig": 0, "legacy": 0, "new": 0, "t_legacy": 0.0, "t_new": 0.0, "ok_legacy": 0, "ok_new": 0, "n": 0}
+    print(f"{'archivo':<28}{'original':>10}{'antes':>10}{'ahora':>10}{'t antes':>9}{'t ahora':>9}")
+    for p in paths:
+        legacy, t_legacy = timed(legacy_preprocess, p)
+        new, t_new = timed(jpg.preprocess_image, p)
+        orig = os.path.getsize(p)
+        tot["orig"] += orig; tot["legacy"] += len(legacy); tot["new"] += len(new)
+        tot["t_legacy"] += t_legacy; tot["t_new"] += t_new
+        print(f"{os.path.basename(p):<28}{orig // 1024:>8}KB{len(legacy) // 1024:>8}KB{len(new) // 1024:>8}KB{t_legacy * 1000:>7.0f}ms{t_new * 1000:>7.0f}ms")
+
+        if check_accuracy:
+            r_legacy = jpg.extract_with_gemini(legacy) or {}
+            r_new = jpg.extract_with_gemini(new) or {}
+            reference = truth.get(os.path.basename(p)) or r_legacy
+            ok_l, n = field_hits(r_legacy, reference)
+            ok_n, _ = field_hits(r_new, reference)
+            tot["ok_legacy"] += ok_l; tot["ok_new"] += ok_n; tot["n"] += n
+
+    print("-" * 76)
+    print(f"{'TOTAL':<28}{tot['orig'] // 1024:>8}KB{tot['legacy'] // 1024:>8}KB{tot['new'] // 1024:>8}KB"
+          f"{tot['t_legacy'] * 1000:>7.0f}ms{tot['t_new'] * 1000:>7.0f}ms")
+    if tot["legacy"]:
+        print(f"Reducción de bytes enviados: {100 * (1 - tot['new'] / tot['legacy']):.1f}%")
+    if check_accuracy and tot["n"]:
+        ref = "verdad" if truth else "pipeline anterior"
+        print(f"Precisión por campo vs {ref}: antes {tot['ok_legacy'] / tot['n']:.1%}  ahora {tot['ok_new'] / tot['n']:.1%}")
@@ -0,0 +1,150 @@
+"""Benchmark del buscador de ciudadanos: LIKE '%x%' anterior frente a database.search.
+Ejecutar: python bench_search.py [n_ciudadanos] [--url DATABASE_URL]
+
+Genera un archivo sintético (SQLite en un archivo temporal por defecto) con
+ciudadanos y su servicio militar, crea los índices de búsqueda y mide cada
+tipo de consulta con ambos métodos (incluye variantes fonéticas y errores de
+tipeo, que el LIKE anterior no encuentra) y la latencia por página del
+listado paginado (keyset) al recorrer el archivo completo. Con --url se usa una base existente (no
+genera datos; las consultas deben tener sentido para esos datos).
+"""
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import date, datetime, timedelta
+
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+
+from sqlalchemy import create_engine, insert, or_, select
+from sqlalchemy.orm import Session
+
+from database.models import Base, Ciudadano, DatosServicioMilitar, Rol, Usuario
+from database.search import ensure_search_indexes, search_citizens, search_page
+
+args = [a for a in sys.argv[1:] if not a.startswith("--")]
+N = int(args[0]) if args else 200_000
+URL = sys.argv[sys.argv.index("--url") + 1] if "--url" in sys.argv else None
+REPS = 5
+
+APELLIDOS = ["QUISPE", "MAMANI", "FLORES", "RODRIGUEZ", "GARCIA", "HUAMAN", "CHAVEZ", "TORRES", "RAMOS", "VARGAS",
+             "CONDORI", "CASTILLO", "ROJAS", "MENDOZA", "DIAZ", "CRUZ", "CCALLO", "PUMA", "APAZA", "ZEVALLOS"]
+NOMBRES = ["JUAN", "JOSE", "LUIS", "CARLOS", "JORGE", "MIGUEL", "VICTOR", "PEDRO", "MARIO", "JULIO",
+           "ALBERTO", "CESAR", "RAUL", "FELIX", "HUGO", "WALTER", "EDGAR", "RICARDO", "MANUEL", "ANGEL"]
+
+
+def generate(engine, n: int):
+    rnd = random.Random(7)
+    Base.metadata.create_all(engine)
+    now = datetime.utcnow()
+    with engine.begin() as conn:
+        conn.execute(insert(Rol), [{"id_rol": 1, "nombre_rol": "admin"}])
+        conn.execute(insert(Usuario), [{"id_usuario": 1, "nombre_usuario": "bench", "contrasena_hash": "x", "id_rol": 1}])
+        for start in range(0, n, 20_000):
+            cs, ss = [], []
+            for k in range(start, min(n, start + 20_000)):
+                nac = date(1940, 1, 1) + timedelta(days=rnd.randrange(365 * 45))
+                cs.append({
+                    "id_ciudadano": k + 1, "dni": dni_of(k), "lm": f"{k + 1:07d}",
+                    "apellidos": f"{rnd.choice(APELLIDOS)} {rnd.choice(APELLIDOS)}",
+                    "nombres": f"{rnd.choice(NOMBRES)} {rnd.choice(NOMBRES)}",
+                    "fecha_nacimiento": nac, "presto_servicio": True, "fecha_creacion": now, "id_usuario_creacion": 1,
+                })
+                ss.append({"id_ciudadano": k + 1, "clase": str(nac.year), "libro": str(k // 400 + 1), "folio": str(k % 400 + 1)})
+            conn.execute(insert(Ciudadano), cs)
+            conn.execute(insert(DatosServicioMilitar), ss)
+
+
+def dni_of(k: int) -> str:
+    # Como lo guarda la aplicación: 8 dígitos rellenos con ceros a 11
+    return f"{10_000_000 + k * 37 % 89_999_999:011d}"
+
+
+def legacy(q: str):
+    like = f"%{q.upper()}%"
+    C = Ciudadano
+    return (select(C).where(or_(C.dni.like(like), C.lm.like(like), C.apellidos.like(like), C.nombres.like(like)))
+            .order_by(C.id_ciudadano.desc()).limit(200))
+
+
+def timed_search(db, q: str) -> tuple:
+    best = float("inf")
+    for _ in range(REPS):
+        t0 = time.perf_counter()
+        rows = search_citizens(db, q)
+        best = min(best, time.perf_counter() - t0)
+        db.expunge_all()
+    return best * 1000, len(rows)
+
+
+def timed(db, stmt) -> tuple:
+    best = float("inf")
+    for _ in range(REPS):
+        t0 = time.perf_counter()
+        rows = db.execute(stmt).scalars().all()
+        best = min(best, time.perf_counter() - t0)
+        db.expunge_all()
+    return best * 1000, len(rows)
+
+
+if __name__ == "__main__":
+    if URL:
+        engine = create_engine(URL, future=True)
+    else:
+        path = os.path.join(tempfile.gettempdir(), f"bench_search_v2_{N}.sqlite3")
+        fresh = not os.path.exists(path)
+        engine = create_engine(f"sqlite:///{path}", future=True)
+        if fresh:
+            t0 = time.perf_counter()
+            generate(engine, N)
+            print(f"generados {N} ciudadanos en {time.perf_counter() - t0:.1f} s -> {path}")
+    t0 = time.perf_counter()
+    mode = ensure_search_indexes(engine)
+    print(f"índices ({mode}) listos en {time.perf_counter() - t0:.1f} s")
+
+    mid = N // 2
+    consultas = [
+        ("DNI exacto", dni_of(mid), True),
+        ("DNI sin ceros", dni_of(mid)[3:], True),
+        ("DNI parcial", dni_of(mid)[5:9], True),
+        ("LM exacto", f"lm:{mid + 1:07d}", False),
+        ("apellidos", "CCALLO ZEVALLOS", False),
+        ("apellido + nombre", "PUMA HUGO", False),
+        ("libro/folio", f"L{mid // 400 + 1}-F{mid % 400 + 1}", False),
+        ("clase + apellido", "clase:1960 APAZA", False),
+        ("fecha nac.", "12/01/1960", False),
+        ("fonético", "SEVAYOS CAYO", False),
+        ("error de tipeo", "QUIPSE WALTER", False),
+        ("transposición", "QUIPSE", False),
+        ("HU/GU", "GUAMAN", False),
+    ]
+    # Término mal escrito -> apellido que debe aparecer primero
+    esperado = {"QUIPSE": "QUISPE", "GUAMAN": "HUAMAN"}
+    print(f"{'consulta':<20} {'texto':<22} {'LIKE ms':>9} {'filas':>6} {'índice ms':>10} {'filas':>6}")
+    with Session(engine) as db:
+        for label, q, comparable in consultas:
+            new_ms, new_n = timed_search(db, q)
+            # El LIKE anterior solo entiende texto libre sobre dni/lm/nombres
+            old = timed(db, legacy(q)) if comparable or label.startswith("apellido") else None
+            old_s = f"{old[0]:9.1f} {old[1]:>6}" if old else f"{'n/a':>9} {'':>6}"
+            print(f"{label:<20} {q:<22} {old_s} {new_ms:10.2f} {new_n:>6}")
+            if label.startswith("DNI") and not URL:
+                # El DNI guardado con ceros debe aparecer se escriba completo, sin ceros o en parte
+                found = {r.dni for r in search_citizens(db, q)}
+                assert dni_of(mid) in found, f"{label}: {q} no encuentra {dni_of(mid)}"
+            if q in esperado and not URL:
+                rows = search_citizens(db, q)
+                assert rows and esperado[q] in rows[0].apellidos, f"{label}: {q} no encuentra {esperado[q]}"
+
+        # Paginación keyset: la página 1 y la página 400 deben costar lo mismo
+        print(f"\n{'listado':<20} {'páginas':>8} {'pág. 1 ms':>10} {'media ms':>9} {'última ms':>10}")
+        for q in ["", "QUISPE"]:
+            times, cur, pages = [], None, 0
+            while pages < 400 and (cur is None or cur.has_more):
+                t0 = time.perf_counter()
+                _, cur = search_page(db, q, cur)
+                times.append((time.perf_counter() - t0) * 1000)
+                pages += 1
+                db.expunge_all()
+            print(f"{q or '(todos)':<20} {pages:>8} {times[0]:10.2f} {sum(times) / len(times):9.2f} {times[-1]:10.2f}")
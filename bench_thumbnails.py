@@ -0,0 +1,80 @@
+"""Benchmark de miniaturas: decodificar originales por render de lista frente a utils.thumbnails.
+Ejecutar: python bench_thumbnails.py [n_archivos]
+
+Genera en un directorio temporal n escaneos (JPEG 2480x3508, A4 a 300 dpi) y
+n PDF de una página con ese escaneo. Mide el costo por render de la lista si
+cada vista previa decodifica el original reducido al tamaño de la tarjeta,
+la generación única de miniaturas (lo que hace el hilo al cargar) y la
+lectura posterior de las miniaturas ya generadas.
+"""
+import io
+import os
+import sys
+import tempfile
+import time
+
+import fitz  # type: ignore
+import numpy as np
+from PIL import Image
+
+# Las miniaturas de archivos fuera de storage/data van a la caché: que sea temporal
+os.environ.setdefault("THUMB_CACHE_DIR", os.path.join(tempfile.gettempdir(), "bench_thumbs_cache"))
+from utils import thumbnails as T
+
+N = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+
+
+def make_files(root: str, n: int) -> list:
+    rnd = np.random.default_rng(9)
+    paths = []
+    for i in range(n):
+        arr = (rnd.random((3508 // 4, 2480 // 4)) * 80 + 160).astype(np.uint8)
+        img = Image.fromarray(arr).resize((2480, 3508)).convert("RGB")
+        jpg = os.path.join(root, f"scan_{i}.jpg")
+        img.save(jpg, "JPEG", quality=85)
+        doc = fitz.open()
+        pg = doc.new_page(width=595, height=842)
+        pg.insert_image(pg.rect, filename=jpg)
+        pdf = os.path.join(root, f"scan_{i}.pdf")
+        doc.save(pdf)
+        paths += [jpg, pdf]
+    return paths
+
+
+def decode_original(path: str) -> bytes:
+    # Lo mínimo para mostrar el original en una tarjeta: decodificar y reducir
+    if path.endswith(".pdf"):
+        with fitz.open(path) as d:
+            return d.load_page(0).get_pixmap(alpha=False).tobytes("png")
+    with Image.open(path) as img:
+        img = img.convert("RGB").resize((240, 340))
+        buf = io.BytesIO()
+        img.save(buf, "JPEG")
+        return buf.getvalue()
+
+
+if __name__ == "__main__":
+    root = tempfile.mkdtemp(prefix="bench_thumbs_")
+    paths = make_files(root, N)
+    print(f"{len(paths)} archivos ({N} JPEG + {N} PDF) en {root}")
+
+    t0 = time.perf_counter()
+    for p in paths:
+        decode_original(p)
+    orig = (time.perf_counter() - t0) * 1000
+
+    t0 = time.perf_counter()
+    for p in paths:
+        T.make_thumbnail(p)
+    gen = (time.perf_counter() - t0) * 1000
+
+    t0 = time.perf_counter()
+    for p in paths:
+        with open(T.existing_thumbnail(p), "rb") as f:
+            f.read()
+    read = (time.perf_counter() - t0) * 1000
+
+    size = sum(os.path.getsize(T.thumbnail_path(p)) for p in paths) / len(paths) / 1024
+    print(f"{'originales por render':<28} {orig:9.1f} ms")
+    print(f"{'generar miniaturas (1 vez)':<28} {gen:9.1f} ms")
+    print(f"{'leer miniaturas por render':<28} {read:9.1f} ms   ({size:.1f} KB c/u)")
@@ -0,0 +1,41 @@
+"""Benchmark de latencia del cliente de extracción compartido.
+Ejecutar: python bench_vertex_client.py [ruta_pdf] [n_llamadas] [--stub]
+
+Mide el costo de la primera llamada (credenciales + vertexai.init + modelo)
+frente a las siguientes, que reutilizan el cliente del proceso. Con --stub se
+usa el backend local (sin red) para medir solo el overhead propio.
+"""
+import os
+import sys
+import time
+
+from utils.vertex_client import StubBackend, get_client, set_client
+import pdf
+
+args = [a for a in sys.argv[1:] if not a.startswith("--")]
+RUTA = args[0] if args else os.path.join("prueba_archivos", "2.pdf")
+N_CALLS = int(args[1]) if len(args) > 1 else 5
+
+if __name__ == "__main__":
+    if "--stub" in sys.argv:
+        set_client(StubBackend(latency=0.0))
+
+    t0 = time.perf_counter()
+    client = get_client()
+    first = pdf.analizar_documento_smv(RUTA)
+    t_first = time.perf_counter() - t0
+    if isinstance(first, dict) and first.get("error"):
+        print(f"Error en la primera llamada: {first['error']}")
+        sys.exit(1)
+
+    times = []
+    for _ in range(N_CALLS):
+        t0 = time.perf_counter()
+        pdf.analizar_documento_smv(RUTA)
+        times.append(time.perf_counter() - t0)
+
+    print(f"backend: {client.name}")
+    print(f"inicialización del cliente: {(client.init_seconds or 0) * 1000:8.1f} ms")
+    print(f"primera llamada (total):    {t_first * 1000:8.1f} ms")
+    if times:
+        print(f"llamadas siguientes (media): {sum(times) / len(times) * 1000:7.1f} ms  (n={len(times)})")
@@ -0,0 +1,89 @@
+"""Benchmark del visor de documentos: render por clic anterior frente a utils.render_cache.
+Ejecutar: python bench_viewer_render.py [ruta.pdf] [--pages N]
+
+Sin ruta genera un PDF temporal de N páginas (imagen escaneada simulada por
+página). Mide por clic de "Siguiente": el camino anterior (abrir el PDF para
+contar páginas, reabrirlo, rasterizar y codificar en base64), la página
+siguiente ya preparada en segundo plano, una página en caché de disco (visor
+reabierto en otro proceso) y una página en caché de memoria.
+"""
+import base64
+import os
+import sys
+import tempfile
+import time
+
+import fitz  # type: ignore
+import numpy as np
+
+from utils.render_cache import RenderCache, RenderedDocument
+
+args = [a for a in sys.argv[1:] if not a.startswith("--")]
+N_PAGES = int(sys.argv[sys.argv.index("--pages") + 1]) if "--pages" in sys.argv else 12
+ZOOM = 1.2
+
+
+def make_pdf(path: str, pages: int) -> None:
+    rnd = np.random.default_rng(5)
+    doc = fitz.open()
+    for i in range(pages):
+        pg = doc.new_page(width=595, height=842)
+        noise = (rnd.random((1100, 800)) * 60 + 180).astype(np.uint8)
+        pix = fitz.Pixmap(fitz.csGRAY, 800, 1100, noise.tobytes(), False)
+        pg.insert_image(pg.rect, pixmap=pix)
+        pg.insert_text((72, 100), f"LIBRETA MILITAR - HOJA {i + 1}", fontsize=18)
+    doc.save(path)
+
+
+def anterior(path: str, page: int) -> str:
+    # Réplica de refresh_image() antes de la caché
+    with fitz.open(path) as d:
+        _ = len(d)
+    doc = fitz.open(path)
+    try:
+        pix = doc.load_page(page).get_pixmap(matrix=fitz.Matrix(ZOOM, ZOOM), alpha=False)
+        return base64.b64encode(pix.tobytes("png")).decode("ascii")
+    finally:
+        doc.close()
+
+
+def ms(fn) -> float:
+    t0 = time.perf_counter()
+    fn()
+    return (time.perf_counter() - t0) * 1000
+
+
+if __name__ == "__main__":
+    tmp = tempfile.mkdtemp(prefix="bench_render_")
+    path = args[0] if args else os.path.join(tmp, "doc.pdf")
+    if not args:
+        make_pdf(path, N_PAGES)
+    pages = len(fitz.open(path))
+    print(f"{path}: {pages} páginas, zoom {ZOOM}")
+
+    old = [ms(lambda p=p: anterior(path, p)) for p in range(pages)]
+
+    cache = RenderCache(root=os.path.join(tmp, "cache"))
+    viewer = RenderedDocument(path, cache)
+    first = ms(lambda: viewer.render(0, ZOOM))
+    nxt = []
+    for p in range(pages):
+        nxt.append(ms(lambda p=p: viewer.render(p, ZOOM)))
+        viewer.prefetch(p, ZOOM)
+        time.sleep(0.3)  # el usuario mira la página; el hilo prepara la siguiente
+    viewer.close()
+
+    # Otro proceso: memoria vacía, disco lleno
+    disk = RenderCache(root=os.path.join(tmp, "cache"))
+    viewer = RenderedDocument(path, disk, prefetch_pages=0)
+    disk_ms = [ms(lambda p=p: viewer.render(p, ZOOM)) for p in range(pages)]
+    mem_ms = [ms(lambda p=p: viewer.render(p, ZOOM)) for p in range(pages)]
+    viewer.close()
+
+    avg = lambda xs: sum(xs) / len(xs)
+    print(f"{'anterior (por clic)':<26} {avg(old):8.2f} ms")
+    print(f"{'primera página (fría)':<26} {first:8.2f} ms")
+    print(f"{'siguiente (prefetch)':<26} {avg(nxt[1:]):8.2f} ms")
+    print(f"{'caché en disco':<26} {avg(disk_ms):8.2f} ms")
+    print(f"{'caché en memoria':<26} {avg(mem_ms):8.3f} ms")
+    print(cache.stats())
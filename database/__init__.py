@@ -1,3 +1,13 @@
 # database/__init__.py
 from .connection import get_db
-from .crud import create_full_digital_record
+from .crud import create_full_digital_record, create_full_digital_records_bulk
+from .catalog_cache import catalog_cache
+from .stats import dashboard_stats
+
+__all__ = [
+    "get_db",
+    "create_full_digital_record",
+    "create_full_digital_records_bulk",
+    "catalog_cache",
+    "dashboard_stats",
+]
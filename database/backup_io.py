@@ -0,0 +1,757 @@
+# database/backup_io.py
+"""Respaldos por tabla en NDJSON comprimido, en memoria acotada.
+
+Formato de un respaldo (carpeta `backup_<AAAAmmdd_HHMMSS>`):
+  - `<tabla>.ndjson.gz`: una fila por línea (objeto JSON columna -> valor;
+    fechas en ISO 8601); en un respaldo completo, ordenada por clave primaria.
+  - `<tabla>.keys.gz`: todas las claves primarias de la tabla en ese momento
+    (una lista JSON por línea, ordenadas); son la base del siguiente
+    incremental.
+  - `<tabla>.deleted.gz` (solo incrementales): claves borradas desde el
+    respaldo anterior.
+  - `files/` y `files.ndjson.gz`: archivos de los documentos exportados,
+    uno por contenido (`files/<sha256><ext>`); el índice da por documento
+    su ruta original, sha256, tamaño y dónde está el contenido, que puede
+    ser un respaldo anterior de la cadena.
+  - `manifest.json`: versión del formato, tipo (full/incremental), fecha,
+    cadena de respaldos de la que depende y por tabla archivo, filas, sha256
+    de las líneas sin comprimir y tamaño comprimido. Se escribe al final: una
+    carpeta sin manifiesto es un respaldo incompleto.
+
+Incrementales: contienen solo lo que cambió desde el respaldo anterior de la
+misma carpeta. Ciudadanos y documentos por sus fechas de auditoría
+(fecha_creacion/fecha_ultima_modificacion, fecha_extraccion; con
+BACKUP_CLOCK_MARGIN_S de margen), servicios por su ciudadano (editar un
+servicio siempre actualiza al ciudadano), más las filas de claves nuevas
+(vínculos, altas con fecha anterior); las tablas de catálogo, roles y
+usuarios van completas. Las bajas salen de comparar las claves con las del
+respaldo anterior (recorrido ordenado de ambas listas, sin cargarlas en
+memoria). Tras BACKUP_MAX_CHAIN incrementales el siguiente es completo.
+
+Las tablas se leen en una sola transacción (REPEATABLE READ en PostgreSQL,
+para que todas vean el mismo instante) con cursores del lado del servidor
+(`stream_results`) de BACKUP_CHUNK_ROWS filas; nunca hay más de un bloque
+en memoria. estadisticas_mensuales no se respalda: se recalcula sola
+(database/stats.py).
+
+La importación recorre el respaldo por bloques (también el backup.json
+anterior): consulta en bloque qué claves ya existen (`IN` de hasta
+BACKUP_CHUNK_ROWS claves), inserta el resto con INSERT ... ON CONFLICT DO
+NOTHING (PostgreSQL/SQLite) y al final ajusta las secuencias de PostgreSQL.
+Todo en una transacción: un checksum que no coincide la deshace entera.
+Un incremental se restaura con toda su cadena, del más nuevo al completo:
+cada fila entra en su versión más reciente y no vuelven las borradas. Luego
+se copian los archivos de documentos que falten en su ruta.
+"""
+import gzip
+import hashlib
+import json
+import os
+import shutil
+import time
+from dataclasses import dataclass, field
+from datetime import date, datetime, timedelta
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+from sqlalchemy import Date, DateTime, Integer, func, insert, or_, select, text, tuple_
+from sqlalchemy.engine import Engine
+
+from . import models
+from .catalog_cache import catalog_cache
+from .name_keys import name_keys
+from .stats import dashboard_stats
+
+FORMAT = "ndjson.gz"
+FORMAT_VERSION = 3
+MANIFEST = "manifest.json"
+FILES_DIR = "files"
+FILES_INDEX = "files.ndjson.gz"
+BACKUP_CHUNK_ROWS = int(os.getenv("BACKUP_CHUNK_ROWS", "5000"))
+BACKUP_MAX_CHAIN = int(os.getenv("BACKUP_MAX_CHAIN", "14"))
+BACKUP_CLOCK_MARGIN = float(os.getenv("BACKUP_CLOCK_MARGIN_S", "300"))
+
+# (nombre en el respaldo, modelo) en orden de dependencias; los nombres son
+# los mismos del backup.json anterior
+TABLES: List[Tuple[str, Any]] = [
+    ("roles", models.Rol),
+    ("usuarios", models.Usuario),
+    ("grados", models.Grado),
+    ("motivos_baja", models.MotivoBaja),
+    ("unidades_militares", models.UnidadMilitar),
+    ("ciudadanos", models.Ciudadano),
+    ("documentos", models.Documento),
+    ("servicios", models.DatosServicioMilitar),
+    ("ciudadano_documento", models.CiudadanoDocumento),
+    ("documento_servicio", models.DocumentoServicio),
+]
+
+MODELS = dict(TABLES)
+
+# Tablas pequeñas que los incrementales copian completas
+ALWAYS_FULL = {"roles", "usuarios", "grados", "motivos_baja", "unidades_militares"}
+
+# on_progress(tabla, filas procesadas en total, filas estimadas en total)
+Progress = Callable[[str, int, int], None]
+
+
+def _json_default(v):
+    if isinstance(v, (datetime, date)):
+        return v.isoformat()
+    return str(v)
+
+
+def dump_row(row: Dict[str, Any]) -> bytes:
+    """Línea NDJSON de una fila; también la usa database/migrate.py para sus checksums."""
+    return (json.dumps(row, ensure_ascii=False, separators=(",", ":"), default=_json_default) + "\n").encode("utf-8")
+
+
+def _file_name(name: str, kind: str = FORMAT) -> str:
+    return f"{name}.{kind}"
+
+
+def _key_line(key: Tuple) -> bytes:
+    # Claves enteras (todas las de TABLES) sin pasar por json: es el grueso de un incremental
+    if all(type(k) is int for k in key):
+        return ("[" + ",".join(map(str, key)) + "]\n").encode("ascii")
+    return (json.dumps(list(key)) + "\n").encode("utf-8")
+
+
+def _parse_key(line: bytes) -> Tuple:
+    try:
+        return tuple(map(int, line[1:line.rindex(b"]")].split(b",")))
+    except ValueError:
+        return tuple(json.loads(line))
+
+
+class _GzWriter:
+    """Archivo .gz de líneas con su cuenta y el sha256 del contenido sin comprimir."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.lines = 0
+        self._digest = hashlib.sha256()
+        self._raw = open(path, "wb")
+        # mtime=0: el mismo contenido produce el mismo .gz
+        self._gz = gzip.GzipFile(fileobj=self._raw, mode="wb", compresslevel=6, mtime=0)
+
+    def write(self, data: bytes, lines: int) -> None:
+        self._digest.update(data)
+        self._gz.write(data)
+        self.lines += lines
+
+    def close(self) -> Dict[str, Any]:
+        self._gz.close()
+        self._raw.close()
+        return {"sha256": self._digest.hexdigest(), "bytes": os.path.getsize(self.path)}
+
+
+def _read_lines(path: str) -> Iterator[bytes]:
+    with gzip.open(path, "rb") as gz:
+        yield from gz
+
+
+def _changed_rows(name: str, since: datetime):
+    """Condición de filas modificadas desde `since`, o None si la tabla no tiene fechas."""
+    C = models.Ciudadano
+    citizen = or_(C.fecha_creacion >= since, C.fecha_ultima_modificacion >= since)
+    if name == "ciudadanos":
+        return citizen
+    if name == "documentos":
+        return models.Documento.fecha_extraccion >= since
+    if name == "servicios":
+        return models.DatosServicioMilitar.id_ciudadano.in_(select(C.id_ciudadano).where(citizen))
+    return None
+
+
+def _parent_keys(parent_dir: str, entry: Dict[str, Any], pk_names: List[str]) -> Iterator[Tuple]:
+    """Claves ordenadas de una tabla en el respaldo anterior (de sus datos si es v1)."""
+    if entry.get("keys"):
+        for line in _read_lines(os.path.join(parent_dir, entry["keys"])):
+            yield _parse_key(line)
+    else:
+        for line in _read_lines(os.path.join(parent_dir, entry["file"])):
+            row = json.loads(line)
+            yield tuple(row[c] for c in pk_names)
+
+
+def _merge_diff(old: Iterator[Tuple], new: Iterator[Tuple]) -> Iterator[Tuple[int, Tuple]]:
+    """(+1, clave nueva) / (-1, clave borrada) entre dos secuencias ordenadas."""
+    o, n = next(old, None), next(new, None)
+    while o is not None or n is not None:
+        if o is None or (n is not None and n < o):
+            yield 1, n
+            n = next(new, None)
+        elif n is None or o < n:
+            yield -1, o
+            o = next(old, None)
+        else:
+            o, n = next(old, None), next(new, None)
+
+
+class _FileCopier:
+    """Copia los archivos de documentos al respaldo, una vez por contenido.
+
+    Cada contenido va a `files/<sha256><ext>`; los documentos que comparten
+    archivo y los contenidos que ya están en la cadena del respaldo anterior
+    (`known`) no se copian: su línea del índice apunta al archivo existente
+    (`respaldo` es la carpeta que lo tiene, si no es esta). El hash se toma
+    de documentos.hash_contenido solo para objetos del almacén por contenido
+    (su nombre es el hash); los demás se hashean al copiar.
+    """
+
+    def __init__(self, out_dir: str, known: Optional[Dict[str, Tuple[Optional[str], str]]] = None):
+        self.out_dir = out_dir
+        os.makedirs(os.path.join(out_dir, FILES_DIR), exist_ok=True)
+        self.index = _GzWriter(os.path.join(out_dir, FILES_INDEX))
+        self.known = known or {}  # sha256 -> (respaldo, archivo)
+        self.by_path = {}  # ruta -> sha256 (páginas de un PDF comparten archivo)
+        self.bytes = 0
+        self.payloads = 0
+        self.deduped = 0
+        self.missing = 0
+
+    def _copy(self, src: str, row_id: int) -> str:
+        tmp = os.path.join(self.out_dir, FILES_DIR, f".{row_id}.tmp")
+        digest = hashlib.sha256()
+        with open(src, "rb") as fi, open(tmp, "wb") as fo:
+            for block in iter(lambda: fi.read(1024 * 1024), b""):
+                digest.update(block)
+                fo.write(block)
+        sha = digest.hexdigest()
+        if sha in self.known:
+            os.remove(tmp)
+        else:
+            rel = f"{FILES_DIR}/{sha}{os.path.splitext(src)[1].lower()}"
+            os.replace(tmp, os.path.join(self.out_dir, rel))
+            self.known[sha] = (None, rel)
+            self.payloads += 1
+            self.bytes += os.path.getsize(src)
+        return sha
+
+    def add(self, row: Dict[str, Any]) -> None:
+        src = row.get("ruta_almacenamiento")
+        if not src or not os.path.isfile(src):
+            self.missing += 1
+            return
+        sha = row.get("hash_contenido")
+        if not (sha and os.path.basename(src).startswith(sha)):
+            sha = self.by_path.get(src)
+        if sha not in self.known:
+            before = self.payloads
+            sha = self.by_path[src] = self._copy(src, row["id_documento"])
+            if self.payloads == before:
+                self.deduped += 1
+        else:
+            self.deduped += 1
+        backup, rel = self.known[sha]
+        line = {"id_documento": row["id_documento"], "ruta": src, "archivo": rel,
+                "sha256": sha, "bytes": os.path.getsize(src)}
+        if backup:
+            line["respaldo"] = backup
+        self.index.write(dump_row(line), 1)
+
+    def close(self) -> Dict[str, Any]:
+        info = self.index.close()
+        return {"file": FILES_INDEX, "count": self.index.lines, "missing": self.missing,
+                "payloads": self.payloads, "deduped": self.deduped, "payload_bytes": self.bytes, **info}
+
+
+def _payload(backup_dir: str, f: Dict[str, Any]) -> str:
+    """Ruta del contenido de una línea del índice de archivos (puede estar en otro respaldo de la cadena)."""
+    if f.get("respaldo"):
+        return os.path.join(os.path.dirname(os.path.abspath(backup_dir)), f["respaldo"], f["archivo"])
+    return os.path.join(backup_dir, f["archivo"])
+
+
+def _known_files(chain) -> Dict[str, Tuple[Optional[str], str]]:
+    """sha256 -> (respaldo, archivo) de los contenidos ya guardados en una cadena."""
+    known = {}
+    for backup_dir, manifest in chain:
+        files = manifest.get("files")
+        if not files:
+            continue
+        for line in _read_lines(os.path.join(backup_dir, files["file"])):
+            f = json.loads(line)
+            known.setdefault(f["sha256"], (f.get("respaldo") or os.path.basename(backup_dir), f["archivo"]))
+    return known
+
+
+def _export_table(conn, name: str, model, out_dir: str, chunk_rows: int, on_chunk: Callable[[int], None],
+                  parent: Optional[Tuple[str, Dict[str, Any]]] = None, since: Optional[datetime] = None,
+                  on_row: Optional[Callable[[Dict[str, Any]], None]] = None, full: bool = False) -> Dict[str, Any]:
+    """Exporta una tabla completa o, con `parent` (y sin `full`), solo lo cambiado desde ese respaldo."""
+    table = model.__table__
+    pk = list(table.primary_key.columns)
+    pk_names = [c.name for c in pk]
+    stream = conn.execution_options(stream_results=True, yield_per=chunk_rows)
+    data = _GzWriter(os.path.join(out_dir, _file_name(name)))
+    keys = _GzWriter(os.path.join(out_dir, _file_name(name, "keys.gz")))
+    entry = {"name": name, "table": table.name, "file": _file_name(name), "keys": _file_name(name, "keys.gz")}
+
+    def write_rows(part) -> None:
+        rows = [dict(r._mapping) for r in part]
+        data.write(b"".join(dump_row(r) for r in rows), len(rows))
+        if on_row:
+            for r in rows:
+                on_row(r)
+
+    parent_entry = None
+    if parent:
+        parent_entry = next((e for e in parent[1]["tables"] if e["name"] == name), None)
+    try:
+        if parent_entry is None or name in ALWAYS_FULL or full:
+            # Completa: datos y claves en una pasada; al restaurar no se mira más atrás
+            entry["complete"] = True
+            for part in stream.execute(select(table).order_by(*pk)).partitions():
+                write_rows(part)
+                keys.write(b"".join(_key_line(tuple(r._mapping[c] for c in pk_names)) for r in part), len(part))
+                on_chunk(len(part))
+        else:
+            # 1) claves actuales contra las del respaldo anterior
+            def current_keys():
+                for part in stream.execute(select(*pk).order_by(*pk)).partitions():
+                    keys.write(b"".join(_key_line(tuple(k)) for k in part), len(part))
+                    on_chunk(len(part))
+                    yield from (tuple(k) for k in part)
+            new_keys = []
+            deleted = None
+            for sign, key in _merge_diff(_parent_keys(parent[0], parent_entry, pk_names), current_keys()):
+                if sign > 0:
+                    new_keys.append(key)
+                else:
+                    if deleted is None:
+                        deleted = _GzWriter(os.path.join(out_dir, _file_name(name, "deleted.gz")))
+                    deleted.write(_key_line(key), 1)
+            if deleted is not None:
+                deleted.close()
+                entry.update(deleted_file=_file_name(name, "deleted.gz"), deleted=deleted.lines)
+            # 2) filas modificadas según sus fechas
+            written = set()
+            cond = _changed_rows(name, since)
+            if cond is not None:
+                for part in stream.execute(select(table).where(cond).order_by(*pk)).partitions():
+                    write_rows(part)
+                    written.update(tuple(r._mapping[c] for c in pk_names) for r in part)
+            # 3) claves nuevas que las fechas no cubren
+            missing = [k for k in new_keys if k not in written]
+            for i in range(0, len(missing), chunk_rows):
+                block = missing[i:i + chunk_rows]
+                where = pk[0].in_([k[0] for k in block]) if len(pk) == 1 else tuple_(*pk).in_(block)
+                write_rows(conn.execute(select(table).where(where).order_by(*pk)).all())
+    finally:
+        info = data.close()
+        keys_info = keys.close()
+    entry.update(rows=data.lines, sha256=info["sha256"], bytes=info["bytes"], key_count=keys.lines, keys_bytes=keys_info["bytes"])
+    return entry
+
+
+def list_backups(base_dir: str) -> List[Tuple[str, Dict[str, Any]]]:
+    """[(carpeta, manifiesto)] de los respaldos terminados en `base_dir`, del más viejo al más nuevo."""
+    found = []
+    if os.path.isdir(base_dir):
+        for name in os.listdir(base_dir):
+            path = os.path.join(base_dir, name)
+            if name.endswith(".partial") or not os.path.isfile(os.path.join(path, MANIFEST)):
+                continue
+            try:
+                found.append((path, read_manifest(path)))
+            except (OSError, ValueError):
+                continue
+    found.sort(key=lambda b: (b[1].get("created_at", ""), os.path.basename(b[0])))
+    return found
+
+
+def export_backup(engine: Engine, base_dir: str, on_progress: Optional[Progress] = None,
+                  chunk_rows: int = BACKUP_CHUNK_ROWS, incremental: bool = False,
+                  include_files: bool = True) -> Tuple[str, Dict[str, Any]]:
+    """Exporta a `base_dir/backup_<ts>`. Devuelve (carpeta, manifiesto).
+
+    incremental=True guarda solo los cambios desde el último respaldo de
+    `base_dir` (si no hay ninguno, o la cadena ya tiene BACKUP_MAX_CHAIN
+    incrementales, hace uno completo). Se escribe en `<carpeta>.partial` y se
+    renombra al terminar; si algo falla la carpeta parcial se borra.
+    """
+    started = datetime.now()
+    parent = None
+    if incremental:
+        previous = list_backups(base_dir)
+        if previous and len(previous[-1][1].get("chain", [])) <= BACKUP_MAX_CHAIN:
+            parent = previous[-1]
+    since = None
+    if parent:
+        since = datetime.fromisoformat(parent[1]["created_at"]) - timedelta(seconds=BACKUP_CLOCK_MARGIN)
+    out_dir = os.path.join(base_dir, f"backup_{started.strftime('%Y%m%d_%H%M%S')}")
+    tmp_dir = out_dir + ".partial"
+    os.makedirs(tmp_dir, exist_ok=True)
+    try:
+        files = _FileCopier(tmp_dir, _known_files(_chain(*parent)) if parent else None) if include_files else None
+        options = {"isolation_level": "REPEATABLE READ"} if engine.dialect.name == "postgresql" else {}
+        with engine.connect().execution_options(**options) as conn, conn.begin():
+            # COUNT(*) solo para la barra de progreso; el manifiesto usa lo exportado
+            total = sum(conn.execute(select(func.count()).select_from(m.__table__)).scalar() or 0 for _, m in TABLES)
+            # El backfill de hash_contenido cambia filas de documentos sin tocar sus fechas:
+            # si avanzó desde el respaldo anterior, documentos va completa
+            D = models.Documento
+            hash_pending = conn.execute(select(func.count()).select_from(D).where(D.hash_contenido.is_(None))).scalar() or 0
+            full = set()
+            if parent and (parent[1].get("hash_pending") is None or hash_pending < parent[1]["hash_pending"]):
+                full.add("documentos")
+            done = 0
+            entries = []
+            for name, model in TABLES:
+                def on_chunk(n, name=name):
+                    nonlocal done
+                    done += n
+                    if on_progress:
+                        on_progress(name, done, max(total, done))
+                if on_progress:
+                    on_progress(name, done, total)
+                on_row = files.add if files and name == "documentos" else None
+                entries.append(_export_table(conn, name, model, tmp_dir, chunk_rows, on_chunk, parent, since, on_row, name in full))
+        chain = (parent[1].get("chain") or [os.path.basename(parent[0])]) if parent else []
+        manifest = {
+            "format": FORMAT,
+            "version": FORMAT_VERSION,
+            "type": "incremental" if parent else "full",
+            "created_at": started.isoformat(timespec="seconds"),
+            "since": since.isoformat(timespec="seconds") if since else None,
+            "parent": os.path.basename(parent[0]) if parent else None,
+            "chain": chain + [os.path.basename(out_dir)],
+            "dialect": engine.dialect.name,
+            "rows": sum(e["rows"] for e in entries),
+            "deleted": sum(e.get("deleted", 0) for e in entries),
+            "hash_pending": hash_pending,
+            "tables": entries,
+            "files": files.close() if files else None,
+        }
+        with open(os.path.join(tmp_dir, MANIFEST), "w", encoding="utf-8") as f:
+            json.dump(manifest, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_dir, out_dir)
+    except BaseException:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        raise
+    return out_dir, manifest
+
+
+def read_manifest(backup_dir: str) -> Dict[str, Any]:
+    with open(os.path.join(backup_dir, MANIFEST), "r", encoding="utf-8") as f:
+        manifest = json.load(f)
+    if manifest.get("format") != FORMAT or manifest.get("version", 0) > FORMAT_VERSION:
+        raise ValueError(f"Formato de respaldo no soportado: {manifest.get('format')} v{manifest.get('version')}")
+    return manifest
+
+
+def _sha256_lines(path: str) -> Tuple[int, str]:
+    digest = hashlib.sha256()
+    rows = 0
+    for line in _read_lines(path):
+        digest.update(line)
+        rows += 1
+    return rows, digest.hexdigest()
+
+
+def verify_backup(backup_dir: str) -> List[str]:
+    """Relee tablas y archivos y compara cuentas y sha256 con el manifiesto. Devuelve los errores."""
+    errors = []
+    manifest = read_manifest(backup_dir)
+    for entry in manifest["tables"]:
+        try:
+            rows, sha = _sha256_lines(os.path.join(backup_dir, entry["file"]))
+        except (OSError, EOFError) as e:
+            errors.append(f"{entry['file']}: {e}")
+            continue
+        if rows != entry["rows"]:
+            errors.append(f"{entry['file']}: {rows} filas, el manifiesto dice {entry['rows']}")
+        elif sha != entry["sha256"]:
+            errors.append(f"{entry['file']}: sha256 no coincide")
+    files = manifest.get("files")
+    if files:
+        try:
+            count, sha = _sha256_lines(os.path.join(backup_dir, files["file"]))
+            if count != files["count"] or sha != files["sha256"]:
+                errors.append(f"{files['file']}: el índice de archivos no coincide")
+            checked = set()
+            for line in _read_lines(os.path.join(backup_dir, files["file"])):
+                f = json.loads(line)
+                payload = _payload(backup_dir, f)
+                if payload in checked:
+                    continue
+                checked.add(payload)
+                if _file_sha256(payload) != f["sha256"]:
+                    errors.append(f"{f['archivo']}: sha256 no coincide")
+        except (OSError, EOFError) as e:
+            errors.append(f"{files['file']}: {e}")
+    return errors
+
+
+def _file_sha256(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+# ----------------------------------------------------------------------
+# Importación
+# ----------------------------------------------------------------------
+@dataclass
+class TableImport:
+    name: str
+    rows: int = 0
+    inserted: int = 0
+    skipped: int = 0  # ya existían (misma clave u otro campo único)
+
+
+@dataclass
+class ImportResult:
+    tables: List[TableImport] = field(default_factory=list)
+    seconds: float = 0.0
+    files: int = 0          # archivos de documentos restaurados
+    files_failed: int = 0
+
+    @property
+    def rows(self) -> int:
+        return sum(t.rows for t in self.tables)
+
+    @property
+    def inserted(self) -> int:
+        return sum(t.inserted for t in self.tables)
+
+    @property
+    def skipped(self) -> int:
+        return sum(t.skipped for t in self.tables)
+
+    @property
+    def rows_per_second(self) -> float:
+        return self.rows / self.seconds if self.seconds else 0.0
+
+
+def _chunks(rows: List[Dict[str, Any]], size: int) -> Iterator[List[Dict[str, Any]]]:
+    for i in range(0, len(rows), size):
+        yield rows[i:i + size]
+
+
+def _ndjson_chunks(path: str, entry: Dict[str, Any], size: int) -> Iterator[List[Dict[str, Any]]]:
+    digest = hashlib.sha256()
+    chunk = []
+    with gzip.open(path, "rb") as gz:
+        for line in gz:
+            digest.update(line)
+            chunk.append(json.loads(line))
+            if len(chunk) >= size:
+                yield chunk
+                chunk = []
+    if chunk:
+        yield chunk
+    if digest.hexdigest() != entry["sha256"]:
+        raise ValueError(f"{entry['file']}: sha256 no coincide con el manifiesto")
+
+
+def _chain(backup_dir: str, manifest: Dict[str, Any]) -> List[Tuple[str, Dict[str, Any]]]:
+    """[(carpeta, manifiesto)] de la cadena de un respaldo, del más nuevo al completo."""
+    if manifest.get("type", "full") == "full":
+        return [(backup_dir, manifest)]
+    base = os.path.dirname(os.path.abspath(backup_dir))
+    chain = []
+    for name in reversed(manifest["chain"]):
+        path = os.path.join(base, name)
+        if not os.path.isfile(os.path.join(path, MANIFEST)):
+            raise ValueError(f"Falta el respaldo {name} de la cadena de {os.path.basename(backup_dir)}")
+        chain.append((path, manifest if name == manifest["chain"][-1] else read_manifest(path)))
+    return chain
+
+
+def _read_deleted(backup_dir: str, entry: Dict[str, Any]) -> set:
+    if not entry.get("deleted_file"):
+        return set()
+    return {_parse_key(line) for line in _read_lines(os.path.join(backup_dir, entry["deleted_file"]))}
+
+
+def _chain_chunks(chain, name: str, pk_names: List[str], size: int) -> Iterator[List[Dict[str, Any]]]:
+    # Del más nuevo al más viejo: lo borrado en un respaldo no debe volver desde los anteriores
+    deleted = set()
+    for backup_dir, manifest in chain:
+        entry = next((e for e in manifest["tables"] if e["name"] == name), None)
+        if entry is None:
+            continue
+        for chunk in _ndjson_chunks(os.path.join(backup_dir, entry["file"]), entry, size):
+            if deleted:
+                chunk = [r for r in chunk if tuple(r.get(c) for c in pk_names) not in deleted]
+            if chunk:
+                yield chunk
+        if entry.get("complete"):
+            break
+        deleted |= _read_deleted(backup_dir, entry)
+
+
+def _resolve(path: str) -> str:
+    """Carpeta de respaldo, su manifest.json, una carpeta de respaldos (el último) o un backup.json."""
+    if os.path.basename(path) == MANIFEST:
+        return os.path.dirname(path) or "."
+    if os.path.isdir(path) and not os.path.exists(os.path.join(path, MANIFEST)):
+        legacy = os.path.join(path, "backup.json")
+        if os.path.exists(legacy):
+            return legacy
+        backups = list_backups(path)
+        if not backups:
+            raise ValueError(f"No hay respaldos en {path}")
+        return backups[-1][0]
+    return path
+
+
+def open_backup(path: str, chunk_rows: int = BACKUP_CHUNK_ROWS) -> List[Tuple[str, int, Iterator[List[Dict[str, Any]]]]]:
+    """[(tabla, filas, bloques)] en orden de TABLES (filas: cota superior en una cadena).
+
+    `path` puede ser la carpeta de un respaldo (con su cadena si es
+    incremental), su manifest.json, la carpeta de respaldos (se toma el
+    último) o un backup.json anterior (que sí se carga entero: es un único
+    documento JSON).
+    """
+    path = _resolve(path)
+    if os.path.isdir(path):
+        chain = _chain(path, read_manifest(path))
+        out = []
+        for name, model in TABLES:
+            total = sum(e["rows"] for _, m in chain for e in m["tables"] if e["name"] == name)
+            if any(e["name"] == name for _, m in chain for e in m["tables"]):
+                pk_names = [c.name for c in model.__table__.primary_key.columns]
+                out.append((name, total, _chain_chunks(chain, name, pk_names, chunk_rows)))
+        return out
+    with open(path, "r", encoding="utf-8") as f:
+        data = json.load(f)
+    return [(name, len(data[name]), _chunks(data[name], chunk_rows)) for name, _ in TABLES if data.get(name)]
+
+
+def restore_files(engine: Engine, path: str, chunk_rows: int = BACKUP_CHUNK_ROWS) -> Tuple[int, int]:
+    """Copia a su ruta los archivos de documentos del respaldo que falten. Devuelve (copiados, fallidos).
+
+    Solo los de documentos que existen en la base con esa misma ruta.
+    """
+    path = _resolve(path)
+    if not os.path.isdir(path):
+        return 0, 0
+    copied = failed = 0
+    D = models.Documento
+    for backup_dir, manifest in _chain(path, read_manifest(path)):
+        files = manifest.get("files")
+        if not files:
+            continue
+        lines = (json.loads(line) for line in _read_lines(os.path.join(backup_dir, files["file"])))
+        while True:
+            block = [f for _, f in zip(range(chunk_rows), lines)]
+            if not block:
+                break
+            with engine.connect() as conn:
+                known = dict(conn.execute(select(D.id_documento, D.ruta_almacenamiento).where(D.id_documento.in_([f["id_documento"] for f in block]))).all())
+            for f in block:
+                dest = f["ruta"]
+                if known.get(f["id_documento"]) != dest or os.path.exists(dest):
+                    continue
+                try:
+                    os.makedirs(os.path.dirname(dest) or ".", exist_ok=True)
+                    shutil.copyfile(_payload(backup_dir, f), dest)
+                    copied += 1
+                except OSError:
+                    failed += 1
+    return copied, failed
+
+
+def _decoder(table) -> Callable[[Dict[str, Any]], Dict[str, Any]]:
+    """Fila del respaldo -> valores de columna (fechas ISO a date/datetime, sin claves ajenas)."""
+    parse = {}
+    for col in table.columns:
+        if isinstance(col.type, DateTime):
+            parse[col.name] = datetime.fromisoformat
+        elif isinstance(col.type, Date):
+            parse[col.name] = lambda v: date.fromisoformat(v[:10])
+        else:
+            parse[col.name] = None
+
+    def decode(row):
+        out = {}
+        for k, fn in parse.items():
+            if k in row:
+                v = row[k]
+                out[k] = fn(v) if fn and isinstance(v, str) else v
+        return out
+    return decode
+
+
+def _existing_keys(conn, pk: List, rows: List[Dict[str, Any]]) -> set:
+    if len(pk) == 1:
+        col = pk[0]
+        keys = {r.get(col.name) for r in rows}
+        return {(k,) for k in conn.execute(select(col).where(col.in_(keys))).scalars()}
+    keys = {tuple(r.get(c.name) for c in pk) for r in rows}
+    return {tuple(k) for k in conn.execute(select(*pk).where(tuple_(*pk).in_(keys)))}
+
+
+def insert_ignore(conn, table, rows: List[Dict[str, Any]]) -> int:
+    """Inserta `rows` ignorando conflictos; devuelve cuántas entraron."""
+    dialect = conn.dialect.name
+    if dialect in ("postgresql", "sqlite"):
+        if dialect == "postgresql":
+            from sqlalchemy.dialects.postgresql import insert as dialect_insert
+        else:
+            from sqlalchemy.dialects.sqlite import insert as dialect_insert
+        stmt = dialect_insert(table).on_conflict_do_nothing().returning(*table.primary_key.columns)
+        return len(conn.execute(stmt, rows).all())
+    conn.execute(insert(table), rows)
+    return len(rows)
+
+
+def reset_sequences(conn, tables=None) -> None:
+    """Tras insertar ids explícitos, lleva cada secuencia serial al máximo de su tabla."""
+    if conn.dialect.name != "postgresql":
+        return
+    for table in tables if tables is not None else [m.__table__ for _, m in TABLES]:
+        pk = list(table.primary_key.columns)
+        if len(pk) != 1 or not isinstance(pk[0].type, Integer):
+            continue
+        t, c = table.name, pk[0].name
+        conn.execute(text(
+            f"SELECT setval(pg_get_serial_sequence('{t}', '{c}'), COALESCE(MAX({c}), 1), MAX({c}) IS NOT NULL) "
+            f"FROM {t} WHERE pg_get_serial_sequence('{t}', '{c}') IS NOT NULL"
+        ))
+
+
+def import_backup(engine: Engine, path: str, on_progress: Optional[Progress] = None,
+                  chunk_rows: int = BACKUP_CHUNK_ROWS) -> ImportResult:
+    """Restaura un respaldo (o su cadena) sin tocar las filas existentes (las ya presentes se omiten)."""
+    t0 = time.perf_counter()
+    source = open_backup(path, chunk_rows)
+    total = sum(n for _, n, _ in source)
+    result = ImportResult()
+    done = 0
+    with engine.begin() as conn:
+        for name, _, chunks in source:
+            table = MODELS[name].__table__
+            pk = list(table.primary_key.columns)
+            decode = _decoder(table)
+            stat = TableImport(name)
+            result.tables.append(stat)
+            if on_progress:
+                on_progress(name, done, total)
+            for chunk in chunks:
+                rows = [decode(r) for r in chunk]
+                if name == "ciudadanos":
+                    for r in rows:
+                        if not r.get("nombre_normalizado"):
+                            r["nombre_normalizado"], r["nombre_fonetico"] = name_keys(r.get("apellidos"), r.get("nombres"))
+                existing = _existing_keys(conn, pk, rows)
+                missing = [r for r in rows if tuple(r.get(c.name) for c in pk) not in existing]
+                inserted = insert_ignore(conn, table, missing) if missing else 0
+                stat.rows += len(rows)
+                stat.inserted += inserted
+                stat.skipped += len(rows) - inserted
+                done += len(rows)
+                if on_progress:
+                    on_progress(name, done, max(total, done))
+        reset_sequences(conn)
+    # Inserciones por Core: las cachés no las ven pasar
+    dashboard_stats.invalidate(stale=True)
+    catalog_cache.invalidate()
+    result.files, result.files_failed = restore_files(engine, path, chunk_rows)
+    result.seconds = time.perf_counter() - t0
+    return result
@@ -0,0 +1,248 @@
+# database/catalog_cache.py
+"""Caché de proceso para los catálogos Grado, MotivoBaja y UnidadMilitar.
+
+Son tablas de decenas de filas que se consultaban en cada registro guardado.
+Aquí se cargan una vez (un SELECT por catálogo) y se resuelven en memoria por
+descripción normalizada (mayúsculas, espacios colapsados), devolviendo ids.
+
+Coherencia:
+  - Los catálogos se leen por una conexión propia del engine, nunca por la
+    transacción (quizá sin confirmar) de quien llama.
+  - Las filas que crea la caché quedan pendientes en la sesión y solo se
+    publican con el commit de la transacción raíz (el de un savepoint no
+    cuenta); un rollback, también de un savepoint, las descarta.
+  - Cualquier commit de este proceso que toque un catálogo por otra vía
+    (ORM o DELETE/UPDATE masivo) invalida ese catálogo.
+  - Cambios desde otra sesión/proceso: cada CATALOG_CACHE_TTL segundos se
+    compara una huella del contenido (sha1 de los pares id, descripción) y
+    se recarga si difiere, así que también se ve un renombre.
+"""
+import hashlib
+import os
+import threading
+import time
+from typing import Dict, Optional
+
+from sqlalchemy import event, inspect, select
+from sqlalchemy.engine import Connection
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from .models import Grado, MotivoBaja, UnidadMilitar
+
+CATALOG_CACHE_TTL = float(os.getenv("CATALOG_CACHE_TTL", "30"))
+
+# modelo -> (columna clave, columna id)
+SPECS = {
+    Grado: (Grado.descripcion, Grado.id_grado),
+    MotivoBaja: (MotivoBaja.descripcion, MotivoBaja.id_motivo_baja),
+    UnidadMilitar: (UnidadMilitar.nombre_unidad, UnidadMilitar.id_unidad),
+}
+
+_PENDING = "catalog_cache_pending"
+_TOUCHED = "catalog_cache_touched"
+_OWN = "catalog_cache_own"
+
+
+def normalize(name: Optional[str]) -> str:
+    return " ".join(str(name or "").upper().split())
+
+
+class _Entry:
+    __slots__ = ("ids", "fingerprint", "checked_at")
+
+    def __init__(self, ids: Dict[str, int], fingerprint: str):
+        self.ids = ids
+        self.fingerprint = fingerprint
+        self.checked_at = time.monotonic()
+
+
+class CatalogCache:
+    def __init__(self, ttl: float = CATALOG_CACHE_TTL):
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.loads = 0
+        self.inserts = 0
+        self._entries: Dict[type, _Entry] = {}
+        self._lock = threading.RLock()
+
+    # ------------------- Carga y frescura -------------------
+    @staticmethod
+    def _rows(db: Session, model) -> list:
+        """(nombre, id) del catálogo leídos por una conexión aparte (solo datos confirmados)."""
+        key_col, id_col = SPECS[model]
+        bind = db.get_bind(mapper=model)
+        engine = bind.engine if isinstance(bind, Connection) else bind
+        with engine.connect() as conn:
+            return conn.execute(select(key_col, id_col).order_by(id_col)).all()
+
+    @staticmethod
+    def _fingerprint(rows: list) -> str:
+        return hashlib.sha1(repr([(pk, name) for name, pk in rows]).encode("utf-8")).hexdigest()
+
+    def _load(self, db: Session, model, rows: Optional[list] = None) -> _Entry:
+        rows = self._rows(db, model) if rows is None else rows
+        ids: Dict[str, int] = {}
+        for name, pk in rows:
+            ids.setdefault(normalize(name), pk)
+        entry = _Entry(ids, self._fingerprint(rows))
+        with self._lock:
+            self._entries[model] = entry
+            self.loads += 1
+        return entry
+
+    def _entry(self, db: Session, model) -> tuple:
+        """(entrada, recién_cargada)."""
+        with self._lock:
+            entry = self._entries.get(model)
+        if entry is None:
+            return self._load(db, model), True
+        if time.monotonic() - entry.checked_at > self.ttl:
+            rows = self._rows(db, model)
+            if self._fingerprint(rows) != entry.fingerprint:
+                return self._load(db, model, rows), True
+            entry.checked_at = time.monotonic()
+        return entry, False
+
+    def invalidate(self, model=None) -> None:
+        with self._lock:
+            if model is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(model, None)
+
+    # ------------------- Resolución -------------------
+    def resolve(self, db: Session, model, name: Optional[str], create_kwargs: dict) -> Optional[int]:
+        """Id del valor de catálogo `name`; lo crea con `create_kwargs` si no existe."""
+        if not normalize(name):
+            return None
+        return self.resolve_many(db, model, {name: create_kwargs}).get(name)
+
+    def resolve_many(self, db: Session, model, names: Dict[str, dict]) -> Dict[str, int]:
+        """{nombre: kwargs_creación} → {nombre: id}. Crea los faltantes con un solo flush."""
+        names = {n: kw for n, kw in names.items() if normalize(n)}
+        if not names:
+            return {}
+        pending = db.info.setdefault(_PENDING, {}).setdefault(model, {})
+        out: Dict[str, int] = {}
+
+        def lookup(entry: _Entry) -> list:
+            missing = []
+            for n in names:
+                k = normalize(n)
+                pk = entry.ids.get(k) or _pending_id(pending, k)
+                if pk is None:
+                    missing.append(n)
+                else:
+                    out[n] = pk
+            return missing
+
+        entry, fresh = self._entry(db, model)
+        missing = lookup(entry)
+        with self._lock:
+            self.hits += len(names) - len(missing)
+            self.misses += len(missing)
+        if missing and not fresh:
+            # Quizá lo creó otra sesión: se recarga una vez antes de insertar
+            missing = lookup(self._load(db, model))
+        if missing:
+            _, id_col = SPECS[model]
+            new = {}
+            for n in missing:
+                new.setdefault(normalize(n), model(**names[n]))
+            db.info.setdefault(_OWN, set()).update(id(o) for o in new.values())
+            try:
+                with db.begin_nested():
+                    db.add_all(new.values())
+                    db.flush()
+            except IntegrityError:
+                # Carrera con otra sesión que insertó el mismo valor
+                missing = lookup(self._load(db, model))
+                if missing:
+                    raise
+            else:
+                for k, obj in new.items():
+                    pending[k] = (obj, getattr(obj, id_col.key))
+                with self._lock:
+                    self.inserts += len(new)
+                lookup(self._entries.get(model) or self._load(db, model))
+        return out
+
+    def stats(self) -> dict:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "loads": self.loads,
+                "inserts": self.inserts,
+                "hit_rate": round(self.hits / total, 3) if total else 0.0,
+                "sizes": {m.__name__: len(e.ids) for m, e in self._entries.items()},
+            }
+
+    # ------------------- Eventos de sesión -------------------
+    def _publish(self, session: Session) -> None:
+        pending = session.info.pop(_PENDING, None) or {}
+        touched = session.info.pop(_TOUCHED, None) or set()
+        session.info.pop(_OWN, None)
+        with self._lock:
+            for model in touched:
+                self._entries.pop(model, None)
+            for model, created in pending.items():
+                entry = self._entries.get(model)
+                if entry is None:
+                    continue
+                for k in created:
+                    pk = _pending_id(created, k)
+                    if pk is not None:
+                        entry.ids.setdefault(k, pk)
+                # La huella ya no coincide: la próxima revisión recarga una vez
+
+    def _discard(self, session: Session) -> None:
+        for key in (_PENDING, _TOUCHED, _OWN):
+            session.info.pop(key, None)
+
+
+def _pending_id(pending: dict, key: str) -> Optional[int]:
+    """Id de una fila creada por la caché en esta sesión, si su savepoint no se deshizo."""
+    obj, pk = pending.get(key, (None, None))
+    if obj is None or inspect(obj).transient:
+        # El rollback de un savepoint devuelve sus filas nuevas a transient
+        return None
+    return pk
+
+
+catalog_cache = CatalogCache()
+
+
+@event.listens_for(Session, "after_flush")
+def _track_catalog_changes(session, _flush_context):
+    own = session.info.get(_OWN) or ()
+    for obj in (*session.new, *session.dirty, *session.deleted):
+        model = type(obj)
+        # Las filas creadas por la propia caché no invalidan
+        if model not in SPECS or id(obj) in own:
+            continue
+        session.info.setdefault(_TOUCHED, set()).add(model)
+
+
+@event.listens_for(Session, "do_orm_execute")
+def _track_bulk_catalog_changes(state):
+    if (state.is_update or state.is_delete) and state.bind_mapper is not None and state.bind_mapper.class_ in SPECS:
+        state.session.info.setdefault(_TOUCHED, set()).add(state.bind_mapper.class_)
+
+
+@event.listens_for(Session, "after_commit")
+def _on_commit(session):
+    # after_commit también se emite al liberar un savepoint (incluido el de resolve_many)
+    if session.in_nested_transaction():
+        return
+    catalog_cache._publish(session)
+
+
+@event.listens_for(Session, "after_soft_rollback")
+def _on_rollback(session, previous_transaction):
+    # Solo el rollback de la transacción raíz descarta lo pendiente
+    if previous_transaction.parent is None:
+        catalog_cache._discard(session)
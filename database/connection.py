@@ -22,9 +22,11 @@ def get_db():
 
 import os
 import re
-from sqlalchemy import create_engine
+from contextlib import contextmanager
+from sqlalchemy import create_engine, event
 from sqlalchemy.orm import sessionmaker
 from config.settings import Config  
+from .instrumentation import TimedQueuePool, pool_metrics
 
 
 if not hasattr(Config, 'DATABASE_URL') or not Config.DATABASE_URL:
@@ -35,15 +37,65 @@ ssl_mode = ssl_match.group(1) if ssl_match else 'prefer'
 
 db_url_base = re.sub(r'\?.*', '', Config.DATABASE_URL)
 
+# Pool (ajustable por entorno; en FLET_MODE=web cada pestaña abierta es una sesión)
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))      # s esperando conexión libre
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "300"))       # s; Neon corta conexiones ociosas
+DB_POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "1") == "1"
+DB_STATEMENT_TIMEOUT_MS = int(os.getenv("DB_STATEMENT_TIMEOUT_MS", "30000"))  # 0 = sin límite
+
+_is_postgres = db_url_base.startswith("postgres")
+
 engine = create_engine(
     db_url_base, 
     future=True,
     connect_args={
         "client_encoding": "utf8", 
         "sslmode": ssl_mode 
-    }
+    } if _is_postgres else {},
+    **({
+        "poolclass": TimedQueuePool,
+        "pool_size": DB_POOL_SIZE,
+        "max_overflow": DB_MAX_OVERFLOW,
+        "pool_timeout": DB_POOL_TIMEOUT,
+        "pool_recycle": DB_POOL_RECYCLE,
+        "pool_pre_ping": DB_POOL_PRE_PING,
+    } if _is_postgres else {})
 )
+pool_metrics.attach(engine)
+
+if _is_postgres and DB_STATEMENT_TIMEOUT_MS > 0:
+    @event.listens_for(engine, "connect")
+    def _set_statement_timeout(dbapi_conn, _record):
+        # SET al conectar (el pooler de Neon no admite "options" en el arranque)
+        cur = dbapi_conn.cursor()
+        cur.execute(f"SET statement_timeout = {DB_STATEMENT_TIMEOUT_MS}")
+        cur.close()
+        dbapi_conn.commit()
+
 SessionLocal = sessionmaker(bind=engine, autocommit=False, autoflush=False)
+
+
+@contextmanager
+def session_scope():
+    """Unidad de trabajo: una sesión por operación, commit al salir sin error,
+    rollback si hay excepción y devolución inmediata de la conexión al pool.
+
+    Los objetos no se expiran en el commit, así que siguen legibles después
+    de cerrar la sesión (las relaciones no cargadas, no).
+    """
+    db = SessionLocal(expire_on_commit=False)
+    try:
+        yield db
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+
 def get_db():
     db = SessionLocal()
     try:
@@ -2,13 +2,15 @@
 from datetime import datetime, date
 from typing import Optional
 from sqlalchemy.orm import Session
-from sqlalchemy import select
+from sqlalchemy import select, or_
 
 from .models import (
     Ciudadano, Documento, DatosServicioMilitar,
     MotivoBaja, UnidadMilitar, Grado,
     DocumentoServicio, CiudadanoDocumento
 )
+from .catalog_cache import catalog_cache
+from .name_keys import set_name_keys
 
 def _parse_date_ddmmyyyy(s: Optional[str]) -> Optional[date]:
     if not s:
@@ -32,14 +34,76 @@ def _to_bool_si_no(v: Optional[str]) -> Optional[bool]:
         return False
     return None
 
-def _get_or_create(session: Session, model, where_kwargs: dict, create_kwargs: dict = None):
-    obj = session.execute(select(model).filter_by(**where_kwargs)).scalar_one_or_none()
-    if obj:
-        return obj, False
-    obj = model(**(create_kwargs or where_kwargs))
-    session.add(obj)
-    session.flush()
-    return obj, True
+def _normalize_record(data: dict) -> dict:
+    """Normaliza los campos extraídos al formato de las tablas."""
+    return {
+        "dni": (data.get("dni") or "").strip() or None,
+        "lm": (data.get("lm") or "").strip() or None,
+        "apellidos": (data.get("apellidos") or "").strip(),
+        "nombres": (data.get("nombres") or "").strip(),
+        "fecha_nacimiento": _parse_date_ddmmyyyy(data.get("fecha_nacimiento")),
+        "presto_servicio": _to_bool_si_no(data.get("presto_servicio")),
+        "gran_unidad": (data.get("gran_unidad") or "").strip() or None,
+        "unidad_alta": (data.get("unidad_alta") or "").strip() or None,
+        "unidad_baja": (data.get("unidad_baja") or "").strip() or None,
+        "fecha_alta": _parse_date_ddmmyyyy(data.get("fecha_alta")),
+        "fecha_baja": _parse_date_ddmmyyyy(data.get("fecha_baja")),
+        "grado": (data.get("grado") or "").strip() or None,
+        "motivo_baja": (data.get("motivo_baja") or "").strip() or None,
+        "clase": (data.get("clase") or "").strip() or None,
+        "libro": (data.get("libro") or "").strip() or None,
+        "folio": (data.get("folio") or "").strip() or None,
+        "or": (data.get("or") or "").strip() or None,
+    }
+
+def _new_ciudadano(r: dict, now: datetime, id_usuario_actual: int) -> Ciudadano:
+    ciudadano = Ciudadano(
+        dni=r["dni"],
+        lm=r["lm"],
+        apellidos=r["apellidos"],
+        nombres=r["nombres"],
+        fecha_nacimiento=r["fecha_nacimiento"],
+        presto_servicio=r["presto_servicio"],
+        fecha_creacion=now,
+        id_usuario_creacion=id_usuario_actual
+    )
+    set_name_keys(ciudadano)
+    return ciudadano
+
+def _update_ciudadano(ciudadano: Ciudadano, r: dict, now: datetime, id_usuario_actual: int) -> None:
+    if r["apellidos"]: ciudadano.apellidos = r["apellidos"]
+    if r["nombres"]:   ciudadano.nombres = r["nombres"]
+    if r["fecha_nacimiento"] is not None: ciudadano.fecha_nacimiento = r["fecha_nacimiento"]
+    if r["presto_servicio"] is not None:  ciudadano.presto_servicio = r["presto_servicio"]
+    if r["dni"] and not ciudadano.dni: ciudadano.dni = r["dni"]
+    if r["lm"]  and not ciudadano.lm:  ciudadano.lm  = r["lm"]
+    set_name_keys(ciudadano)
+    ciudadano.fecha_ultima_modificacion = now
+    ciudadano.id_usuario_ultima_modificacion = id_usuario_actual
+
+def _new_servicio(r: dict, id_unidad_alta, id_unidad_baja, id_grado, id_motivo_baja, **ciudadano_ref) -> DatosServicioMilitar:
+    return DatosServicioMilitar(
+        **ciudadano_ref,
+        referencia_documento_origen=r["or"],
+        clase=r["clase"], libro=r["libro"], folio=r["folio"],
+        fecha_alta=r["fecha_alta"], fecha_baja=r["fecha_baja"],
+        id_unidad_alta=id_unidad_alta,
+        id_unidad_baja=id_unidad_baja,
+        id_grado=id_grado,
+        id_motivo_baja=id_motivo_baja
+    )
+
+def _update_servicio(servicio: DatosServicioMilitar, r: dict, id_unidad_alta, id_unidad_baja, id_grado, id_motivo_baja) -> None:
+    servicio.referencia_documento_origen = r["or"] or servicio.referencia_documento_origen
+    servicio.clase = r["clase"] or servicio.clase
+    servicio.libro = r["libro"] or servicio.libro
+    servicio.folio = r["folio"] or servicio.folio
+    if r["fecha_alta"] is not None: servicio.fecha_alta = r["fecha_alta"]
+    if r["fecha_baja"] is not None: servicio.fecha_baja = r["fecha_baja"]
+    if id_unidad_alta: servicio.id_unidad_alta = id_unidad_alta
+    if id_unidad_baja: servicio.id_unidad_baja = id_unidad_baja
+    if id_grado:       servicio.id_grado = id_grado
+    if id_motivo_baja: servicio.id_motivo_baja = id_motivo_baja
 
 def create_full_digital_record(
     db: Session,
@@ -56,60 +120,18 @@ def create_full_digital_record(
     Devuelve: {'ciudadano_id', 'servicio_id', 'documento_id'}
     """
     # --- normalizaciones de entrada ---
-    dni = (data.get("dni") or "").strip() or None
-    lm  = (data.get("lm") or "").strip() or None
-    apellidos = (data.get("apellidos") or "").strip()
-    nombres   = (data.get("nombres") or "").strip()
-
-    fecha_nacimiento = _parse_date_ddmmyyyy(data.get("fecha_nacimiento"))
-    presto_servicio  = _to_bool_si_no(data.get("presto_servicio"))
-
-    gran_unidad = (data.get("gran_unidad") or "").strip() or None
-    unidad_alta_nombre = (data.get("unidad_alta") or "").strip() or None
-    unidad_baja_nombre = (data.get("unidad_baja") or "").strip() or None
-
-    fecha_alta = _parse_date_ddmmyyyy(data.get("fecha_alta"))
-    fecha_baja = _parse_date_ddmmyyyy(data.get("fecha_baja"))
-
-    grado_desc = (data.get("grado") or "").strip() or None
-    motivo_baja_desc = (data.get("motivo_baja") or "").strip() or None
-
-    clase = (data.get("clase") or "").strip() or None
-    libro = (data.get("libro") or "").strip() or None
-    folio = (data.get("folio") or "").strip() or None
-    referencia_origen = (data.get("or") or "").strip() or None
-
-    # --- catálogos ---
-    grado = None
-    if grado_desc:
-        grado, _ = _get_or_create(
-            db, Grado,
-            where_kwargs={"descripcion": grado_desc},
-            create_kwargs={"descripcion": grado_desc, "codigo_grado": None}
-        )
+    r = _normalize_record(data)
+    dni, lm = r["dni"], r["lm"]
 
-    motivo_baja = None
-    if motivo_baja_desc:
-        motivo_baja, _ = _get_or_create(
-            db, MotivoBaja,
-            where_kwargs={"descripcion": motivo_baja_desc},
-            create_kwargs={"descripcion": motivo_baja_desc}
-        )
-
-    unidad_alta = None
-    if unidad_alta_nombre:
-        unidad_alta, _ = _get_or_create(
-            db, UnidadMilitar,
-            where_kwargs={"nombre_unidad": unidad_alta_nombre},
-            create_kwargs={"nombre_unidad": unidad_alta_nombre, "gran_unidad": gran_unidad}
-        )
-    unidad_baja = None
-    if unidad_baja_nombre:
-        unidad_baja, _ = _get_or_create(
-            db, UnidadMilitar,
-            where_kwargs={"nombre_unidad": unidad_baja_nombre},
-            create_kwargs={"nombre_unidad": unidad_baja_nombre, "gran_unidad": gran_unidad}
-        )
+    # --- catálogos (caché de proceso: sin consultas si ya existen) ---
+    grado = catalog_cache.resolve(
+        db, Grado, r["grado"], {"descripcion": r["grado"], "codigo_grado": None})
+    motivo_baja = catalog_cache.resolve(
+        db, MotivoBaja, r["motivo_baja"], {"descripcion": r["motivo_baja"]})
+    unidad_alta = catalog_cache.resolve(
+        db, UnidadMilitar, r["unidad_alta"], {"nombre_unidad": r["unidad_alta"], "gran_unidad": r["gran_unidad"]})
+    unidad_baja = catalog_cache.resolve(
+        db, UnidadMilitar, r["unidad_baja"], {"nombre_unidad": r["unidad_baja"], "gran_unidad": r["gran_unidad"]})
 
     # --- ciudadano (dni o lm requerido) ---
     if not dni and not lm:
@@ -127,27 +149,11 @@ def create_full_digital_record(
     now = datetime.utcnow()
 
     if ciudadano is None:
-        ciudadano = Ciudadano(
-            dni=dni,
-            lm=lm,
-            apellidos=apellidos,
-            nombres=nombres,
-            fecha_nacimiento=fecha_nacimiento,
-            presto_servicio=presto_servicio,
-            fecha_creacion=now,
-            id_usuario_creacion=id_usuario_actual
-        )
+        ciudadano = _new_ciudadano(r, now, id_usuario_actual)
         db.add(ciudadano)
         db.flush()
     else:
-        if apellidos: ciudadano.apellidos = apellidos
-        if nombres:   ciudadano.nombres = nombres
-        if fecha_nacimiento is not None: ciudadano.fecha_nacimiento = fecha_nacimiento
-        if presto_servicio is not None:  ciudadano.presto_servicio = presto_servicio
-        if dni and not ciudadano.dni: ciudadano.dni = dni
-        if lm  and not ciudadano.lm:  ciudadano.lm  = lm
-        ciudadano.fecha_ultima_modificacion = now
-        ciudadano.id_usuario_ultima_modificacion = id_usuario_actual
+        _update_ciudadano(ciudadano, r, now, id_usuario_actual)
         db.flush()
 
     # --- datos servicio militar (1:1) ---
@@ -156,35 +162,18 @@ def create_full_digital_record(
     ).scalar_one_or_none()
 
     if servicio is None:
-        servicio = DatosServicioMilitar(
-            id_ciudadano=ciudadano.id_ciudadano,
-            referencia_documento_origen=referencia_origen,
-            clase=clase, libro=libro, folio=folio,
-            fecha_alta=fecha_alta, fecha_baja=fecha_baja,
-            id_unidad_alta=unidad_alta.id_unidad if unidad_alta else None,
-            id_unidad_baja=unidad_baja.id_unidad if unidad_baja else None,
-            id_grado=grado.id_grado if grado else None,
-            id_motivo_baja=motivo_baja.id_motivo_baja if motivo_baja else None
-        )
+        servicio = _new_servicio(r, unidad_alta, unidad_baja, grado, motivo_baja, id_ciudadano=ciudadano.id_ciudadano)
         db.add(servicio)
         db.flush()
     else:
-        servicio.referencia_documento_origen = referencia_origen or servicio.referencia_documento_origen
-        servicio.clase = clase or servicio.clase
-        servicio.libro = libro or servicio.libro
-        servicio.folio = folio or servicio.folio
-        if fecha_alta is not None: servicio.fecha_alta = fecha_alta
-        if fecha_baja is not None: servicio.fecha_baja = fecha_baja
-        if unidad_alta: servicio.id_unidad_alta = unidad_alta.id_unidad
-        if unidad_baja: servicio.id_unidad_baja = unidad_baja.id_unidad
-        if grado:       servicio.id_grado = grado.id_grado
-        if motivo_baja: servicio.id_motivo_baja = motivo_baja.id_motivo_baja
+        _update_servicio(servicio, r, unidad_alta, unidad_baja, grado, motivo_baja)
         db.flush()
 
     # --- documento ---
     documento = Documento(
         nombre_archivo=file_info.get("name"),
         ruta_almacenamiento=file_info.get("path"),
+        hash_contenido=file_info.get("sha256"),
         fecha_extraccion=now,
         id_usuario_extraccion=id_usuario_actual
     )
@@ -203,3 +192,135 @@ def create_full_digital_record(
         "servicio_id": servicio.id_servicio,
         "documento_id": documento.id_documento
     }
+
+# ----------------------------------------------------------------------
+# Alta masiva
+# ----------------------------------------------------------------------
+BULK_CHUNK_SIZE = 200
+
+def _bulk_chunk(db: Session, chunk: list, id_usuario_actual: int) -> list:
+    """Inserta un bloque de registros ya validados en una sola transacción.
+
+    `chunk` es [(índice, registro_normalizado, file_info)]. Cada flush agrupa
+    las filas nuevas de una tabla en un INSERT multi-fila (insertmanyvalues).
+    """
+    now = datetime.utcnow()
+
+    # --- catálogos: desde la caché; solo los nuevos van en un INSERT por tabla ---
+    grados = catalog_cache.resolve_many(db, Grado, {
+        r["grado"]: {"descripcion": r["grado"], "codigo_grado": None} for _, r, _ in chunk if r["grado"]})
+    motivos = catalog_cache.resolve_many(db, MotivoBaja, {
+        r["motivo_baja"]: {"descripcion": r["motivo_baja"]} for _, r, _ in chunk if r["motivo_baja"]})
+    unidades_kw = {}
+    for _, r, _ in chunk:
+        for nombre in (r["unidad_alta"], r["unidad_baja"]):
+            if nombre:
+                unidades_kw.setdefault(nombre, {"nombre_unidad": nombre, "gran_unidad": r["gran_unidad"]})
+    unidades = catalog_cache.resolve_many(db, UnidadMilitar, unidades_kw)
+
+    # --- ciudadanos existentes por dni/lm en una sola consulta ---
+    dnis = {r["dni"] for _, r, _ in chunk if r["dni"]}
+    lms = {r["lm"] for _, r, _ in chunk if r["lm"]}
+    conds = []
+    if dnis: conds.append(Ciudadano.dni.in_(dnis))
+    if lms:  conds.append(Ciudadano.lm.in_(lms))
+    by_dni, by_lm = {}, {}
+    for c in db.execute(select(Ciudadano).where(or_(*conds))).scalars():
+        if c.dni: by_dni[c.dni] = c
+        if c.lm:  by_lm[c.lm] = c
+
+    servicios = {}
+    existing_ids = [c.id_ciudadano for c in {*by_dni.values(), *by_lm.values()}]
+    if existing_ids:
+        for sv in db.execute(
+            select(DatosServicioMilitar).where(DatosServicioMilitar.id_ciudadano.in_(existing_ids))
+        ).scalars():
+            servicios.setdefault(sv.id_ciudadano, sv)
+
+    # --- armado en memoria; un único flush ordena e inserta por tabla ---
+    rows = []
+    for idx, r, file_info in chunk:
+        ciudadano = (by_dni.get(r["dni"]) if r["dni"] else None) or (by_lm.get(r["lm"]) if r["lm"] else None)
+        if ciudadano is None:
+            ciudadano = _new_ciudadano(r, now, id_usuario_actual)
+            db.add(ciudadano)
+        else:
+            _update_ciudadano(ciudadano, r, now, id_usuario_actual)
+        # Registros repetidos dentro del bloque resuelven al mismo ciudadano
+        if ciudadano.dni: by_dni[ciudadano.dni] = ciudadano
+        if ciudadano.lm:  by_lm[ciudadano.lm] = ciudadano
+
+        ua = unidades.get(r["unidad_alta"]); ub = unidades.get(r["unidad_baja"])
+        gr = grados.get(r["grado"]); mb = motivos.get(r["motivo_baja"])
+        key = ciudadano.id_ciudadano if ciudadano.id_ciudadano is not None else id(ciudadano)
+        servicio = servicios.get(key)
+        if servicio is None:
+            servicio = _new_servicio(r, ua, ub, gr, mb, ciudadano=ciudadano)
+            db.add(servicio)
+            servicios[key] = servicio
+        else:
+            _update_servicio(servicio, r, ua, ub, gr, mb)
+
+        documento = Documento(
+            nombre_archivo=file_info.get("name"),
+            ruta_almacenamiento=file_info.get("path"),
+            hash_contenido=file_info.get("sha256"),
+            fecha_extraccion=now,
+            id_usuario_extraccion=id_usuario_actual
+        )
+        db.add(documento)
+        db.add(DocumentoServicio(documento=documento, servicio=servicio))
+        db.add(CiudadanoDocumento(ciudadano=ciudadano, documento=documento))
+        rows.append((idx, ciudadano, servicio, documento))
+
+    db.flush()
+    return [
+        {"index": idx, "ok": True, "ciudadano_id": c.id_ciudadano, "servicio_id": sv.id_servicio, "documento_id": d.id_documento}
+        for idx, c, sv, d in rows
+    ]
+
+def create_full_digital_records_bulk(
+    db: Session,
+    items: list,
+    id_usuario_actual: int,
+    chunk_size: int = BULK_CHUNK_SIZE
+) -> dict:
+    """
+    Alta masiva de registros extraídos: `items` = [(data, file_info), ...].
+
+    Por bloque de `chunk_size`: catálogos y ciudadanos se resuelven con
+    consultas por conjunto, las filas nuevas van en INSERT multi-fila y se
+    hace un solo commit. Si un bloque falla se reintenta registro a registro
+    con create_full_digital_record para aislar el que falla.
+
+    Devuelve {'results': [...], 'saved', 'errors'}; cada resultado lleva
+    'index' (posición en `items`), 'ok' y los ids o 'error'.
+    """
+    results = []
+    valid = []
+    for idx, (data, file_info) in enumerate(items):
+        r = _normalize_record(data or {})
+        if not r["dni"] and not r["lm"]:
+            results.append({"index": idx, "ok": False, "error": "Se requiere al menos DNI o LM para registrar al ciudadano."})
+            continue
+        valid.append((idx, r, file_info or {}))
+
+    for start in range(0, len(valid), max(1, chunk_size)):
+        chunk = valid[start:start + chunk_size]
+        try:
+            results.extend(_bulk_chunk(db, chunk, id_usuario_actual))
+            db.commit()
+        except Exception:
+            db.rollback()
+            for idx, _, file_info in chunk:
+                data, _ = items[idx]
+                try:
+                    ids = create_full_digital_record(db, data, file_info, id_usuario_actual)
+                    results.append({"index": idx, "ok": True, **ids})
+                except Exception as e:
+                    db.rollback()
+                    results.append({"index": idx, "ok": False, "error": str(e)})
+
+    results.sort(key=lambda x: x["index"])
+    saved = sum(1 for x in results if x["ok"])
+    return {"results": results, "saved": saved, "errors": len(results) - saved}
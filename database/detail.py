@@ -0,0 +1,62 @@
+# database/detail.py
+"""Carga del detalle de un ciudadano en una sola consulta.
+
+Ciudadano + servicio militar + catálogos (unidad alta/baja, grado, motivo)
++ documentos vinculados salen de un único SELECT con joinedload, en lugar
+de una sesión y varias cargas perezosas por cada parte del panel.
+"""
+from dataclasses import dataclass, field
+from typing import List, Optional
+
+from sqlalchemy import select
+from sqlalchemy.orm import Session, joinedload
+
+from .models import Ciudadano, CiudadanoDocumento, DatosServicioMilitar, Documento
+
+
+@dataclass
+class CitizenDetail:
+    ciudadano: Ciudadano
+    servicio: Optional[DatosServicioMilitar] = None
+    documentos: List[Documento] = field(default_factory=list)
+    unidad_alta: str = ""
+    unidad_baja: str = ""
+    grado: str = ""
+    motivo_baja: str = ""
+
+
+def citizen_detail_query(id_ciudadano: int):
+    sv = joinedload(Ciudadano.datos_servicio)
+    return (
+        select(Ciudadano)
+        .where(Ciudadano.id_ciudadano == id_ciudadano)
+        .options(
+            sv.joinedload(DatosServicioMilitar.unidad_alta),
+            sv.joinedload(DatosServicioMilitar.unidad_baja),
+            sv.joinedload(DatosServicioMilitar.grado),
+            sv.joinedload(DatosServicioMilitar.motivo_baja),
+            joinedload(Ciudadano.documentos_vinculados).joinedload(CiudadanoDocumento.documento),
+        )
+    )
+
+
+def load_citizen_detail(db: Session, id_ciudadano: int) -> Optional[CitizenDetail]:
+    """Detalle completo del ciudadano (None si no existe). Los objetos quedan
+    cargados y se pueden usar después de cerrar la sesión."""
+    c = db.execute(citizen_detail_query(id_ciudadano)).unique().scalar_one_or_none()
+    if c is None:
+        return None
+    sv = c.datos_servicio
+    documentos = sorted(
+        (link.documento for link in c.documentos_vinculados if link.documento is not None),
+        key=lambda d: d.id_documento, reverse=True,
+    )
+    return CitizenDetail(
+        ciudadano=c,
+        servicio=sv,
+        documentos=documentos,
+        unidad_alta=sv.unidad_alta.nombre_unidad if sv and sv.unidad_alta else "",
+        unidad_baja=sv.unidad_baja.nombre_unidad if sv and sv.unidad_baja else "",
+        grado=sv.grado.descripcion if sv and sv.grado else "",
+        motivo_baja=sv.motivo_baja.descripcion if sv and sv.motivo_baja else "",
+    )
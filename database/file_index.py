@@ -0,0 +1,130 @@
+# database/file_index.py
+"""Hash de contenido de los documentos (documentos.hash_contenido).
+
+  - ensure_hash_column: agrega la columna y su índice si faltan (idempotente,
+    como database/search.py).
+  - find_duplicate: documento ya guardado con los mismos bytes; las vistas de
+    digitalización lo usan para no volver a guardar un archivo repetido.
+  - file_in_use: si otro Documento sigue apuntando a un archivo. Con el
+    almacén por contenido (utils/file_store.py) varios documentos comparten
+    archivo: solo se borra o se manda a la papelera cuando nadie lo usa.
+  - backfill_hashes: calcula el hash de los documentos que no lo tienen y
+    pasa al almacén los archivos de storage/data anteriores a él (enlace duro
+    al objeto, la fila apunta al objeto y se borra la ruta vieja; los
+    repetidos liberan su espacio). Los archivos fuera de storage solo se
+    hashean. Corre en segundo plano al iniciar (start_hash_backfill).
+"""
+import os
+import threading
+from typing import Iterable, Optional, Tuple
+
+from sqlalchemy import inspect, select, update
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session
+
+from utils import file_store
+from utils import thumbnails as thumbs
+from utils.ocr_cache import file_sha256
+
+from .models import Documento
+
+HASH_BACKFILL_BATCH = int(os.getenv("HASH_BACKFILL_BATCH", "200"))
+
+
+def ensure_hash_column(engine: Engine) -> None:
+    cols = {c["name"] for c in inspect(engine).get_columns("documentos")}
+    with engine.begin() as conn:
+        if "hash_contenido" not in cols:
+            conn.exec_driver_sql("ALTER TABLE documentos ADD COLUMN hash_contenido VARCHAR(64)")
+        conn.exec_driver_sql("CREATE INDEX IF NOT EXISTS ix_documentos_hash_contenido ON documentos (hash_contenido)")
+
+
+def find_duplicate(db: Session, sha: Optional[str], nombre: Optional[str] = None) -> Optional[Documento]:
+    """Documento con ese contenido (y ese nombre, para páginas de un mismo PDF) o None."""
+    if not sha:
+        return None
+    stmt = select(Documento).where(Documento.hash_contenido == sha)
+    if nombre is not None:
+        stmt = stmt.where(Documento.nombre_archivo == nombre)
+    return db.execute(stmt.limit(1)).scalars().first()
+
+
+def file_in_use(db: Session, path: str, exclude: Iterable[int] = ()) -> bool:
+    """¿Algún Documento (fuera de `exclude`) apunta a `path`? Compara ruta relativa y absoluta."""
+    rutas = {path, os.path.abspath(path)}
+    try:
+        rutas.add(os.path.relpath(path))
+    except ValueError:  # otra unidad en Windows
+        pass
+    stmt = select(Documento.id_documento).where(Documento.ruta_almacenamiento.in_(rutas))
+    exclude = list(exclude)
+    if exclude:
+        stmt = stmt.where(Documento.id_documento.notin_(exclude))
+    return db.execute(stmt.limit(1)).first() is not None
+
+
+def _migrate_file(ruta: str, sha: str) -> Tuple[str, int]:
+    """Lleva un archivo de storage/data al almacén. Devuelve (nueva ruta, bytes liberados)."""
+    obj, _, created = file_store.store(ruta, sha)
+    if os.path.isabs(ruta):
+        obj = os.path.abspath(obj)
+    return obj, 0 if created else os.path.getsize(ruta)
+
+
+def backfill_hashes(engine: Engine, batch: int = HASH_BACKFILL_BATCH, migrate_files: bool = True) -> Tuple[int, int, int]:
+    """Completa hash_contenido. Devuelve (documentos, archivos movidos al almacén, bytes liberados)."""
+    D = Documento.__table__.c
+    last = 0
+    hashed = moved = freed = 0
+    while True:
+        with engine.connect() as conn:
+            rows = conn.execute(
+                select(D.id_documento, D.ruta_almacenamiento)
+                .where(D.hash_contenido.is_(None), D.id_documento > last)
+                .order_by(D.id_documento).limit(batch)
+            ).all()
+        if not rows:
+            return hashed, moved, freed
+        last = rows[-1][0]
+        for ruta in dict.fromkeys(r[1] for r in rows if r[1]):
+            if not os.path.isfile(ruta):
+                continue
+            try:
+                sha = file_sha256(ruta)
+                new, saved = ruta, 0
+                if migrate_files and file_store.in_storage(ruta) and not file_store.is_object(ruta):
+                    new, saved = _migrate_file(ruta, sha)
+            except OSError as e:
+                print(f"[file_index] {ruta}: {e}")
+                continue
+            with engine.begin() as conn:
+                hashed += conn.execute(
+                    update(Documento.__table__).where(D.ruta_almacenamiento == ruta)
+                    .values(hash_contenido=sha, ruta_almacenamiento=new)
+                ).rowcount or 0
+            if new != ruta:
+                # La fila ya apunta al objeto: la ruta vieja sobra
+                if thumbs.existing_thumbnail(new):
+                    thumbs.discard(ruta)
+                else:
+                    thumbs.move_with(ruta, new)
+                try:
+                    os.remove(ruta)
+                except OSError:
+                    pass
+                moved += 1
+                freed += saved
+
+
+def start_hash_backfill(engine: Engine) -> None:
+    """backfill_hashes en un hilo demonio (una vez por arranque)."""
+
+    def run():
+        try:
+            hashed, moved, freed = backfill_hashes(engine)
+            if hashed:
+                print(f"[file_index] {hashed} documentos con hash; {moved} archivos al almacén, {freed / 2**20:.1f} MB liberados")
+        except Exception as e:
+            print(f"[file_index] backfill fallido: {e}")
+
+    threading.Thread(target=run, name="hash-backfill", daemon=True).start()
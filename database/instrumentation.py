@@ -0,0 +1,158 @@
+# database/instrumentation.py
+"""Métricas de base de datos: sentencias por operación y uso del pool.
+
+    with count_queries(engine) as qc:
+        load_citizen_detail(db, 42)
+    print(qc.count, qc.elapsed_ms)
+
+Con DB_QUERY_LOG=1 la vista de Gestión de Datos imprime el conteo de cada
+apertura de ciudadano. pool_metrics.snapshot() devuelve checkouts, conexiones
+en uso (y pico), espera por conexión libre y timeouts; con
+DB_POOL_LOG_INTERVAL=N (s) se imprime periódicamente.
+"""
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import List
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from sqlalchemy.exc import TimeoutError as PoolTimeout
+from sqlalchemy.pool import QueuePool
+
+QUERY_LOG = os.getenv("DB_QUERY_LOG", "0") == "1"
+POOL_LOG_INTERVAL = float(os.getenv("DB_POOL_LOG_INTERVAL", "0"))
+
+
+class QueryCounter:
+    def __init__(self, keep_sql: bool = False):
+        self.count = 0
+        self.statements: List[str] = []
+        self.keep_sql = keep_sql
+        self.elapsed_ms = 0.0
+        self._thread = threading.get_ident()
+
+    def _on_execute(self, conn, cursor, statement, parameters, context, executemany):
+        # Solo las sentencias del hilo que abrió el contador
+        if threading.get_ident() != self._thread:
+            return
+        self.count += 1
+        if self.keep_sql:
+            self.statements.append(statement)
+
+
+@contextmanager
+def count_queries(engine: Engine, keep_sql: bool = False):
+    qc = QueryCounter(keep_sql)
+    event.listen(engine, "before_cursor_execute", qc._on_execute)
+    t0 = time.perf_counter()
+    try:
+        yield qc
+    finally:
+        qc.elapsed_ms = (time.perf_counter() - t0) * 1000
+        event.remove(engine, "before_cursor_execute", qc._on_execute)
+
+
+# ----------------------------------------------------------------------
+# Pool
+# ----------------------------------------------------------------------
+class PoolMetrics:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+        self._engine = None
+
+    def reset(self) -> None:
+        with self._lock:
+            self.checkouts = 0
+            self.in_use = 0
+            self.peak_in_use = 0
+            self.connects = 0
+            self.invalidated = 0
+            self.waits = 0            # checkouts que tuvieron que esperar (> 1 ms)
+            self.wait_total_ms = 0.0
+            self.wait_max_ms = 0.0
+            self.timeouts = 0
+
+    def record_wait(self, ms: float, timed_out: bool = False) -> None:
+        with self._lock:
+            if timed_out:
+                self.timeouts += 1
+            if ms > 1.0:
+                self.waits += 1
+                self.wait_total_ms += ms
+                self.wait_max_ms = max(self.wait_max_ms, ms)
+
+    def _checkout(self, *_a):
+        with self._lock:
+            self.checkouts += 1
+            self.in_use += 1
+            self.peak_in_use = max(self.peak_in_use, self.in_use)
+
+    def _checkin(self, *_a):
+        with self._lock:
+            self.in_use = max(0, self.in_use - 1)
+
+    def _connect(self, *_a):
+        with self._lock:
+            self.connects += 1
+
+    def _invalidate(self, *_a):
+        with self._lock:
+            self.invalidated += 1
+
+    def attach(self, engine: Engine) -> None:
+        self._engine = engine
+        event.listen(engine, "checkout", self._checkout)
+        event.listen(engine, "checkin", self._checkin)
+        event.listen(engine, "connect", self._connect)
+        event.listen(engine, "invalidate", self._invalidate)
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            snap = {
+                "checkouts": self.checkouts,
+                "in_use": self.in_use,
+                "peak_in_use": self.peak_in_use,
+                "connects": self.connects,
+                "invalidated": self.invalidated,
+                "waits": self.waits,
+                "wait_avg_ms": round(self.wait_total_ms / self.waits, 1) if self.waits else 0.0,
+                "wait_max_ms": round(self.wait_max_ms, 1),
+                "timeouts": self.timeouts,
+            }
+        pool = getattr(self._engine, "pool", None)
+        if pool is not None:
+            snap["pool"] = pool.status()
+        return snap
+
+
+pool_metrics = PoolMetrics()
+
+
+class TimedQueuePool(QueuePool):
+    """QueuePool que mide cuánto espera cada checkout por una conexión libre."""
+
+    def _do_get(self):
+        t0 = time.perf_counter()
+        try:
+            conn = super()._do_get()
+        except PoolTimeout:
+            pool_metrics.record_wait((time.perf_counter() - t0) * 1000, timed_out=True)
+            raise
+        pool_metrics.record_wait((time.perf_counter() - t0) * 1000)
+        return conn
+
+
+def start_pool_logger(interval: float = POOL_LOG_INTERVAL) -> None:
+    """Imprime pool_metrics cada `interval` segundos (hilo demonio); 0 = apagado."""
+    if interval <= 0:
+        return
+
+    def loop():
+        while True:
+            time.sleep(interval)
+            print(f"[pool] {pool_metrics.snapshot()}")
+
+    threading.Thread(target=loop, name="pool-metrics", daemon=True).start()
@@ -0,0 +1,204 @@
+# database/migrate.py
+"""Migración de la base completa a otra DATABASE_URL (Neon <-> SQLite/PostgreSQL local).
+
+  - Tablas en orden de claves foráneas (metadata.sorted_tables), leídas por
+    clave primaria con cursores del lado del servidor y escritas en bloques
+    de MIGRATE_CHUNK_ROWS filas con INSERT ... ON CONFLICT DO NOTHING
+    (backup_io.insert_ignore); cada bloque es su propia transacción en el
+    destino.
+  - Puntos de control: tras cada bloque se guarda la última clave copiada por
+    tabla en `storage/migrations/<destino>.json`; si la migración se corta,
+    la siguiente continúa desde ahí. Al terminar sin errores se borra.
+  - Verificación: por tabla se comparan filas y sha256 de todas las filas en
+    orden de clave (la misma serialización de los respaldos) en origen y
+    destino. Se lee fuera de la transacción de la copia: si la base de
+    origen sigue en uso, lo escrito entretanto aparece como diferencia.
+
+Sin interfaz:
+    python -m database.migrate --to postgresql+psycopg2://u:p@host/db [--from URL]
+        [--chunk N] [--restart] [--no-verify]
+"""
+import argparse
+import hashlib
+import json
+import os
+import sys
+import time
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional
+
+from sqlalchemy import create_engine, func, select, tuple_
+from sqlalchemy.engine import Engine, make_url
+
+from .backup_io import Progress, dump_row, insert_ignore, reset_sequences
+from .models import Base
+
+MIGRATE_CHUNK_ROWS = int(os.getenv("MIGRATE_CHUNK_ROWS", "5000"))
+CHECKPOINT_DIR = os.getenv("MIGRATE_CHECKPOINT_DIR", os.path.join("storage", "migrations"))
+
+
+@dataclass
+class TableMigration:
+    name: str
+    copied: int = 0      # filas leídas del origen en esta ejecución
+    inserted: int = 0    # de ellas, las que no existían en el destino
+    source_rows: Optional[int] = None
+    target_rows: Optional[int] = None
+    checksum_ok: Optional[bool] = None
+
+
+@dataclass
+class MigrationResult:
+    tables: List[TableMigration] = field(default_factory=list)
+    resumed: bool = False
+    seconds: float = 0.0
+
+    @property
+    def copied(self) -> int:
+        return sum(t.copied for t in self.tables)
+
+    @property
+    def errors(self) -> List[str]:
+        out = []
+        for t in self.tables:
+            if t.source_rows is not None and t.source_rows != t.target_rows:
+                out.append(f"{t.name}: {t.source_rows} filas en origen, {t.target_rows} en destino")
+            elif t.checksum_ok is False:
+                out.append(f"{t.name}: el contenido no coincide (sha256)")
+        return out
+
+
+def checkpoint_path(target_url: str) -> str:
+    """Archivo de puntos de control de un destino (la contraseña no entra en el nombre)."""
+    safe = make_url(target_url).render_as_string(hide_password=True)
+    return os.path.join(CHECKPOINT_DIR, hashlib.sha1(safe.encode("utf-8")).hexdigest()[:16] + ".json")
+
+
+def _load_checkpoint(path: str) -> Dict[str, Any]:
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def _save_checkpoint(path: str, state: Dict[str, Any]) -> None:
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(state, f)
+    os.replace(tmp, path)
+
+
+def _table_digest(engine: Engine, table, chunk_rows: int):
+    """(filas, sha256) de la tabla completa en orden de clave primaria."""
+    digest = hashlib.sha256()
+    rows = 0
+    with engine.connect() as conn:
+        result = conn.execution_options(stream_results=True, yield_per=chunk_rows).execute(
+            select(table).order_by(*table.primary_key.columns)
+        )
+        for part in result.partitions():
+            for r in part:
+                digest.update(dump_row(dict(r._mapping)))
+            rows += len(part)
+    return rows, digest.hexdigest()
+
+
+def migrate(source: Engine, target: Engine, checkpoint: Optional[str] = None, on_progress: Optional[Progress] = None,
+            chunk_rows: int = MIGRATE_CHUNK_ROWS, restart: bool = False, verify: bool = True) -> MigrationResult:
+    """Copia todas las tablas de `source` a `target` (crea el esquema si falta)."""
+    t0 = time.perf_counter()
+    checkpoint = checkpoint or checkpoint_path(target.url.render_as_string(hide_password=False))
+    origin = source.url.render_as_string(hide_password=True)
+    state = {} if restart else _load_checkpoint(checkpoint)
+    if state.get("source") != origin:  # otro origen: el punto de control no sirve
+        state = {"source": origin, "tables": {}}
+    result = MigrationResult(resumed=bool(state["tables"]))
+    tables = Base.metadata.sorted_tables
+    Base.metadata.create_all(target)
+
+    options = {"isolation_level": "REPEATABLE READ"} if source.dialect.name == "postgresql" else {}
+    with source.connect().execution_options(**options) as src, src.begin():
+        total = sum(src.execute(select(func.count()).select_from(t)).scalar() or 0 for t in tables)
+        done = sum(t["rows"] for t in state["tables"].values())
+        for table in tables:
+            stat = TableMigration(table.name)
+            result.tables.append(stat)
+            saved = state["tables"].setdefault(table.name, {"rows": 0, "last": None, "done": False})
+            if saved["done"]:
+                continue
+            pk = list(table.primary_key.columns)
+            stmt = select(table).order_by(*pk)
+            if saved["last"] is not None:
+                stmt = stmt.where(tuple_(*pk) > tuple_(*saved["last"]) if len(pk) > 1 else pk[0] > saved["last"][0])
+            if on_progress:
+                on_progress(table.name, done, total)
+            rows = src.execution_options(stream_results=True, yield_per=chunk_rows).execute(stmt)
+            for part in rows.partitions():
+                batch = [dict(r._mapping) for r in part]
+                with target.begin() as dst:
+                    stat.inserted += insert_ignore(dst, table, batch)
+                stat.copied += len(batch)
+                saved["rows"] += len(batch)
+                saved["last"] = [batch[-1][c.name] for c in pk]
+                _save_checkpoint(checkpoint, state)
+                done += len(batch)
+                if on_progress:
+                    on_progress(table.name, done, max(total, done))
+            saved["done"] = True
+            _save_checkpoint(checkpoint, state)
+
+    with target.begin() as dst:
+        reset_sequences(dst, tables)
+
+    if verify:
+        for table, stat in zip(tables, result.tables):
+            if on_progress:
+                on_progress(f"verificando {table.name}", done, total)
+            stat.source_rows, src_sha = _table_digest(source, table, chunk_rows)
+            stat.target_rows, dst_sha = _table_digest(target, table, chunk_rows)
+            stat.checksum_ok = src_sha == dst_sha
+    if not result.errors:
+        try:
+            os.remove(checkpoint)
+        except OSError:
+            pass
+    result.seconds = time.perf_counter() - t0
+    return result
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Migra la base de datos ORMD a otra DATABASE_URL.")
+    parser.add_argument("--to", required=True, help="DATABASE_URL destino")
+    parser.add_argument("--from", dest="source", help="DATABASE_URL origen (por defecto la de .env)")
+    parser.add_argument("--chunk", type=int, default=MIGRATE_CHUNK_ROWS, help="filas por bloque")
+    parser.add_argument("--restart", action="store_true", help="ignora los puntos de control y empieza de cero")
+    parser.add_argument("--no-verify", action="store_true", help="no compara filas y checksums al final")
+    args = parser.parse_args(argv)
+
+    if args.source:
+        source = create_engine(args.source, future=True)
+    else:
+        from .connection import engine as source
+    target = create_engine(args.to, future=True)
+
+    def on_progress(tabla, hechas, total):
+        print(f"\r{tabla:<32} {hechas:>10,}/{total:,}", end="", flush=True)
+
+    res = migrate(source, target, on_progress=on_progress, chunk_rows=args.chunk,
+                  restart=args.restart, verify=not args.no_verify)
+    print()
+    if res.resumed:
+        print("(continuación de una migración interrumpida)")
+    for t in res.tables:
+        check = "" if t.checksum_ok is None else (" ok" if t.checksum_ok and t.source_rows == t.target_rows else " DIFERENTE")
+        print(f"  {t.name:<28} {t.copied:>10,} copiadas {t.inserted:>10,} nuevas{check}")
+    print(f"{res.copied:,} filas en {res.seconds:.1f} s ({res.copied / max(res.seconds, 1e-6):,.0f} filas/s)")
+    for e in res.errors:
+        print(f"⚠️ {e}")
+    return 1 if res.errors else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
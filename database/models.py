@@ -76,6 +76,7 @@ class Documento(Base):
     id_documento = Column(Integer, primary_key=True)
     nombre_archivo = Column(String(255), nullable=False)
     ruta_almacenamiento = Column(String(255))
+    hash_contenido = Column(String(64), index=True)  # sha256 del archivo (utils/file_store.py)
     fecha_extraccion = Column(DateTime, nullable=False)
     id_usuario_extraccion = Column(Integer, ForeignKey('usuarios.id_usuario'), nullable=False)
 
@@ -96,9 +97,13 @@ class Ciudadano(Base):
     lm = Column(String(20), unique=True)
     apellidos = Column(String(150), nullable=False)
     nombres = Column(String(150), nullable=False)
-    fecha_nacimiento = Column(Date)
+    fecha_nacimiento = Column(Date, index=True)
     presto_servicio = Column(Boolean)
 
+    # Claves de búsqueda (database/name_keys.py), se fijan al escribir
+    nombre_normalizado = Column(String(300), index=True)
+    nombre_fonetico = Column(String(300), index=True)
+
     # Auditoría
     fecha_creacion = Column(DateTime, nullable=False)
     id_usuario_creacion = Column(Integer, ForeignKey('usuarios.id_usuario'), nullable=False)
@@ -127,7 +132,7 @@ class DatosServicioMilitar(Base):
     id_servicio = Column(Integer, primary_key=True)
     
     # Claves Foráneas
-    id_ciudadano = Column(Integer, ForeignKey('ciudadanos.id_ciudadano'), nullable=False)
+    id_ciudadano = Column(Integer, ForeignKey('ciudadanos.id_ciudadano'), nullable=False, index=True)
     id_unidad_alta = Column(Integer, ForeignKey('unidades_militares.id_unidad'))
     id_unidad_baja = Column(Integer, ForeignKey('unidades_militares.id_unidad'))
     id_grado = Column(Integer, ForeignKey('grados.id_grado'))
@@ -135,7 +140,7 @@ class DatosServicioMilitar(Base):
     
     # Campos de datos
     referencia_documento_origen = Column(String(50))
-    clase = Column(String(10))
+    clase = Column(String(10), index=True)
     libro = Column(String(10))
     folio = Column(String(10))
     fecha_alta = Column(Date)
@@ -151,6 +156,8 @@ class DatosServicioMilitar(Base):
     # Relación N:M con Documento
     documentos = relationship("DocumentoServicio", back_populates="servicio")
 
+    __table_args__ = (Index("ix_datos_servicio_militar_libro_folio", "libro", "folio"),)
+
 # ----------------------------------------------------------------------
 # 4. Tablas de Asociación (N:M)
 # ----------------------------------------------------------------------
@@ -171,4 +178,12 @@ class CiudadanoDocumento(Base):
     
     # Relaciones de vuelta
     ciudadano = relationship("Ciudadano", back_populates="documentos_vinculados")
-    documento = relationship("Documento", back_populates="ciudadanos_vinculados")
\ No newline at end of file
+    documento = relationship("Documento", back_populates="ciudadanos_vinculados")
+# ----------------------------------------------------------------------
+# 5. Estadísticas (database/stats.py)
+# ----------------------------------------------------------------------
+class EstadisticaMensual(Base):
+    __tablename__ = 'estadisticas_mensuales'
+    periodo = Column(String(7), primary_key=True)  # 'AAAA-MM'
+    ciudadanos = Column(Integer, nullable=False, default=0)
+    documentos = Column(Integer, nullable=False, default=0)
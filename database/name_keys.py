@@ -0,0 +1,125 @@
+# database/name_keys.py
+"""Claves normalizadas y fonéticas de nombres para la búsqueda tolerante.
+
+El OCR confunde Ñ/N, pierde tildes y duplica letras; quien busca tampoco
+escribe siempre igual (CEVALLOS/ZEVALLOS, HUAMAN/GUAMAN). Se guardan dos
+claves por ciudadano al escribir:
+  - normalizada: mayúsculas sin tildes (Ñ→N), solo letras y espacios.
+  - fonética: reglas del castellano (B/V, S/Z/C suave, LL/Y, H muda, QU/K...).
+La búsqueda filtra por ellas con índice y ordena por distancia de edición
+(los errores de tipeo se buscan aparte, ver database/search.py).
+"""
+import re
+import unicodedata
+from functools import lru_cache
+from typing import Iterable, List, Optional, Tuple
+
+_NO_LETRAS = re.compile(r"[^A-Z ]+")
+
+# (patrón, reemplazo) en orden; se aplican palabra por palabra
+_FONETICA = [
+    (re.compile(r"G(?=[EI])"), "J"),
+    (re.compile(r"GU(?=[EI])"), "G"),
+    (re.compile(r"QU(?=[EI])"), "K"),
+    (re.compile(r"X"), "KS"),
+    (re.compile(r"CH"), "X"),
+    (re.compile(r"C(?=[EI])"), "S"),
+    (re.compile(r"[CQ]"), "K"),
+    (re.compile(r"Z"), "S"),
+    (re.compile(r"V"), "B"),
+    (re.compile(r"W"), "U"),
+    (re.compile(r"GU(?=[AO])"), "U"),
+    (re.compile(r"LL"), "Y"),
+    (re.compile(r"Y(?=[^AEIOU]|$)"), "I"),
+    (re.compile(r"H"), ""),
+    (re.compile(r"(.)\1+"), r"\1"),
+]
+
+
+def normalize_name(s: Optional[str]) -> str:
+    """'Muñoz  Cáceres' → 'MUNOZ CACERES'."""
+    s = unicodedata.normalize("NFKD", str(s or "").upper())
+    s = "".join(ch for ch in s if not unicodedata.combining(ch))
+    return " ".join(_NO_LETRAS.sub(" ", s).split())
+
+
+@lru_cache(maxsize=50_000)
+def phonetic_word(w: str) -> str:
+    for pat, rep in _FONETICA:
+        w = pat.sub(rep, w)
+    return w
+
+
+def phonetic_name(s: Optional[str]) -> str:
+    """'Cevallos Huamán' → 'SEBAYOS UAMAN' (igual que 'ZEVALLOS GUAMAN')."""
+    return " ".join(p for p in (phonetic_word(w) for w in normalize_name(s).split()) if p)
+
+
+def name_keys(apellidos: Optional[str], nombres: Optional[str]) -> Tuple[str, str]:
+    """(clave normalizada, clave fonética) de 'apellidos nombres'."""
+    full = f"{apellidos or ''} {nombres or ''}"
+    return normalize_name(full), phonetic_name(full)
+
+
+def set_name_keys(ciudadano) -> None:
+    """Actualiza las columnas de búsqueda de un Ciudadano a partir de sus nombres."""
+    ciudadano.nombre_normalizado, ciudadano.nombre_fonetico = name_keys(ciudadano.apellidos, ciudadano.nombres)
+
+
+# ----------------------------------------------------------------------
+# Puntuación
+# ----------------------------------------------------------------------
+def levenshtein(a: str, b: str, max_dist: Optional[int] = None) -> int:
+    """Distancia de edición (una transposición cuenta 1); corta en max_dist + 1 si se supera."""
+    if a == b:
+        return 0
+    if len(a) < len(b):
+        a, b = b, a
+    if max_dist is not None and len(a) - len(b) > max_dist:
+        return max_dist + 1
+    before, prev = None, list(range(len(b) + 1))
+    for i, ca in enumerate(a, 1):
+        cur = [i]
+        for j, cb in enumerate(b, 1):
+            d = min(prev[j] + 1, cur[j - 1] + 1, prev[j - 1] + (ca != cb))
+            if before and j > 1 and ca == b[j - 2] and a[i - 2] == cb:
+                d = min(d, before[j - 2] + 1)
+            cur.append(d)
+        if max_dist is not None and min(cur) > max_dist:
+            return max_dist + 1
+        before, prev = prev, cur
+    return prev[-1]
+
+
+def _similarity(a: str, b: str) -> float:
+    if not a or not b:
+        return 0.0
+    return 1.0 - levenshtein(a, b) / max(len(a), len(b))
+
+
+def token_score(token: str, words: List[str]) -> float:
+    """Mejor parecido (0..1) de un término normalizado con las palabras de un nombre.
+
+    Un prefijo exacto vale 1; la coincidencia fonética al menos 0.9.
+    """
+    if any(w.startswith(token) for w in words):
+        return 1.0
+    ptoken = phonetic_word(token)
+    if ptoken and any(phonetic_word(w).startswith(ptoken) for w in words):
+        return 0.9
+    best = 0.0
+    for w in words:
+        # Por debajo de 0.5 no interesa: se corta la distancia en len/2
+        d = levenshtein(token, w, max(len(token), len(w)) // 2)
+        best = max(best, 1.0 - d / max(len(token), len(w)))
+    return max(best, 0.0)
+
+
+def name_score(tokens: Iterable[str], nombre_normalizado: Optional[str]) -> float:
+    """Promedio de token_score de los términos buscados sobre un nombre normalizado."""
+    tokens = [normalize_name(t) for t in tokens]
+    tokens = [t for t in tokens if t]
+    if not tokens:
+        return 0.0
+    words = (nombre_normalizado or "").split()
+    return sum(token_score(t, words) for t in tokens) / len(tokens)
@@ -0,0 +1,575 @@
+# database/search.py
+"""Búsqueda multi-criterio de ciudadanos sobre columnas indexadas.
+
+La consulta libre se descompone en criterios tipados (ver parse_query) y cada
+uno va a su columna con índice:
+  - DNI / LM: números de 8+ dígitos por igualdad con y sin el relleno de
+    ceros con que se guardan (DNI a 11, LM a 10; índices únicos); dígitos
+    sueltos más cortos por contenido (LIKE '%d%', índices de trigramas).
+  - Clase, libro/folio: índices b-tree en datos_servicio_militar.
+  - Fecha de nacimiento (o año): rango sobre ciudadanos.fecha_nacimiento.
+  - Nombres/apellidos: claves normalizada y fonética (name_keys) con GIN
+    pg_trgm en Postgres y FTS5 en SQLite; los candidatos se ordenan por
+    distancia de edición. Si ninguno tiene todos los términos se buscan
+    palabras parecidas (similitud de trigramas en Postgres, vocabulario
+    FTS5 en SQLite) para tolerar errores de tipeo.
+
+Las columnas de claves se agregan al iniciar (ensure_name_columns); el
+completado de claves y los índices (CONCURRENTLY en Postgres) corren en
+segundo plano (start_search_indexes). Mientras tanto, y si el motor no
+admite trigramas/FTS5, se busca con lo que haya o con LIKE.
+"""
+import re
+import threading
+from dataclasses import dataclass, field
+from datetime import date
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import and_, bindparam, func, inspect, or_, select, text, update
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session
+
+from .models import Ciudadano, DatosServicioMilitar
+from .name_keys import levenshtein, name_keys, name_score, normalize_name, phonetic_word
+
+SEARCH_LIMIT = 200
+DNI_DIGITS = 11           # los DNI se guardan rellenos con ceros a 11 dígitos
+LM_DIGITS = 10            # y la LM a 10
+PAGE_SIZE = 50            # filas por página del listado (keyset)
+COUNT_CAP = 10_000        # el conteo exacto se corta aquí ("10000+")
+FUZZY_CANDIDATES = 1000   # candidatos que se puntúan en Python
+FUZZY_MIN_SCORE = 0.7     # parecido mínimo en la búsqueda relajada
+TYPO_MIN_LEN = 4          # términos más cortos no se corrigen
+TYPO_TRGM_THRESHOLD = 0.4 # word_similarity mínima en Postgres (una transposición en 6 letras ≈ 0.43)
+BACKFILL_BATCH = 5000
+
+_NAME_COLUMNS = ("nombre_normalizado", "nombre_fonetico")
+
+# Índices b-tree comunes a ambos motores (mismo nombre que index=True en models)
+_BTREE = [
+    "CREATE INDEX IF NOT EXISTS ix_ciudadanos_fecha_nacimiento ON ciudadanos (fecha_nacimiento)",
+    "CREATE INDEX IF NOT EXISTS ix_ciudadanos_nombre_normalizado ON ciudadanos (nombre_normalizado)",
+    "CREATE INDEX IF NOT EXISTS ix_ciudadanos_nombre_fonetico ON ciudadanos (nombre_fonetico)",
+    "CREATE INDEX IF NOT EXISTS ix_datos_servicio_militar_id_ciudadano ON datos_servicio_militar (id_ciudadano)",
+    "CREATE INDEX IF NOT EXISTS ix_datos_servicio_militar_clase ON datos_servicio_militar (clase)",
+    "CREATE INDEX IF NOT EXISTS ix_datos_servicio_militar_libro_folio ON datos_servicio_militar (libro, folio)",
+]
+
+_PG = [
+    "CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_ciudadanos_nombre_normalizado_trgm ON ciudadanos "
+    "USING gin (nombre_normalizado gin_trgm_ops)",
+    "CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_ciudadanos_nombre_fonetico_trgm ON ciudadanos "
+    "USING gin (nombre_fonetico gin_trgm_ops)",
+    "CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_ciudadanos_dni_trgm ON ciudadanos USING gin (dni gin_trgm_ops)",
+    "CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_ciudadanos_lm_trgm ON ciudadanos USING gin (lm gin_trgm_ops)",
+]
+
+# Tabla FTS5 de contenido externo sincronizada por triggers
+_FTS_COLS = "nombre_normalizado, nombre_fonetico"
+_FTS_NEW = "new.id_ciudadano, new.nombre_normalizado, new.nombre_fonetico"
+_FTS_OLD = "old.id_ciudadano, old.nombre_normalizado, old.nombre_fonetico"
+_SQLITE_FTS = [
+    f"CREATE VIRTUAL TABLE IF NOT EXISTS ciudadanos_fts USING fts5("
+    f"{_FTS_COLS}, content='ciudadanos', content_rowid='id_ciudadano', tokenize='unicode61 remove_diacritics 2')",
+    f"CREATE TRIGGER IF NOT EXISTS ciudadanos_fts_ai AFTER INSERT ON ciudadanos BEGIN "
+    f"INSERT INTO ciudadanos_fts(rowid, {_FTS_COLS}) VALUES ({_FTS_NEW}); END",
+    f"CREATE TRIGGER IF NOT EXISTS ciudadanos_fts_ad AFTER DELETE ON ciudadanos BEGIN "
+    f"INSERT INTO ciudadanos_fts(ciudadanos_fts, rowid, {_FTS_COLS}) VALUES ('delete', {_FTS_OLD}); END",
+    f"CREATE TRIGGER IF NOT EXISTS ciudadanos_fts_au AFTER UPDATE OF {_FTS_COLS} ON ciudadanos BEGIN "
+    f"INSERT INTO ciudadanos_fts(ciudadanos_fts, rowid, {_FTS_COLS}) VALUES ('delete', {_FTS_OLD}); "
+    f"INSERT INTO ciudadanos_fts(rowid, {_FTS_COLS}) VALUES ({_FTS_NEW}); END",
+    # Vocabulario del índice: candidatos para los errores de tipeo
+    "CREATE VIRTUAL TABLE IF NOT EXISTS ciudadanos_fts_vocab USING fts5vocab(ciudadanos_fts, 'row')",
+]
+_SQLITE_FTS_DROP = [
+    "DROP TRIGGER IF EXISTS ciudadanos_fts_ai",
+    "DROP TRIGGER IF EXISTS ciudadanos_fts_ad",
+    "DROP TRIGGER IF EXISTS ciudadanos_fts_au",
+    "DROP TABLE IF EXISTS ciudadanos_fts_vocab",
+    "DROP TABLE IF EXISTS ciudadanos_fts",
+]
+
+_ready = {}  # id(engine) -> "trgm" | "fts5" | "like", cuando ya están los índices
+_lock = threading.Lock()
+
+
+def ensure_name_columns(engine: Engine) -> None:
+    """Agrega las columnas de claves de nombre si faltan (rápido; antes de escribir ciudadanos)."""
+    cols = {c["name"] for c in inspect(engine).get_columns("ciudadanos")}
+    with engine.begin() as conn:
+        for name in _NAME_COLUMNS:
+            if name not in cols:
+                conn.exec_driver_sql(f"ALTER TABLE ciudadanos ADD COLUMN {name} VARCHAR(300)")
+
+
+def backfill_name_keys(engine: Engine, batch: int = BACKFILL_BATCH) -> int:
+    """Completa las claves vacías o de una versión anterior de la fonética. Devuelve las filas."""
+    C = Ciudadano.__table__.c
+    # Claves calculadas antes de la regla GU+A/O → U (la fonética actual no deja "GUA"/"GUO")
+    stale = or_(C.nombre_fonetico.is_(None), C.nombre_fonetico.like("%GUA%"), C.nombre_fonetico.like("%GUO%"))
+    last, done = 0, 0
+    while True:
+        with engine.begin() as conn:
+            rows = conn.execute(
+                select(C.id_ciudadano, C.apellidos, C.nombres)
+                .where(stale, C.id_ciudadano > last).order_by(C.id_ciudadano).limit(batch)
+            ).all()
+            if not rows:
+                return done
+            last = rows[-1][0]
+            params = []
+            for pk, ap, no in rows:
+                norm, fon = name_keys(ap, no)
+                params.append({"pk": pk, "norm": norm, "fon": fon})
+            conn.execute(
+                update(Ciudadano.__table__)
+                .where(C.id_ciudadano == bindparam("pk"))
+                .values(nombre_normalizado=bindparam("norm"), nombre_fonetico=bindparam("fon")),
+                params,
+            )
+            done += len(rows)
+
+
+def _create_pg_indexes(engine: Engine) -> None:
+    """Índices en Postgres con CREATE INDEX CONCURRENTLY: fuera de transacción, sin
+    bloquear escrituras en ciudadanos y sin el statement_timeout de la sesión."""
+    names = [ddl.split(" IF NOT EXISTS ")[1].split()[0] for ddl in _BTREE + _PG]
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        timeout = conn.exec_driver_sql("SHOW statement_timeout").scalar()
+        conn.exec_driver_sql("SET statement_timeout = 0")
+        try:
+            conn.exec_driver_sql("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+            # Un CONCURRENTLY interrumpido deja el índice inválido y IF NOT EXISTS lo saltaría
+            invalid = conn.execute(text(
+                "SELECT c.relname FROM pg_index i JOIN pg_class c ON c.oid = i.indexrelid "
+                "WHERE NOT i.indisvalid AND c.relname = ANY(:names)"), {"names": names}).scalars().all()
+            for name in invalid:
+                conn.exec_driver_sql(f"DROP INDEX CONCURRENTLY IF EXISTS {name}")
+            for ddl in _BTREE + _PG:
+                conn.exec_driver_sql(ddl.replace("CREATE INDEX IF", "CREATE INDEX CONCURRENTLY IF", 1))
+        finally:
+            conn.exec_driver_sql(f"SET statement_timeout = '{timeout}'")
+
+
+def _create_sqlite_indexes(engine: Engine) -> None:
+    with engine.begin() as conn:
+        for ddl in _BTREE:
+            conn.exec_driver_sql(ddl)
+        sql = conn.exec_driver_sql(
+            "SELECT sql FROM sqlite_master WHERE name = 'ciudadanos_fts'").scalar()
+        if sql and "nombre_fonetico" not in sql:
+            # Tabla FTS de la versión anterior (apellidos, nombres)
+            for ddl in _SQLITE_FTS_DROP:
+                conn.exec_driver_sql(ddl)
+            sql = None
+        for ddl in _SQLITE_FTS:
+            conn.exec_driver_sql(ddl)
+        if not sql:
+            conn.exec_driver_sql("INSERT INTO ciudadanos_fts(ciudadanos_fts) VALUES ('rebuild')")
+
+
+def ensure_search_indexes(engine: Engine) -> str:
+    """Columnas, claves e índices de búsqueda (idempotente). Devuelve el modo disponible.
+
+    Puede tardar con un archivo grande: al iniciar la aplicación corre en
+    segundo plano (start_search_indexes).
+    """
+    key = id(engine)
+    if key in _ready:
+        return _ready[key]
+    with _lock:
+        if key in _ready:
+            return _ready[key]
+        dialect = engine.dialect.name
+        ensure_name_columns(engine)
+        backfill_name_keys(engine)
+        try:
+            if dialect == "postgresql":
+                _create_pg_indexes(engine)
+            elif dialect == "sqlite":
+                _create_sqlite_indexes(engine)
+            else:
+                with engine.begin() as conn:
+                    for ddl in _BTREE:
+                        conn.exec_driver_sql(ddl)
+        except Exception as e:
+            # Sin pg_trgm (permisos) o SQLite sin FTS5: se busca con LIKE
+            print(f"[search] índices de texto no disponibles ({dialect}): {e}")
+        _ready[key] = _detect_mode(engine)
+        return _ready[key]
+
+
+def start_search_indexes(engine: Engine) -> None:
+    """ensure_search_indexes en un hilo demonio (una vez por arranque)."""
+
+    def run():
+        try:
+            ensure_search_indexes(engine)
+        except Exception as e:
+            print(f"[search] preparación de índices fallida: {e}")
+
+    threading.Thread(target=run, name="search-indexes", daemon=True).start()
+
+
+def _detect_mode(engine: Engine) -> str:
+    """Modo según lo que ya existe en la base, sin crear nada."""
+    with engine.connect() as conn:
+        if engine.dialect.name == "postgresql":
+            found = conn.exec_driver_sql("SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm'").first()
+            return "trgm" if found else "like"
+        if engine.dialect.name == "sqlite":
+            found = conn.exec_driver_sql(
+                "SELECT 1 FROM sqlite_master WHERE name = 'ciudadanos_fts_vocab'").first()
+            return "fts5" if found else "like"
+    return "like"
+
+
+def search_mode(engine: Engine) -> str:
+    """Modo de búsqueda; mientras se preparan los índices, el que ya haya (o LIKE)."""
+    return _ready.get(id(engine)) or _detect_mode(engine)
+
+
+# ----------------------------------------------------------------------
+# Interpretación de la consulta
+# ----------------------------------------------------------------------
+@dataclass
+class SearchCriteria:
+    dni: Optional[str] = None          # "dni:"
+    lm: Optional[str] = None           # alfanumérico o "lm:"
+    numeros: List[str] = field(default_factory=list)  # 8+ dígitos: DNI o LM exactos
+    digits: List[str] = field(default_factory=list)  # parte de un DNI o LM
+    clase: Optional[str] = None
+    anio: Optional[int] = None         # 19xx/20xx suelto: clase o año de nacimiento
+    libro: Optional[str] = None
+    folio: Optional[str] = None
+    fecha_nacimiento: Optional[date] = None
+    nombres: List[str] = field(default_factory=list)
+
+    def empty(self) -> bool:
+        return not (self.dni or self.lm or self.numeros or self.digits or self.clase or self.anio or self.libro
+                    or self.folio or self.fecha_nacimiento or self.nombres)
+
+
+_PREFIXED = re.compile(r"\b(dni|lm|clase|libro|folio|fn|nac)\s*[:=]\s*(\S+)", re.I)
+_LIBRO_FOLIO = re.compile(r"\bL(?:IBRO)?\s*\.?\s*(\d\w*)\s*[-/ ]\s*F(?:OLIO)?\s*\.?\s*(\d\w*)\b", re.I)
+_FECHA = re.compile(r"\b(\d{1,2})[/.-](\d{1,2})[/.-](\d{4})\b|\b(\d{4})-(\d{2})-(\d{2})\b")
+
+
+def _parse_date(s: str) -> Optional[date]:
+    m = _FECHA.fullmatch(s.strip())
+    if not m:
+        return None
+    try:
+        if m.group(1):
+            return date(int(m.group(3)), int(m.group(2)), int(m.group(1)))
+        return date(int(m.group(4)), int(m.group(5)), int(m.group(6)))
+    except ValueError:
+        return None
+
+
+def parse_query(q: str) -> SearchCriteria:
+    """Descompone la búsqueda libre en criterios tipados.
+
+    Admite prefijos explícitos (dni:, lm:, clase:, libro:, folio:, fn:),
+    pares "L12-F34" / "libro 12 folio 34", fechas dd/mm/aaaa o aaaa-mm-dd,
+    DNI/LM completos (8+ dígitos) o parciales, años sueltos y palabras de
+    nombre/apellido.
+    """
+    c = SearchCriteria()
+    rest = (q or "").strip()
+
+    def take(m):
+        key, val = m.group(1).lower(), m.group(2).strip().upper()
+        if key == "dni": c.dni = val
+        elif key == "lm": c.lm = val
+        elif key == "clase": c.clase = val
+        elif key == "libro": c.libro = val
+        elif key == "folio": c.folio = val
+        else: c.fecha_nacimiento = _parse_date(val)
+        return " "
+    rest = _PREFIXED.sub(take, rest)
+
+    def take_lf(m):
+        c.libro, c.folio = m.group(1).upper(), m.group(2).upper()
+        return " "
+    rest = re.sub(r"\blibro\s+(\w+)\s+folio\s+(\w+)\b", take_lf, rest, flags=re.I)
+    rest = _LIBRO_FOLIO.sub(take_lf, rest)
+
+    def take_date(m):
+        c.fecha_nacimiento = c.fecha_nacimiento or _parse_date(m.group(0))
+        return " "
+    rest = _FECHA.sub(take_date, rest)
+
+    for tok in re.split(r"[\s,;]+", rest.upper()):
+        tok = tok.strip(".-")
+        if not tok:
+            continue
+        if tok.isdigit():
+            if len(tok) >= 8:
+                c.numeros.append(tok)
+            elif len(tok) == 4 and tok[:2] in ("19", "20") and not c.anio:
+                c.anio = int(tok)
+            else:
+                c.digits.append(tok)
+        elif any(ch.isdigit() for ch in tok):
+            c.lm = c.lm or tok
+        else:
+            c.nombres.append(tok)
+    return c
+
+
+# ----------------------------------------------------------------------
+# Consulta
+# ----------------------------------------------------------------------
+def _fts_term(tok: str, prefix: bool = True) -> str:
+    return '"' + tok.replace('"', '""') + ('"*' if prefix else '"')
+
+
+def _name_conditions(tokens: List[str], mode: str, strict: bool,
+                     typo: Optional[Dict[str, List[str]]] = None) -> list:
+    """Cada término coincide por prefijo normalizado o fonético; AND (estricto) u OR.
+
+    Con `typo` (ver _typo_words) cada término acepta además las palabras
+    parecidas: las del vocabulario FTS5 en SQLite, similitud de trigramas en
+    Postgres.
+    """
+    tokens = [t for t in (normalize_name(t) for t in tokens) if t]
+    C = Ciudadano
+    if mode == "fts5":
+        terms = []
+        for t in tokens:
+            alts = [f"nombre_normalizado : {_fts_term(t)}", f"nombre_fonetico : {_fts_term(phonetic_word(t) or t)}"]
+            alts += ["{nombre_normalizado nombre_fonetico} : " + _fts_term(w, prefix=False)
+                     for w in (typo or {}).get(t, [])]
+            terms.append("(" + " OR ".join(alts) + ")")
+        match = (" AND " if strict else " OR ").join(terms)
+        return [C.id_ciudadano.in_(
+            select(text("rowid")).select_from(text("ciudadanos_fts"))
+            .where(text("ciudadanos_fts MATCH :fts_q").bindparams(fts_q=match))
+        )]
+    # Con pg_trgm los LIKE '%x%' sobre ambas columnas usan los índices GIN
+    conds = []
+    for t in tokens:
+        alts = [C.nombre_normalizado.like(f"%{t}%"), C.nombre_fonetico.like(f"%{phonetic_word(t) or t}%")]
+        if typo is not None and mode == "trgm":
+            # t <% columna: alguna palabra del nombre con similitud de trigramas >= el umbral
+            alts += [C.nombre_normalizado.op("%>")(t), C.nombre_fonetico.op("%>")(phonetic_word(t) or t)]
+        conds.append(or_(*alts))
+    return conds if strict else [or_(*conds)]
+
+
+def _typo_words(db: Session, tokens: List[str], mode: str) -> Optional[Dict[str, List[str]]]:
+    """Palabras del índice a distancia de edición TYPO_MAX_DIST de cada término.
+
+    SQLite: se recorre el vocabulario FTS5 (ciudadanos_fts_vocab) de las
+    palabras que empiezan con la misma letra que el término o su clave
+    fonética (las confusiones de la primera letra, C/Z, V/B, H/G..., ya las
+    cubre la fonética). Postgres: no hace falta lista, el operador de
+    similitud usa el índice de trigramas; aquí solo se baja su umbral para
+    esta transacción. None si el motor no tiene índice de texto.
+    """
+    if mode == "trgm":
+        db.execute(text("SELECT set_config('pg_trgm.word_similarity_threshold', :t, true)"),
+                   {"t": str(TYPO_TRGM_THRESHOLD)})
+        return {}
+    if mode != "fts5":
+        return None
+    out: Dict[str, List[str]] = {}
+    for t in (normalize_name(t) for t in tokens):
+        if len(t) < TYPO_MIN_LEN:
+            continue
+        max_dist = max(1, len(t) // 4)
+        found = []
+        for word in dict.fromkeys([t, phonetic_word(t) or t]):
+            lo = word[0].lower()
+            for (term,) in db.execute(
+                text("SELECT term FROM ciudadanos_fts_vocab WHERE term >= :lo AND term < :hi"),
+                {"lo": lo, "hi": chr(ord(lo) + 1)},
+            ):
+                if abs(len(term) - len(word)) <= max_dist and levenshtein(word, term.upper(), max_dist) <= max_dist:
+                    found.append(term.upper())
+        out[t] = list(dict.fromkeys(found))
+    return out
+
+
+def _padded(value: str, width: int) -> List[str]:
+    """Formas guardadas de un número: tal cual y con el relleno de ceros (jpg.py, ocr_smv)."""
+    return list(dict.fromkeys([value, value.zfill(width)] if value.isdigit() else [value]))
+
+
+def build_search(c: SearchCriteria, mode: str = "like", limit: Optional[int] = SEARCH_LIMIT,
+                 strict: bool = True, before_id: Optional[int] = None,
+                 typo: Optional[Dict[str, List[str]]] = None):
+    """SELECT de Ciudadano que aplica los criterios (AND entre tipos).
+
+    Con strict=False los términos de nombre se combinan con OR (búsqueda relajada);
+    con `typo` aceptan también palabras parecidas (_typo_words).
+    before_id es la clave de búsqueda (keyset) de la página siguiente.
+    """
+    C, S = Ciudadano, DatosServicioMilitar
+    conds = []
+    servicio = []
+
+    if c.dni:
+        conds.append(C.dni.in_(_padded(c.dni, DNI_DIGITS)) if len(c.dni) >= 8 else C.dni.like(f"%{c.dni}%"))
+    if c.lm:
+        conds.append(C.lm.in_(_padded(c.lm, LM_DIGITS)))
+    for n in c.numeros:
+        conds.append(or_(C.dni.in_(_padded(n, DNI_DIGITS)), C.lm.in_(_padded(n, LM_DIGITS))))
+    for d in c.digits:
+        conds.append(or_(C.dni.like(f"%{d}%"), C.lm.like(f"%{d}%")))
+    if c.fecha_nacimiento:
+        conds.append(C.fecha_nacimiento == c.fecha_nacimiento)
+    if c.clase:
+        servicio.append(S.clase == c.clase)
+    if c.libro:
+        servicio.append(S.libro == c.libro)
+    if c.folio:
+        servicio.append(S.folio == c.folio)
+    if servicio:
+        conds.append(C.id_ciudadano.in_(select(S.id_ciudadano).where(*servicio)))
+    if c.anio:
+        conds.append(or_(
+            C.fecha_nacimiento.between(date(c.anio, 1, 1), date(c.anio, 12, 31)),
+            C.id_ciudadano.in_(select(S.id_ciudadano).where(S.clase == str(c.anio))),
+        ))
+
+    if c.nombres:
+        conds.extend(_name_conditions(c.nombres, mode, strict, typo))
+    if before_id is not None:
+        conds.append(C.id_ciudadano < before_id)
+
+    stmt = select(C)
+    if conds:
+        stmt = stmt.where(and_(*conds))
+    stmt = stmt.order_by(C.id_ciudadano.desc())
+    return stmt.limit(limit) if limit else stmt
+
+
+def _rank(db: Session, c: SearchCriteria, mode: str, strict: bool, limit: int,
+          typo: Optional[Dict[str, List[str]]] = None) -> List[tuple]:
+    """[(parecido, id)] de hasta `limit` candidatos, mejor primero."""
+    # Solo (id, clave) para puntuar; las entidades se cargan para los elegidos
+    stmt = build_search(c, mode, limit, strict, typo=typo).with_only_columns(
+        Ciudadano.id_ciudadano, Ciudadano.nombre_normalizado)
+    if typo is not None and mode == "trgm":
+        # Los candidatos por trigramas pueden ser muchos: primero los más parecidos
+        tokens = [t for t in (normalize_name(t) for t in c.nombres) if t]
+        stmt = stmt.order_by(None).order_by(
+            sum(func.word_similarity(t, Ciudadano.nombre_normalizado) for t in tokens).desc())
+    scored = [(name_score(c.nombres, norm), pk) for pk, norm in db.execute(stmt)]
+    scored.sort(key=lambda x: (-x[0], -x[1]))
+    return scored
+
+
+def _candidates(db: Session, c: SearchCriteria, mode: str, limit: int) -> Tuple[List[tuple], bool]:
+    """(candidatos puntuados, si son coincidencias exactas de todos los términos).
+
+    Se prueba en orden: todos los términos por prefijo o fonética; todos
+    admitiendo errores de tipeo; cualquiera de ellos con errores de tipeo.
+    Las dos últimas pasadas se quedan con parecido >= FUZZY_MIN_SCORE.
+    """
+    scored = _rank(db, c, mode, True, limit)
+    if scored:
+        return scored, True
+    typo = _typo_words(db, c.nombres, mode)
+    if typo is not None:
+        scored = [x for x in _rank(db, c, mode, True, limit, typo) if x[0] >= FUZZY_MIN_SCORE]
+        if scored:
+            return scored, False
+    return [x for x in _rank(db, c, mode, False, limit, typo) if x[0] >= FUZZY_MIN_SCORE], False
+
+
+def _load_ordered(db: Session, ids: List[int]) -> List[Ciudadano]:
+    if not ids:
+        return []
+    by_id = {r.id_ciudadano: r for r in db.execute(select(Ciudadano).where(Ciudadano.id_ciudadano.in_(ids))).scalars()}
+    return [by_id[pk] for pk in ids if pk in by_id]
+
+
+def search_citizens(db: Session, q: str, limit: int = SEARCH_LIMIT) -> List[Ciudadano]:
+    """Ciudadanos que cumplen la búsqueda libre `q`.
+
+    Sin términos de nombre: más recientes primero. Con nombres: por parecido
+    (name_score) y luego más recientes; si ningún registro tiene todos los
+    términos se admiten errores de tipeo (ver _candidates).
+    """
+    mode = search_mode(db.get_bind())
+    c = parse_query(q)
+    if not c.nombres:
+        return db.execute(build_search(c, mode, limit)).scalars().all()
+    scored, _ = _candidates(db, c, mode, max(limit, FUZZY_CANDIDATES))
+    return _load_ordered(db, [pk for _, pk in scored[:limit]])
+
+
+# ----------------------------------------------------------------------
+# Paginación (keyset) y conteo
+# ----------------------------------------------------------------------
+@dataclass
+class SearchCursor:
+    """Estado de un listado paginado; la vista lo guarda y lo devuelve tal cual."""
+    query: str
+    ranked: List[int] = field(default_factory=list)  # ids ordenados por parecido aún no entregados
+    keyset: bool = True                # quedan filas por id descendente
+    before_id: Optional[int] = None    # la siguiente página empieza en id < before_id
+    total: int = 0                     # coincidencias (o estimación)
+    total_exact: bool = True
+    loaded: int = 0
+
+    @property
+    def has_more(self) -> bool:
+        return bool(self.ranked) or self.keyset
+
+
+def count_matches(db: Session, q: str, cap: int = COUNT_CAP) -> Tuple[int, bool]:
+    """(coincidencias, exacto). Se cuenta hasta `cap` sobre los índices; sin filtros
+    en Postgres se usa la estimación del planificador (pg_class.reltuples)."""
+    mode = search_mode(db.get_bind())
+    c = parse_query(q)
+    if c.empty() and db.get_bind().dialect.name == "postgresql":
+        est = db.execute(text("SELECT reltuples::bigint FROM pg_class WHERE oid = 'ciudadanos'::regclass")).scalar()
+        if est and est > 0:
+            return int(est), False
+    ids = build_search(c, mode, cap + 1).with_only_columns(Ciudadano.id_ciudadano).order_by(None).subquery()
+    n = db.execute(select(func.count()).select_from(ids)).scalar() or 0
+    return min(n, cap), n <= cap
+
+
+def search_page(db: Session, q: str, cursor: Optional[SearchCursor] = None,
+                page_size: int = PAGE_SIZE) -> Tuple[List[Ciudadano], SearchCursor]:
+    """Página siguiente de la búsqueda `q` (la primera si cursor es None).
+
+    Sin nombres: keyset por id descendente (costo constante por página).
+    Con nombres: primero los candidatos ordenados por parecido (como
+    search_citizens); si había más coincidencias que FUZZY_CANDIDATES, el
+    resto sigue por keyset a partir del último candidato.
+    """
+    mode = search_mode(db.get_bind())
+    c = parse_query(q)
+    if cursor is None:
+        cursor = SearchCursor(q)
+        if c.nombres:
+            scored, exact = _candidates(db, c, mode, FUZZY_CANDIDATES)
+            capped = exact and len(scored) >= FUZZY_CANDIDATES
+            cursor.keyset = capped
+            cursor.before_id = min(pk for _, pk in scored) if capped else None
+            cursor.ranked = [pk for _, pk in scored]
+            if cursor.keyset:
+                cursor.total, cursor.total_exact = count_matches(db, q)
+            else:
+                cursor.total, cursor.total_exact = len(cursor.ranked), True
+        else:
+            cursor.total, cursor.total_exact = count_matches(db, q)
+
+    rows = _load_ordered(db, cursor.ranked[:page_size])
+    cursor.ranked = cursor.ranked[page_size:]
+    need = page_size - len(rows)
+    if need > 0 and cursor.keyset:
+        fetched = db.execute(build_search(c, mode, need + 1, True, cursor.before_id)).scalars().all()
+        cursor.keyset = len(fetched) > need
+        fetched = fetched[:need]
+        if fetched:
+            cursor.before_id = fetched[-1].id_ciudadano
+        rows.extend(fetched)
+    cursor.loaded += len(rows)
+    return rows, cursor
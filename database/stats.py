@@ -0,0 +1,271 @@
+# database/stats.py
+"""Estadísticas de Inicio: totales y producción mensual sin COUNT(*).
+
+estadisticas_mensuales guarda por mes ('AAAA-MM') cuántos ciudadanos se
+registraron (fecha_creacion) y cuántos documentos se digitalizaron
+(fecha_extraccion); los totales son la suma de los meses.
+
+Mantenimiento:
+  - Incremental: cada flush anota +1/-1 por Ciudadano/Documento creado o
+    borrado y al commit de la transacción raíz (no al liberar un savepoint)
+    se aplica con UPDATE ... SET n = n + d. Un rollback
+    (también el de un savepoint) descarta lo anotado.
+  - Reconciliación: la tabla se recalcula con GROUP BY al crearla, cada
+    STATS_RECONCILE_INTERVAL segundos (hilo demonio) y en la siguiente lectura
+    si hubo cambios que no se pudieron anotar (DELETE/INSERT masivos).
+  - Lectura: instantánea en memoria durante STATS_CACHE_TTL segundos; los
+    commits de este proceso la actualizan al momento.
+"""
+import os
+import threading
+import time
+from collections import defaultdict
+from dataclasses import dataclass, field
+from datetime import date
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import delete, event, func, insert, inspect, select, update
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session
+
+from .models import Ciudadano, Documento, EstadisticaMensual
+
+STATS_CACHE_TTL = float(os.getenv("STATS_CACHE_TTL", "30"))
+STATS_RECONCILE_INTERVAL = float(os.getenv("STATS_RECONCILE_INTERVAL", "3600"))
+
+# modelo -> (columna de estadisticas_mensuales, atributo de fecha)
+TRACKED = {
+    Ciudadano: ("ciudadanos", "fecha_creacion"),
+    Documento: ("documentos", "fecha_extraccion"),
+}
+
+MESES = ["Ene", "Feb", "Mar", "Abr", "May", "Jun", "Jul", "Ago", "Sep", "Oct", "Nov", "Dic"]
+
+_DELTAS = "stats_deltas"
+_STALE = "stats_stale"
+
+E = EstadisticaMensual
+
+
+def periodo(d) -> str:
+    return f"{d.year:04d}-{d.month:02d}"
+
+
+@dataclass
+class DashboardStats:
+    ciudadanos: int = 0
+    documentos: int = 0
+    meses: Dict[str, Tuple[int, int]] = field(default_factory=dict)  # periodo -> (ciudadanos, documentos)
+
+    def ultimos_meses(self, n: int = 6, hoy: Optional[date] = None) -> List[Tuple[str, int, int]]:
+        """(mes abreviado, ciudadanos, documentos) de los n últimos meses, con ceros si no hubo."""
+        hoy = hoy or date.today()
+        y, m = hoy.year, hoy.month
+        out = []
+        for _ in range(n):
+            c, d = self.meses.get(f"{y:04d}-{m:02d}", (0, 0))
+            out.append((MESES[m - 1], c, d))
+            y, m = (y, m - 1) if m > 1 else (y - 1, 12)
+        return out[::-1]
+
+
+class StatsStore:
+    def __init__(self, ttl: float = STATS_CACHE_TTL):
+        self.ttl = ttl
+        self.stale = False
+        self.hits = 0
+        self.loads = 0
+        self.reconciles = 0
+        self.applied = 0
+        self._snapshot: Optional[DashboardStats] = None
+        self._loaded_at = 0.0
+        self._ready = set()  # id(engine)
+        self._lock = threading.RLock()
+
+    # ------------------------------------------------------------------
+    def ensure(self, engine: Engine) -> bool:
+        """Crea la tabla si falta y la calcula si está vacía. True si reconcilió."""
+        if id(engine) in self._ready:
+            return False
+        with self._lock:
+            if id(engine) in self._ready:
+                return False
+            E.__table__.create(engine, checkfirst=True)
+            with engine.connect() as conn:
+                empty = conn.execute(select(E.periodo).limit(1)).first() is None
+            if empty:
+                self.reconcile(engine)
+            self._ready.add(id(engine))
+            return empty
+
+    def get(self, engine: Engine) -> DashboardStats:
+        """Totales y meses; no toca la base si la instantánea es reciente."""
+        self.ensure(engine)
+        if self.stale:
+            return self.reconcile(engine)
+        with self._lock:
+            if self._snapshot is not None and time.monotonic() - self._loaded_at < self.ttl:
+                self.hits += 1
+                return self._snapshot
+        return self._load(engine)
+
+    def invalidate(self, stale: bool = False) -> None:
+        """Olvida la instantánea; stale=True fuerza reconciliar en la próxima lectura."""
+        with self._lock:
+            self._snapshot = None
+            self.stale = self.stale or stale
+
+    def stats(self) -> dict:
+        return {"hits": self.hits, "loads": self.loads, "reconciles": self.reconciles,
+                "applied": self.applied, "stale": self.stale}
+
+    # ------------------------------------------------------------------
+    def _load(self, engine: Engine) -> DashboardStats:
+        with engine.connect() as conn:
+            rows = conn.execute(select(E.periodo, E.ciudadanos, E.documentos)).all()
+        snap = DashboardStats(
+            ciudadanos=sum(r.ciudadanos for r in rows),
+            documentos=sum(r.documentos for r in rows),
+            meses={r.periodo: (r.ciudadanos, r.documentos) for r in rows},
+        )
+        with self._lock:
+            self._snapshot, self._loaded_at = snap, time.monotonic()
+            self.loads += 1
+        return snap
+
+    def reconcile(self, engine: Engine) -> DashboardStats:
+        """Recalcula estadisticas_mensuales desde ciudadanos y documentos."""
+        with self._lock:
+            counts = defaultdict(lambda: [0, 0])
+            with engine.begin() as conn:
+                for i, (model, (_col, attr)) in enumerate(TRACKED.items()):
+                    col = getattr(model, attr)
+                    y, m = func.extract("year", col), func.extract("month", col)
+                    for yy, mm, n in conn.execute(select(y, m, func.count()).where(col.is_not(None)).group_by(y, m)):
+                        counts[f"{int(yy):04d}-{int(mm):02d}"][i] = n
+                conn.execute(delete(E))
+                if counts:
+                    conn.execute(insert(E), [
+                        {"periodo": p, "ciudadanos": c, "documentos": d} for p, (c, d) in counts.items()
+                    ])
+            self.stale = False
+            self.reconciles += 1
+            return self._load(engine)
+
+    def _apply(self, engine: Engine, deltas: Dict[str, Dict[str, int]]) -> None:
+        # La reconciliación de la primera escritura ya incluye este commit
+        if self.ensure(engine):
+            return
+        with self._lock:
+            with engine.begin() as conn:
+                for p, vals in deltas.items():
+                    res = conn.execute(
+                        update(E).where(E.periodo == p).values({c: getattr(E, c) + d for c, d in vals.items()})
+                    )
+                    if res.rowcount:
+                        continue
+                    if any(d < 0 for d in vals.values()):
+                        # Baja en un mes sin fila: la tabla no cuadra
+                        self.stale = True
+                        continue
+                    conn.execute(insert(E).values(periodo=p, ciudadanos=vals.get("ciudadanos", 0),
+                                                  documentos=vals.get("documentos", 0)))
+            self.applied += 1
+            snap = self._snapshot
+            if snap is None:
+                return
+            for p, vals in deltas.items():
+                c, d = snap.meses.get(p, (0, 0))
+                dc, dd = vals.get("ciudadanos", 0), vals.get("documentos", 0)
+                snap.meses[p] = (c + dc, d + dd)
+                snap.ciudadanos += dc
+                snap.documentos += dd
+
+
+dashboard_stats = StatsStore()
+
+
+def start_stats_reconciler(engine: Engine, interval: float = STATS_RECONCILE_INTERVAL) -> None:
+    """Reconcilia cada `interval` segundos en un hilo demonio; 0 = apagado."""
+    if interval <= 0:
+        return
+
+    def loop():
+        while True:
+            time.sleep(interval)
+            try:
+                dashboard_stats.reconcile(engine)
+            except Exception as e:
+                print(f"[stats] reconciliación fallida: {e}")
+
+    threading.Thread(target=loop, name="stats-reconciler", daemon=True).start()
+
+
+# ----------------------------------------------------------------------
+# Eventos de sesión
+# ----------------------------------------------------------------------
+def _current_tx(session):
+    return session.get_nested_transaction() or session.get_transaction()
+
+
+@event.listens_for(Session, "after_flush")
+def _track_changes(session, _flush_context):
+    for objs, sign in ((session.new, 1), (session.deleted, -1)):
+        for obj in objs:
+            spec = TRACKED.get(type(obj))
+            if spec is None:
+                continue
+            col, attr = spec
+            fecha = inspect(obj).dict.get(attr)
+            if fecha is None:
+                session.info[_STALE] = True
+                continue
+            session.info.setdefault(_DELTAS, []).append((_current_tx(session), periodo(fecha), col, sign))
+
+
+@event.listens_for(Session, "do_orm_execute")
+def _track_bulk_changes(state):
+    if (state.is_insert or state.is_update or state.is_delete) and state.bind_mapper is not None \
+            and state.bind_mapper.class_ in TRACKED:
+        state.session.info[_STALE] = True
+
+
+@event.listens_for(Session, "after_commit")
+def _on_commit(session):
+    # after_commit también se emite al liberar un savepoint: solo cuenta el commit raíz
+    if session.in_nested_transaction():
+        return
+    entries = session.info.pop(_DELTAS, None)
+    if session.info.pop(_STALE, False):
+        dashboard_stats.invalidate(stale=True)
+    if not entries:
+        return
+    deltas = defaultdict(lambda: defaultdict(int))
+    for _tx, p, col, sign in entries:
+        deltas[p][col] += sign
+    bind = session.get_bind(mapper=E)
+    try:
+        dashboard_stats._apply(getattr(bind, "engine", bind), deltas)
+    except Exception as e:
+        print(f"[stats] no se pudo actualizar estadísticas: {e}")
+        dashboard_stats.invalidate(stale=True)
+
+
+@event.listens_for(Session, "after_soft_rollback")
+def _on_rollback(session, previous_transaction):
+    if previous_transaction.parent is None:
+        session.info.pop(_DELTAS, None)
+        session.info.pop(_STALE, None)
+        return
+
+    # Savepoint: se descartan solo sus anotaciones (y las de sus hijos)
+    def inside(tx):
+        while tx is not None:
+            if tx is previous_transaction:
+                return True
+            tx = tx.parent
+        return False
+
+    entries = session.info.get(_DELTAS)
+    if entries:
+        session.info[_DELTAS] = [e for e in entries if not inside(e[0])]
@@ -6,20 +6,24 @@ import re
 import json
 import cv2
 import numpy as np
-import vertexai
 import traceback
 
-from vertexai.generative_models import (
-    GenerativeModel, Content, Part,
-    HarmCategory, HarmBlockThreshold
-)
+from utils.vertex_client import ClientInitError, get_client
 
 # ==================== CONFIGURACIÓN ====================
-PROJECT_ID  = "ormd-476617"   # <-- CAMBIA ESTO
-LOCATION    = "us-central1"
+# Proyecto, región y clave JSON: ver utils/vertex_client.py (VERTEX_PROJECT, VERTEX_LOCATION, VERTEX_KEY_PATH)
 IMAGE_PATH  = "7.jpg"         # <-- Ruta de la imagen a procesar
 MODEL_NAME  = "gemini-2.0-flash-001"  # Mejor para OCR manuscrito
-KEY_PATH = "ormd-476617-56cca3f6e4a6.json" 
+# Modo depuración: además de pasar los bytes en memoria, guarda la imagen
+# preprocesada en DEBUG_DIR para inspeccionarla (OCR_DEBUG_IMAGES=1)
+DEBUG_IMAGES = os.getenv("OCR_DEBUG_IMAGES", "0").strip().lower() in ("1", "true", "si", "yes")
+DEBUG_DIR   = os.path.join("storage", "data", "temp")
+# Tamaño de envío: lado largo máximo en píxeles (~200 DPI en A4); 0 = sin reducir
+TARGET_LONG_EDGE = int(os.getenv("OCR_TARGET_LONG_EDGE", "2200"))
+# Recorte del fondo alrededor de la hoja (fotos de celular)
+CROP_BORDERS = os.getenv("OCR_CROP_BORDERS", "1").strip().lower() in ("1", "true", "si", "yes")
+# Huella del preprocesado: forma parte de la clave de la caché OCR
+PREPROCESS_SIGNATURE = f"v2-long{TARGET_LONG_EDGE}-crop{int(CROP_BORDERS)}-png1bit"
 # ======================================================
 
 
@@ -139,18 +143,77 @@ def normalize_result(d: dict) -> dict:
 
 
 # ------------------- Preprocesamiento de imagen -------------------
-def preprocess_image(image_path: str) -> str:
-    """Mejora la imagen para OCR: rotación simple, CLAHE, Otsu, dilate suave."""
-    img = cv2.imread(image_path)
-    if img is None:
+def _crop_document(img: np.ndarray) -> np.ndarray:
+    """Recorta el fondo alrededor de la hoja (imagen en gris) usando el contorno más grande.
+
+    Si no se detecta una hoja clara (contorno < 40% del área) devuelve la imagen tal cual.
+    """
+    h, w = img.shape[:2]
+    scale = 800.0 / max(h, w)
+    small = cv2.resize(img, (max(1, int(w * scale)), max(1, int(h * scale))), interpolation=cv2.INTER_AREA) if scale < 1 else img
+    blur = cv2.GaussianBlur(small, (5, 5), 0)
+    _, mask = cv2.threshold(blur, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)
+    mask = cv2.morphologyEx(mask, cv2.MORPH_CLOSE, np.ones((15, 15), np.uint8))
+    contours, _ = cv2.findContours(mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+    if not contours:
+        return img
+    x, y, cw, ch = cv2.boundingRect(max(contours, key=cv2.contourArea))
+    sh, sw = small.shape[:2]
+    if cw * ch < 0.4 * sw * sh:
+        return img
+    f = 1.0 / scale if scale < 1 else 1.0
+    pad = int(0.01 * max(h, w))
+    x0, y0 = max(0, int(x * f) - pad), max(0, int(y * f) - pad)
+    x1, y1 = min(w, int((x + cw) * f) + pad), min(h, int((y + ch) * f) + pad)
+    return img[y0:y1, x0:x1]
+
+
+def _encode_png_1bit(binary: np.ndarray) -> bytes:
+    """PNG bitonal (1 bit/píxel) con Pillow; cae a PNG de 8 bits con OpenCV."""
+    try:
+        from io import BytesIO
+        from PIL import Image
+
+        out = BytesIO()
+        Image.fromarray(binary).convert("1").save(out, format="PNG")
+        return out.getvalue()
+    except Exception:
+        ok, buf = cv2.imencode(".png", binary, [cv2.IMWRITE_PNG_COMPRESSION, 9])
+        if not ok:
+            raise ValueError("No se pudo codificar la imagen preprocesada.")
+        return buf.tobytes()
+
+
+def preprocess_image(image_path: str, long_edge: int | None = None, crop: bool | None = None) -> bytes:
+    """Mejora la imagen para OCR: recorte de bordes, reducción, rotación simple, CLAHE, Otsu, dilate suave.
+
+    Devuelve el PNG codificado en memoria; no toca disco salvo en modo depuración,
+    así varios procesos/hilos pueden preprocesar a la vez sin pisarse archivos.
+    La imagen se reduce a `long_edge` píxeles (TARGET_LONG_EDGE) antes de binarizar
+    y se codifica a 1 bit, para que el envío al modelo pese lo mínimo.
+    """
+    long_edge = TARGET_LONG_EDGE if long_edge is None else long_edge
+    crop = CROP_BORDERS if crop is None else crop
+
+    # Lectura directa en gris: el color no aporta al OCR y abarata recorte/reducción
+    gray = cv2.imread(image_path, cv2.IMREAD_GRAYSCALE)
+    if gray is None:
         raise FileNotFoundError(f"No se pudo leer la imagen: {image_path}")
 
+    if crop:
+        gray = _crop_document(gray)
+
     # Rotación básica (muchas están apaisadas)
-    h, w = img.shape[:2]
+    h, w = gray.shape[:2]
     if w > h:
-        img = cv2.rotate(img, cv2.ROTATE_90_CLOCKWISE)
+        gray = cv2.rotate(gray, cv2.ROTATE_90_CLOCKWISE)
+        h, w = w, h
+
+    # Reducción adaptativa: las fotos de celular superan con creces lo necesario para OCR
+    if long_edge and max(h, w) > long_edge:
+        f = long_edge / float(max(h, w))
+        gray = cv2.resize(gray, (int(w * f), int(h * f)), interpolation=cv2.INTER_AREA)
 
-    gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
     clahe = cv2.createCLAHE(clipLimit=2.0, tileGridSize=(8, 8))
     enhanced = clahe.apply(gray)
     _, binary = cv2.threshold(enhanced, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)
@@ -158,10 +221,16 @@ def preprocess_image(image_path: str) -> str:
     kernel = np.ones((1, 1), np.uint8)
     binary = cv2.dilate(binary, kernel, iterations=1)
 
-    temp_path = "temp_processed.png"
-    cv2.imwrite(temp_path, binary)
-    print(f"Imagen preprocesada: {temp_path}")
-    return temp_path
+    png_bytes = _encode_png_1bit(binary)
+
+    if DEBUG_IMAGES:
+        os.makedirs(DEBUG_DIR, exist_ok=True)
+        base = os.path.splitext(os.path.basename(image_path))[0]
+        debug_path = os.path.join(DEBUG_DIR, f"{base}_{os.getpid()}_processed.png")
+        with open(debug_path, "wb") as f:
+            f.write(png_bytes)
+        print(f"Imagen preprocesada: {debug_path}")
+    return png_bytes
 
 
 # ------------------- Prompt -------------------
@@ -216,47 +285,29 @@ Responde SOLO con el objeto JSON.
 
 
 # ------------------- Llamada a Gemini -------------------
-def extract_with_gemini(processed_image_path: str) -> dict | None:
-    # 1. AUTENTICACIÓN: Establecer la clave JSON de la cuenta de servicio
-    # Asume que KEY_PATH es una variable global o definida en la configuración.
-    if not os.path.exists(KEY_PATH):
-        print(f"[ERROR Autenticación] No se encontró el archivo de clave JSON en la ruta: {KEY_PATH}")
-        return None
-        
-    # 2. INICIALIZACIÓN DE VERTEX AI CON CREDENCIALES EXPLÍCITAS
-    try:
-        from google.oauth2 import service_account
-        
-        # Cargar credenciales explícitamente
-        credentials = service_account.Credentials.from_service_account_file(KEY_PATH)
-        
-        # Inicializar Vertex AI con credenciales explícitas
-        vertexai.init(project=PROJECT_ID, location=LOCATION, credentials=credentials)
-        print(f"[INFO] Vertex AI inicializado con credenciales del service account: {credentials.service_account_email}")
-    except Exception as e:
-        print(f"[ERROR Vertex AI Init] Fallo al inicializar la sesión: {e}")
-        print("Asegúrate de que la Service Account tiene los roles necesarios:")
-        print("- Vertex AI User (roles/aiplatform.user)")
-        print("- Storage Object Viewer (roles/storage.objectViewer)")
-        return None
-        
-    model = GenerativeModel(MODEL_NAME)
-
-    # 3. PREPARAR LA IMAGEN
-    try:
-        with open(processed_image_path, "rb") as f:
-            img_bytes = f.read()
-    except Exception as e:
-        print(f"[ERROR IO] No se pudo leer la imagen preprocesada: {e}")
-        return None
+def extract_with_gemini(processed_image: bytes | str) -> dict | None:
+    # 1. PREPARAR LA IMAGEN (bytes PNG de preprocess_image o ruta a un PNG)
+    if isinstance(processed_image, (bytes, bytearray, memoryview)):
+        img_bytes = bytes(processed_image)
+    else:
+        try:
+            with open(processed_image, "rb") as f:
+                img_bytes = f.read()
+        except Exception as e:
+            print(f"[ERROR IO] No se pudo leer la imagen preprocesada: {e}")
+            return None
 
-    image_part = Part.from_data(mime_type="image/png", data=img_bytes)
+    # 2. CLIENTE COMPARTIDO (credenciales + vertexai.init una sola vez por proceso)
+    client = get_client()
 
-    # 4. LLAMADA A LA API (Con TRY/EXCEPT detallado)
+    # 3. LLAMADA A LA API (Con TRY/EXCEPT detallado)
     try:
         print("Enviando solicitud al modelo...")
-        response = model.generate_content(
-            [image_part, PROMPT],
+        text = client.generate(
+            MODEL_NAME,
+            img_bytes,
+            "image/png",
+            PROMPT,
             generation_config={
                 "response_mime_type": "application/json",
                 "temperature": 0.0,
@@ -264,8 +315,8 @@ def extract_with_gemini(processed_image_path: str) -> dict | None:
             }
         )
 
-        # 5. PROCESAMIENTO DE LA RESPUESTA
-        raw = _strip_code_fences(response.text)
+        # 4. PROCESAMIENTO DE LA RESPUESTA
+        raw = _strip_code_fences(text)
         data = json.loads(raw)
 
         # Manejo de listas de respuesta (si Gemini devuelve una lista)
@@ -276,6 +327,13 @@ def extract_with_gemini(processed_image_path: str) -> dict | None:
 
         return normalize_result(data)
 
+    except ClientInitError as e:
+        print(f"[ERROR Vertex AI Init] Fallo al inicializar la sesión: {e}")
+        print("Asegúrate de que la Service Account tiene los roles necesarios:")
+        print("- Vertex AI User (roles/aiplatform.user)")
+        print("- Storage Object Viewer (roles/storage.objectViewer)")
+        return None
+
     except Exception as e:
         # IMPRIMIR LA TRAZA DE ERROR COMPLETA PARA DIAGNÓSTICO
         print("\n--- INICIO DE LA TRAZA DE ERROR DETALLADA ---")
@@ -321,12 +379,6 @@ def main():
     else:
         print("Falló la extracción.")
 
-    try:
-        if os.path.exists("temp_processed.png"):
-            os.remove("temp_processed.png")
-    except Exception:
-        pass
-
 
 if __name__ == "__main__":
     main()
@@ -256,6 +256,45 @@ def main(page: ft.Page):
 
 
 if __name__ == "__main__":
+    # Búsqueda: columnas de claves de nombre y, en segundo plano, claves e índices
+    try:
+        from database.connection import engine
+        from database.search import ensure_name_columns, start_search_indexes
+        ensure_name_columns(engine)
+        start_search_indexes(engine)
+    except Exception as e:
+        print(f"⚠️ No se pudieron preparar los índices de búsqueda: {e}")
+
+    # Hash de contenido de documentos: columna y, en segundo plano, los que falten
+    try:
+        from database.connection import engine
+        from database.file_index import ensure_hash_column, start_hash_backfill
+        ensure_hash_column(engine)
+        start_hash_backfill(engine)
+    except Exception as e:
+        print(f"⚠️ No se pudo preparar el hash de documentos: {e}")
+
+    # Auditoría: importación de los .jsonl anteriores y rotación, en segundo plano
+    try:
+        import threading
+        from utils.audit_log import audit_log
+        threading.Thread(target=audit_log.ensure, name="audit-log", daemon=True).start()
+    except Exception as e:
+        print(f"⚠️ No se pudo preparar la auditoría: {e}")
+
+    # Estadísticas de Inicio: tabla mensual y reconciliación periódica
+    try:
+        from database.connection import engine
+        from database.stats import dashboard_stats, start_stats_reconciler
+        dashboard_stats.ensure(engine)
+        start_stats_reconciler(engine)
+    except Exception as e:
+        print(f"⚠️ No se pudieron preparar las estadísticas: {e}")
+
+    # Métricas del pool en consola si DB_POOL_LOG_INTERVAL > 0
+    from database.instrumentation import start_pool_logger
+    start_pool_logger()
+
     # Detectar modo (web vs desktop)
     IS_WEB = os.getenv("FLET_MODE") == "web"
     
@@ -1,8 +1,8 @@
 # modules/dashboard/dashboard_view.py
 # -*- coding: utf-8 -*-
 import flet as ft
-from database.connection import SessionLocal
-from database.models import Ciudadano, Documento
+from database.connection import engine
+from database.stats import DashboardStats, dashboard_stats
 
 # Importa el paquete y/o sus vistas de forma segura
 try:
@@ -33,18 +33,18 @@ BG_COLOR = ft.Colors.GREEN_50
 CARD_BG = ft.Colors.WHITE
 
 
-def get_stats():
-    db = SessionLocal()
+def load_stats() -> DashboardStats:
+    """Totales y producción mensual mantenidos por database.stats (sin COUNT(*))."""
     try:
-        total_ciudadanos = db.query(Ciudadano).count()
-        total_documentos = db.query(Documento).count()
+        return dashboard_stats.get(engine)
     except Exception as e:
         print(f"Error al obtener estadísticas: {e}")
-        total_ciudadanos = 0
-        total_documentos = 0
-    finally:
-        db.close()
-    return total_ciudadanos, total_documentos
+        return DashboardStats()
+
+
+def get_stats():
+    s = load_stats()
+    return s.ciudadanos, s.documentos
 
 
 def stat_card(title: str, value, icon=ft.Icons.INFO_OUTLINE):
@@ -168,7 +168,8 @@ def create_dashboard_view(page: ft.Page, user_data, logout_callback):
     jefe_archivo = {"value": "TCR. Cap Hinojosa Gamboa"}
 
     def create_home_content():
-        ciud, docs = get_stats()
+        stats = load_stats()
+        ciud, docs = stats.ciudadanos, stats.documentos
         
         # Función para abrir modal (simplificada)
         def open_config_modal(e):
@@ -275,27 +276,13 @@ def create_dashboard_view(page: ft.Page, user_data, logout_callback):
                 )
             )
 
-        # Gráfico realista: Documentos procesados por mes (últimos 6 meses)
-        import datetime
-        current_month = datetime.datetime.now().month
-        months = ["Ene", "Feb", "Mar", "Abr", "May", "Jun", "Jul", "Ago", "Sep", "Oct", "Nov", "Dic"]
-        last_6_months = []
-        for i in range(6):
-            month_idx = (current_month - 6 + i) % 12
-            last_6_months.append(months[month_idx])
-
-        # Datos realistas basados en el total de documentos
-        if docs > 0:
-            monthly_data = [
-                max(1, docs // 8),  # Mes -5
-                max(1, docs // 6),  # Mes -4
-                max(1, docs // 7),  # Mes -3
-                max(1, docs // 5),  # Mes -2
-                max(1, docs // 4),  # Mes -1
-                max(1, docs // 3),  # Mes actual
-            ]
-        else:
-            monthly_data = [2, 5, 3, 8, 6, 4]
+        # Producción real de los últimos 6 meses (estadisticas_mensuales)
+        ultimos = stats.ultimos_meses(6)
+        last_6_months = [m for m, _, _ in ultimos]
+        monthly_data = [d for _, _, d in ultimos]
+        monthly_citizens = [c for _, c, _ in ultimos]
+        # Altura de barra relativa al mejor mes (máx. 150 px)
+        top_docs = max(monthly_data) or 1
 
         chart1_content = ft.Column([
             ft.Text("📈 Documentos Procesados Mensualmente", size=14, color=ft.Colors.BLUE_GREY_700),
@@ -304,7 +291,7 @@ def create_dashboard_view(page: ft.Page, user_data, logout_callback):
             ft.Row([
                 ft.Container(
                     content=ft.Column([
-                        ft.Container(bgcolor=ft.Colors.BLUE_600, width=35, height=min(150, max(20, val * 3)), border_radius=3),
+                        ft.Container(bgcolor=ft.Colors.BLUE_600, width=35, height=max(4, 150 * val // top_docs), border_radius=3),
                         ft.Text(str(val), size=10, weight=ft.FontWeight.BOLD, color=PRIMARY_COLOR)
                     ], horizontal_alignment=ft.CrossAxisAlignment.CENTER),
                 ) for val in monthly_data
@@ -315,49 +302,42 @@ def create_dashboard_view(page: ft.Page, user_data, logout_callback):
             ], spacing=28, alignment=ft.MainAxisAlignment.CENTER)
         ])
 
-        # Gráfico realista: Tipos de documentos más procesados con distribución mejorada
-        doc_types = [
-            {"name": "Libretas Militares", "count": max(1, docs // 2 + 5), "color": ft.Colors.BLUE_600, "percent": 45},
-            {"name": "Certificados SMV", "count": max(1, docs // 3 + 3), "color": ft.Colors.GREEN_600, "percent": 30}, 
-            {"name": "Resoluciones", "count": max(1, docs // 4 + 2), "color": ft.Colors.ORANGE_600, "percent": 20},
-            {"name": "Otros Documentos", "count": max(1, docs // 8 + 1), "color": ft.Colors.RED_600, "percent": 5}
-        ]
+        # Ciudadanos registrados por mes (no hay tipo de documento en el modelo)
+        top_citizens = max(monthly_citizens) or 1
+        month_total = sum(monthly_citizens)
+        best_idx = monthly_citizens.index(max(monthly_citizens))
 
         chart2_content = ft.Column([
-            ft.Text("📊 Distribución de Documentos por Tipo", size=14, color=ft.Colors.BLUE_GREY_700),
-            ft.Container(height=15),
-            
-            # Gráfico de barras horizontales mejorado
+            ft.Text("👥 Ciudadanos Registrados por Mes", size=14, color=ft.Colors.BLUE_GREY_700),
+            ft.Container(height=10),
+
             ft.Column([
                 ft.Row([
                     ft.Container(
-                        content=ft.Text(doc["name"], size=12, color=ft.Colors.BLUE_GREY_700, weight=ft.FontWeight.W_500),
-                        width=130,
+                        content=ft.Text(month, size=12, color=ft.Colors.BLUE_GREY_700, weight=ft.FontWeight.W_500),
+                        width=40,
                         alignment=ft.alignment.center_left
                     ),
                     ft.Container(
-                        content=ft.Row([
-                            ft.Container(
-                                bgcolor=doc["color"], 
-                                width=max(15, doc["percent"] * 2.5), 
-                                height=18, 
-                                border_radius=9
-                            ),
-                            ft.Text(f"{doc['percent']}%", size=11, color=PRIMARY_COLOR, weight=ft.FontWeight.BOLD)
-                        ], spacing=8, alignment=ft.CrossAxisAlignment.CENTER),
-                        width=200
+                        content=ft.Container(
+                            bgcolor=ft.Colors.GREEN_600,
+                            width=max(4, 220 * val // top_citizens),
+                            height=14,
+                            border_radius=7
+                        ),
+                        width=230
                     ),
-                    ft.Text(f"{doc['count']} docs", size=11, weight=ft.FontWeight.BOLD, color=PRIMARY_COLOR, width=60),
+                    ft.Text(str(val), size=11, weight=ft.FontWeight.BOLD, color=PRIMARY_COLOR, width=60),
                 ], spacing=10, alignment=ft.CrossAxisAlignment.CENTER)
-                for doc in doc_types
-            ], spacing=15),
-            
-            ft.Container(height=15),
+                for month, val in zip(last_6_months, monthly_citizens)
+            ], spacing=8),
+
+            ft.Container(height=10),
             ft.Container(
                 content=ft.Column([
-                    ft.Text(f"� Total procesados: {sum(d['count'] for d in doc_types)} documentos", 
+                    ft.Text(f"👥 Últimos 6 meses: {month_total} ciudadanos",
                            size=13, weight=ft.FontWeight.BOLD, color=PRIMARY_COLOR),
-                    ft.Text(f"🎯 Tipo principal: {doc_types[0]['name']} ({doc_types[0]['percent']}%)", 
+                    ft.Text(f"🎯 Mejor mes: {last_6_months[best_idx]} ({monthly_citizens[best_idx]})",
                            size=12, color=ft.Colors.BLUE_GREY_600)
                 ], spacing=5),
                 padding=10,
@@ -368,7 +348,7 @@ def create_dashboard_view(page: ft.Page, user_data, logout_callback):
 
         charts_row = ft.Row([
             create_chart_card("Producción Mensual", chart1_content),
-            create_chart_card("Distribución por Tipo", chart2_content)
+            create_chart_card("Registro de Ciudadanos", chart2_content)
         ], wrap=True, spacing=25, alignment=ft.MainAxisAlignment.CENTER)
 
         return ft.Column([
@@ -25,7 +25,6 @@ def build_ciudadano_line(apellidos, nombres, fecha_nac, lm, resultado):
 import os
 import json
 import shutil
-import base64
 import subprocess
 from datetime import datetime
 from config.settings import Config
@@ -37,15 +36,19 @@ from modules.dashboard.pdf_renderer import (
 )
 from modules.dashboard.pdf_renderer_vs2 import generate_oficio_pdf_vs2
 
-try:  # PyMuPDF
-    import fitz  # type: ignore
-except Exception:  # pragma: no cover
-    fitz = None  # type: ignore
+from sqlalchemy import select
 
-from sqlalchemy import select, or_
-
-from database.connection import SessionLocal
+from database.connection import engine, session_scope
 from database import models
+from database.detail import CitizenDetail, load_citizen_detail
+from database.file_index import file_in_use
+from database.instrumentation import QUERY_LOG, count_queries
+from database.name_keys import set_name_keys
+from database.search import SearchCursor, search_page
+from utils.render_cache import RenderedDocument
+from utils import file_store
+from utils.audit_log import audit_log
+from utils import thumbnails as thumbs
 ACCENT_COLOR = ft.Colors.GREEN_600
 PRIMARY_COLOR = ft.Colors.GREEN_800
 SECONDARY_COLOR = ft.Colors.RED_600  # Bandera Perú / énfasis
@@ -59,35 +62,14 @@ def _fmt_date(d):
     return d.strftime("%Y-%m-%d") if d else ""
 
 
-def _fetch_citizens(search: str = "") -> List[models.Ciudadano]:
-    """Obtiene hasta 200 ciudadanos, aplicando filtro LIKE si hay búsqueda."""
-    session = SessionLocal()
-    try:
-        stmt = select(models.Ciudadano).order_by(models.Ciudadano.id_ciudadano.desc()).limit(200)
-        if search:
-            like = f"%{search.upper()}%"
-            stmt = (
-                select(models.Ciudadano)
-                .where(
-                    or_(
-                        models.Ciudadano.dni.like(like),
-                        models.Ciudadano.lm.like(like),
-                        models.Ciudadano.apellidos.like(like),
-                        models.Ciudadano.nombres.like(like),
-                    )
-                )
-                .order_by(models.Ciudadano.id_ciudadano.desc())
-                .limit(200)
-            )
-        rows = session.execute(stmt).scalars().all()
-        return rows
-    finally:
-        session.close()
+def _fetch_citizens(search: str = "", cursor: Optional[SearchCursor] = None):
+    """Página siguiente (keyset) de ciudadanos que cumplen la búsqueda: (filas, cursor)."""
+    with session_scope() as session:
+        return search_page(session, search, cursor)
 
 
 def _fetch_documents(id_ciudadano: int) -> List[models.Documento]:
-    session = SessionLocal()
-    try:
+    with session_scope() as session:
         stmt = (
             select(models.Documento)
             .join(models.CiudadanoDocumento, models.CiudadanoDocumento.id_documento == models.Documento.id_documento)
@@ -95,31 +77,37 @@ def _fetch_documents(id_ciudadano: int) -> List[models.Documento]:
             .order_by(models.Documento.id_documento.desc())
         )
         return session.execute(stmt).scalars().all()
-    finally:
-        session.close()
+
+
+def _load_detail(id_ciudadano: int) -> Optional[CitizenDetail]:
+    """Ciudadano, servicio, catálogos y documentos en un único SELECT."""
+    with session_scope() as session:
+        if not QUERY_LOG:
+            return load_citizen_detail(session, id_ciudadano)
+        with count_queries(engine) as qc:
+            detail = load_citizen_detail(session, id_ciudadano)
+        print(f"[detalle] ciudadano {id_ciudadano}: {qc.count} consulta(s), {qc.elapsed_ms:.1f} ms")
+        return detail
 
 
 def _update_citizen(c: models.Ciudadano, dni: str, lm: str, ap: str, no: str, uid: Optional[int]) -> bool:
     """Update citizen base fields in DB. Inputs should be uppercase already."""
-    session = SessionLocal()
     try:
-        db_c = session.get(models.Ciudadano, c.id_ciudadano)
-        if not db_c:
-            return False
-        db_c.dni = (dni or "").strip() or None
-        db_c.lm = (lm or "").strip() or None
-        db_c.apellidos = (ap or "").strip() or None
-        db_c.nombres = (no or "").strip() or None
-        db_c.fecha_ultima_modificacion = datetime.now()
-        if uid:
-            db_c.id_usuario_ultima_modificacion = uid
-        session.commit()
+        with session_scope() as session:
+            db_c = session.get(models.Ciudadano, c.id_ciudadano)
+            if not db_c:
+                return False
+            db_c.dni = (dni or "").strip() or None
+            db_c.lm = (lm or "").strip() or None
+            db_c.apellidos = (ap or "").strip() or None
+            db_c.nombres = (no or "").strip() or None
+            set_name_keys(db_c)
+            db_c.fecha_ultima_modificacion = datetime.now()
+            if uid:
+                db_c.id_usuario_ultima_modificacion = uid
         return True
     except Exception:
-        session.rollback()
         return False
-    finally:
-        session.close()
 
 
 def build(page: ft.Page, user_data: Optional[dict] = None) -> ft.Control:
@@ -158,6 +146,8 @@ def build(page: ft.Page, user_data: Optional[dict] = None) -> ft.Control:
 
     # State
     citizens: List[models.Ciudadano] = []
+    citizens_cursor: Optional[SearchCursor] = None
+    loading_more = False
     selected: Optional[models.Ciudadano] = None
     docs: List[models.Documento] = []
     servicio: Optional[models.DatosServicioMilitar] = None
@@ -166,9 +156,11 @@ def build(page: ft.Page, user_data: Optional[dict] = None) -> ft.Control:
     last_search_count: int = 0
 
     # Search and list
-    search_field = ft.TextField(label="Buscar DNI / LM / Apellidos / Nombres", expand=True)
+    search_field = ft.TextField(label="Buscar DNI / LM / Apellidos / Nombres / Clase / L12-F34 / dd/mm/aaaa", expand=True)
     refresh_btn = ft.FilledButton("Buscar", icon=ft.Icons.SEARCH)
-    citizens_list = ft.ListView(expand=True, spacing=6, padding=0, auto_scroll=False)
+    citizens_list = ft.ListView(expand=True, spacing=6, padding=0, auto_scroll=False, on_scroll_interval=100)
+    citizens_status = ft.Text("", size=12, color=ft.Colors.BLUE_GREY_600)
+    more_btn = ft.TextButton("Cargar más", icon=ft.Icons.EXPAND_MORE, visible=False)
 
     # Detail controls
     detail_title = ft.Text("Detalle del Ciudadano", size=20, weight=ft.FontWeight.BOLD, color=PRIMARY_COLOR)
@@ -238,11 +230,7 @@ def build(page: ft.Page, user_data: Optional[dict] = None) -> ft.Control:
     # Consulta logging
     def _log_consulta(c: models.Ciudadano):
         try:
-            import json
             from datetime import datetime as _dt
-            logs_dir = os.path.join("storage", "data", "logs")
-            os.makedirs(logs_dir, exist_ok=True)
-            log_path = os.path.join(logs_dir, "consultas.jsonl")
             rec = {
                 "ts": _dt.now().isoformat(),
                 "id_usuario": (user_data or {}).get("id_usuario"),
@@ -255,18 +243,13 @@ def build(page: ft.Page, user_data: Optional[dict] = None) -> ft.Control:
                 "apellidos": c.apellidos,
                 "nombres": c.nombres,
             }
-            with open(log_path, "a", encoding="utf-8") as f:
-                f.write(json.dumps(rec, ensure_ascii=False) + "\n")
+            audit_log.record(rec)
         except Exception:
             pass
 
     def _log_busqueda(query: str, resultados: int):
         try:
-            import json
             from datetime import datetime as _dt
-            logs_dir = os.path.join("storage", "data", "logs")
-            os.makedirs(logs_dir, exist_ok=True)
-            log_path = os.path.join(logs_dir, "consultas.jsonl")
             rec = {
                 "ts": _dt.now().isoformat(),
                 "id_usuario": (user_data or {}).get("id_usuario"),
@@ -276,46 +259,84 @@ def build(page: ft.Page, user_data: Optional[dict] = None) -> ft.Control:
                 "query": query,
                 "resultados": resultados,
             }
-            with open(log_path, "a", encoding="utf-8") as f:
-                f.write(json.dumps(rec, ensure_ascii=False) + "\n")
+            audit_log.record(rec)
         except Exception:
             pass
 
     def pick(c: models.Ciudadano):
         nonlocal selected, docs
-        selected = c
+        detail = _load_detail(c.id_ciudadano)
+        selected = detail.ciudadano if detail else c
         populate_detail()
-        docs = _fetch_documents(c.id_ciudadano)
+        docs = detail.documentos if detail else []
         populate_docs()
-        populate_service()
-        _log_consulta(c)
+        populate_service(detail)
+        _log_consulta(selected)
         page.update()
 
+    def _citizen_item(c: models.Ciudadano) -> ft.Control:
+        linea1 = f"{c.apellidos or ''}, {c.nombres or ''}"
+        linea2 = f"DNI: {c.dni or '-'} • LM: {c.lm or '-'}"
+        linea3 = f"ID: {c.id_ciudadano}"
+        return ft.Container(
+            content=ft.Row([
+                ft.Column([
+                    ft.Text(linea1, weight=ft.FontWeight.W_600),
+                    ft.Text(linea2, size=12, color=ft.Colors.BLUE_GREY_600),
+                    ft.Text(linea3, size=11, color=ft.Colors.BLUE_GREY_600),
+                ], spacing=3, expand=True),
+                ft.IconButton(icon=ft.Icons.VISIBILITY, tooltip="Ver", icon_size=18, padding=ft.padding.all(4), on_click=lambda e, c=c: pick(c)),
+            ], alignment=ft.MainAxisAlignment.SPACE_BETWEEN),
+            on_click=lambda e, c=c: pick(c),
+        )
+
+    def update_citizens_status():
+        cur = citizens_cursor
+        if cur is None:
+            citizens_status.value = ""
+        else:
+            total = f"{cur.total}" if cur.total_exact else f"~{max(cur.total, len(citizens))}"
+            citizens_status.value = f"Mostrando {len(citizens)} de {total}"
+        more_btn.visible = bool(cur and cur.has_more)
+
     def populate_citizens():
         citizens_list.controls.clear()
-        for c in citizens:
-            linea1 = f"{c.apellidos or ''}, {c.nombres or ''}"
-            linea2 = f"DNI: {c.dni or '-'} • LM: {c.lm or '-'}"
-            linea3 = f"ID: {c.id_ciudadano}"
-            item = ft.Container(
-                content=ft.Row([
-                    ft.Column([
-                        ft.Text(linea1, weight=ft.FontWeight.W_600),
-                        ft.Text(linea2, size=12, color=ft.Colors.BLUE_GREY_600),
-                        ft.Text(linea3, size=11, color=ft.Colors.BLUE_GREY_600),
-                    ], spacing=3, expand=True),
-                    ft.IconButton(icon=ft.Icons.VISIBILITY, tooltip="Ver", icon_size=18, padding=ft.padding.all(4), on_click=lambda e, c=c: pick(c)),
-                ], alignment=ft.MainAxisAlignment.SPACE_BETWEEN),
-                on_click=lambda e, c=c: pick(c),
-            )
-            citizens_list.controls.append(item)
+        citizens_list.controls.extend(_citizen_item(c) for c in citizens)
+        update_citizens_status()
 
     def load_citizens():
-        nonlocal citizens
-        citizens = _fetch_citizens((search_field.value or "").strip())
+        # Primera página de la búsqueda; las siguientes llegan con load_more_citizens
+        nonlocal citizens, citizens_cursor
+        citizens, citizens_cursor = _fetch_citizens((search_field.value or "").strip())
         populate_citizens()
         page.update()
 
+    def load_more_citizens(e=None):
+        # Solo se agregan los controles de la página nueva
+        nonlocal citizens_cursor, loading_more
+        if loading_more or citizens_cursor is None or not citizens_cursor.has_more:
+            return
+        loading_more = True
+        try:
+            rows, citizens_cursor = _fetch_citizens(citizens_cursor.query, citizens_cursor)
+            citizens.extend(rows)
+            citizens_list.controls.extend(_citizen_item(c) for c in rows)
+            update_citizens_status()
+            page.update()
+        finally:
+            loading_more = False
+
+    def on_citizens_scroll(e):
+        # Desplazamiento infinito: pedir la página siguiente cerca del final
+        try:
+            if e.max_scroll_extent - e.pixels < 400:
+                load_more_citizens()
+        except Exception:
+            pass
+
+    citizens_list.on_scroll = on_citizens_scroll
+    more_btn.on_click = load_more_citizens
+
     # Detail population
     def populate_detail():
         if not selected:
@@ -342,26 +363,10 @@ def build(page: ft.Page, user_data: Optional[dict] = None) -> ft.Control:
             delete_btn.disabled = not is_admin()
 
     # Service population
-    def populate_service():
+    def populate_service(detail: Optional[CitizenDetail] = None):
+        # Los datos llegan ya cargados por _load_detail (sin consultas aquí)
         nonlocal servicio
-        if not selected:
-            for f in [clase_field, libro_field, folio_field, ref_doc_field, fecha_alta_field, fecha_baja_field, unidad_alta_field, unidad_baja_field, grado_field, motivo_baja_field]:
-                f.value = ""
-            return
-        session = SessionLocal()
-        ua = ub = gr = mb = ""
-        try:
-            servicio = session.execute(
-                select(models.DatosServicioMilitar).where(models.DatosServicioMilitar.id_ciudadano == selected.id_ciudadano)
-            ).scalar_one_or_none()
-            if servicio:
-                # Touch relationships while session is open
-                ua = servicio.unidad_alta.nombre_unidad if servicio.unidad_alta else ""
-                ub = servicio.unidad_baja.nombre_unidad if servicio.unidad_baja else ""
-                gr = servicio.grado.descripcion if servicio.grado else ""
-                mb = servicio.motivo_baja.descripcion if servicio.motivo_baja else ""
-        finally:
-            session.close()
+        servicio = detail.servicio if selected and detail else None
         if not servicio:
             for f in [clase_field, libro_field, folio_field, ref_doc_field, fecha_alta_field, fecha_baja_field, unidad_alta_field, unidad_baja_field, grado_field, motivo_baja_field]:
                 f.value = ""
@@ -372,10 +377,10 @@ def build(page: ft.Page, user_data: Optional[dict] = None) -> ft.Control:
             ref_doc_field.value = servicio.referencia_documento_origen or ""
             fecha_alta_field.value = _fmt_date(servicio.fecha_alta)
             fecha_baja_field.value = _fmt_date(servicio.fecha_baja)
-            unidad_alta_field.value = ua
-            unidad_baja_field.value = ub
-            grado_field.value = gr
-            motivo_baja_field.value = mb
+            unidad_alta_field.value = detail.unidad_alta
+            unidad_baja_field.value = detail.unidad_baja
+            grado_field.value = detail.grado
+            motivo_baja_field.value = detail.motivo_baja
 
     # Save with confirmation modal
     def save_detail(e):
@@ -411,49 +416,45 @@ def build(page: ft.Page, user_data: Optional[dict] = None) -> ft.Control:
             )
 
             if ok:
-                session2 = SessionLocal()
                 try:
-                    db_c = session2.get(models.Ciudadano, selected.id_ciudadano)
-                    if db_c:
-                        db_c.fecha_nacimiento = fnac_val
-                        val_presto = presto_dd.value
-                        if val_presto == "SI":
-                            db_c.presto_servicio = True
-                        elif val_presto == "NO":
-                            db_c.presto_servicio = False
-                        db_c.fecha_ultima_modificacion = datetime.now()
-                        if uid:
-                            db_c.id_usuario_ultima_modificacion = uid
-                        # Servicio militar
-                        serv = session2.execute(
-                            select(models.DatosServicioMilitar).where(models.DatosServicioMilitar.id_ciudadano == db_c.id_ciudadano)
-                        ).scalar_one_or_none()
-                        def _parse_date(s: Optional[str]):
-                            s = (s or "").strip()
-                            if not s:
-                                return None
-                            try:
-                                return _dt.strptime(s, "%Y-%m-%d").date()
-                            except Exception:
-                                return None
-                        if not serv:
-                            serv = models.DatosServicioMilitar(id_ciudadano=db_c.id_ciudadano)
-                            session2.add(serv)
-                        serv.clase = (clase_field.value or "").upper() or None
-                        serv.libro = (libro_field.value or "").upper() or None
-                        serv.folio = (folio_field.value or "").upper() or None
-                        serv.referencia_documento_origen = (ref_doc_field.value or "").upper() or None
-                        serv.fecha_alta = _parse_date(fecha_alta_field.value)
-                        serv.fecha_baja = _parse_date(fecha_baja_field.value)
-                        session2.commit()
+                    with session_scope() as session2:
+                        db_c = session2.get(models.Ciudadano, selected.id_ciudadano)
+                        if db_c:
+                            db_c.fecha_nacimiento = fnac_val
+                            val_presto = presto_dd.value
+                            if val_presto == "SI":
+                                db_c.presto_servicio = True
+                            elif val_presto == "NO":
+                                db_c.presto_servicio = False
+                            db_c.fecha_ultima_modificacion = datetime.now()
+                            if uid:
+                                db_c.id_usuario_ultima_modificacion = uid
+                            # Servicio militar
+                            serv = session2.execute(
+                                select(models.DatosServicioMilitar).where(models.DatosServicioMilitar.id_ciudadano == db_c.id_ciudadano)
+                            ).scalar_one_or_none()
+                            def _parse_date(s: Optional[str]):
+                                s = (s or "").strip()
+                                if not s:
+                                    return None
+                                try:
+                                    return _dt.strptime(s, "%Y-%m-%d").date()
+                                except Exception:
+                                    return None
+                            if not serv:
+                                serv = models.DatosServicioMilitar(id_ciudadano=db_c.id_ciudadano)
+                                session2.add(serv)
+                            serv.clase = (clase_field.value or "").upper() or None
+                            serv.libro = (libro_field.value or "").upper() or None
+                            serv.folio = (folio_field.value or "").upper() or None
+                            serv.referencia_documento_origen = (ref_doc_field.value or "").upper() or None
+                            serv.fecha_alta = _parse_date(fecha_alta_field.value)
+                            serv.fecha_baja = _parse_date(fecha_baja_field.value)
                 except Exception as ex:
-                    session2.rollback()
                     page.dialog = ft.AlertDialog(title=ft.Text("Error"), content=ft.Text(str(ex)), modal=True)
                     page.dialog.open = True
                     page.update()
                     return
-                finally:
-                    session2.close()
 
             if ok:
                 done = ft.AlertDialog(
@@ -500,30 +501,28 @@ def build(page: ft.Page, user_data: Optional[dict] = None) -> ft.Control:
         def on_result(res: ft.FilePickerResultEvent):
             if not res or not res.files:
                 return
-            session = SessionLocal()
             try:
-                base_dir = os.path.join("storage", "data")
-                os.makedirs(base_dir, exist_ok=True)
-                for f in res.files:
-                    src = f.path
-                    if not src or not os.path.exists(src):
-                        continue
-                    name = os.path.basename(src)
-                    ts = datetime.now().strftime("%Y%m%d_%H%M%S_%f")
-                    dst = os.path.join(base_dir, f"{ts}_{name}")
-                    shutil.copy2(src, dst)
-
-                    # Crear Documento y vincular
-                    doc = models.Documento(
-                        nombre_archivo=name,
-                        ruta_almacenamiento=os.path.abspath(dst),
-                        fecha_extraccion=datetime.now(),
-                        id_usuario_extraccion=(user_data or {}).get("id_usuario") or 1,
-                    )
-                    session.add(doc)
-                    session.flush()
-                    session.add(models.CiudadanoDocumento(id_ciudadano=selected.id_ciudadano, id_documento=doc.id_documento))
-                session.commit()
+                with session_scope() as session:
+                    for f in res.files:
+                        src = f.path
+                        if not src or not os.path.exists(src):
+                            continue
+                        name = os.path.basename(src)
+                        # Almacén por contenido: un archivo repetido no ocupa disco otra vez
+                        dst, sha, _ = file_store.store(src)
+                        thumbs.adopt(src, dst)
+
+                        # Crear Documento y vincular
+                        doc = models.Documento(
+                            nombre_archivo=name,
+                            ruta_almacenamiento=os.path.abspath(dst),
+                            hash_contenido=sha,
+                            fecha_extraccion=datetime.now(),
+                            id_usuario_extraccion=(user_data or {}).get("id_usuario") or 1,
+                        )
+                        session.add(doc)
+                        session.flush()
+                        session.add(models.CiudadanoDocumento(id_ciudadano=selected.id_ciudadano, id_documento=doc.id_documento))
                 # recargar docs
                 nonlocal docs
                 docs = _fetch_documents(selected.id_ciudadano)
@@ -536,11 +535,9 @@ def build(page: ft.Page, user_data: Optional[dict] = None) -> ft.Control:
                 except Exception:
                     pass
             except Exception as ex:
-                session.rollback()
                 page.dialog = ft.AlertDialog(title=ft.Text("Error"), content=ft.Text(str(ex)), modal=True)
                 page.dialog.open = True
             finally:
-                session.close()
                 page.update()
 
         file_picker.on_result = on_result
@@ -552,15 +549,10 @@ def build(page: ft.Page, user_data: Optional[dict] = None) -> ft.Control:
     # Auditoría de eliminaciones
     def _log_eliminacion(payload: dict):
         try:
-            import json
             from datetime import datetime as _dt
-            logs_dir = os.path.join("storage", "data", "logs")
-            os.makedirs(logs_dir, exist_ok=True)
-            log_path = os.path.join(logs_dir, "auditoria_eliminaciones.jsonl")
             payload = dict(payload)
             payload["ts"] = _dt.now().isoformat()
-            with open(log_path, "a", encoding="utf-8") as f:
-                f.write(json.dumps(payload, ensure_ascii=False) + "\n")
+            audit_log.record(payload)
         except Exception:
             pass
 
@@ -572,6 +564,7 @@ def build(page: ft.Page, user_data: Optional[dict] = None) -> ft.Control:
             ts = datetime.now().strftime("%Y%m%d_%H%M%S_%f")
             dst = os.path.join(trash_dir, f"{ts}_{base}")
             shutil.move(path, dst)
+            thumbs.move_with(path, dst)
             return True, dst
         except Exception:
             return False, ""
@@ -589,108 +582,111 @@ def build(page: ft.Page, user_data: Optional[dict] = None) -> ft.Control:
 
         def confirm(_):
             nonlocal selected, docs
-            session = SessionLocal()
             files_to_trash = []
             removed_docs = 0
             removed_files = 0
             snapshot = {}
             try:
-                # Snapshot del ciudadano, servicio y documentos antes de borrar
-                snap_docs = []
-                try:
-                    # capturar datos visibles
-                    snap_c = {
-                        "id_ciudadano": selected.id_ciudadano,
-                        "dni": selected.dni,
-                        "lm": selected.lm,
-                        "apellidos": selected.apellidos,
-                        "nombres": selected.nombres,
-                        "fecha_nacimiento": _fmt_date(selected.fecha_nacimiento),
-                        "presto_servicio": selected.presto_servicio,
-                    }
-                    # servicio militar (si existe)
+                with session_scope() as session:
+                    # Snapshot del ciudadano, servicio y documentos antes de borrar
+                    snap_docs = []
+                    try:
+                        # capturar datos visibles
+                        snap_c = {
+                            "id_ciudadano": selected.id_ciudadano,
+                            "dni": selected.dni,
+                            "lm": selected.lm,
+                            "apellidos": selected.apellidos,
+                            "nombres": selected.nombres,
+                            "fecha_nacimiento": _fmt_date(selected.fecha_nacimiento),
+                            "presto_servicio": selected.presto_servicio,
+                        }
+                        # servicio militar (si existe)
+                        serv = session.execute(
+                            select(models.DatosServicioMilitar).where(models.DatosServicioMilitar.id_ciudadano == selected.id_ciudadano)
+                        ).scalar_one_or_none()
+                        snap_serv = None
+                        if serv:
+                            snap_serv = {
+                                "id_servicio": serv.id_servicio,
+                                "id_unidad_alta": serv.id_unidad_alta,
+                                "id_unidad_baja": serv.id_unidad_baja,
+                                "id_grado": serv.id_grado,
+                                "id_motivo_baja": serv.id_motivo_baja,
+                                "referencia_documento_origen": serv.referencia_documento_origen,
+                                "clase": serv.clase,
+                                "libro": serv.libro,
+                                "folio": serv.folio,
+                                "fecha_alta": _fmt_date(serv.fecha_alta),
+                                "fecha_baja": _fmt_date(serv.fecha_baja),
+                            }
+                        for d in _fetch_documents(selected.id_ciudadano):
+                            snap_docs.append({
+                                "id_documento": d.id_documento,
+                                "nombre_archivo": d.nombre_archivo,
+                                "ruta_almacenamiento": d.ruta_almacenamiento,
+                                "hash_contenido": d.hash_contenido,
+                            })
+                        # Enlaces documento-servicio si hubiera servicio
+                        ds_links = []
+                        if serv:
+                            dsl = session.execute(
+                                select(models.DocumentoServicio).where(models.DocumentoServicio.id_servicio == serv.id_servicio)
+                            ).scalars().all()
+                            ds_links = [{"id_documento": x.id_documento} for x in dsl]
+                        snapshot = {"ciudadano": snap_c, "servicio": snap_serv, "documentos": snap_docs, "doc_servicio": ds_links}
+                    except Exception:
+                        snapshot = {}
+                    # 1) Eliminar vínculos ciudadano-documento y recolectar documentos relacionados
+                    links = session.execute(
+                        select(models.CiudadanoDocumento).where(models.CiudadanoDocumento.id_ciudadano == selected.id_ciudadano)
+                    ).scalars().all()
+                    doc_ids = [ln.id_documento for ln in links]
+                    for ln in links:
+                        session.delete(ln)
+
+                    # 2) Eliminar servicio militar y sus vínculos con documentos
                     serv = session.execute(
                         select(models.DatosServicioMilitar).where(models.DatosServicioMilitar.id_ciudadano == selected.id_ciudadano)
                     ).scalar_one_or_none()
-                    snap_serv = None
-                    if serv:
-                        snap_serv = {
-                            "id_servicio": serv.id_servicio,
-                            "id_unidad_alta": serv.id_unidad_alta,
-                            "id_unidad_baja": serv.id_unidad_baja,
-                            "id_grado": serv.id_grado,
-                            "id_motivo_baja": serv.id_motivo_baja,
-                            "referencia_documento_origen": serv.referencia_documento_origen,
-                            "clase": serv.clase,
-                            "libro": serv.libro,
-                            "folio": serv.folio,
-                            "fecha_alta": _fmt_date(serv.fecha_alta),
-                            "fecha_baja": _fmt_date(serv.fecha_baja),
-                        }
-                    for d in _fetch_documents(selected.id_ciudadano):
-                        snap_docs.append({
-                            "id_documento": d.id_documento,
-                            "nombre_archivo": d.nombre_archivo,
-                            "ruta_almacenamiento": d.ruta_almacenamiento,
-                        })
-                    # Enlaces documento-servicio si hubiera servicio
-                    ds_links = []
                     if serv:
-                        dsl = session.execute(
+                        ds_links = session.execute(
                             select(models.DocumentoServicio).where(models.DocumentoServicio.id_servicio == serv.id_servicio)
                         ).scalars().all()
-                        ds_links = [{"id_documento": x.id_documento} for x in dsl]
-                    snapshot = {"ciudadano": snap_c, "servicio": snap_serv, "documentos": snap_docs, "doc_servicio": ds_links}
-                except Exception:
-                    snapshot = {}
-                # 1) Eliminar vínculos ciudadano-documento y recolectar documentos relacionados
-                links = session.execute(
-                    select(models.CiudadanoDocumento).where(models.CiudadanoDocumento.id_ciudadano == selected.id_ciudadano)
-                ).scalars().all()
-                doc_ids = [ln.id_documento for ln in links]
-                for ln in links:
-                    session.delete(ln)
-
-                # 2) Eliminar servicio militar y sus vínculos con documentos
-                serv = session.execute(
-                    select(models.DatosServicioMilitar).where(models.DatosServicioMilitar.id_ciudadano == selected.id_ciudadano)
-                ).scalar_one_or_none()
-                if serv:
-                    ds_links = session.execute(
-                        select(models.DocumentoServicio).where(models.DocumentoServicio.id_servicio == serv.id_servicio)
-                    ).scalars().all()
-                    for dsl in ds_links:
-                        session.delete(dsl)
-                    session.delete(serv)
-
-                # 3) Para cada Documento, si ya no está vinculado a ningún ciudadano, eliminar registro y programar borrado físico
-                session.flush()  # que las eliminaciones previas afecten a consultas siguientes
-                for did in set(doc_ids):
-                    other_link = session.execute(
-                        select(models.CiudadanoDocumento).where(models.CiudadanoDocumento.id_documento == did)
-                    ).first()
-                    if not other_link:
-                        # limpiar vínculos del documento con servicios (si existieran)
-                        dserv = session.execute(
-                            select(models.DocumentoServicio).where(models.DocumentoServicio.id_documento == did)
-                        ).scalars().all()
-                        for r in dserv:
-                            session.delete(r)
-
-                        doc = session.get(models.Documento, did)
-                        if doc:
-                            path = doc.ruta_almacenamiento or ""
-                            session.delete(doc)
-                            removed_docs += 1
-                            if path and os.path.exists(path):
-                                files_to_trash.append(path)
-
-                # 4) Eliminar ciudadano
-                db_c = session.get(models.Ciudadano, selected.id_ciudadano)
-                if db_c:
-                    session.delete(db_c)
+                        for dsl in ds_links:
+                            session.delete(dsl)
+                        session.delete(serv)
+
+                    # 3) Para cada Documento, si ya no está vinculado a ningún ciudadano, eliminar registro y programar borrado físico
+                    session.flush()  # que las eliminaciones previas afecten a consultas siguientes
+                    for did in set(doc_ids):
+                        other_link = session.execute(
+                            select(models.CiudadanoDocumento).where(models.CiudadanoDocumento.id_documento == did)
+                        ).first()
+                        if not other_link:
+                            # limpiar vínculos del documento con servicios (si existieran)
+                            dserv = session.execute(
+                                select(models.DocumentoServicio).where(models.DocumentoServicio.id_documento == did)
+                            ).scalars().all()
+                            for r in dserv:
+                                session.delete(r)
+
+                            doc = session.get(models.Documento, did)
+                            if doc:
+                                path = doc.ruta_almacenamiento or ""
+                                session.delete(doc)
+                                removed_docs += 1
+                                if path and os.path.exists(path):
+                                    files_to_trash.append(path)
+
+                    # Archivos compartidos (almacén por contenido, páginas de un PDF) que otro documento aún usa
+                    session.flush()
+                    files_to_trash = [p for p in dict.fromkeys(files_to_trash) if not file_in_use(session, p)]
 
-                session.commit()
+                    # 4) Eliminar ciudadano
+                    db_c = session.get(models.Ciudadano, selected.id_ciudadano)
+                    if db_c:
+                        session.delete(db_c)
 
                 # 5) Mover a Papelera archivos ya sin referencias (si el usuario lo pidió)
                 traslados = []
@@ -741,12 +737,10 @@ def build(page: ft.Page, user_data: Optional[dict] = None) -> ft.Control:
                 except Exception:
                     pass
             except Exception as ex:
-                session.rollback()
                 page.dialog = ft.AlertDialog(title=ft.Text("Error"), content=ft.Text(str(ex)), modal=True)
                 page.dialog.open = True
             finally:
                 page.update()
-                session.close()
 
         dlg = ft.AlertDialog(
             title=ft.Text("Eliminar Ciudadano", weight=ft.FontWeight.BOLD),
@@ -912,12 +906,10 @@ def build(page: ft.Page, user_data: Optional[dict] = None) -> ft.Control:
                     lines.append(f"DOCUMENTOS ({len(doc_list)}):")
                     for d in (doc_list or [])[:50]:
                         lines.append(f"  • #{d.id_documento} - {d.nombre_archivo or ''}")
-                    try:
-                        session_r = SessionLocal()
-                        serv = session_r.execute(select(models.DatosServicioMilitar).where(models.DatosServicioMilitar.id_ciudadano == selected.id_ciudadano)).scalar_one_or_none()
-                    finally:
-                        try: session_r.close()
-                        except Exception: pass
+                    serv = servicio if servicio is not None and servicio.id_ciudadano == selected.id_ciudadano else None
+                    if serv is None:
+                        with session_scope() as session_r:
+                            serv = session_r.execute(select(models.DatosServicioMilitar).where(models.DatosServicioMilitar.id_ciudadano == selected.id_ciudadano)).scalar_one_or_none()
                     if serv:
                         lines.append("")
                         lines.append("SERVICIO MILITAR:")
@@ -1186,20 +1178,6 @@ def build(page: ft.Page, user_data: Optional[dict] = None) -> ft.Control:
     def _is_image(path: str) -> bool:
         return path.lower().endswith((".png", ".jpg", ".jpeg", ".bmp", ".gif"))
 
-    def _render_pdf_to_base64(path: str, page_index: int, zoom: float = 1.0) -> str:
-        if not fitz:
-            raise RuntimeError("PyMuPDF no disponible; instale 'pymupdf'")
-        doc = fitz.open(path)
-        try:
-            page_index = max(0, min(page_index, len(doc) - 1))
-            page = doc.load_page(page_index)
-            mat = fitz.Matrix(zoom, zoom)
-            pix = page.get_pixmap(matrix=mat, alpha=False)
-            png_bytes = pix.tobytes("png")
-            return base64.b64encode(png_bytes).decode("ascii")
-        finally:
-            doc.close()
-
     def _print_path(path: str):
         """Impresión directa en Windows.
         - Para imágenes (PNG/JPG/BMP/GIF): usar mspaint /pt para imprimir a la impresora predeterminada.
@@ -1233,15 +1211,24 @@ def build(page: ft.Page, user_data: Optional[dict] = None) -> ft.Control:
         image = ft.Image(expand=True, fit=ft.ImageFit.CONTAIN)
         scroll = ft.Container(content=image, height=520, bgcolor=ft.Colors.BLACK12)
 
+        # PDF abierto mientras dure el visor; páginas desde utils.render_cache
+        renderer = None
+        if is_pdf:
+            try:
+                renderer = RenderedDocument(path)
+                total_pages = renderer.page_count
+            except Exception as ex:
+                page.dialog = ft.AlertDialog(title=ft.Text("Error al abrir"), content=ft.Text(str(ex)), modal=True)
+                page.dialog.open = True
+                page.update()
+                return
+
         def refresh_image():
             try:
                 if is_pdf:
-                    nonlocal total_pages
-                    with fitz.open(path) as d:
-                        total_pages = len(d)
-                    b64 = _render_pdf_to_base64(path, page_idx, zoom)
-                    image.src_base64 = b64
+                    image.src_base64 = renderer.render(page_idx, zoom)
                     image.src = None
+                    renderer.prefetch(page_idx, zoom)
                 elif is_img:
                     image.src_base64 = None
                     image.src = path
@@ -1315,11 +1302,16 @@ def build(page: ft.Page, user_data: Optional[dict] = None) -> ft.Control:
                 scroll,
             ], spacing=8, tight=True),
             actions=[
-                ft.TextButton("Cerrar", on_click=lambda e: page.close(dlg)),
+                ft.TextButton("Cerrar", on_click=lambda e: close_viewer()),
             ],
             actions_alignment=ft.MainAxisAlignment.END,
         )
 
+        def close_viewer():
+            if renderer:
+                renderer.close()
+            page.close(dlg)
+
         page.open(dlg)
         refresh_image()
 
@@ -1349,9 +1341,12 @@ def build(page: ft.Page, user_data: Optional[dict] = None) -> ft.Control:
         # Confirmación antes de eliminar
         def do_confirm_delete(_):
             try:
-                # Eliminar archivo físico si existe
-                if os.path.exists(path):
+                # Eliminar archivo físico si existe y ningún otro documento lo comparte
+                with session_scope() as session:
+                    shared = file_in_use(session, path, exclude=[doc.id_documento])
+                if os.path.exists(path) and not shared:
                     os.remove(path)
+                    thumbs.discard(path)
                 # Eliminar de la base de datos si corresponde
                 # Aquí deberías agregar la lógica para eliminar el registro del documento en la base de datos
                 # Por ejemplo: database.crud.delete_document(doc.id_documento)
@@ -1377,6 +1372,20 @@ def build(page: ft.Page, user_data: Optional[dict] = None) -> ft.Control:
         )
         page.open(confirm_dlg)
 
+    def _doc_preview(d: models.Documento) -> ft.Control:
+        """Miniatura junto al archivo; si falta se genera en segundo plano y se refresca la tabla."""
+        path = d.ruta_almacenamiento or ""
+        thumb = thumbs.existing_thumbnail(path) if path else None
+        if thumb:
+            return ft.Image(src=thumb, width=36, height=48, fit=ft.ImageFit.COVER, border_radius=3)
+        if path and os.path.exists(path):
+            def done(_path, result):
+                if result and not thumbs.thumbnails.pending() and any(x.ruta_almacenamiento == _path for x in docs):
+                    populate_docs()
+                    page.update()
+            thumbs.thumbnails.submit(path, done)
+        return ft.Icon(ft.Icons.PICTURE_AS_PDF if path.lower().endswith(".pdf") else ft.Icons.IMAGE, color=ft.Colors.BLUE_GREY_400)
+
     def populate_docs():
         docs_table.rows.clear()
         for d in docs:
@@ -1389,6 +1398,7 @@ def build(page: ft.Page, user_data: Optional[dict] = None) -> ft.Control:
                 ft.DataRow(
                     cells=[
                         ft.DataCell(ft.Text(str(d.id_documento))),
+                        ft.DataCell(_doc_preview(d)),
                         ft.DataCell(ft.Text(d.nombre_archivo or "")),
                         ft.DataCell(actions),
                     ],
@@ -1399,10 +1409,12 @@ def build(page: ft.Page, user_data: Optional[dict] = None) -> ft.Control:
     docs_table = ft.DataTable(
         columns=[
             ft.DataColumn(ft.Text("ID")),
+            ft.DataColumn(ft.Text("Vista")),
             ft.DataColumn(ft.Text("Nombre")),
             ft.DataColumn(ft.Text("Acciones")),
         ],
         rows=[],
+        data_row_max_height=56,
         expand=True,
     )
 
@@ -1412,13 +1424,13 @@ def build(page: ft.Page, user_data: Optional[dict] = None) -> ft.Control:
         q = (search_field.value or "").strip()
         last_search_query = q
         load_citizens()
-        last_search_count = len(citizens)
+        last_search_count = citizens_cursor.total if citizens_cursor else len(citizens)
         # Log de búsqueda para Operador/Consulta
         role_name = (user_data or {}).get("rol") or (user_data or {}).get("rol_nombre") or ""
         rn = _norm_role(role_name)
         if rn in ("operador", "consulta"):
             try:
-                _log_busqueda(q, len(citizens))
+                _log_busqueda(q, last_search_count)
             except Exception:
                 pass
 
@@ -1443,6 +1455,7 @@ def build(page: ft.Page, user_data: Optional[dict] = None) -> ft.Control:
                 ft.Row([search_field, refresh_btn], spacing=12),
                 ft.Divider(height=1, thickness=1, color=NEUTRAL_COLOR),
                 ft.Container(citizens_list, expand=True),
+                ft.Row([citizens_status, ft.Container(expand=True), more_btn]),
             ], spacing=14),
             bgcolor=CARD_BG,
             border_radius=12,
@@ -1,8 +1,8 @@
 # modules/dashboard/layout.py
 # -*- coding: utf-8 -*-
 import flet as ft
-from database.connection import SessionLocal
-from database.models import Ciudadano, Documento
+from database.connection import engine
+from database.stats import DashboardStats, dashboard_stats
 
 # Paleta (usa ft.Colors)
 ACCENT_COLOR  = ft.Colors.BLUE_600
@@ -10,18 +10,17 @@ PRIMARY_COLOR = ft.Colors.BLUE_GREY_800
 BG_COLOR      = ft.Colors.BLUE_GREY_50
 CARD_BG       = ft.Colors.WHITE
 
-def get_stats():
-    db = SessionLocal()
+def load_stats() -> DashboardStats:
+    """Totales y producción mensual mantenidos por database.stats (sin COUNT(*))."""
     try:
-        total_ciudadanos = db.query(Ciudadano).count()
-        total_documentos = db.query(Documento).count()
+        return dashboard_stats.get(engine)
     except Exception as e:
         print(f"Error al obtener estadísticas: {e}")
-        total_ciudadanos = 0
-        total_documentos = 0
-    finally:
-        db.close()
-    return total_ciudadanos, total_documentos
+        return DashboardStats()
+
+def get_stats():
+    s = load_stats()
+    return s.ciudadanos, s.documentos
 
 def stat_card(title: str, value, icon=ft.Icons.INFO_OUTLINE):
     return ft.Card(
@@ -10,26 +10,26 @@ from typing import Optional, List, Dict
 import flet as ft
 from sqlalchemy import select
 from sqlalchemy.exc import SQLAlchemyError
-from database.connection import SessionLocal
+from database.connection import session_scope
 from database.models import Usuario, Rol, Documento, Ciudadano
 from utils.security import hash_password  # asumimos que existe; si no, reemplazar
 
 
 class UserService:
-    """Operaciones CRUD sobre usuarios y roles en una capa simple."""
+    """Operaciones CRUD sobre usuarios y roles en una capa simple.
 
-    def __init__(self):
-        self.db = SessionLocal()
+    Cada operación usa su propia unidad de trabajo (session_scope): no se
+    retiene una conexión del pool mientras la vista está abierta.
+    """
 
     def close(self):
-        try:
-            self.db.close()
-        except Exception:
-            pass
+        # Compatibilidad: ya no hay sesión abierta que cerrar
+        pass
 
     # ---- Roles ----
     def list_roles(self) -> List[Rol]:
-        return list(self.db.execute(select(Rol)).scalars().all())
+        with session_scope() as db:
+            return list(db.execute(select(Rol)).scalars().all())
 
     def get_role_map(self) -> Dict[int, str]:
         return {r.id_rol: r.nombre_rol for r in self.list_roles()}
@@ -49,17 +49,19 @@ class UserService:
             except Exception:
                 pass
 
-    def ensure_role(self, nombre: str) -> Rol:
+    def ensure_role(self, nombre: str, db=None) -> Rol:
+        if db is None:
+            with session_scope() as db:
+                return self.ensure_role(nombre, db)
         nombre = nombre.strip()
         if not nombre:
             raise ValueError("Nombre de rol vacío")
-        rol = self.db.execute(select(Rol).where(Rol.nombre_rol == nombre)).scalar_one_or_none()
+        rol = db.execute(select(Rol).where(Rol.nombre_rol == nombre)).scalar_one_or_none()
         if rol:
             return rol
         rol = Rol(nombre_rol=nombre)
-        self.db.add(rol)
-        self.db.commit()
-        self.db.refresh(rol)
+        db.add(rol)
+        db.flush()
         return rol
 
     # ---- Usuarios ----
@@ -68,43 +70,49 @@ class UserService:
         if q:
             qlike = f"%{q.strip()}%"
             stmt = stmt.where(Usuario.nombre_usuario.ilike(qlike))
-        return list(self.db.execute(stmt).scalars().all())
+        with session_scope() as db:
+            return list(db.execute(stmt).scalars().all())
 
     def create_user(self, nombre_usuario: str, contrasena: str, rol_nombre: str, apellidos: str = "", nombres: str = "") -> Usuario:
         nombre_usuario = nombre_usuario.strip()
         if not nombre_usuario or not contrasena:
             raise ValueError("Usuario y contraseña requeridos")
-        existing = self.db.execute(select(Usuario).where(Usuario.nombre_usuario == nombre_usuario)).scalar_one_or_none()
-        if existing:
-            raise ValueError("Usuario ya existe")
-        rol = self.ensure_role(rol_nombre)
-        contrasena_hash = hash_password(contrasena)
-        user = Usuario(nombre_usuario=nombre_usuario, contrasena_hash=contrasena_hash, id_rol=rol.id_rol, apellidos=apellidos, nombres=nombres)
-        self.db.add(user)
-        self.db.commit()
-        self.db.refresh(user)
-        return user
-
-    def update_user(self, user_id: int, rol_nombre: Optional[str] = None, nueva_contrasena: Optional[str] = None) -> Usuario:
-        user = self.db.execute(select(Usuario).where(Usuario.id_usuario == user_id)).scalar_one_or_none()
-        if not user:
-            raise ValueError("Usuario no encontrado")
-        if rol_nombre:
-            rol = self.ensure_role(rol_nombre)
-            user.id_rol = rol.id_rol
-        if nueva_contrasena:
-            user.contrasena_hash = hash_password(nueva_contrasena)
-        self.db.commit()
-        self.db.refresh(user)
-        return user
+        with session_scope() as db:
+            existing = db.execute(select(Usuario).where(Usuario.nombre_usuario == nombre_usuario)).scalar_one_or_none()
+            if existing:
+                raise ValueError("Usuario ya existe")
+            rol = self.ensure_role(rol_nombre, db)
+            contrasena_hash = hash_password(contrasena)
+            user = Usuario(nombre_usuario=nombre_usuario, contrasena_hash=contrasena_hash, id_rol=rol.id_rol, apellidos=apellidos, nombres=nombres)
+            db.add(user)
+            db.flush()
+            return user
+
+    def update_user(self, user_id: int, rol_nombre: Optional[str] = None, nueva_contrasena: Optional[str] = None,
+                    apellidos: Optional[str] = None, nombres: Optional[str] = None) -> Usuario:
+        with session_scope() as db:
+            user = db.execute(select(Usuario).where(Usuario.id_usuario == user_id)).scalar_one_or_none()
+            if not user:
+                raise ValueError("Usuario no encontrado")
+            if rol_nombre:
+                rol = self.ensure_role(rol_nombre, db)
+                user.id_rol = rol.id_rol
+            if nueva_contrasena:
+                user.contrasena_hash = hash_password(nueva_contrasena)
+            if apellidos is not None:
+                user.apellidos = apellidos
+            if nombres is not None:
+                user.nombres = nombres
+            db.flush()
+            return user
 
     def delete_user(self, user_id: int) -> bool:
-        user = self.db.execute(select(Usuario).where(Usuario.id_usuario == user_id)).scalar_one_or_none()
-        if not user:
-            return False
-        self.db.delete(user)
-        self.db.commit()
-        return True
+        with session_scope() as db:
+            user = db.execute(select(Usuario).where(Usuario.id_usuario == user_id)).scalar_one_or_none()
+            if not user:
+                return False
+            db.delete(user)
+            return True
 
     def get_user_activity(self, user_id: int, limit: int = 20) -> List[Dict]:
         """Devuelve actividad combinada reciente del usuario.
@@ -113,10 +121,20 @@ class UserService:
         - Ciudadanos modificados por el usuario
         """
         acts: List[Dict] = []
-        # Documentos extraídos
-        docs = self.db.execute(
-            select(Documento).where(Documento.id_usuario_extraccion == user_id).order_by(Documento.fecha_extraccion.desc()).limit(limit)
-        ).scalars().all()
+        with session_scope() as db:
+            # Documentos extraídos
+            docs = db.execute(
+                select(Documento).where(Documento.id_usuario_extraccion == user_id).order_by(Documento.fecha_extraccion.desc()).limit(limit)
+            ).scalars().all()
+            # Ciudadanos creados
+            creados = db.execute(
+                select(Ciudadano).where(Ciudadano.id_usuario_creacion == user_id).order_by(Ciudadano.fecha_creacion.desc()).limit(limit)
+            ).scalars().all()
+            # Ciudadanos modificados
+            mods = db.execute(
+                select(Ciudadano).where(Ciudadano.id_usuario_ultima_modificacion == user_id).order_by(Ciudadano.fecha_ultima_modificacion.desc()).limit(limit)
+            ).scalars().all()
+
         for d in docs:
             acts.append({
                 "ts": getattr(d, "fecha_extraccion", None),
@@ -124,11 +142,6 @@ class UserService:
                 "subtitle": f"{d.nombre_archivo} | {d.ruta_almacenamiento or ''}",
                 "icon": ft.Icons.DESCRIPTION,
             })
-
-        # Ciudadanos creados
-        creados = self.db.execute(
-            select(Ciudadano).where(Ciudadano.id_usuario_creacion == user_id).order_by(Ciudadano.fecha_creacion.desc()).limit(limit)
-        ).scalars().all()
         for c in creados:
             acts.append({
                 "ts": getattr(c, "fecha_creacion", None),
@@ -136,11 +149,6 @@ class UserService:
                 "subtitle": f"{c.apellidos} {c.nombres} | DNI: {c.dni or '—'} | LM: {c.lm or '—'}",
                 "icon": ft.Icons.PERSON_ADD_ALT_1,
             })
-
-        # Ciudadanos modificados
-        mods = self.db.execute(
-            select(Ciudadano).where(Ciudadano.id_usuario_ultima_modificacion == user_id).order_by(Ciudadano.fecha_ultima_modificacion.desc()).limit(limit)
-        ).scalars().all()
         for c in mods:
             acts.append({
                 "ts": getattr(c, "fecha_ultima_modificacion", None),
@@ -232,9 +232,8 @@ def create_users_view(page: ft.Page, user_data: dict | None = None) -> ft.Contro
                     msg.value = " | ".join(probs); msg.update(); return
             try:
                 # Actualizar apellidos y nombres si el modelo/controlador lo permite
-                svc.update_user(user_id, rol_nombre=new_role, nueva_contrasena=new_pass)
-                user.apellidos = new_apellidos
-                user.nombres = new_nombres
+                svc.update_user(user_id, rol_nombre=new_role, nueva_contrasena=new_pass,
+                                apellidos=new_apellidos, nombres=new_nombres)
                 page.close(dlg)
                 load(search_ref.current.value.strip())
             except Exception as exc:
@@ -20,10 +20,16 @@ import sys
 import asyncio
 import flet as ft
 from PIL import Image as PILImage
-from utils.extractors import extract_image
+from utils.extractors import extract_image, routing_stats, routing_delta
+from utils.ocr_batch import BatchEvent
+from utils.ocr_jobs import make_batch_engine
 from utils.nav_guard import register_guard, unregister_guard
-from database.connection import get_db
-from database.crud import create_full_digital_record
+from utils import file_store
+from utils.ocr_cache import file_sha256
+from utils.thumbnails import adopt, existing_thumbnail, thumbnails
+from database.connection import session_scope
+from database.crud import create_full_digital_record, create_full_digital_records_bulk
+from database.file_index import find_duplicate
 
 
 class Colors:
@@ -97,9 +103,12 @@ def create_digitalizacion_jpg_view(page: ft.Page, user_data=None):
     files: list[dict] = []
     selected_index: int | None = None
     last_result: dict | None = None
+    # Lote OCR: cola persistente + trabajador en segundo plano (o en proceso con OCR_BACKGROUND=0)
+    batch_engine = make_batch_engine(extract_image, page, source="digitalizacion_jpg", kind="image",
+                                    owner=(user_data or {}).get("id_usuario"))
 
     def has_pending_work():
-        return bool(files) or last_result is not None or any(f.get("status") == "Procesando" for f in files)
+        return bool(files) or last_result is not None or batch_engine.running or any(f.get("status") == "Procesando" for f in files)
     register_guard("digitalizacion_jpg", has_pending_work)
 
     log = ft.ListView(expand=True, spacing=2, auto_scroll=True)
@@ -145,6 +154,20 @@ def create_digitalizacion_jpg_view(page: ft.Page, user_data=None):
         tf_falta.value = pick("fecha_alta"); tf_fbaja.value = pick("fecha_baja"); tf_grado.value = pick("grado")
         tf_motivo.value = pick("motivo_baja"); page.update()
 
+    def request_thumbnail(it: dict):
+        """Miniatura ya generada o pedida al hilo de miniaturas (refresca la lista al terminar)."""
+        it['thumb'] = existing_thumbnail(it['path'])
+        if it['thumb']: return
+        def done(_path, result, item=it):
+            item['thumb'] = result
+            if not thumbnails.pending(): refresh_table()
+        thumbnails.submit(it['path'], done)
+
+    def file_icon(it: dict, is_sel: bool):
+        if it.get('thumb'):
+            return ft.Image(src=it['thumb'], width=32, height=32, fit=ft.ImageFit.COVER, border_radius=3, gapless_playback=True)
+        return ft.Icon(ft.Icons.PHOTO,size=16,color=Colors.PRIMARY if is_sel else Colors.ON_SURFACE_VARIANT)
+
     def refresh_table():
         files_list.controls.clear()
         if not files:
@@ -170,12 +193,13 @@ def create_digitalizacion_jpg_view(page: ft.Page, user_data=None):
                 update_ocr_button(); refresh_table()
             def on_remove(e, idx=i):
                 nonlocal selected_index, last_result
-                files.pop(idx)
+                removed=files.pop(idx); batch_engine.ack([removed['path']])
                 if selected_index == idx:
                     selected_index=None; last_result=None; current_title.value="Sin archivo"; current_meta.value="Seleccione..."; clear_form()
                 elif selected_index and selected_index>idx: selected_index-=1
                 refresh_table(); update_ocr_button()
             status = it.get("status","Pendiente"); is_sel = i==selected_index
+            if 'thumb' not in it: request_thumbnail(it)
             chip = create_status_chip(status) if status!="Procesando" else ft.Container(
                 content=ft.Row([ft.ProgressRing(width=14,height=14,stroke_width=2,color="#059669"), ft.Text("OCR", size=9,color="#059669")],spacing=3,tight=True),
                 bgcolor="#ECFDF5", padding=ft.padding.symmetric(horizontal=6, vertical=3), border_radius=12,
@@ -183,7 +207,7 @@ def create_digitalizacion_jpg_view(page: ft.Page, user_data=None):
             files_list.controls.append(ft.Container(
                 content=ft.Row([
                     ft.Checkbox(value=it.get("selected",False), on_change=on_toggle, scale=0.8),
-                    ft.Icon(ft.Icons.PHOTO,size=16,color=Colors.PRIMARY if is_sel else Colors.ON_SURFACE_VARIANT),
+                    file_icon(it, is_sel),
                     ft.Column([ft.Text(it['name'], size=11, weight=ft.FontWeight.BOLD if is_sel else ft.FontWeight.NORMAL, overflow=ft.TextOverflow.ELLIPSIS),
                                ft.Text(f"{round((it.get('size') or 0)/1024,1)} KB", size=9, color=Colors.ON_SURFACE_VARIANT)],spacing=0, expand=True),
                     ft.Container(content=chip,width=120),
@@ -561,7 +585,7 @@ def create_digitalizacion_jpg_view(page: ft.Page, user_data=None):
             page.open(dlg)
             return
         it=files[selected_index]
-        if it.get("status") == "Procesando": return
+        if it.get("status") == "Procesando" or batch_engine.running: return
         path=it['path']
         if not os.path.exists(path): it['status']="Error"; refresh_table(); return
         it['status']="Procesando"; refresh_table(); update_ocr_button()
@@ -576,21 +600,60 @@ def create_digitalizacion_jpg_view(page: ft.Page, user_data=None):
         refresh_table(); update_ocr_button()
 
     def run_ocr_batch():
+        if batch_engine.running: return
         targets=[i for i,f in enumerate(files) if f.get('status') in ("Pendiente","Error")]
         if not targets: return
-        for idx in targets:
-            it=files[idx]; path=it['path']
-            if not os.path.exists(path): it['status']="Error"; continue
-            it['status']="Procesando"; refresh_table()
-            try:
-                data=extract_image(path) or {}
-                if isinstance(data, dict) and data.get("error"):
-                    it['status']="Error"
-                else:
-                    it['status']="Procesado"; it['result']=data
-            except Exception:
+        batch_engine.on_event=make_batch_handler({idx: files[idx] for idx in targets})
+        batch_engine.start([(i, files[i]['path']) for i in targets])
+        update_batch_controls()
+
+    def make_batch_handler(items):
+        # Los eventos llegan desde hilos del pool (o de pubsub en segundo plano); se aplican sobre los dicts capturados
+        r0=routing_stats()
+
+        def on_event(ev: BatchEvent):
+            nonlocal last_result
+            it=items.get(ev.index) if ev.index is not None else None
+            if ev.kind=="inicio" and it is not None:
+                it['status']="Procesando"
+            elif ev.kind=="procesado" and it is not None:
+                it['status']="Procesado"; it['result']=ev.result or {}
+                if selected_index is not None and selected_index<len(files) and files[selected_index] is it:
+                    last_result=it['result']; fill_form(last_result)
+            elif ev.kind=="error" and it is not None:
                 it['status']="Error"
-        refresh_table(); update_ocr_button()
+                # Sin conexión a Vertex: no tiene sentido seguir con el resto del lote
+                if isinstance(ev.result, dict) and ev.result.get("error")=="sin_conexion": batch_engine.cancel()
+            elif ev.kind=="cancelado" and it is not None:
+                it['status']="Pendiente"
+            elif ev.kind=="fin":
+                update_batch_controls(); update_ocr_button()
+                st=batch_engine.stats; rd=routing_delta(r0)
+                # Con el trabajador en otro proceso los contadores locales quedan en cero
+                routed=f"\nLocal: {rd['local']} · Remoto: {rd['remote']} · Caché: {rd['cache']}" if any(rd.values()) else ""
+                dlg=ft.AlertDialog(title=ft.Text("Procesamiento cancelado" if batch_engine.cancelled else "Procesamiento completado"),
+                                   content=ft.Text(f"Exitosos: {st.processed}\nErrores: {st.errors}"+(f"\nCancelados: {st.cancelled}" if st.cancelled else "")+f"\nTiempo: {st.elapsed:.1f} s"+routed),
+                                   actions=[ft.TextButton("OK", on_click=lambda e: page.close(dlg))])
+                page.open(dlg)
+                return
+            refresh_table()
+        return on_event
+
+    def toggle_pause_batch():
+        if not batch_engine.running: return
+        if batch_engine.paused: batch_engine.resume()
+        else: batch_engine.pause()
+        update_batch_controls()
+
+    def cancel_batch():
+        if batch_engine.running: batch_engine.cancel(); update_batch_controls()
+
+    def update_batch_controls():
+        running=batch_engine.running and not batch_engine.cancelled
+        btn_pause_batch.visible=running; btn_cancel_batch.visible=running
+        btn_pause_batch.text="Reanudar" if batch_engine.paused else "Pausar"
+        btn_pause_batch.icon=ft.Icons.PLAY_ARROW if batch_engine.paused else ft.Icons.PAUSE
+        page.update()
 
     # --- Form helpers ---
     def get_form_data():
@@ -617,81 +680,76 @@ def create_digitalizacion_jpg_view(page: ft.Page, user_data=None):
 
     async def _save_indices(indices:list[int]):
         try:
-            sess_gen=get_db()
-            try: db=next(sess_gen)
-            except StopIteration: db=None
-            if db is None: return
-            from database.models import Documento, Usuario
-            from sqlalchemy import select
-            try:
-                username=(user_data or {}).get("username")
-                user_row = db.execute(select(Usuario).where(Usuario.nombre_usuario==username)).scalar_one_or_none() if username else None
-                if user_row is not None:
-                    user_id = getattr(user_row, "id_usuario", None) or 1
-                else:
-                    first_user = db.execute(select(Usuario)).scalars().first()
-                    if first_user:
-                        user_id = getattr(first_user, "id_usuario", 1)
-                    else:
-                        user_id = 1
-            except Exception:
-                user_id=1
-            saved=0; skipped=0
-            invalid=0
-            import shutil, time
-            from pathlib import Path
-            storage_dir = Path("storage") / "data"
-            try:
-                storage_dir.mkdir(parents=True, exist_ok=True)
-            except Exception:
-                pass
-
-            for idx in indices:
-                if idx>=len(files): continue
-                it=files[idx]; res=it.get('result') or {}
-                if not res:
-                    continue
-                # Validación mínima: se requiere DNI o LM para crear el ciudadano
-                dni_ok = bool((res.get("dni") or "").strip())
-                lm_ok = bool((res.get("lm") or "").strip())
-                if not (dni_ok or lm_ok):
-                    it['status'] = 'Error'
-                    invalid += 1
-                    continue
-                path=it['path']
-                original_path = path  # conservar para verificación de duplicado
-                # Si el archivo no está ya dentro de storage/data lo copiamos para persistencia
-                stored_path = path
-                try:
-                    if storage_dir.exists() and (not str(path).lower().replace("\\","/").endswith("/storage/data") and "storage/data" not in str(path).replace("\\","/").lower()):
-                        ext = os.path.splitext(path)[1]
-                        base_name = os.path.splitext(it['name'])[0][:40].replace(' ','_')
-                        new_name = f"{base_name}_{int(time.time())}{ext}"
-                        candidate = storage_dir / new_name
-                        shutil.copy2(path, candidate)
-                        stored_path = str(candidate)
-                        it['stored_path'] = stored_path
-                except Exception:
-                    # Si falla la copia seguimos guardando con la ruta original
-                    stored_path = path
-                try:
-                    from database.models import Documento
-                    from sqlalchemy import select as _sel
-                    # Verifica duplicado por ruta original o por ruta ya copiada
-                    existing=db.execute(_sel(Documento).where(Documento.ruta_almacenamiento==original_path)).scalar_one_or_none()
-                    if not existing and stored_path != original_path:
-                        existing=db.execute(_sel(Documento).where(Documento.ruta_almacenamiento==stored_path)).scalar_one_or_none()
-                except Exception:
-                    existing=None
-                if existing:
-                    skipped+=1; it['status']='Guardado'; continue
+            with session_scope() as db:
+                from database.models import Documento, Usuario
+                from sqlalchemy import select
                 try:
-                    ids=create_full_digital_record(db,res,{"name":it['name'],"path":stored_path},user_id)
-                    it['db_ids']=ids; it['status']='Guardado'; saved+=1
+                    username=(user_data or {}).get("username")
+                    user_row = db.execute(select(Usuario).where(Usuario.nombre_usuario==username)).scalar_one_or_none() if username else None
+                    if user_row is not None:
+                        user_id = getattr(user_row, "id_usuario", None) or 1
+                    else:
+                        first_user = db.execute(select(Usuario)).scalars().first()
+                        if first_user:
+                            user_id = getattr(first_user, "id_usuario", 1)
+                        else:
+                            user_id = 1
                 except Exception:
-                    it['status']='Error'
-            try: db.close()
-            except Exception: pass
+                    user_id=1
+                saved=0; skipped=0
+                invalid=0
+
+                to_save=[]
+                seen=set()  # hashes ya incluidos en esta selección
+                for idx in indices:
+                    if idx>=len(files): continue
+                    it=files[idx]; res=it.get('result') or {}
+                    if not res:
+                        continue
+                    # Validación mínima: se requiere DNI o LM para crear el ciudadano
+                    dni_ok = bool((res.get("dni") or "").strip())
+                    lm_ok = bool((res.get("lm") or "").strip())
+                    if not (dni_ok or lm_ok):
+                        it['status'] = 'Error'
+                        invalid += 1
+                        continue
+                    path=it['path']
+                    original_path = path  # conservar para verificación de duplicado
+                    # Si el archivo no está ya dentro de storage/data va al almacén por contenido
+                    stored_path = it.get('stored_path') or path
+                    sha = it.get('sha256')
+                    try:
+                        if stored_path == path and os.path.exists(path):
+                            if "storage/data" in str(path).replace("\\","/").lower():
+                                sha = file_sha256(path)
+                            else:
+                                stored_path, sha, _ = file_store.store(path)
+                                adopt(path, stored_path)
+                            it['stored_path'] = stored_path; it['sha256'] = sha
+                    except Exception:
+                        # Si falla la copia seguimos guardando con la ruta original
+                        stored_path = path
+                    try:
+                        from database.models import Documento
+                        from sqlalchemy import select as _sel
+                        # Duplicado por contenido, o por ruta en documentos sin hash
+                        existing=(sha and sha in seen) or find_duplicate(db, sha)
+                        if not existing:
+                            existing=db.execute(_sel(Documento).where(Documento.ruta_almacenamiento.in_({original_path, stored_path}))).scalars().first()
+                    except Exception:
+                        existing=None
+                    if existing:
+                        skipped+=1; it['status']='Guardado'; continue
+                    seen.add(sha)
+                    to_save.append((it, res, {"name":it['name'],"path":stored_path,"sha256":sha}))
+                # Alta masiva: catálogos y ciudadanos por conjunto, un commit por bloque
+                report=create_full_digital_records_bulk(db, [(r, fi) for _, r, fi in to_save], user_id)
+                for r in report["results"]:
+                    it=to_save[r["index"]][0]
+                    if r["ok"]: it['db_ids']={k: r[k] for k in ("ciudadano_id","servicio_id","documento_id")}; it['status']='Guardado'; saved+=1
+                    else: it['status']='Error'
+                # Lo guardado ya no debe reaparecer al restaurar la cola OCR
+                batch_engine.ack([it['path'] for it in files if it.get('status')=='Guardado'])
             refresh_table(); update_ocr_button()
             details = f"Nuevos: {saved}\nDuplicados: {skipped}"
             if invalid:
@@ -730,6 +788,7 @@ def create_digitalizacion_jpg_view(page: ft.Page, user_data=None):
             dlg = ft.AlertDialog(title=ft.Text("Advertencia"), content=ft.Text("No hay archivos cargados para limpiar."), actions=[ft.TextButton("Cerrar", on_click=lambda e: page.close(dlg))], modal=True)
             page.open(dlg)
             return
+        batch_engine.cancel(); batch_engine.ack([it['path'] for it in files])
         files.clear(); selected_index=None; last_result=None; clear_form(); refresh_table(); update_ocr_button()
 
     # --- Campos formulario ---
@@ -756,6 +815,9 @@ def create_digitalizacion_jpg_view(page: ft.Page, user_data=None):
     btn_pick=create_button("Cargar Imágenes", ft.Icons.UPLOAD_FILE, "filled", lambda e: fp.pick_files(allow_multiple=True))
     btn_ocr=create_button("Procesar OCR", ft.Icons.SMART_TOY, "filled", lambda e: run_ocr_single(), Colors.SECONDARY)
     btn_ocr_batch=create_button("OCR Todo", ft.Icons.AUTO_AWESOME, "outlined", lambda e: run_ocr_batch(), Colors.SECONDARY)
+    btn_pause_batch=create_button("Pausar", ft.Icons.PAUSE, "outlined", lambda e: toggle_pause_batch(), Colors.WARNING)
+    btn_cancel_batch=create_button("Cancelar lote", ft.Icons.STOP, "outlined", lambda e: cancel_batch(), Colors.DANGER)
+    btn_pause_batch.visible=False; btn_cancel_batch.visible=False
     btn_clear=create_button("Limpiar Todo", ft.Icons.CLEAR_ALL, "outlined", lambda e: clear_all(), Colors.WARNING)
     btn_apply=create_button("Aplicar Cambios", ft.Icons.CHECK_CIRCLE, "filled", lambda e: apply_changes())
     btn_mark=create_button("Marcar Validado", ft.Icons.VERIFIED, "outlined", lambda e: mark_validated(), Colors.SUCCESS)
@@ -763,7 +825,7 @@ def create_digitalizacion_jpg_view(page: ft.Page, user_data=None):
 
     # --- Layout ---
     left_panel=create_card(ft.Column([
-        ft.Row([btn_pick, btn_ocr, btn_ocr_batch, btn_clear], spacing=8, wrap=True),
+        ft.Row([btn_pick, btn_ocr, btn_ocr_batch, btn_pause_batch, btn_cancel_batch, btn_clear], spacing=8, wrap=True),
         ft.Container(files_list, expand=True)
     ],spacing=16,expand=True),"Archivos de Imagen",16)
     form_content=ft.Column([
@@ -785,8 +847,23 @@ def create_digitalizacion_jpg_view(page: ft.Page, user_data=None):
     header=ft.Container(content=ft.Row([ft.Icon(ft.Icons.IMAGE,size=28,color=Colors.PRIMARY), ft.Text("Digitalización de Imágenes", size=20, weight=ft.FontWeight.BOLD)],spacing=10), padding=ft.padding.only(bottom=12))
     root=ft.Container(content=ft.Column([header, ft.Container(main_content, expand=True)], expand=True, spacing=0), padding=ft.padding.symmetric(horizontal=16, vertical=12), expand=True, bgcolor=Colors.SURFACE)
 
-    def cleanup(): unregister_guard("digitalizacion_jpg")
+    # El lote sigue en el trabajador al cerrar la vista; al volver se recupera
+    def cleanup(): batch_engine.detach(); unregister_guard("digitalizacion_jpg")
     root.cleanup=cleanup
+
+    # Trabajos de una sesión anterior (ventana cerrada o app reiniciada)
+    reattach={}
+    for job in batch_engine.restore():
+        if any(it['path']==job['path'] for it in files): continue
+        status={"hecho":"Procesado","error":"Error"}.get(job['status'],"Procesando")
+        try: size=os.path.getsize(job['path'])
+        except Exception: size=0
+        files.append({"name":os.path.basename(job['path']),"path":job['path'],"mime":guess_mime(job['path']),"size":size,"status":status,"result":job.get('result') or {}})
+        if status=="Procesando": reattach[len(files)-1]=job
+    if files: refresh_table(); update_ocr_button()
+    if reattach:
+        batch_engine.on_event=make_batch_handler({idx: files[idx] for idx in reattach})
+        batch_engine.attach([(idx, job['id']) for idx, job in reattach.items()]); update_batch_controls()
     return root
 
 
@@ -1366,55 +1443,44 @@ def create_digitalizacion_jpg_view(page: ft.Page, user_data=None):
             async def _save_indices(indices: list[int]):
                 """Versión async para usar con page.run_task: guarda registros y muestra resumen."""
                 try:
-                    sess_gen = get_db()
-                    try:
-                        db_sess = next(sess_gen)  # type: ignore
-                    except StopIteration:
-                        db_sess = None
-                    if db_sess is None:
-                        log_add("� No se pudo crear sesión de base de datos.")
-                        return
-                    from database.models import Documento, Usuario
-                    from sqlalchemy import select
-                    try:
-                        username = (user_data or {}).get("username")
-                        if username:
-                            user_row = db_sess.execute(select(Usuario).where(Usuario.nombre_usuario == username)).scalar_one_or_none()
-                            user_id = getattr(user_row, "id_usuario", 1) if user_row else 1
-                        else:
-                            user_id = 1
-                    except Exception:
-                        user_id = 1
-                    saved = 0
-                    skipped = 0
-                    for idx in indices:
-                        if idx >= len(files):
-                            continue
-                        it = files[idx]
-                        result = it.get("result") or {}
-                        if not result:
-                            log_add(f"⚠️ {it['name']} sin datos OCR, omitido.")
-                            continue
-                        file_info = {"name": it["name"], "path": it["path"]}
+                    with session_scope() as db_sess:
+                        from database.models import Documento, Usuario
+                        from sqlalchemy import select
                         try:
-                            existing = db_sess.execute(select(Documento).where(Documento.ruta_almacenamiento == file_info["path"])).scalar_one_or_none()
+                            username = (user_data or {}).get("username")
+                            if username:
+                                user_row = db_sess.execute(select(Usuario).where(Usuario.nombre_usuario == username)).scalar_one_or_none()
+                                user_id = getattr(user_row, "id_usuario", 1) if user_row else 1
+                            else:
+                                user_id = 1
                         except Exception:
-                            existing = None
-                        if existing:
-                            it["status"] = "Guardado"  # Consideramos duplicado como ya guardado
-                            skipped += 1
-                            log_add(f"ℹ️ Duplicado omitido: {it['name']}")
-                            continue
-                        try:
-                            ids_map = create_full_digital_record(db_sess, result, file_info, user_id)
-                            it["status"] = "Guardado"; it["db_ids"] = ids_map; saved += 1
-                            log_add(f"💾 Guardado: {it['name']}")
-                        except Exception as ex:
-                            it["status"] = "Error"; log_add(f"🚨 Error al guardar {it['name']}: {ex}")
-                    try:
-                        db_sess.close()
-                    except Exception:
-                        pass
+                            user_id = 1
+                        saved = 0
+                        skipped = 0
+                        for idx in indices:
+                            if idx >= len(files):
+                                continue
+                            it = files[idx]
+                            result = it.get("result") or {}
+                            if not result:
+                                log_add(f"⚠️ {it['name']} sin datos OCR, omitido.")
+                                continue
+                            file_info = {"name": it["name"], "path": it["path"]}
+                            try:
+                                existing = db_sess.execute(select(Documento).where(Documento.ruta_almacenamiento == file_info["path"])).scalar_one_or_none()
+                            except Exception:
+                                existing = None
+                            if existing:
+                                it["status"] = "Guardado"  # Consideramos duplicado como ya guardado
+                                skipped += 1
+                                log_add(f"ℹ️ Duplicado omitido: {it['name']}")
+                                continue
+                            try:
+                                ids_map = create_full_digital_record(db_sess, result, file_info, user_id)
+                                it["status"] = "Guardado"; it["db_ids"] = ids_map; saved += 1
+                                log_add(f"💾 Guardado: {it['name']}")
+                            except Exception as ex:
+                                it["status"] = "Error"; log_add(f"🚨 Error al guardar {it['name']}: {ex}")
                     refresh_table(); update_ocr_button()
                     summary_modal = ft.AlertDialog(
                         title=ft.Row([
@@ -1865,63 +1931,49 @@ def create_digitalizacion_jpg_view(page: ft.Page, user_data=None):
     def _save_indices(indices: list[int]):
         """Unifica lógica con módulo PDF (manejo de sesión, duplicados y modal resumen)."""
         try:
-            # get_db() devuelve generador; extraer sesión real
-            sess_gen = get_db()
-            try:
-                db_sess = next(sess_gen)  # type: ignore
-            except StopIteration:
-                db_sess = None
-            if db_sess is None:
-                log_add("🚨 No se pudo crear sesión de base de datos.")
-                return
-
-            from database.models import Documento, Usuario  # import local para evitar overhead arriba
-            from sqlalchemy import select
+            with session_scope() as db_sess:
+                from database.models import Documento, Usuario  # import local para evitar overhead arriba
+                from sqlalchemy import select
 
-            # Resolver usuario
-            try:
-                username = (user_data or {}).get("username")
-                if username:
-                    user_row = db_sess.execute(select(Usuario).where(Usuario.nombre_usuario == username)).scalar_one_or_none()
-                    user_id = getattr(user_row, "id_usuario", 1) if user_row else 1
-                else:
-                    user_id = 1
-            except Exception:
-                user_id = 1
-
-            saved = 0
-            skipped = 0
-            for idx in indices:
-                it = files[idx]
-                result = it.get("result") or {}
-                if not result:
-                    log_add(f"⚠️ {it['name']} sin datos OCR, omitido.")
-                    continue
-                file_info = {"name": it["name"], "path": it["path"]}
-                # Duplicado por ruta
+                # Resolver usuario
                 try:
-                    existing = db_sess.execute(select(Documento).where(Documento.ruta_almacenamiento == file_info["path"])).scalar_one_or_none()
+                    username = (user_data or {}).get("username")
+                    if username:
+                        user_row = db_sess.execute(select(Usuario).where(Usuario.nombre_usuario == username)).scalar_one_or_none()
+                        user_id = getattr(user_row, "id_usuario", 1) if user_row else 1
+                    else:
+                        user_id = 1
                 except Exception:
-                    existing = None
-                if existing:
-                    it["status"] = "Guardado"
-                    skipped += 1
-                    log_add(f"ℹ️ Ya existía documento: {it['name']}")
-                    continue
-                try:
-                    ids_map = create_full_digital_record(db_sess, result, file_info, user_id)
-                    it["status"] = "Guardado"
-                    it["db_ids"] = ids_map
-                    saved += 1
-                    log_add(f"💾 Guardado: {it['name']}")
-                except Exception as ex:
-                    it["status"] = "Error"
-                    log_add(f"🚨 Error al guardar {it['name']}: {ex}")
+                    user_id = 1
 
-            try:
-                db_sess.close()
-            except Exception:
-                pass
+                saved = 0
+                skipped = 0
+                for idx in indices:
+                    it = files[idx]
+                    result = it.get("result") or {}
+                    if not result:
+                        log_add(f"⚠️ {it['name']} sin datos OCR, omitido.")
+                        continue
+                    file_info = {"name": it["name"], "path": it["path"]}
+                    # Duplicado por ruta
+                    try:
+                        existing = db_sess.execute(select(Documento).where(Documento.ruta_almacenamiento == file_info["path"])).scalar_one_or_none()
+                    except Exception:
+                        existing = None
+                    if existing:
+                        it["status"] = "Guardado"
+                        skipped += 1
+                        log_add(f"ℹ️ Ya existía documento: {it['name']}")
+                        continue
+                    try:
+                        ids_map = create_full_digital_record(db_sess, result, file_info, user_id)
+                        it["status"] = "Guardado"
+                        it["db_ids"] = ids_map
+                        saved += 1
+                        log_add(f"💾 Guardado: {it['name']}")
+                    except Exception as ex:
+                        it["status"] = "Error"
+                        log_add(f"🚨 Error al guardar {it['name']}: {ex}")
 
             refresh_table()
             update_ocr_button()
@@ -1,14 +1,21 @@
 # -*- coding: utf-8 -*-
 import os
 import sys
+import threading
 from typing import Any, Callable, Dict, List, Optional
 
 import flet as ft
 
-from utils.extractors import extract_pdf
+from utils.extractors import contar_paginas, extract_pdf, extract_pdf_pages, routing_stats, routing_delta
+from utils.ocr_batch import BatchEvent
+from utils.ocr_jobs import make_batch_engine
 from utils.nav_guard import register_guard, unregister_guard
-from database.connection import get_db
-from database.crud import create_full_digital_record
+from utils import file_store
+from utils.ocr_cache import file_sha256
+from utils.thumbnails import adopt, existing_thumbnail, thumbnails
+from database.connection import session_scope
+from database.crud import create_full_digital_records_bulk
+from database.file_index import find_duplicate
 from database.models import Documento, Usuario
 from sqlalchemy import select
 
@@ -135,6 +142,9 @@ def create_digitalizacion_pdf_view(
     files: List[Dict[str, Any]] = []
     selected_index: Optional[int] = None
     last_result: Optional[Dict[str, Any]] = None
+    # Lote OCR: cola persistente + trabajador en segundo plano (o en proceso con OCR_BACKGROUND=0)
+    batch_engine = make_batch_engine(extract_pdf, page, source="digitalizacion_pdf", kind="pdf",
+                                    owner=(user_data or {}).get("id_usuario"))
 
     preview_ref: ft.Ref[ft.Container] = ft.Ref[ft.Container]()
     pdf_view_cls = None
@@ -145,7 +155,7 @@ def create_digitalizacion_pdf_view(
             break
 
     def has_pending_work() -> bool:
-        return bool(files) or any(f.get("status") == "Procesando" for f in files)
+        return bool(files) or batch_engine.running or any(f.get("status") == "Procesando" for f in files)
 
     register_guard("digitalizacion_pdf", has_pending_work)
 
@@ -255,7 +265,8 @@ def create_digitalizacion_pdf_view(
 
                 doc = fitz.open(path)
                 total = doc.page_count
-                state = {"page": 0, "zoom": 1.2}
+                # Las filas de un PDF dividido por página abren el visor en su página
+                state = {"page": max(0, int(file_item.get("page") or 1) - 1), "zoom": 1.2}
 
                 # Para mejorar la sensación de zoom: mantenemos un caché de render (pix)
                 # y re-renderizamos sólo cuando el cambio de zoom es suficientemente grande
@@ -700,12 +711,14 @@ def create_digitalizacion_pdf_view(
             log_add(f"❌ Ruta inexistente: {path}")
             return
 
-        # Solo metadatos y accesos rápidos (sin visor embebido)
+        # Metadatos, miniatura de la primera página y accesos rápidos (sin visor embebido)
         size_kb = os.path.getsize(path) / 1024
+        thumb = existing_thumbnail(path)
         preview_ref.current.content = ft.Column([
             ft.Container(
                 content=ft.Row([
-                    ft.Icon(ft.Icons.PICTURE_AS_PDF, size=68, color=Colors.PRIMARY),
+                    ft.Image(src=thumb, width=68, height=90, fit=ft.ImageFit.CONTAIN, border_radius=4)
+                    if thumb else ft.Icon(ft.Icons.PICTURE_AS_PDF, size=68, color=Colors.PRIMARY),
                     ft.Column([
                         ft.Text(os.path.basename(path), weight=ft.FontWeight.BOLD, size=14),
                         ft.Text(f"📁 {size_kb:.1f} KB", size=12, color=Colors.ON_SURFACE_VARIANT),
@@ -937,7 +950,9 @@ def create_digitalizacion_pdf_view(
         nonlocal files, selected_index, last_result
         if idx < 0 or idx >= len(files):
             return
-        files.pop(idx)
+        removed = files.pop(idx)
+        if not any(it["path"] == removed["path"] for it in files):
+            batch_engine.ack([removed["path"]])
         if selected_index == idx:
             selected_index = None
             last_result = None
@@ -993,87 +1008,86 @@ def create_digitalizacion_pdf_view(
 
     async def save_indices(indices: List[int]) -> None:
         try:
-            # get_db() devuelve un generador (patrón FastAPI). Extraemos la sesión real.
-            sess_gen = get_db()
-            try:
-                conn = next(sess_gen)  # type: ignore
-            except StopIteration:
-                conn = None
-            if conn is None:
-                log_add("🚨 No se pudo conectar a la base de datos")
-                return
-
-            saved = 0
-            skipped = 0
-            user_id = _resolve_user_id(conn)
-            if not user_id:
-                show_modal("Usuarios no configurados", "No hay usuarios en la base de datos. Crea al menos uno para poder guardar.", ft.Icons.WARNING)
-                return
-
-            for idx in indices:
-                file_item = files[idx]
-                result = file_item.get("result") or {}
-                # Validación obligatoria: DNI o LM
-                dni_ok = bool((result.get("dni") or "").strip())
-                lm_ok = bool((result.get("lm") or "").strip())
-                if not (dni_ok or lm_ok):
-                    file_item["status"] = "Error"
-                    log_add(f"❌ Falta DNI o LM en: {file_item['name']}")
-                    continue
-                # Si el archivo PDF no está dentro de storage/data, lo copiamos para persistencia
-                file_path = file_item["path"]
-                stored_path = file_path
-                try:
-                    import shutil, time
-                    from pathlib import Path
-                    storage_dir = Path("storage") / "data"
-                    storage_dir.mkdir(parents=True, exist_ok=True)
-                    is_in_storage = "storage/data" in str(file_path).replace("\\","/").lower()
-                    if not is_in_storage and os.path.exists(file_path):
-                        ext = os.path.splitext(file_path)[1]
-                        base_name = os.path.splitext(file_item['name'])[0][:40].replace(' ','_')
-                        new_name = f"{base_name}_{int(time.time())}{ext}"
-                        candidate = storage_dir / new_name
-                        shutil.copy2(file_path, candidate)
-                        stored_path = str(candidate)
-                        file_item['stored_path'] = stored_path
-                except Exception:
-                    stored_path = file_path
+            with session_scope() as conn:
+                saved = 0
+                skipped = 0
+                user_id = _resolve_user_id(conn)
+                if not user_id:
+                    show_modal("Usuarios no configurados", "No hay usuarios en la base de datos. Crea al menos uno para poder guardar.", ft.Icons.WARNING)
+                    return
 
-                file_info = {"name": file_item["name"], "path": stored_path}
-                # Evitar duplicados por ruta exacta del archivo
-                try:
-                    # Duplicado por ruta original o por ruta copiada
-                    existing_doc = conn.execute(
-                        select(Documento).where(Documento.ruta_almacenamiento == file_path)  # type: ignore
-                    ).scalar_one_or_none()
-                    if not existing_doc and stored_path != file_path:
-                        existing_doc = conn.execute(
-                            select(Documento).where(Documento.ruta_almacenamiento == stored_path)  # type: ignore
-                        ).scalar_one_or_none()
-                except Exception:
-                    existing_doc = None
+                to_save = []
+                seen = set()  # (sha, página): repetidos dentro de esta misma selección
+                for idx in indices:
+                    file_item = files[idx]
+                    result = file_item.get("result") or {}
+                    # Validación obligatoria: DNI o LM
+                    dni_ok = bool((result.get("dni") or "").strip())
+                    lm_ok = bool((result.get("lm") or "").strip())
+                    if not (dni_ok or lm_ok):
+                        file_item["status"] = "Error"
+                        log_add(f"❌ Falta DNI o LM en: {file_item['name']}")
+                        continue
+                    # Si el archivo PDF no está dentro de storage/data, va al almacén por contenido
+                    file_path = file_item["path"]
+                    # Las filas de un mismo PDF dividido por página comparten un solo objeto
+                    shared = file_item if file_item.get("stored_path") else next(
+                        (it for it in files if it.get("path") == file_path and it.get("stored_path")), file_item
+                    )
+                    stored_path = shared.get("stored_path") or file_path
+                    sha = shared.get("sha256")
+                    try:
+                        is_in_storage = "storage/data" in str(file_path).replace("\\","/").lower()
+                        if stored_path == file_path and os.path.exists(file_path):
+                            if is_in_storage:
+                                sha = file_sha256(file_path)
+                            else:
+                                stored_path, sha, _ = file_store.store(file_path)
+                                adopt(file_path, stored_path)
+                            for it in files:
+                                if it.get("path") == file_path:
+                                    it['stored_path'] = stored_path
+                                    it['sha256'] = sha
+                    except Exception:
+                        stored_path = file_path
 
-                if existing_doc:
-                    file_item["status"] = "Guardado"
-                    skipped += 1
-                    log_add(f"ℹ️ Ya existía documento para: {file_item['name']}")
-                    continue
+                    file_info = {"name": file_item["name"], "path": stored_path, "sha256": sha}
+                    # Evitar duplicados por contenido, o por ruta en documentos sin hash (y por página si viene dividido)
+                    key = (sha, file_item["name"] if file_item.get("page") else None)
+                    try:
+                        page_filter = [Documento.nombre_archivo == file_item["name"]] if file_item.get("page") else []
+                        existing_doc = (sha and key in seen) or find_duplicate(conn, *key)
+                        if not existing_doc:
+                            existing_doc = conn.execute(
+                                select(Documento).where(Documento.ruta_almacenamiento.in_({file_path, stored_path}), *page_filter)  # type: ignore
+                            ).scalars().first()
+                    except Exception:
+                        existing_doc = None
 
-                try:
-                    ids_map = create_full_digital_record(conn, result, file_info, user_id)
-                    file_item["status"] = "Guardado"
-                    file_item["db_ids"] = ids_map
-                    saved += 1
-                    log_add(f"💾 Guardado: {file_item['name']}")
-                except Exception as exc:
-                    file_item["status"] = "Error"
-                    log_add(f"🚨 Error al guardar {file_item['name']}: {exc}")
+                    if existing_doc:
+                        file_item["status"] = "Guardado"
+                        skipped += 1
+                        log_add(f"ℹ️ Ya existía documento para: {file_item['name']}")
+                        continue
 
-            try:
-                conn.close()
-            except Exception:
-                pass
+                    seen.add(key)
+                    to_save.append((file_item, result, file_info))
+
+                # Alta masiva: catálogos y ciudadanos por conjunto, un commit por bloque
+                report = create_full_digital_records_bulk(conn, [(r, fi) for _, r, fi in to_save], user_id)
+                for res in report["results"]:
+                    file_item = to_save[res["index"]][0]
+                    if res["ok"]:
+                        file_item["status"] = "Guardado"
+                        file_item["db_ids"] = {k: res[k] for k in ("ciudadano_id", "servicio_id", "documento_id")}
+                        saved += 1
+                        log_add(f"💾 Guardado: {file_item['name']}")
+                    else:
+                        file_item["status"] = "Error"
+                        log_add(f"🚨 Error al guardar {file_item['name']}: {res['error']}")
+
+                # Lo guardado ya no debe reaparecer al restaurar la cola OCR
+                batch_engine.ack([it["path"] for it in files if it.get("status") == "Guardado"])
             refresh_table()
             update_ocr_buttons()
             show_modal(
@@ -1149,6 +1163,26 @@ def create_digitalizacion_pdf_view(
         btn_ocr_batch.disabled = not any(f.get("status") in {"Pendiente", "Error"} for f in files)
         page.update()
 
+    def request_thumbnail(file_item: Dict[str, Any]) -> None:
+        """Usa la miniatura ya generada o la pide al hilo de miniaturas (refresca la lista al terminar)."""
+        thumb = existing_thumbnail(file_item["path"])
+        file_item["thumb"] = thumb
+        if thumb:
+            return
+
+        def done(_path: str, result: Optional[str], item: Dict[str, Any] = file_item) -> None:
+            item["thumb"] = result
+            if not thumbnails.pending():
+                refresh_table()
+
+        thumbnails.submit(file_item["path"], done)
+
+    def file_icon(file_item: Dict[str, Any], color: str) -> ft.Control:
+        thumb = file_item.get("thumb")
+        if thumb:
+            return ft.Image(src=thumb, width=28, height=36, fit=ft.ImageFit.COVER, border_radius=3, gapless_playback=True)
+        return ft.Icon(ft.Icons.PICTURE_AS_PDF, color=color, size=18)
+
     def refresh_table() -> None:
         files_list.controls.clear()
         update_docs_ref()
@@ -1174,11 +1208,13 @@ def create_digitalizacion_pdf_view(
         for idx, file_item in enumerate(files):
             status = file_item.get("status", "Pendiente")
             is_selected = idx == selected_index
+            if "thumb" not in file_item:
+                request_thumbnail(file_item)
 
             def toggle(event: ft.ControlEvent, index: int = idx) -> None:
                 files[index]["selected"] = event.control.value
 
-            def select(_: ft.ControlEvent, index: int = idx) -> None:
+            def on_select(_: ft.ControlEvent, index: int = idx) -> None:
                 select_file(index)
 
             def remove(_: ft.ControlEvent, index: int = idx) -> None:
@@ -1253,7 +1289,7 @@ def create_digitalizacion_pdf_view(
                 ], spacing=0),
                 expand=True,
                 ink=True,
-                on_click=select,
+                on_click=on_select,
             )
 
             file_card = ft.Container(
@@ -1269,11 +1305,7 @@ def create_digitalizacion_pdf_view(
                         alignment=ft.alignment.center,
                     ),
                     ft.Container(
-                        content=ft.Icon(
-                            ft.Icons.PICTURE_AS_PDF,
-                            color=Colors.PRIMARY if is_selected else Colors.ON_SURFACE_VARIANT,
-                            size=18,
-                        ),
+                        content=file_icon(file_item, Colors.PRIMARY if is_selected else Colors.ON_SURFACE_VARIANT),
                         width=28,
                         alignment=ft.alignment.center,
                     ),
@@ -1308,9 +1340,72 @@ def create_digitalizacion_pdf_view(
 
         page.update()
 
+    def run_ocr_pages(file_item: Dict[str, Any], total_pages: int) -> None:
+        """PDF multipágina: un registro por página, agregado a la lista según llega."""
+        base_name = file_item["name"]
+        file_item.update({"status": "Procesando", "page": 1, "name": f"{base_name} (pág. 1/{total_pages})"})
+        refresh_table()
+        update_ocr_buttons()
+        log_add(f"📄 {base_name}: {total_pages} páginas, extracción por página")
+
+        rows: List[Dict[str, Any]] = [file_item]
+        errors = 0
+
+        # El hilo solo extrae; files, el formulario y la tabla se tocan en el loop de la página
+        async def on_page(n: int, rec: Dict[str, Any]) -> None:
+            nonlocal last_result, selected_index, errors
+            row = file_item
+            if n > 1:
+                # Cada página siguiente es una fila nueva tras la anterior
+                row = {
+                    "name": f"{base_name} (pág. {n}/{total_pages})",
+                    "path": file_item["path"],
+                    "mime": "application/pdf",
+                    "size": file_item.get("size", 0),
+                    "page": n,
+                }
+                prev = rows[-1]
+                pos = files.index(prev) + 1 if prev in files else len(files)
+                files.insert(pos, row)
+                rows.append(row)
+                if selected_index is not None and selected_index >= pos:
+                    selected_index += 1
+            if rec.get("error"):
+                errors += 1
+                row.update({"status": "Error", "result": {}})
+                log_add(f"❌ Página {n}: {rec['error']}")
+            else:
+                row.update({"status": "Procesado", "result": rec})
+            if row is file_item and selected_index is not None and selected_index < len(files) and files[selected_index] is file_item:
+                last_result = rec
+                fill_form(rec)
+            refresh_table()
+
+        async def on_done(exc: Optional[Exception]) -> None:
+            nonlocal errors
+            if exc is not None:
+                if file_item.get("status") == "Procesando":
+                    file_item["status"] = "Error"
+                    refresh_table()
+                log_add(f"🚨 Error en OCR por página: {exc}")
+                errors += 1
+            update_ocr_buttons()
+            log_add(f"✅ {base_name}: {total_pages} páginas procesadas ({errors} con error)")
+
+        def worker() -> None:
+            exc = None
+            try:
+                for rec in extract_pdf_pages(file_item["path"]):
+                    page.run_task(on_page, rec.pop("pagina", None) or 1, rec)
+            except Exception as ex:
+                exc = ex
+            page.run_task(on_done, exc)
+
+        threading.Thread(target=worker, name="ocr-paginas", daemon=True).start()
+
     def run_ocr(_: Optional[ft.ControlEvent] = None) -> None:
         nonlocal last_result
-        if any(f.get("status") == "Procesando" for f in files):
+        if batch_engine.running or any(f.get("status") == "Procesando" for f in files):
             show_modal("Procesando", "Espera a que finalice el OCR en curso.")
             return
         if selected_index is None:
@@ -1325,11 +1420,24 @@ def create_digitalizacion_pdf_view(
             show_modal("Archivo no encontrado", path, ft.Icons.ERROR)
             return
 
+        # Libros escaneados (varias hojas, un ciudadano por hoja): modo por página
+        try:
+            total_pages = contar_paginas(path) if not file_item.get("page") else 1
+        except Exception:
+            total_pages = 1
+        if total_pages > 1:
+            run_ocr_pages(file_item, total_pages)
+            return
+
         try:
             file_item["status"] = "Procesando"
             refresh_table()
             update_ocr_buttons()
-            data = extract_pdf(path)
+            if file_item.get("page"):
+                data = next(extract_pdf_pages(path, [file_item["page"]]), {})
+                data.pop("pagina", None)
+            else:
+                data = extract_pdf(path)
             if isinstance(data, dict) and data.get("error"):
                 file_item["status"] = "Error"
                 refresh_table()
@@ -1350,7 +1458,7 @@ def create_digitalizacion_pdf_view(
             show_modal("Error en OCR", str(exc), ft.Icons.ERROR)
 
     def run_ocr_batch(_: Optional[ft.ControlEvent] = None) -> None:
-        if any(f.get("status") == "Procesando" for f in files):
+        if batch_engine.running or any(f.get("status") == "Procesando" for f in files):
             show_modal("Procesando", "Espera a que finalice el OCR en curso.")
             return
 
@@ -1377,47 +1485,84 @@ def create_digitalizacion_pdf_view(
         safe_open_dialog(dialog)
 
         def process_all() -> None:
-            processed = 0
-            errors = 0
-            for idx in pending:
-                try:
-                    item = files[idx]
-                    path = item["path"]
-                    if not os.path.exists(path):
-                        item["status"] = "Error"
-                        errors += 1
-                        log_add(f"❌ No existe: {item['name']}")
-                        continue
-                    item["status"] = "Procesando"
-                    refresh_table()
-                    page.update()
-                    data = extract_pdf(path)
-                    if isinstance(data, dict) and data.get("error"):
-                        item["status"] = "Error"
-                        errors += 1
-                        log_add(f"❌ Error en OCR: {data.get('mensaje', 'desconocido')}")
-                        continue
-                    item["result"] = data or {}
-                    item["status"] = "Procesado"
-                    processed += 1
-                    if selected_index == idx:
-                        fill_form(item["result"])
-                    refresh_table()
-                    page.update()
-                except Exception as ex:
-                    files[idx]["status"] = "Error"
-                    errors += 1
-                    log_add(f"❌ Error en {files[idx]['name']}: {ex}")
-            update_ocr_buttons()
-            results = ft.AlertDialog(
-                title=ft.Text("✅ Procesamiento Completado"),
-                content=ft.Text(f"Exitosos: {processed}\nErrores: {errors}"),
-                actions=[ft.TextButton("OK", on_click=lambda e: page.close(results))],
-            )
-            page.open(results)
+            batch_engine.on_event = make_batch_handler({idx: files[idx] for idx in pending})
+            batch_engine.start([(idx, files[idx]["path"]) for idx in pending])
+            update_batch_controls()
+
+    def make_batch_handler(targets: Dict[int, Dict[str, Any]]) -> Callable[[BatchEvent], None]:
+        # Los eventos llegan desde hilos del pool (o de pubsub si el lote corre en
+        # segundo plano): se aplican sobre los dicts capturados aquí para no
+        # depender de índices si la lista cambia.
+        routing_start = routing_stats()
+
+        def on_event(ev: BatchEvent) -> None:
+            nonlocal last_result
+            item = targets.get(ev.index) if ev.index is not None else None
+            if ev.kind == "inicio" and item is not None:
+                item["status"] = "Procesando"
+            elif ev.kind == "procesado" and item is not None:
+                item["result"] = ev.result or {}
+                item["status"] = "Procesado"
+                if selected_index is not None and selected_index < len(files) and files[selected_index] is item:
+                    last_result = item["result"]
+                    fill_form(item["result"])
+                log_add(f"✅ OCR {ev.done}/{ev.total}: {item['name']}")
+            elif ev.kind == "error" and item is not None:
+                item["status"] = "Error"
+                log_add(f"❌ Error en {item['name']}: {ev.error}")
+            elif ev.kind == "cancelado" and item is not None:
+                item["status"] = "Pendiente"
+            elif ev.kind == "fin":
+                update_batch_controls()
+                update_ocr_buttons()
+                stats = batch_engine.stats
+                routed = routing_delta(routing_start)
+                results = ft.AlertDialog(
+                    title=ft.Text("⏹️ Procesamiento Cancelado" if batch_engine.cancelled else "✅ Procesamiento Completado"),
+                    content=ft.Text(
+                        f"Exitosos: {stats.processed}\nErrores: {stats.errors}"
+                        + (f"\nCancelados: {stats.cancelled}" if stats.cancelled else "")
+                        + f"\nTiempo: {stats.elapsed:.1f} s"
+                        # Con el trabajador en otro proceso los contadores locales quedan en cero
+                        + (f"\nLocal: {routed['local']} · Remoto: {routed['remote']} · Caché: {routed['cache']}" if any(routed.values()) else "")
+                    ),
+                    actions=[ft.TextButton("OK", on_click=lambda e: page.close(results))],
+                )
+                page.open(results)
+                return
+            refresh_table()
+
+        return on_event
+
+    def toggle_pause_batch(_: Optional[ft.ControlEvent] = None) -> None:
+        if not batch_engine.running:
+            return
+        if batch_engine.paused:
+            batch_engine.resume()
+            log_add("▶️ Lote reanudado")
+        else:
+            batch_engine.pause()
+            log_add("⏸️ Lote en pausa (los PDFs en curso terminarán)")
+        update_batch_controls()
+
+    def cancel_batch(_: Optional[ft.ControlEvent] = None) -> None:
+        if batch_engine.running:
+            batch_engine.cancel()
+            log_add("⏹️ Cancelando lote…")
+            update_batch_controls()
+
+    def update_batch_controls() -> None:
+        running = batch_engine.running and not batch_engine.cancelled
+        btn_pause_batch.visible = running
+        btn_cancel_batch.visible = running
+        btn_pause_batch.text = "Reanudar" if batch_engine.paused else "Pausar"
+        btn_pause_batch.icon = ft.Icons.PLAY_ARROW if batch_engine.paused else ft.Icons.PAUSE
+        page.update()
 
     def clear_all(_: Optional[ft.ControlEvent] = None) -> None:
         nonlocal files, selected_index, last_result
+        batch_engine.cancel()
+        batch_engine.ack([it["path"] for it in files])
         files = []
         selected_index = None
         last_result = None
@@ -1552,6 +1697,10 @@ def create_digitalizacion_pdf_view(
     )
     btn_ocr = create_button("Procesar OCR", ft.Icons.SMART_TOY, "filled", run_ocr, Colors.SECONDARY)
     btn_ocr_batch = create_button("OCR Todo", ft.Icons.AUTO_AWESOME, "outlined", run_ocr_batch, Colors.SECONDARY)
+    btn_pause_batch = create_button("Pausar", ft.Icons.PAUSE, "outlined", toggle_pause_batch, Colors.WARNING)
+    btn_cancel_batch = create_button("Cancelar lote", ft.Icons.STOP, "outlined", cancel_batch, Colors.DANGER)
+    btn_pause_batch.visible = False
+    btn_cancel_batch.visible = False
     btn_clear = create_button("Limpiar Todo", ft.Icons.CLEAR_ALL, "outlined", clear_all, Colors.WARNING)
     btn_save = create_button("Guardar en BD", ft.Icons.SAVE, "filled", save_to_db, Colors.SECONDARY)
     btn_apply = create_button("Aplicar cambios", ft.Icons.CHECK, "outlined", apply_changes, Colors.PRIMARY)
@@ -1580,6 +1729,8 @@ def create_digitalizacion_pdf_view(
                     btn_pick,
                     btn_ocr,
                     btn_ocr_batch,
+                    btn_pause_batch,
+                    btn_cancel_batch,
                     btn_clear,
                 ], spacing=8, wrap=True),
                 ft.Container(files_list, expand=True),
@@ -1644,10 +1795,36 @@ def create_digitalizacion_pdf_view(
     )
 
     def cleanup() -> None:
+        # El lote sigue en el trabajador; al volver a la vista se recupera
+        batch_engine.detach()
         unregister_guard("digitalizacion_pdf")
 
     root.cleanup = cleanup  # type: ignore[attr-defined]
 
+    # Trabajos de una sesión anterior (ventana cerrada o app reiniciada)
+    reattach: Dict[int, Dict[str, Any]] = {}
+    for job in batch_engine.restore():
+        if any(it["path"] == job["path"] for it in files):
+            continue
+        status = {"hecho": "Procesado", "error": "Error"}.get(job["status"], "Procesando")
+        files.append({
+            "name": os.path.basename(job["path"]),
+            "path": job["path"],
+            "mime": "application/pdf",
+            "size": guess_size(job["path"]),
+            "status": status,
+            "result": job.get("result") or {},
+        })
+        if status == "Procesando":
+            reattach[len(files) - 1] = job
+    if files:
+        refresh_table()
+        update_ocr_buttons()
+    if reattach:
+        batch_engine.on_event = make_batch_handler({idx: files[idx] for idx in reattach})
+        batch_engine.attach([(idx, job["id"]) for idx, job in reattach.items()])
+        update_batch_controls()
+
     # Inicialización visual sin forzar updates prematuros
     # (los botones y preview se actualizarán en las acciones del usuario)
 
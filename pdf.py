@@ -1,46 +1,22 @@
-import vertexai
-from vertexai.generative_models import GenerativeModel, Part, HarmCategory, HarmBlockThreshold
 import json
 import base64
 import os
-from typing import Dict, Any
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Any, Iterable, Iterator, Optional, Tuple
 
-# === CONFIGURACIÓN ===
-PROJECT_ID = "ormd-476617"        # ← TU PROJECT ID
-LOCATION = "us-central1"            # o europe-west1, etc.
-KEY_PATH = "ormd-476617-56cca3f6e4a6.json"           # ← Ruta a tu JSON key
-
-def analizar_documento_smv(ruta_documento: str) -> Dict[str, Any]:
-    # AUTENTICACIÓN: Inicializar Vertex AI con credenciales explícitas
-    try:
-        from google.oauth2 import service_account
-        
-        if not os.path.exists(KEY_PATH):
-            return {"error": f"Archivo de clave de servicio no encontrado: {KEY_PATH}", "raw": None}
-        
-        # Cargar credenciales explícitamente
-        credentials = service_account.Credentials.from_service_account_file(KEY_PATH)
-        
-        # Inicializar Vertex AI con credenciales explícitas
-        vertexai.init(project=PROJECT_ID, location=LOCATION, credentials=credentials)
-        print(f"[INFO] Vertex AI inicializado con credenciales del service account: {credentials.service_account_email}")
-    except Exception as e:
-        return {"error": f"Error de autenticación: {e}", "raw": None}
-    # Leer archivo
-    with open(ruta_documento, "rb") as f:
-        file_data = f.read()
+from utils.vertex_client import ClientInitError, get_client
 
-    # MIME type
-    _, ext = os.path.splitext(ruta_documento.lower())
-    mime_type = {
-        '.jpg': 'image/jpeg', '.jpeg': 'image/jpeg',
-        '.png': 'image/png', '.pdf': 'application/pdf'
-    }.get(ext, 'application/octet-stream')
+# === CONFIGURACIÓN ===
+# Proyecto, región y clave JSON: ver utils/vertex_client.py (VERTEX_PROJECT, VERTEX_LOCATION, VERTEX_KEY_PATH)
+MODEL_NAME = "gemini-2.0-flash-001"
 
-    document_part = Part.from_data(data=file_data, mime_type=mime_type)
+# Modo por página: resolución de rasterizado y páginas en vuelo simultáneas
+PAGE_DPI = int(os.getenv("OCR_PAGE_DPI", "200"))
+PAGE_WORKERS = int(os.getenv("OCR_PAGE_WORKERS", "4"))
 
-    # Prompt
-    prompt = """Eres un extractor experto para documentos del Servicio Militar Peruano (SMV) con calidad de escaneo variable y campos manuscritos. Devuelve **SOLO** un JSON válido UTF-8, sin comentarios ni texto extra..
+# Prompt
+PROMPT = """Eres un extractor experto para documentos del Servicio Militar Peruano (SMV) con calidad de escaneo variable y campos manuscritos. Devuelve **SOLO** un JSON válido UTF-8, sin comentarios ni texto extra..
 
 REGLAS:
 1. Solo texto visible.
@@ -68,30 +44,96 @@ SI "presto_servicio" == "SI" → incluir:
   "gran_unidad", "unidad_alta", "unidad_baja", "fecha_alta", "fecha_baja", "grado", "motivo_baja"
 """
 
-    # Modelo
-    model = GenerativeModel("gemini-2.0-flash-001")
+GENERATION_CONFIG = {
+    "response_mime_type": "application/json",
+    "temperature": 0.2,
+    "max_output_tokens": 2048,
+}
 
+def _generar_json(file_data: bytes, mime_type: str) -> Dict[str, Any]:
+    # Cliente compartido: credenciales y vertexai.init solo en la primera llamada
+    raw = None
     try:
-        response = model.generate_content(
-            [document_part, prompt],
-            generation_config={
-                "response_mime_type": "application/json",
-                "temperature": 0.2,
-                "max_output_tokens": 2048,
-            },
-            safety_settings={
-                HarmCategory.HARM_CATEGORY_HATE_SPEECH: HarmBlockThreshold.BLOCK_NONE,
-                HarmCategory.HARM_CATEGORY_DANGEROUS_CONTENT: HarmBlockThreshold.BLOCK_NONE,
-                HarmCategory.HARM_CATEGORY_SEXUALLY_EXPLICIT: HarmBlockThreshold.BLOCK_NONE,
-                HarmCategory.HARM_CATEGORY_HARASSMENT: HarmBlockThreshold.BLOCK_NONE,
-            }
+        raw = get_client().generate(
+            MODEL_NAME,
+            file_data,
+            mime_type,
+            PROMPT,
+            generation_config=GENERATION_CONFIG,
+            block_none_safety=True,
         )
+        return json.loads(raw.strip())
 
-        json_text = response.text.strip()
-        return json.loads(json_text)
-
+    except ClientInitError as e:
+        return {"error": f"Error de autenticación: {e}", "raw": None}
     except Exception as e:
-        return {"error": str(e), "raw": response.text if 'response' in locals() else None}
+        return {"error": str(e), "raw": raw}
+
+def analizar_documento_smv(ruta_documento: str) -> Dict[str, Any]:
+    # Leer archivo
+    with open(ruta_documento, "rb") as f:
+        file_data = f.read()
+
+    # MIME type
+    _, ext = os.path.splitext(ruta_documento.lower())
+    mime_type = {
+        '.jpg': 'image/jpeg', '.jpeg': 'image/jpeg',
+        '.png': 'image/png', '.pdf': 'application/pdf'
+    }.get(ext, 'application/octet-stream')
+
+    return _generar_json(file_data, mime_type)
+
+
+# === MODO POR PÁGINA ===
+def contar_paginas(ruta_pdf: str) -> int:
+    import fitz  # PyMuPDF
+    with fitz.open(ruta_pdf) as doc:
+        return doc.page_count
+
+def iterar_paginas(ruta_pdf: str, dpi: Optional[int] = None,
+                   paginas: Optional[Iterable[int]] = None) -> Iterator[Tuple[int, bytes]]:
+    """Rasteriza el PDF página a página (PNG en gris) sin cargarlo entero en memoria.
+
+    `paginas` limita a esos números (1-based). Produce (número, png).
+    """
+    import fitz  # PyMuPDF
+    dpi = dpi or PAGE_DPI
+    with fitz.open(ruta_pdf) as doc:
+        numeros = sorted(set(paginas)) if paginas is not None else range(1, doc.page_count + 1)
+        for n in numeros:
+            if not 1 <= n <= doc.page_count:
+                continue
+            pix = doc.load_page(n - 1).get_pixmap(dpi=dpi, colorspace=fitz.csGRAY)
+            yield n, pix.tobytes("png")
+
+def analizar_documento_smv_por_pagina(ruta_pdf: str, dpi: Optional[int] = None,
+                                      max_workers: Optional[int] = None,
+                                      paginas: Optional[Iterable[int]] = None) -> Iterator[Dict[str, Any]]:
+    """Extrae un registro por página, en paralelo, y los produce en orden de página.
+
+    Solo hay `max_workers * 2` páginas rasterizadas en memoria a la vez, así que
+    el consumo es plano aunque el libro tenga decenas de hojas. Cada registro
+    lleva `pagina` (1-based).
+    """
+    max_workers = max(1, max_workers or PAGE_WORKERS)
+    pendientes: deque = deque()
+    with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="ocr-pag") as pool:
+        for n, png in iterar_paginas(ruta_pdf, dpi, paginas):
+            pendientes.append((n, pool.submit(_generar_json, png, "image/png")))
+            # Se entrega lo ya terminado en cabeza; con la ventana llena se espera
+            # (no rasterizar más de lo que se puede enviar)
+            while pendientes and (pendientes[0][1].done() or len(pendientes) >= max_workers * 2):
+                n0, fut = pendientes.popleft()
+                yield {**_como_dict(fut.result()), "pagina": n0}
+        while pendientes:
+            n0, fut = pendientes.popleft()
+            yield {**_como_dict(fut.result()), "pagina": n0}
+
+def _como_dict(res: Any) -> Dict[str, Any]:
+    # El modelo a veces responde una lista: se toma el primer objeto
+    if isinstance(res, list):
+        res = next((r for r in res if isinstance(r, dict)), {})
+    return res if isinstance(res, dict) else {}
 
 
 # === USO ===
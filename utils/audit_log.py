@@ -0,0 +1,293 @@
+# utils/audit_log.py
+# -*- coding: utf-8 -*-
+"""Auditoría (búsquedas, consultas y eliminaciones) en SQLite por meses.
+
+Cada mes es un archivo `storage/data/logs/auditoria-AAAA-MM.sqlite3` con una
+tabla `eventos` (ts ISO, acción, usuario, texto de búsqueda en minúsculas y
+el registro completo en JSON) e índices por fecha, acción+fecha y
+usuario+fecha. Un evento va al segmento del mes de su `ts`.
+
+Consultas paginadas del más nuevo al más viejo: se recorren los segmentos
+del rango de fechas en orden descendente y en cada uno se pide con
+ORDER BY ts DESC, id DESC LIMIT (keyset: el cursor es (mes, ts, id)), así
+que abrir la pantalla o pasar de página no depende del tamaño del
+historial. El filtro de texto (instr sobre la columna `texto`) solo recorre
+los segmentos necesarios para llenar la página.
+
+Rotación: con AUDIT_RETENTION_MONTHS > 0, los segmentos más viejos se mueven
+a `logs/archivo/` (no se borran ni se consultan). Los consultas.jsonl y
+auditoria_eliminaciones.jsonl anteriores se importan una vez (idempotente:
+cada línea lleva su sha1 en una columna única) y se renombran a
+`.importado`.
+"""
+import hashlib
+import json
+import os
+import re
+import shutil
+import sqlite3
+import threading
+from dataclasses import dataclass
+from datetime import date, datetime, timedelta
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple
+
+AUDIT_DIR = os.getenv("AUDIT_DIR", os.path.join("storage", "data", "logs"))
+AUDIT_RETENTION_MONTHS = int(os.getenv("AUDIT_RETENTION_MONTHS", "0"))  # 0 = todo el historial
+PAGE_SIZE = 30
+COUNT_CAP = 10_000  # el conteo se corta aquí ("10000+")
+IMPORT_BATCH = 5000
+
+LEGACY_FILES = ("consultas.jsonl", "auditoria_eliminaciones.jsonl")
+_TEXT_FIELDS = ("usuario", "rol", "query", "dni", "apellidos", "nombres", "accion",
+                "id_ciudadano", "removed_docs", "removed_files")
+_SEGMENT = re.compile(r"^auditoria-(\d{4}-\d{2})\.sqlite3$")
+
+_SCHEMA = [
+    "CREATE TABLE IF NOT EXISTS eventos ("
+    " id INTEGER PRIMARY KEY, ts TEXT NOT NULL, accion TEXT NOT NULL, usuario TEXT,"
+    " texto TEXT NOT NULL, datos TEXT NOT NULL, clave TEXT UNIQUE)",
+    "CREATE INDEX IF NOT EXISTS ix_eventos_ts ON eventos (ts)",
+    "CREATE INDEX IF NOT EXISTS ix_eventos_accion_ts ON eventos (accion, ts)",
+    "CREATE INDEX IF NOT EXISTS ix_eventos_usuario_ts ON eventos (usuario, ts)",
+]
+
+Cursor = Tuple[str, str, int]  # (mes, ts, id) del último evento entregado
+
+
+@dataclass
+class AuditQuery:
+    acciones: Optional[Sequence[str]] = None
+    usuario: Optional[str] = None
+    desde: Optional[date] = None
+    hasta: Optional[date] = None   # inclusive
+    texto: str = ""
+
+    def months(self) -> Tuple[str, str]:
+        lo = self.desde.strftime("%Y-%m") if self.desde else "0000-00"
+        hi = self.hasta.strftime("%Y-%m") if self.hasta else "9999-99"
+        return lo, hi
+
+    def where(self) -> Tuple[List[str], List[Any]]:
+        cond, params = [], []
+        if self.acciones:
+            cond.append(f"accion IN ({', '.join('?' * len(self.acciones))})")
+            params.extend(self.acciones)
+        if self.usuario:
+            cond.append("usuario = ?")
+            params.append(self.usuario)
+        if self.desde:
+            cond.append("ts >= ?")
+            params.append(self.desde.isoformat())
+        if self.hasta:
+            cond.append("ts < ?")
+            params.append((self.hasta + timedelta(days=1)).isoformat())
+        if self.texto.strip():
+            cond.append("instr(texto, ?) > 0")
+            params.append(self.texto.strip().lower())
+        return cond, params
+
+
+def _row(rec: Dict[str, Any], clave: Optional[str] = None) -> Tuple:
+    ts = str(rec.get("ts") or datetime.now().isoformat())
+    texto = " ".join(str(rec.get(k) or "") for k in _TEXT_FIELDS).lower()
+    return (ts, str(rec.get("accion") or ""), rec.get("usuario"), texto,
+            json.dumps(rec, ensure_ascii=False, default=str), clave)
+
+
+class AuditLog:
+    def __init__(self, root: str = AUDIT_DIR, retention_months: int = AUDIT_RETENTION_MONTHS):
+        self.root = root
+        self.retention_months = retention_months
+        self._lock = threading.RLock()
+        self._conns: Dict[str, sqlite3.Connection] = {}
+        self._ready = False
+
+    # ------------------- segmentos -------------------
+    def _path(self, month: str) -> str:
+        return os.path.join(self.root, f"auditoria-{month}.sqlite3")
+
+    def segments(self) -> List[str]:
+        """Meses con segmento, del más nuevo al más viejo."""
+        try:
+            names = os.listdir(self.root)
+        except OSError:
+            return []
+        return sorted((m.group(1) for m in map(_SEGMENT.match, names) if m), reverse=True)
+
+    def _conn(self, month: str) -> sqlite3.Connection:
+        conn = self._conns.get(month)
+        if conn is None:
+            os.makedirs(self.root, exist_ok=True)
+            conn = sqlite3.connect(self._path(month), check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            for ddl in _SCHEMA:
+                conn.execute(ddl)
+            conn.commit()
+            self._conns[month] = conn
+        return conn
+
+    def ensure(self) -> None:
+        """Importa los .jsonl anteriores y rota, una vez por proceso."""
+        if self._ready:
+            return
+        with self._lock:
+            if self._ready:
+                return
+            self.import_legacy()
+            self.rotate()
+            self._ready = True
+
+    # ------------------- escritura -------------------
+    def record(self, rec: Dict[str, Any]) -> None:
+        self.record_many([rec])
+
+    def record_many(self, recs, claves: Optional[Sequence[Optional[str]]] = None) -> int:
+        """Inserta eventos (cada uno en el segmento de su mes). Devuelve los nuevos."""
+        by_month: Dict[str, List[Tuple]] = {}
+        for i, rec in enumerate(recs):
+            row = _row(rec, claves[i] if claves else None)
+            by_month.setdefault(row[0][:7], []).append(row)
+        added = 0
+        with self._lock:
+            for month, rows in by_month.items():
+                conn = self._conn(month)
+                before = conn.total_changes
+                conn.executemany(
+                    "INSERT OR IGNORE INTO eventos (ts, accion, usuario, texto, datos, clave) VALUES (?, ?, ?, ?, ?, ?)", rows)
+                conn.commit()
+                added += conn.total_changes - before
+        return added
+
+    def import_legacy(self) -> int:
+        """Importa los .jsonl anteriores y los renombra a .importado."""
+        added = 0
+        for name in LEGACY_FILES:
+            path = os.path.join(self.root, name)
+            if not os.path.exists(path):
+                continue
+            recs, claves = [], []
+            with open(path, "rb") as f:
+                for line in f:
+                    try:
+                        rec = json.loads(line)
+                    except ValueError:
+                        continue
+                    if not isinstance(rec, dict):
+                        continue
+                    recs.append(rec)
+                    claves.append(hashlib.sha1(line.strip()).hexdigest())
+                    if len(recs) >= IMPORT_BATCH:
+                        added += self.record_many(recs, claves)
+                        recs, claves = [], []
+            added += self.record_many(recs, claves)
+            done = path + ".importado"
+            if os.path.exists(done):
+                done = f"{path}.{datetime.now().strftime('%Y%m%d_%H%M%S')}.importado"
+            os.replace(path, done)
+        return added
+
+    def rotate(self, keep_months: Optional[int] = None) -> List[str]:
+        """Mueve a `archivo/` los segmentos fuera de la retención. Devuelve los meses movidos."""
+        keep = self.retention_months if keep_months is None else keep_months
+        if keep <= 0:
+            return []
+        today = date.today()
+        y, m = divmod(today.year * 12 + today.month - 1 - (keep - 1), 12)
+        cutoff = f"{y:04d}-{m + 1:02d}"
+        moved = []
+        archive = os.path.join(self.root, "archivo")
+        with self._lock:
+            for month in self.segments():
+                if month >= cutoff:
+                    continue
+                conn = self._conns.pop(month, None)
+                if conn is not None:
+                    conn.close()
+                os.makedirs(archive, exist_ok=True)
+                for suffix in ("", "-wal", "-shm"):
+                    src = self._path(month) + suffix
+                    if os.path.exists(src):
+                        shutil.move(src, os.path.join(archive, os.path.basename(src)))
+                moved.append(month)
+        return moved
+
+    # ------------------- lectura -------------------
+    def query(self, q: AuditQuery, cursor: Optional[Cursor] = None,
+              limit: int = PAGE_SIZE) -> Tuple[List[Dict[str, Any]], Optional[Cursor]]:
+        """Una página de eventos (más nuevos primero) y el cursor de la siguiente (None si no hay)."""
+        self.ensure()
+        lo, hi = q.months()
+        cond, params = q.where()
+        out: List[Tuple[str, str, int, str]] = []
+        with self._lock:
+            for month in self.segments():
+                if not (lo <= month <= hi) or (cursor and month > cursor[0]):
+                    continue
+                where, args = list(cond), list(params)
+                if cursor and month == cursor[0]:
+                    where.append("(ts, id) < (?, ?)")
+                    args += [cursor[1], cursor[2]]
+                sql = "SELECT ts, id, datos FROM eventos"
+                if where:
+                    sql += " WHERE " + " AND ".join(where)
+                sql += " ORDER BY ts DESC, id DESC LIMIT ?"
+                rows = self._conn(month).execute(sql, args + [limit + 1 - len(out)]).fetchall()
+                out.extend((month, ts, pk, datos) for ts, pk, datos in rows)
+                if len(out) > limit:
+                    break
+        more = len(out) > limit
+        out = out[:limit]
+        events = []
+        for _, _, _, datos in out:
+            try:
+                events.append(json.loads(datos))
+            except ValueError:
+                continue
+        nxt = (out[-1][0], out[-1][1], out[-1][2]) if more and out else None
+        return events, nxt
+
+    def iter_events(self, q: AuditQuery, batch: int = 1000) -> Iterator[Dict[str, Any]]:
+        """Todos los eventos que cumplen `q`, por páginas (exportación)."""
+        cursor = None
+        while True:
+            events, cursor = self.query(q, cursor, batch)
+            yield from events
+            if cursor is None:
+                return
+
+    def count(self, q: AuditQuery, cap: int = COUNT_CAP) -> int:
+        """Eventos que cumplen `q`, cortado en `cap`."""
+        self.ensure()
+        lo, hi = q.months()
+        cond, params = q.where()
+        total = 0
+        with self._lock:
+            for month in self.segments():
+                if not (lo <= month <= hi) or total >= cap:
+                    continue
+                sql = "SELECT count(*) FROM (SELECT 1 FROM eventos"
+                if cond:
+                    sql += " WHERE " + " AND ".join(cond)
+                sql += " LIMIT ?)"
+                total += self._conn(month).execute(sql, params + [cap - total]).fetchone()[0]
+        return min(total, cap)
+
+    def users(self) -> List[str]:
+        """Usuarios con eventos en el historial (índice usuario+fecha)."""
+        self.ensure()
+        found = set()
+        with self._lock:
+            for month in self.segments():
+                found.update(u for u, in self._conn(month).execute(
+                    "SELECT DISTINCT usuario FROM eventos WHERE usuario IS NOT NULL"))
+        return sorted(found, key=str.lower)
+
+    def close(self) -> None:
+        with self._lock:
+            for conn in self._conns.values():
+                conn.close()
+            self._conns.clear()
+
+
+audit_log = AuditLog()
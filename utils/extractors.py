@@ -1,10 +1,33 @@
 # utils/extractors.py
 # -*- coding: utf-8 -*-
+import hashlib
 import json
-from typing import Any, Dict
+import os
+import re
+import threading
+import time
+from collections import Counter
+from datetime import date, datetime
+from typing import Any, Dict, Iterator, List, Optional, Tuple
 
-from jpg import preprocess_image, extract_with_gemini as _jpg_extract
-from pdf import analizar_documento_smv as _pdf_extract
+from jpg import preprocess_image, extract_with_gemini as _jpg_extract, PROMPT as _JPG_PROMPT, MODEL_NAME as _JPG_MODEL, PREPROCESS_SIGNATURE as _JPG_PREPROCESS
+from pdf import analizar_documento_smv as _pdf_extract, PROMPT as _PDF_PROMPT, MODEL_NAME as _PDF_MODEL
+from pdf import analizar_documento_smv_por_pagina as _pdf_pages, contar_paginas, PAGE_DPI as _PDF_PAGE_DPI
+from utils.ocr_cache import cache as ocr_cache, version_key
+from utils.ocr_smv import OCRConfig, extract_tesseract_detailed, ROIS as _LOCAL_ROIS, FIELD_PATTERNS as _LOCAL_PATTERNS
+
+# Versión de extracción: cambiar prompt, modelo o preprocesado invalida la caché
+IMAGE_VERSION = version_key("image", _JPG_PROMPT, _JPG_MODEL, _JPG_PREPROCESS)
+PDF_VERSION = version_key("pdf", _PDF_PROMPT, _PDF_MODEL)
+PDF_PAGE_VERSION = version_key("pdf-page", _PDF_PROMPT, _PDF_MODEL, str(_PDF_PAGE_DPI))
+
+# Enrutamiento: "hybrid" (local primero, remoto solo si falla), "remote" o "local"
+ROUTING_MODE = os.getenv("OCR_ROUTING", "hybrid").strip().lower()
+# Confianza mínima de Tesseract (0-100) para aceptar un campo leído en local
+MIN_LOCAL_CONFIDENCE = float(os.getenv("OCR_MIN_CONFIDENCE", "70"))
+# Campos que el motor local debe resolver para no escalar al modelo remoto
+REQUIRED_FIELDS = ("apellidos", "nombres")
+LOCAL_VERSION = version_key("local", repr(_LOCAL_ROIS), repr(_LOCAL_PATTERNS), str(MIN_LOCAL_CONFIDENCE), ",".join(REQUIRED_FIELDS))
 
 # Alias que pueden venir del modelo
 ALIASES = {
@@ -67,13 +90,233 @@ def _coerce_to_dict(obj: Any) -> Dict[str, Any]:
     out["presto_servicio"] = "SI" if str(out.get("presto_servicio") or "").upper() == "SI" else "NO"
     return out
 
+def _cache_key(path: str, version: str) -> Optional[str]:
+    try:
+        return ocr_cache.make_key(path, version)
+    except OSError:
+        return None
+
+def _has_data(out: Dict[str, Any]) -> bool:
+    """¿Algún campo con valor? Una respuesta vacía (o todo en null) no se guarda en caché."""
+    return any(out.get(k) not in (None, "") for k in BASE if k != "presto_servicio") or out.get("presto_servicio") == "SI"
+
+def _cached(path: str, version: str, run) -> Dict[str, Any]:
+    """Devuelve el resultado en caché o ejecuta `run` y guarda si no hubo error ni quedó vacío."""
+    key = _cache_key(path, version)
+    if key:
+        hit = ocr_cache.get(key)
+        if hit is not None:
+            return _coerce_to_dict(hit)
+    raw = run()
+    out = _coerce_to_dict(raw)
+    if key and raw and not out.get("error") and _has_data(out):
+        ocr_cache.put(key, out)
+    return out
+
+# ---------------------------------------------------------------------
+# Validación de formatos SMV
+# ---------------------------------------------------------------------
+def _valid_dni(v: str) -> bool:
+    return bool(re.fullmatch(r"\d{11}", v)) and 6 <= len(v.lstrip("0")) <= 8
+
+def _valid_lm(v: str) -> bool:
+    return bool(re.fullmatch(r"\d{10,11}", v)) and len(v.lstrip("0")) >= 6
+
+def _valid_or(v: str) -> bool:
+    return bool(re.fullmatch(r"\d{3}[A-Z]", v))
+
+def _valid_clase(v: str) -> bool:
+    return bool(re.fullmatch(r"\d{4}", v)) and 1900 <= int(v) <= date.today().year
+
+def _valid_fecha(v: str) -> bool:
+    try:
+        return 1900 <= datetime.strptime(v, "%d/%m/%Y").year <= date.today().year
+    except ValueError:
+        return False
+
+VALIDATORS = {
+    "dni": _valid_dni, "lm": _valid_lm, "or": _valid_or, "clase": _valid_clase,
+    "fecha_nacimiento": _valid_fecha, "fecha_alta": _valid_fecha, "fecha_baja": _valid_fecha,
+}
+
+def failing_fields(result: Dict[str, Any], confidence: Dict[str, float]) -> List[str]:
+    """Campos por los que una lectura local no es aceptable.
+
+    Falla un campo con valor si su confianza es baja o no cumple el formato;
+    además deben estar los REQUIRED_FIELDS y al menos uno de DNI/LM válido.
+    """
+    failed = []
+    for k, v in result.items():
+        if k not in BASE or k == "presto_servicio" or v in (None, ""):
+            continue
+        if confidence.get(k, 0.0) < MIN_LOCAL_CONFIDENCE:
+            failed.append(k)
+        elif k in VALIDATORS and not VALIDATORS[k](str(v)):
+            failed.append(k)
+    for k in REQUIRED_FIELDS:
+        if not result.get(k) and k not in failed:
+            failed.append(k)
+    if not any(result.get(k) and k not in failed for k in ("dni", "lm")):
+        failed.append("dni_o_lm")
+    return failed
+
+# ---------------------------------------------------------------------
+# Enrutamiento híbrido local → remoto
+# ---------------------------------------------------------------------
+_routing_lock = threading.Lock()
+_routing = Counter()
+_failed_fields = Counter()
+_local_disabled = False
+
+def _count(**inc) -> None:
+    with _routing_lock:
+        for k, v in inc.items():
+            _routing[k] += v
+
+def _engine_missing(e: Exception) -> bool:
+    """¿El error es por falta del motor (no del archivo)? TesseractNotFoundError es un OSError."""
+    if isinstance(e, ImportError):
+        return True
+    try:
+        from pytesseract import TesseractNotFoundError
+    except ImportError:
+        return False
+    return isinstance(e, TesseractNotFoundError)
+
+def _local_pass(path: str) -> Optional[Tuple[Dict[str, Any], Dict[str, float]]]:
+    """Lectura con Tesseract; None si el motor local no está disponible o falla."""
+    global _local_disabled
+    if _local_disabled:
+        return None
+    t0 = time.perf_counter()
+    try:
+        res = extract_tesseract_detailed(path, OCRConfig(engine="tesseract"))
+    except Exception as e:
+        if _engine_missing(e):
+            # pytesseract o el binario de Tesseract ausentes: no reintentar en cada documento
+            print(f"[WARN] Motor OCR local no disponible, se usa solo el remoto: {e}")
+            _local_disabled = True
+            return None
+        # Archivo ilegible u otro error de este documento: solo este va al remoto
+        print(f"[WARN] Falló el OCR local en {path}: {e}")
+        _count(local_error=1)
+        return None
+    finally:
+        _count(local_seconds=time.perf_counter() - t0)
+    return res
+
+def _routed(path: str, version: str, run) -> Dict[str, Any]:
+    """Caché → pasada local → modelo remoto solo para lo que la local no resuelve."""
+    if ROUTING_MODE == "remote":
+        return _cached(path, version, run)
+
+    remote_key = _cache_key(path, version)
+    local_key = _cache_key(path, LOCAL_VERSION)
+    for key in (remote_key, local_key):
+        hit = ocr_cache.get(key) if key else None
+        if hit is not None:
+            _count(cache=1)
+            return _coerce_to_dict(hit)
+
+    local = _local_pass(path)
+    if local is not None:
+        out, confidence = local
+        failed = failing_fields(out, confidence)
+        if not failed or ROUTING_MODE == "local":
+            _count(local=1)
+            out = _coerce_to_dict(out)
+            if local_key and _has_data(out):
+                ocr_cache.put(local_key, out)
+            return out
+        with _routing_lock:
+            _failed_fields.update(failed)
+
+    t0 = time.perf_counter()
+    raw = run()
+    _count(remote=1, remote_seconds=time.perf_counter() - t0)
+    out = _coerce_to_dict(raw)
+    if not raw or out.get("error"):
+        return out
+    if local is not None:
+        # Completa huecos del remoto con campos locales que sí pasaron la validación
+        l_out, _ = local
+        for k in BASE:
+            if out.get(k) in (None, "") and l_out.get(k) and k not in failed:
+                out[k] = l_out[k]
+    if remote_key and _has_data(out):
+        ocr_cache.put(remote_key, out)
+    return out
+
+def routing_stats() -> Dict[str, Any]:
+    """Decisiones de enrutamiento y ahorro estimado de llamadas remotas."""
+    with _routing_lock:
+        r = dict(_routing)
+        failed = dict(_failed_fields.most_common())
+    local, remote = int(r.get("local", 0)), int(r.get("remote", 0))
+    decided = local + remote
+    avg_remote = r.get("remote_seconds", 0.0) / remote if remote else None
+    return {
+        "mode": ROUTING_MODE,
+        "local_available": not _local_disabled,
+        "local": local,
+        "remote": remote,
+        "cache": int(r.get("cache", 0)),
+        "local_error": int(r.get("local_error", 0)),
+        "remote_calls_saved": local,
+        "remote_ratio": round(remote / decided, 3) if decided else 0.0,
+        "local_seconds": round(r.get("local_seconds", 0.0), 2),
+        "remote_seconds": round(r.get("remote_seconds", 0.0), 2),
+        # Tiempo remoto evitado estimado con la latencia media observada
+        "remote_seconds_saved": round(avg_remote * local, 2) if avg_remote else None,
+        "failed_fields": failed,
+    }
+
+def routing_delta(before: Dict[str, Any]) -> Dict[str, int]:
+    """Decisiones tomadas desde la instantánea `before` de routing_stats() (p.ej. un lote)."""
+    now = routing_stats()
+    return {k: now[k] - before.get(k, 0) for k in ("local", "remote", "cache", "local_error")}
+
+def reset_routing_stats() -> None:
+    with _routing_lock:
+        _routing.clear()
+        _failed_fields.clear()
+
 def extract_image(path: str) -> Dict[str, Any]:
     """Imagen (JPG/PNG) → dict normalizado."""
-    processed = preprocess_image(path)
-    data = _jpg_extract(processed)
-    return _coerce_to_dict(data)
+    return _routed(path, IMAGE_VERSION, lambda: _jpg_extract(preprocess_image(path)))
 
 def extract_pdf(path: str) -> Dict[str, Any]:
     """PDF → dict normalizado."""
-    data = _pdf_extract(path)
-    return _coerce_to_dict(data)
+    return _routed(path, PDF_VERSION, lambda: _pdf_extract(path))
+
+def extract_pdf_pages(path: str, pages: Optional[List[int]] = None) -> Iterator[Dict[str, Any]]:
+    """PDF multipágina → un dict normalizado por página (con `pagina`), en orden.
+
+    Las páginas ya cacheadas no se rasterizan ni se envían; el resto se
+    extrae en streaming con pdf.analizar_documento_smv_por_pagina.
+    `pages` limita a esos números (1-based).
+    """
+    total = contar_paginas(path)
+    numbers = sorted(n for n in set(pages) if 1 <= n <= total) if pages else list(range(1, total + 1))
+    base = _cache_key(path, PDF_PAGE_VERSION)
+    keys = {n: hashlib.sha256(f"{base}:{n}".encode("ascii")).hexdigest() for n in numbers} if base else {}
+    hits = {}
+    for n, key in keys.items():
+        hit = ocr_cache.get(key)
+        if hit is not None:
+            hits[n] = {**_coerce_to_dict(hit), "pagina": n}
+    missing = [n for n in numbers if n not in hits]
+    stream = _pdf_pages(path, paginas=missing) if missing else iter(())
+    for n in numbers:
+        if n in hits:
+            yield hits[n]
+            continue
+        raw = next(stream)
+        out = {**_coerce_to_dict(raw), "pagina": raw.get("pagina", n)}
+        if keys and any(v not in (None, "") for k, v in raw.items() if k != "pagina") and not out.get("error"):
+            ocr_cache.put(keys[n], out)
+        yield out
+
+def cache_stats() -> Dict[str, Any]:
+    """Contadores de la caché OCR (aciertos, fallos, tamaño)."""
+    return ocr_cache.stats()
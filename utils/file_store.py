@@ -0,0 +1,121 @@
+# utils/file_store.py
+# -*- coding: utf-8 -*-
+"""Almacén de archivos de documentos direccionado por contenido.
+
+Cada archivo se guarda una sola vez en
+`storage/data/objects/<aa>/<bb>/<sha256><ext>` (ext en minúsculas). Guardar
+dos veces los mismos bytes —aunque vengan con otro nombre— devuelve el
+objeto existente sin copiar nada; varios Documento pueden compartir ruta,
+así que un archivo solo se borra cuando ningún Documento lo referencia
+(ver database/file_index.py).
+
+El objeto nuevo se crea, en este orden, como:
+  - enlace duro, solo si el origen ya está en storage (p. ej. archivos
+    anteriores al almacén que se migran); nunca con archivos del usuario,
+    que podrían editarse después fuera de la aplicación;
+  - reflink (FICLONE: Btrfs, XFS) en Linux, copia sin duplicar bloques;
+  - copia normal.
+Se escribe en un temporal y se renombra: no quedan objetos a medias.
+
+Los objetos viven bajo storage/data, así que conservan su miniatura al lado
+(utils/thumbnails.py).
+"""
+import os
+import shutil
+import threading
+from typing import Optional, Tuple
+
+from utils.ocr_cache import file_sha256
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None  # type: ignore
+
+STORAGE_DIR = os.path.join("storage", "data")
+OBJECTS_DIR = os.getenv("FILE_STORE_DIR", os.path.join(STORAGE_DIR, "objects"))
+FICLONE = 0x40049409  # linux/fs.h
+
+_lock = threading.Lock()
+
+
+def object_path(sha: str, ext: str = "") -> str:
+    return os.path.join(OBJECTS_DIR, sha[:2], sha[2:4], sha + ext.lower())
+
+
+def find(sha: str) -> Optional[str]:
+    """Objeto existente con ese contenido (cualquier extensión) o None."""
+    folder = os.path.dirname(object_path(sha))
+    try:
+        names = os.listdir(folder)
+    except OSError:
+        return None
+    for name in names:
+        if name.startswith(sha) and not name.endswith(".tmp") and ".thumb." not in name:
+            return os.path.join(folder, name)
+    return None
+
+
+def is_object(path: Optional[str]) -> bool:
+    if not path:
+        return False
+    try:
+        return os.path.commonpath([os.path.abspath(path), os.path.abspath(OBJECTS_DIR)]) == os.path.abspath(OBJECTS_DIR)
+    except ValueError:
+        return False
+
+
+def in_storage(path: str) -> bool:
+    try:
+        return os.path.commonpath([os.path.abspath(path), os.path.abspath(STORAGE_DIR)]) == os.path.abspath(STORAGE_DIR)
+    except ValueError:
+        return False
+
+
+def _reflink(src: str, dest: str) -> bool:
+    if fcntl is None:
+        return False
+    try:
+        with open(src, "rb") as fi, open(dest, "wb") as fo:
+            fcntl.ioctl(fo.fileno(), FICLONE, fi.fileno())
+        shutil.copystat(src, dest)
+        return True
+    except OSError:
+        try:
+            os.remove(dest)
+        except OSError:
+            pass
+        return False
+
+
+def store(src: str, sha: Optional[str] = None) -> Tuple[str, str, bool]:
+    """Guarda `src` en el almacén. Devuelve (ruta del objeto, sha256, creado).
+
+    `creado` es False si ya había un objeto con el mismo contenido.
+    """
+    sha = sha or file_sha256(src)
+    existing = find(sha)
+    if existing:
+        return existing, sha, False
+    dest = object_path(sha, os.path.splitext(src)[1])
+    os.makedirs(os.path.dirname(dest), exist_ok=True)
+    with _lock:
+        existing = find(sha)
+        if existing:
+            return existing, sha, False
+        tmp = f"{dest}.{threading.get_ident()}.tmp"
+        try:
+            linked = False
+            if in_storage(src):
+                try:
+                    os.link(src, tmp)
+                    linked = True
+                except OSError:
+                    pass
+            if not linked and not _reflink(src, tmp):
+                shutil.copy2(src, tmp)
+            os.replace(tmp, dest)
+        finally:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+    return dest, sha, True
@@ -0,0 +1,210 @@
+# utils/ocr_batch.py
+# -*- coding: utf-8 -*-
+"""Motor de OCR en lote con un pool acotado de hilos.
+
+Las vistas de digitalización entregan una lista de rutas y un extractor
+(`extract_pdf` / `extract_image`); el motor procesa los archivos en paralelo
+hasta `max_workers` a la vez y notifica cada avance mediante `on_event`.
+El extractor es inyectable, así que el motor puede medirse con un extractor
+falso local sin llamar a Vertex (ver `bench_ocr_batch.py`).
+"""
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional
+
+# Límite por defecto de archivos procesados a la vez
+DEFAULT_MAX_WORKERS = int(os.getenv("OCR_MAX_WORKERS", "4"))
+
+
+@dataclass
+class BatchEvent:
+    """Evento de progreso emitido por el motor.
+
+    kind: "inicio" | "procesado" | "error" | "cancelado" | "fin"
+    """
+    kind: str
+    index: Optional[int] = None
+    path: Optional[str] = None
+    result: Optional[Dict[str, Any]] = None
+    error: Optional[str] = None
+    done: int = 0
+    total: int = 0
+
+
+@dataclass
+class BatchStats:
+    total: int = 0
+    processed: int = 0
+    errors: int = 0
+    cancelled: int = 0
+    started_at: float = 0.0
+    finished_at: float = 0.0
+    durations: List[float] = field(default_factory=list)
+
+    @property
+    def elapsed(self) -> float:
+        end = self.finished_at or time.perf_counter()
+        return max(0.0, end - self.started_at) if self.started_at else 0.0
+
+    @property
+    def throughput(self) -> float:
+        """Archivos terminados por segundo."""
+        el = self.elapsed
+        return (self.processed + self.errors) / el if el else 0.0
+
+
+class OCRBatchEngine:
+    """Ejecuta un extractor sobre varios archivos con concurrencia acotada.
+
+    - `start(items)` lanza el lote en segundo plano y retorna de inmediato.
+    - `pause()` / `resume()` detienen el arranque de nuevos archivos; los que
+      ya están en curso terminan normalmente.
+    - `cancel()` descarta los archivos que aún no comenzaron.
+    - `wait()` bloquea hasta el final (útil en scripts y benchmarks).
+
+    `items` es una lista de tuplas (index, path); el índice es el de la tabla
+    de la vista, de modo que los eventos se aplican directo a `files[index]`.
+    Los callbacks se invocan desde hilos del pool: deben ser breves.
+    """
+
+    def __init__(
+        self,
+        extractor: Callable[[str], Dict[str, Any]],
+        on_event: Optional[Callable[[BatchEvent], None]] = None,
+        max_workers: Optional[int] = None,
+    ):
+        self.extractor = extractor
+        self.on_event = on_event
+        self.max_workers = max(1, int(max_workers or DEFAULT_MAX_WORKERS))
+        self.stats = BatchStats()
+        self._resume = threading.Event()
+        self._resume.set()
+        self._cancel = threading.Event()
+        self._lock = threading.Lock()
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._pending = 0
+        self._finished = threading.Event()
+        self._finished.set()
+
+    # ------------------- Estado -------------------
+    @property
+    def running(self) -> bool:
+        return not self._finished.is_set()
+
+    @property
+    def paused(self) -> bool:
+        return not self._resume.is_set()
+
+    @property
+    def cancelled(self) -> bool:
+        return self._cancel.is_set()
+
+    # ------------------- Control -------------------
+    def start(self, items: List[tuple]) -> None:
+        if self.running:
+            raise RuntimeError("Ya hay un lote en ejecución.")
+        items = list(items)
+        self.stats = BatchStats(total=len(items), started_at=time.perf_counter())
+        self._cancel.clear()
+        self._resume.set()
+        if not items:
+            self._finish()
+            return
+        self._finished.clear()
+        self._pending = len(items)
+        self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="ocr-batch")
+        for index, path in items:
+            self._executor.submit(self._run_one, index, path)
+        # No bloquear: los hilos del pool se liberan al terminar el último archivo
+        self._executor.shutdown(wait=False)
+
+    def pause(self) -> None:
+        self._resume.clear()
+
+    def resume(self) -> None:
+        self._resume.set()
+
+    def cancel(self) -> None:
+        self._cancel.set()
+        # Liberar a los hilos en pausa para que descarten su archivo
+        self._resume.set()
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        return self._finished.wait(timeout)
+
+    # Misma interfaz que utils.ocr_jobs.BackgroundBatch: en proceso no hay
+    # nada que recuperar y el lote no sobrevive a la vista.
+    def detach(self) -> None:
+        self.cancel()
+
+    def restore(self) -> List[Dict[str, Any]]:
+        return []
+
+    def attach(self, items: List[tuple]) -> None:
+        pass
+
+    def ack(self, paths: List[str]) -> None:
+        pass
+
+    # ------------------- Internos -------------------
+    def _emit(self, event: BatchEvent) -> None:
+        if self.on_event is None:
+            return
+        try:
+            self.on_event(event)
+        except Exception:
+            # Un fallo de UI no debe tumbar el hilo de trabajo
+            pass
+
+    def _done_count(self) -> int:
+        s = self.stats
+        return s.processed + s.errors + s.cancelled
+
+    def _run_one(self, index: int, path: str) -> None:
+        try:
+            self._resume.wait()
+            if self._cancel.is_set():
+                with self._lock:
+                    self.stats.cancelled += 1
+                    done = self._done_count()
+                self._emit(BatchEvent("cancelado", index, path, done=done, total=self.stats.total))
+                return
+
+            self._emit(BatchEvent("inicio", index, path, done=self._done_count(), total=self.stats.total))
+            t0 = time.perf_counter()
+            try:
+                if not os.path.exists(path):
+                    raise FileNotFoundError(f"No existe: {path}")
+                data = self.extractor(path) or {}
+                error = None
+                if isinstance(data, dict) and data.get("error"):
+                    error = data.get("mensaje") or data.get("error")
+            except Exception as ex:
+                data, error = None, str(ex)
+            elapsed = time.perf_counter() - t0
+
+            with self._lock:
+                self.stats.durations.append(elapsed)
+                if error:
+                    self.stats.errors += 1
+                else:
+                    self.stats.processed += 1
+                done = self._done_count()
+            if error:
+                self._emit(BatchEvent("error", index, path, result=data, error=str(error), done=done, total=self.stats.total))
+            else:
+                self._emit(BatchEvent("procesado", index, path, result=data, done=done, total=self.stats.total))
+        finally:
+            with self._lock:
+                self._pending -= 1
+                last = self._pending == 0
+            if last:
+                self._finish()
+
+    def _finish(self) -> None:
+        self.stats.finished_at = time.perf_counter()
+        self._finished.set()
+        self._emit(BatchEvent("fin", done=self._done_count(), total=self.stats.total))
@@ -0,0 +1,158 @@
+# utils/ocr_cache.py
+# -*- coding: utf-8 -*-
+"""Caché persistente de resultados OCR indexada por contenido.
+
+La clave es el SHA-256 de los bytes del archivo más una versión de
+extracción (prompt + modelo), de modo que reprocesar el mismo escaneo —aunque
+venga con otro nombre— no vuelve a pagar la llamada remota, y cambiar el
+prompt invalida automáticamente las entradas viejas.
+
+Cada entrada es un JSON en `storage/cache/ocr/<aa>/<hash>.json`. El tamaño
+total se acota con desalojo LRU (el acceso se registra en el mtime).
+"""
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+CACHE_DIR = os.getenv("OCR_CACHE_DIR", os.path.join("storage", "cache", "ocr"))
+CACHE_MAX_BYTES = int(float(os.getenv("OCR_CACHE_MAX_MB", "256")) * 1024 * 1024)
+CACHE_ENABLED = os.getenv("OCR_CACHE_ENABLED", "1").strip().lower() not in ("0", "false", "no")
+
+
+def file_sha256(path: str, chunk_size: int = 1024 * 1024) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def version_key(*parts: str) -> str:
+    """Huella corta del prompt/modelo usada como parte de la clave."""
+    return hashlib.sha256("\x1f".join(parts).encode("utf-8")).hexdigest()[:16]
+
+
+class OCRCache:
+    def __init__(self, root: str = CACHE_DIR, max_bytes: int = CACHE_MAX_BYTES, enabled: bool = CACHE_ENABLED):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.enabled = enabled
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        # key -> tamaño en bytes, ordenado de menos a más reciente
+        self._index: Optional[OrderedDict] = None
+        self._total = 0
+
+    # ------------------- Índice LRU -------------------
+    def _path(self, key: str) -> str:
+        return os.path.join(self.root, key[:2], f"{key}.json")
+
+    def _load_index(self) -> None:
+        if self._index is not None:
+            return
+        entries = []
+        if os.path.isdir(self.root):
+            for shard in os.listdir(self.root):
+                sdir = os.path.join(self.root, shard)
+                if not os.path.isdir(sdir):
+                    continue
+                for name in os.listdir(sdir):
+                    if not name.endswith(".json"):
+                        continue
+                    p = os.path.join(sdir, name)
+                    try:
+                        st = os.stat(p)
+                    except OSError:
+                        continue
+                    entries.append((st.st_mtime, name[:-5], st.st_size))
+        entries.sort()
+        self._index = OrderedDict((k, size) for _, k, size in entries)
+        self._total = sum(self._index.values())
+
+    def _evict(self) -> None:
+        while self._index and self._total > self.max_bytes:
+            key, size = self._index.popitem(last=False)
+            self._total -= size
+            self.evictions += 1
+            try:
+                os.remove(self._path(key))
+            except OSError:
+                pass
+
+    # ------------------- API -------------------
+    def make_key(self, path: str, version: str) -> str:
+        return hashlib.sha256(f"{file_sha256(path)}:{version}".encode("ascii")).hexdigest()
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        if not self.enabled:
+            return None
+        with self._lock:
+            self._load_index()
+            if key not in self._index:
+                self.misses += 1
+                return None
+            p = self._path(key)
+            try:
+                with open(p, "r", encoding="utf-8") as f:
+                    data = json.load(f)
+                os.utime(p, None)
+            except Exception:
+                self._total -= self._index.pop(key, 0)
+                self.misses += 1
+                return None
+            self._index.move_to_end(key)
+            self.hits += 1
+            return data
+
+    def put(self, key: str, data: Dict[str, Any]) -> None:
+        if not self.enabled:
+            return
+        payload = json.dumps(data, ensure_ascii=False, default=str).encode("utf-8")
+        p = self._path(key)
+        with self._lock:
+            self._load_index()
+            try:
+                os.makedirs(os.path.dirname(p), exist_ok=True)
+                tmp = f"{p}.{threading.get_ident()}.tmp"
+                with open(tmp, "wb") as f:
+                    f.write(payload)
+                os.replace(tmp, p)
+            except OSError:
+                return
+            self._total += len(payload) - self._index.pop(key, 0)
+            self._index[key] = len(payload)
+            self._evict()
+
+    def clear(self) -> None:
+        with self._lock:
+            self._load_index()
+            for key in list(self._index):
+                try:
+                    os.remove(self._path(key))
+                except OSError:
+                    pass
+            self._index.clear()
+            self._total = 0
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            self._load_index()
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._index),
+                "bytes": self._total,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": (self.hits / lookups) if lookups else 0.0,
+            }
+
+
+# Instancia compartida por los extractores
+cache = OCRCache()
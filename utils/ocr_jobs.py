@@ -0,0 +1,539 @@
+# utils/ocr_jobs.py
+# -*- coding: utf-8 -*-
+"""Cola persistente de trabajos OCR y trabajador en segundo plano.
+
+Las vistas ya no ejecutan el OCR en sus handlers: encolan los archivos en una
+base SQLite (`storage/cache/ocr_jobs.sqlite3`) y un proceso aparte
+(`python -m utils.ocr_jobs`) los procesa. El progreso vuelve a la UI por
+`page.pubsub` (un tópico por vista y usuario). Como la cola está en disco,
+los trabajos siguen corriendo si se cierra la ventana y, tras reiniciar la
+app, se reanudan los pendientes y se recuperan los resultados no guardados.
+
+`BackgroundBatch` expone la misma interfaz que `OCRBatchEngine`
+(start/pause/resume/cancel/running/stats + `on_event` con `BatchEvent`), así
+que las vistas la usan sin cambiar su lógica de eventos.
+
+Con `OCR_BACKGROUND=0` las vistas vuelven al motor en proceso. Con
+`OCR_WORKER_MODE=thread` (o app empaquetada) el trabajador corre como hilo
+del propio proceso: sobrevive al cierre de la vista, no al de la app.
+"""
+import json
+import os
+import sqlite3
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional
+
+from utils.ocr_batch import DEFAULT_MAX_WORKERS, BatchEvent, BatchStats, OCRBatchEngine
+
+# Relativa a la raíz del proyecto: el trabajador corre con cwd=raíz y debe ver la misma cola que la UI
+_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+JOBS_DB = os.path.join(_ROOT, os.getenv("OCR_JOBS_DB", os.path.join("storage", "cache", "ocr_jobs.sqlite3")))
+BACKGROUND_ENABLED = os.getenv("OCR_BACKGROUND", "1").strip().lower() not in ("0", "false", "no")
+WORKER_MODE = os.getenv("OCR_WORKER_MODE", "thread" if getattr(sys, "frozen", False) else "process").strip().lower()
+WORKER_LOG = os.path.join("storage", "data", "logs", "ocr_worker.log")
+# Latido del trabajador; un trabajo "procesando" sin latido en STALE_SECONDS vuelve a la cola
+HEARTBEAT_SECONDS = 2.0
+STALE_SECONDS = 30.0
+POLL_SECONDS = 0.5
+# El proceso trabajador termina tras este tiempo sin trabajos
+IDLE_EXIT_SECONDS = float(os.getenv("OCR_WORKER_IDLE_EXIT", "120"))
+# Trabajos ya confirmados por la vista se purgan tras estos días
+KEEP_DAYS = 7
+
+TERMINAL = ("hecho", "error", "cancelado")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    source TEXT NOT NULL,
+    kind TEXT NOT NULL,
+    path TEXT NOT NULL,
+    status TEXT NOT NULL DEFAULT 'pendiente',
+    result TEXT,
+    error TEXT,
+    seq INTEGER NOT NULL DEFAULT 0,
+    created REAL NOT NULL,
+    updated REAL NOT NULL,
+    acked INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS ix_jobs_status ON jobs(status, id);
+CREATE INDEX IF NOT EXISTS ix_jobs_seq ON jobs(seq);
+CREATE INDEX IF NOT EXISTS ix_jobs_source ON jobs(source, acked);
+CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT);
+"""
+
+
+class JobQueue:
+    """Cola de trabajos en SQLite, segura entre procesos.
+
+    Cada cambio de estado incrementa un contador global (`seq`), de modo que
+    los observadores solo leen lo que cambió desde su última consulta.
+    """
+
+    def __init__(self, db_path: str = JOBS_DB):
+        self.db_path = db_path
+        self._local = threading.local()
+        os.makedirs(os.path.dirname(db_path) or ".", exist_ok=True)
+        self._conn().executescript(_SCHEMA)
+
+    def _conn(self) -> sqlite3.Connection:
+        cx = getattr(self._local, "cx", None)
+        if cx is None:
+            cx = sqlite3.connect(self.db_path, timeout=30, isolation_level=None, check_same_thread=False)
+            cx.row_factory = sqlite3.Row
+            cx.execute("PRAGMA journal_mode=WAL")
+            cx.execute("PRAGMA synchronous=NORMAL")
+            self._local.cx = cx
+        return cx
+
+    class _Tx:
+        def __init__(self, cx: sqlite3.Connection):
+            self.cx = cx
+
+        def __enter__(self) -> sqlite3.Connection:
+            self.cx.execute("BEGIN IMMEDIATE")
+            return self.cx
+
+        def __exit__(self, exc_type, exc, tb) -> None:
+            self.cx.execute("ROLLBACK" if exc_type else "COMMIT")
+
+    def _tx(self) -> "_Tx":
+        return JobQueue._Tx(self._conn())
+
+    @staticmethod
+    def _next_seq(cx: sqlite3.Connection) -> int:
+        row = cx.execute("SELECT value FROM meta WHERE key='seq'").fetchone()
+        seq = int(row["value"]) + 1 if row else 1
+        cx.execute("INSERT OR REPLACE INTO meta(key, value) VALUES('seq', ?)", (str(seq),))
+        return seq
+
+    # ------------------- Productor (UI) -------------------
+    def submit(self, source: str, kind: str, paths: List[str]) -> List[int]:
+        now = time.time()
+        ids = []
+        with self._tx() as cx:
+            seq = self._next_seq(cx)
+            for p in paths:
+                cur = cx.execute(
+                    "INSERT INTO jobs(source, kind, path, seq, created, updated) VALUES(?,?,?,?,?,?)",
+                    (source, kind, os.path.abspath(p), seq, now, now),
+                )
+                ids.append(cur.lastrowid)
+        return ids
+
+    def cancel(self, ids: List[int]) -> int:
+        if not ids:
+            return 0
+        with self._tx() as cx:
+            seq = self._next_seq(cx)
+            marks = ",".join("?" * len(ids))
+            cur = cx.execute(
+                f"UPDATE jobs SET status='cancelado', seq=?, updated=? WHERE status='pendiente' AND id IN ({marks})",
+                (seq, time.time(), *ids),
+            )
+            return cur.rowcount
+
+    def set_paused(self, source: str, paused: bool) -> None:
+        with self._tx() as cx:
+            if paused:
+                cx.execute("INSERT OR REPLACE INTO meta(key, value) VALUES(?, '1')", (f"pausa:{source}",))
+            else:
+                cx.execute("DELETE FROM meta WHERE key=?", (f"pausa:{source}",))
+
+    def is_paused(self, source: str) -> bool:
+        return self._conn().execute("SELECT 1 FROM meta WHERE key=?", (f"pausa:{source}",)).fetchone() is not None
+
+    def changes(self, since: int, ids: Optional[List[int]] = None) -> tuple:
+        """Trabajos modificados después de `since` → (filas, último seq visto)."""
+        cx = self._conn()
+        # El contador se lee primero: cada transacción sube seq y escribe sus filas
+        # de forma atómica, así que (since, upto] queda completo.
+        row = cx.execute("SELECT value FROM meta WHERE key='seq'").fetchone()
+        upto = int(row["value"]) if row else 0
+        if ids:
+            marks = ",".join("?" * len(ids))
+            rows = cx.execute(
+                f"SELECT * FROM jobs WHERE seq > ? AND seq <= ? AND id IN ({marks}) ORDER BY seq, id", (since, upto, *ids)
+            ).fetchall()
+        else:
+            rows = cx.execute("SELECT * FROM jobs WHERE seq > ? AND seq <= ? ORDER BY seq, id", (since, upto)).fetchall()
+        return [dict(r) for r in rows], max(since, upto)
+
+    def unacked(self, source: str) -> List[Dict[str, Any]]:
+        """Trabajos no confirmados de `source`: el más reciente por ruta (uno viejo en
+        'error' no debe tapar un 'hecho' posterior), en orden de envío."""
+        rows = self._conn().execute(
+            "SELECT * FROM jobs WHERE id IN (SELECT max(id) FROM jobs WHERE source=? AND acked=0"
+            " AND status != 'cancelado' GROUP BY path) ORDER BY id", (source,)
+        ).fetchall()
+        return [dict(r) for r in rows]
+
+    def ack(self, source: str, paths: List[str]) -> None:
+        """La vista ya no necesita estos resultados (guardados o quitados de la lista)."""
+        if not paths:
+            return
+        paths = [os.path.abspath(p) for p in paths]
+        marks = ",".join("?" * len(paths))
+        with self._tx() as cx:
+            seq = self._next_seq(cx)
+            cx.execute(
+                f"UPDATE jobs SET status=CASE WHEN status='pendiente' THEN 'cancelado' ELSE status END, acked=1, seq=? "
+                f"WHERE source=? AND acked=0 AND path IN ({marks})",
+                (seq, source, *paths),
+            )
+
+    # ------------------- Consumidor (trabajador) -------------------
+    def claim(self, limit: int) -> List[Dict[str, Any]]:
+        if limit <= 0:
+            return []
+        with self._tx() as cx:
+            paused = [r["key"][6:] for r in cx.execute("SELECT key FROM meta WHERE key LIKE 'pausa:%'")]
+            marks = ",".join("?" * len(paused)) or "''"
+            rows = cx.execute(
+                f"SELECT * FROM jobs WHERE status='pendiente' AND source NOT IN ({marks}) ORDER BY id LIMIT ?",
+                (*paused, limit),
+            ).fetchall()
+            if rows:
+                seq = self._next_seq(cx)
+                now = time.time()
+                cx.executemany(
+                    "UPDATE jobs SET status='procesando', seq=?, updated=? WHERE id=?",
+                    [(seq, now, r["id"]) for r in rows],
+                )
+        return [dict(r) for r in rows]
+
+    def finish(self, job_id: int, result: Optional[Dict[str, Any]], error: Optional[str]) -> None:
+        with self._tx() as cx:
+            seq = self._next_seq(cx)
+            cx.execute(
+                "UPDATE jobs SET status=?, result=?, error=?, seq=?, updated=? WHERE id=?",
+                ("error" if error else "hecho", json.dumps(result, ensure_ascii=False, default=str) if result is not None else None,
+                 error, seq, time.time(), job_id),
+            )
+
+    def touch(self, ids: List[int]) -> None:
+        if not ids:
+            return
+        marks = ",".join("?" * len(ids))
+        with self._tx() as cx:
+            cx.execute(f"UPDATE jobs SET updated=? WHERE id IN ({marks})", (time.time(), *ids))
+
+    def requeue_stale(self) -> int:
+        """Devuelve a la cola los trabajos de un trabajador que murió a mitad."""
+        with self._tx() as cx:
+            seq = self._next_seq(cx)
+            cur = cx.execute(
+                "UPDATE jobs SET status='pendiente', seq=? WHERE status='procesando' AND updated < ?",
+                (seq, time.time() - STALE_SECONDS),
+            )
+            return cur.rowcount
+
+    def purge(self, days: int = KEEP_DAYS) -> None:
+        with self._tx() as cx:
+            cx.execute(
+                "DELETE FROM jobs WHERE acked=1 AND status IN ('hecho','error','cancelado') AND updated < ?",
+                (time.time() - days * 86400,),
+            )
+
+    def has_pending(self) -> bool:
+        return self._conn().execute("SELECT 1 FROM jobs WHERE status IN ('pendiente','procesando') LIMIT 1").fetchone() is not None
+
+    # ------------------- Registro del trabajador -------------------
+    def register_worker(self, pid: int) -> bool:
+        """Toma el rol de trabajador si no hay otro vivo. Atómico entre procesos."""
+        with self._tx() as cx:
+            row = cx.execute("SELECT value FROM meta WHERE key='worker'").fetchone()
+            if row:
+                info = json.loads(row["value"])
+                if info.get("pid") != pid and time.time() - info.get("ts", 0) < STALE_SECONDS:
+                    return False
+            cx.execute("INSERT OR REPLACE INTO meta(key, value) VALUES('worker', ?)", (json.dumps({"pid": pid, "ts": time.time()}),))
+            return True
+
+    def release_worker(self, pid: int) -> None:
+        with self._tx() as cx:
+            row = cx.execute("SELECT value FROM meta WHERE key='worker'").fetchone()
+            if row and json.loads(row["value"]).get("pid") == pid:
+                cx.execute("DELETE FROM meta WHERE key='worker'")
+
+    def worker_alive(self) -> bool:
+        row = self._conn().execute("SELECT value FROM meta WHERE key='worker'").fetchone()
+        return bool(row) and time.time() - json.loads(row["value"]).get("ts", 0) < STALE_SECONDS
+
+
+_queue: Optional[JobQueue] = None
+_queue_lock = threading.Lock()
+
+
+def get_queue() -> JobQueue:
+    global _queue
+    if _queue is None:
+        with _queue_lock:
+            if _queue is None:
+                _queue = JobQueue()
+    return _queue
+
+
+# ======================================================================
+# Trabajador
+# ======================================================================
+def _extractor(kind: str) -> Callable[[str], Dict[str, Any]]:
+    from utils.extractors import extract_image, extract_pdf
+    return extract_pdf if kind == "pdf" else extract_image
+
+
+def _process(queue: JobQueue, job: Dict[str, Any]) -> None:
+    try:
+        if not os.path.exists(job["path"]):
+            raise FileNotFoundError(f"No existe: {job['path']}")
+        data = _extractor(job["kind"])(job["path"]) or {}
+        error = (data.get("mensaje") or data.get("error")) if isinstance(data, dict) and data.get("error") else None
+    except Exception as ex:
+        data, error = None, str(ex)
+    queue.finish(job["id"], data, str(error) if error else None)
+
+
+def run_worker(max_workers: Optional[int] = None, queue: Optional[JobQueue] = None,
+               idle_exit: Optional[float] = IDLE_EXIT_SECONDS) -> None:
+    """Bucle del trabajador: reclama trabajos, los procesa y late. Sale si ya hay otro vivo."""
+    queue = queue or get_queue()
+    pid = os.getpid() if WORKER_MODE == "process" else -threading.get_ident()
+    if not queue.register_worker(pid):
+        return
+    max_workers = max(1, int(max_workers or DEFAULT_MAX_WORKERS))
+    inflight: Dict[int, Any] = {}
+    last_beat = 0.0
+    idle_since = time.time()
+    queue.requeue_stale()
+    queue.purge()
+    print(f"[INFO] Trabajador OCR iniciado (pid {os.getpid()}, {max_workers} en paralelo)")
+    try:
+        with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="ocr-job") as pool:
+            while True:
+                for job_id, fut in list(inflight.items()):
+                    if fut.done():
+                        inflight.pop(job_id)
+                for job in queue.claim(max_workers - len(inflight)):
+                    inflight[job["id"]] = pool.submit(_process, queue, job)
+                now = time.time()
+                if now - last_beat >= HEARTBEAT_SECONDS:
+                    queue.register_worker(pid)
+                    queue.touch(list(inflight))
+                    queue.requeue_stale()
+                    last_beat = now
+                if inflight or queue.has_pending():
+                    idle_since = now
+                elif idle_exit is not None and now - idle_since > idle_exit:
+                    break
+                time.sleep(POLL_SECONDS)
+    finally:
+        queue.release_worker(pid)
+        print("[INFO] Trabajador OCR detenido")
+
+
+_spawn_lock = threading.Lock()
+
+
+def ensure_worker() -> None:
+    """Arranca el trabajador si no hay uno vivo (proceso aparte o hilo, según WORKER_MODE)."""
+    queue = get_queue()
+    with _spawn_lock:
+        if queue.worker_alive():
+            return
+        if WORKER_MODE == "thread":
+            threading.Thread(target=run_worker, name="ocr-worker", daemon=True).start()
+            return
+        os.makedirs(os.path.dirname(WORKER_LOG), exist_ok=True)
+        kwargs: Dict[str, Any] = {}
+        if os.name == "nt":
+            kwargs["creationflags"] = getattr(subprocess, "DETACHED_PROCESS", 0) | getattr(subprocess, "CREATE_NEW_PROCESS_GROUP", 0)
+        else:
+            kwargs["start_new_session"] = True
+        with open(WORKER_LOG, "a", encoding="utf-8") as log:
+            subprocess.Popen([sys.executable, "-m", "utils.ocr_jobs"], cwd=_ROOT, stdout=log, stderr=log, **kwargs)
+        # Espera breve al primer latido para no lanzar dos trabajadores seguidos
+        deadline = time.time() + 5
+        while time.time() < deadline and not queue.worker_alive():
+            time.sleep(0.1)
+
+
+# ======================================================================
+# Adaptador para las vistas
+# ======================================================================
+class BackgroundBatch:
+    """Lote OCR ejecutado por el trabajador, con la interfaz de `OCRBatchEngine`.
+
+    Un hilo observa la cola y publica los cambios en el tópico
+    `ocr_jobs:<source>` de `page.pubsub`; el handler suscrito los convierte en
+    `BatchEvent` para `on_event`. `source` ya viene acotado al usuario (ver
+    `make_batch_engine`): en modo web el pubsub, la pausa y los resultados
+    pendientes no se comparten entre sesiones de usuarios distintos.
+    """
+
+    def __init__(self, page, source: str, kind: str, on_event: Optional[Callable[[BatchEvent], None]] = None):
+        self.page = page
+        self.source = source
+        self.kind = kind
+        self.on_event = on_event
+        self.queue = get_queue()
+        self.topic = f"ocr_jobs:{source}"
+        self.stats = BatchStats()
+        self._index: Dict[int, int] = {}
+        self._status: Dict[int, str] = {}
+        self._cancelled = False
+        self._finished = threading.Event()
+        self._finished.set()
+        self._stop = threading.Event()
+        self._lock = threading.Lock()
+        page.pubsub.subscribe_topic(self.topic, self._on_message)
+
+    # ------------------- Estado -------------------
+    @property
+    def running(self) -> bool:
+        return not self._finished.is_set()
+
+    @property
+    def paused(self) -> bool:
+        return self.queue.is_paused(self.source)
+
+    @property
+    def cancelled(self) -> bool:
+        return self._cancelled
+
+    # ------------------- Control -------------------
+    def start(self, items: List[tuple]) -> None:
+        if self.running:
+            raise RuntimeError("Ya hay un lote en ejecución.")
+        items = list(items)
+        self.queue.set_paused(self.source, False)
+        ids = self.queue.submit(self.source, self.kind, [p for _, p in items])
+        self._track(list(zip(ids, [i for i, _ in items])))
+
+    def attach(self, items: List[tuple]) -> None:
+        """Retoma el seguimiento de trabajos de una sesión anterior: [(index, job_id)]."""
+        if items and not self.running:
+            self._track([(job_id, index) for index, job_id in items])
+
+    def restore(self) -> List[Dict[str, Any]]:
+        """Trabajos de esta vista aún no confirmados (resultado cargado con `result`)."""
+        jobs = self.queue.unacked(self.source)
+        for j in jobs:
+            j["result"] = json.loads(j["result"]) if j.get("result") else None
+        return jobs
+
+    def ack(self, paths: List[str]) -> None:
+        self.queue.ack(self.source, paths)
+
+    def pause(self) -> None:
+        self.queue.set_paused(self.source, True)
+
+    def resume(self) -> None:
+        self.queue.set_paused(self.source, False)
+
+    def cancel(self) -> None:
+        self._cancelled = True
+        self.queue.set_paused(self.source, False)
+        self.queue.cancel(list(self._index))
+
+    def detach(self) -> None:
+        """La vista se cierra: se deja de observar, los trabajos siguen en el trabajador."""
+        self._stop.set()
+        try:
+            self.page.pubsub.unsubscribe_topic(self.topic)
+        except Exception:
+            pass
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        return self._finished.wait(timeout)
+
+    # ------------------- Internos -------------------
+    def _track(self, pairs: List[tuple]) -> None:
+        with self._lock:
+            self._index = {job_id: index for job_id, index in pairs}
+            self._status = {job_id: "pendiente" for job_id in self._index}
+        self.stats = BatchStats(total=len(pairs), started_at=time.perf_counter())
+        self._cancelled = False
+        self._stop.clear()
+        if not pairs:
+            self._finished.set()
+            self._emit(BatchEvent("fin", total=0))
+            return
+        self._finished.clear()
+        ensure_worker()
+        threading.Thread(target=self._watch, name=f"ocr-watch-{self.source}", daemon=True).start()
+
+    def _watch(self) -> None:
+        since = 0
+        ids = list(self._index)
+        last_check = time.time()
+        while not self._stop.is_set() and self.running:
+            try:
+                rows, since = self.queue.changes(since, ids)
+                for r in rows:
+                    self.page.pubsub.send_all_on_topic(
+                        self.topic, {"id": r["id"], "status": r["status"], "path": r["path"],
+                                     "result": r["result"], "error": r["error"]})
+                # Si el trabajador murió (p.ej. app cerrada a mitad) se relanza
+                if time.time() - last_check > STALE_SECONDS / 2:
+                    ensure_worker()
+                    last_check = time.time()
+            except Exception as ex:
+                print(f"[WARN] Observador de trabajos OCR: {ex}")
+            time.sleep(POLL_SECONDS)
+
+    def _emit(self, event: BatchEvent) -> None:
+        if self.on_event is None:
+            return
+        try:
+            self.on_event(event)
+        except Exception:
+            pass
+
+    def _on_message(self, _topic: str, msg: Dict[str, Any]) -> None:
+        job_id = msg.get("id")
+        with self._lock:
+            if job_id not in self._index or self._status.get(job_id) == msg["status"] or self._status.get(job_id) in TERMINAL:
+                return
+            self._status[job_id] = msg["status"]
+            s = self.stats
+            if msg["status"] == "hecho":
+                s.processed += 1
+            elif msg["status"] == "error":
+                s.errors += 1
+            elif msg["status"] == "cancelado":
+                s.cancelled += 1
+            done = s.processed + s.errors + s.cancelled
+            last = all(st in TERMINAL for st in self._status.values())
+        index, path = self._index[job_id], msg.get("path")
+        result = json.loads(msg["result"]) if msg.get("result") else None
+        kind = {"procesando": "inicio", "hecho": "procesado", "error": "error", "cancelado": "cancelado"}.get(msg["status"])
+        if kind:
+            self._emit(BatchEvent(kind, index, path, result=result, error=msg.get("error"), done=done, total=self.stats.total))
+        if last:
+            self.stats.finished_at = time.perf_counter()
+            self._finished.set()
+            self._emit(BatchEvent("fin", done=done, total=self.stats.total))
+
+
+def make_batch_engine(extractor: Callable[[str], Dict[str, Any]], page=None, source: str = "", kind: str = "pdf",
+                      owner: Any = None):
+    """Motor de lote para una vista: cola en segundo plano si está habilitada, si no en proceso.
+
+    Los trabajos, la pausa y el tópico se acotan a `<source>:<owner>`; `owner` es el
+    id del usuario y, si no lo hay, la sesión de Flet.
+    """
+    if BACKGROUND_ENABLED and page is not None and hasattr(getattr(page, "pubsub", None), "subscribe_topic"):
+        owner = owner if owner is not None else getattr(page, "session_id", None) or "local"
+        try:
+            return BackgroundBatch(page, f"{source}:{owner}", kind)
+        except Exception as ex:
+            print(f"[WARN] Cola OCR en segundo plano no disponible, se usa el motor en proceso: {ex}")
+    return OCRBatchEngine(extractor)
+
+
+if __name__ == "__main__":
+    run_worker()
@@ -1,7 +1,7 @@
 # utils/ocr_smv.py
 import os, re, json
 from dataclasses import dataclass
-from typing import Dict, Any
+from typing import Dict, Any, List, Optional, Tuple
 
 MES = {
     "ENE":"01","FEB":"02","MAR":"03","ABR":"04","MAY":"05","JUN":"06",
@@ -9,19 +9,25 @@ MES = {
     "NOV":"11","DIC":"12","DEC":"12"
 }
 
+FIELDS = ["dni","lm","or","clase","libro","folio","apellidos","nombres","fecha_nacimiento","presto_servicio",
+          "gran_unidad","unidad_alta","unidad_baja","fecha_alta","fecha_baja","grado","motivo_baja"]
+
 @dataclass
 class OCRConfig:
-    engine: str = "gemini"          # "gemini" | "tesseract"
+    engine: str = os.getenv("OCR_ENGINE", "gemini")          # "gemini" | "tesseract"
     project_id: str | None = os.getenv("VERTEX_PROJECT")
     location: str | None = os.getenv("VERTEX_LOCATION", "us-central1")
     key_path: str | None = os.getenv("VERTEX_KEY_PATH")
     model_name: str = os.getenv("VERTEX_MODEL", "gemini-2.0-flash-001")
+    # Motor local
+    tesseract_lang: str = os.getenv("TESSERACT_LANG", "spa")
+    tesseract_cmd: str | None = os.getenv("TESSERACT_CMD")
+    pdf_dpi: int = int(os.getenv("OCR_PDF_DPI", "300"))
 
 def _normalize(d: Dict[str, Any]) -> Dict[str, Any]:
     # Normalización mínima para que la UI funcione
     out = {k: (None if d.get(k) in ("", None) else d.get(k)) for k in d.keys()} if isinstance(d, dict) else {}
-    for k in ["dni","lm","or","clase","libro","folio","apellidos","nombres","fecha_nacimiento","presto_servicio",
-              "gran_unidad","unidad_alta","unidad_baja","fecha_alta","fecha_baja","grado","motivo_baja"]:
+    for k in FIELDS:
         out.setdefault(k, None)
     # DNI a 11 dígitos (relleno)
     if out.get("dni"):
@@ -51,15 +57,222 @@ def _normalize(d: Dict[str, Any]) -> Dict[str, Any]:
     out["presto_servicio"] = "SI" if str(out.get("presto_servicio") or "").strip().upper()=="SI" else "NO"
     return out
 
-def extract_from_file(path: str, cfg: OCRConfig) -> Dict[str, Any]:
-    """
-    STUB: devuelve campos vacíos normalizados para permitir flujos de edición manual.
-    Reemplázame por la versión completa (Gemini + preprocesado) del canvas.
+
+# ======================================================================
+# Motor local: Tesseract + preprocesado OpenCV + heurísticas por regex
+# ======================================================================
+
+# Regiones de interés del formato SMV como fracciones de la página
+# (x0, y0, x1, y1). Las bandas se solapan para tolerar escaneos desplazados.
+ROIS = {
+    "cabecera":  (0.00, 0.00, 1.00, 0.32),
+    "filiacion": (0.00, 0.18, 1.00, 0.62),
+    "servicio":  (0.00, 0.50, 1.00, 1.00),
+}
+
+FIELD_ROI = {
+    "dni": "cabecera", "lm": "cabecera", "or": "cabecera", "clase": "cabecera", "libro": "cabecera", "folio": "cabecera",
+    "apellidos": "filiacion", "nombres": "filiacion", "fecha_nacimiento": "filiacion",
+    "gran_unidad": "servicio", "unidad_alta": "servicio", "unidad_baja": "servicio",
+    "fecha_alta": "servicio", "fecha_baja": "servicio", "grado": "servicio", "motivo_baja": "servicio",
+}
+
+_NRO = r"(?:N\s*[°ºO0]\.?\s*)?"
+_SEP = r"\s*[:\-.]?\s*"
+_FECHA = r"(\d{1,2}[\s/.\-]+(?:\d{1,2}|[A-Z]{3,4})[\s/.\-]+\d{2,4})"
+_TEXTO = r"([A-ZÑÁÉÍÓÚÜ][A-ZÑÁÉÍÓÚÜ0-9 .'\"\-]{1,58}[A-ZÑÁÉÍÓÚÜ0-9.\"])"
+# Dígitos (con confusiones típicas O/I/l/S/B); los grupos separados por espacio deben empezar en dígito
+_DIGITOS = r"([0-9OIl][0-9OIlSB]{2,}(?: [0-9][0-9OIlSB]*)*)"
+
+FIELD_PATTERNS = {
+    "dni": [rf"\bD\.?\s*N\.?\s*I\.?{_SEP}{_NRO}{_DIGITOS}"],
+    "lm": [rf"(?:LIBRETA\s+MILITAR|\bL\.?\s*S\.?\s*M\.?|\bL\.?\s*M\.?)(?![A-Z]){_SEP}{_NRO}{_DIGITOS}"],
+    "or": [rf"\bO\.?\s*R\.?(?![A-Z]){_SEP}{_NRO}([0-9O]{{3}}\s*-?\s*[A-Z4])\b"],
+    "clase": [rf"\bCLASE(?:\s+DE)?{_SEP}([0-9OIl]{{4}})\b"],
+    "libro": [rf"\bLIBRO{_SEP}{_NRO}([0-9A-Z\-]{{1,10}})\b"],
+    "folio": [rf"\bFOLIO{_SEP}{_NRO}([0-9A-Z\-]{{1,10}})\b"],
+    "apellidos": [rf"\bAPELLIDOS?(?:\s+PATERNO\s+Y\s+MATERNO)?{_SEP}{_TEXTO}"],
+    "nombres": [rf"\bNOMBRES?{_SEP}{_TEXTO}"],
+    "fecha_nacimiento": [rf"(?:FECHA\s+DE\s+)?NAC(?:IMIENTO|IDO(?:\s+EL)?)?\.?{_SEP}{_FECHA}"],
+    "gran_unidad": [rf"\bGRAN\s+UNIDAD{_SEP}{_TEXTO}"],
+    "unidad_alta": [rf"\bUNIDAD\s+(?:DE\s+)?ALTA{_SEP}{_TEXTO}"],
+    "unidad_baja": [rf"\bUNIDAD\s+(?:DE\s+)?BAJA{_SEP}{_TEXTO}"],
+    "fecha_alta": [rf"\bFECHA\s+(?:DE\s+)?ALTA{_SEP}{_FECHA}"],
+    "fecha_baja": [rf"\bFECHA\s+(?:DE\s+)?BAJA{_SEP}{_FECHA}"],
+    "grado": [rf"\bGRADO{_SEP}{_TEXTO}"],
+    "motivo_baja": [rf"\bMOTIVO\s+(?:DE\s+)?(?:LA\s+)?BAJA{_SEP}{_TEXTO}"],
+}
+
+_NUMERIC = {"dni", "lm", "clase"}
+_DIGIT_FIX = str.maketrans({"O": "0", "I": "1", "L": "1", "l": "1", "S": "5", "B": "8"})
+_SERVICE_FIELDS = ("gran_unidad", "unidad_alta", "unidad_baja", "fecha_alta", "fecha_baja", "grado", "motivo_baja")
+
+
+def _load_page(path: str, dpi: int, index: int = 0):
+    """Devuelve una página como array en gris (del PDF solo se rasteriza esa, con PyMuPDF)."""
+    import cv2
+    import numpy as np
+
+    if path.lower().endswith(".pdf"):
+        import fitz  # PyMuPDF
+
+        with fitz.open(path) as doc:
+            pix = doc[index].get_pixmap(dpi=dpi, colorspace=fitz.csGRAY)
+        return np.frombuffer(pix.samples, dtype=np.uint8).reshape(pix.height, pix.width).copy()
+    img = cv2.imread(path, cv2.IMREAD_GRAYSCALE)
+    if img is None:
+        raise FileNotFoundError(f"No se pudo leer la imagen: {path}")
+    return img
+
+
+def _deskew(gray):
+    import cv2
+    import numpy as np
+
+    try:
+        from deskew import determine_skew
+        angle = determine_skew(gray)
+    except Exception:
+        coords = np.column_stack(np.where(gray < 128))
+        if len(coords) < 100:
+            return gray
+        angle = cv2.minAreaRect(coords.astype(np.float32))[-1]
+        angle = angle - 90 if angle > 45 else angle
+    if angle is None or abs(angle) < 0.3 or abs(angle) > 15:
+        return gray
+    h, w = gray.shape[:2]
+    m = cv2.getRotationMatrix2D((w / 2, h / 2), angle, 1.0)
+    return cv2.warpAffine(gray, m, (w, h), flags=cv2.INTER_CUBIC, borderMode=cv2.BORDER_REPLICATE)
+
+
+def preprocess_for_tesseract(gray):
+    """Cadena OpenCV para Tesseract: orientación, deskew, CLAHE, Otsu y borrado de líneas del formulario."""
+    import cv2
+    import numpy as np
+
+    h, w = gray.shape[:2]
+    if w > h:
+        gray = cv2.rotate(gray, cv2.ROTATE_90_CLOCKWISE)
+    gray = _deskew(gray)
+    gray = cv2.createCLAHE(clipLimit=2.0, tileGridSize=(8, 8)).apply(gray)
+    _, binary = cv2.threshold(gray, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)
+
+    # Las líneas del formulario confunden a Tesseract: se detectan y se pintan de blanco
+    inv = 255 - binary
+    h, w = binary.shape[:2]
+    horiz = cv2.morphologyEx(inv, cv2.MORPH_OPEN, cv2.getStructuringElement(cv2.MORPH_RECT, (max(40, w // 25), 1)))
+    vert = cv2.morphologyEx(inv, cv2.MORPH_OPEN, cv2.getStructuringElement(cv2.MORPH_RECT, (1, max(40, h // 25))))
+    lines = cv2.dilate(cv2.bitwise_or(horiz, vert), np.ones((3, 3), np.uint8))
+    binary[lines > 0] = 255
+    return binary
+
+
+def _ocr_region(img, lang: str) -> Tuple[str, List[Tuple[int, int, float]]]:
+    """OCR de una región: texto por líneas y spans (inicio, fin, confianza) por palabra."""
+    import pytesseract
+
+    data = pytesseract.image_to_data(img, lang=lang, config="--oem 1 --psm 6", output_type=pytesseract.Output.DICT)
+    text_parts: List[str] = []
+    spans: List[Tuple[int, int, float]] = []
+    pos = 0
+    last_line = None
+    for i, word in enumerate(data["text"]):
+        word = (word or "").strip()
+        if not word:
+            continue
+        line_key = (data["block_num"][i], data["par_num"][i], data["line_num"][i])
+        if last_line is not None:
+            sep = " " if line_key == last_line else "\n"
+            text_parts.append(sep)
+            pos += 1
+        last_line = line_key
+        try:
+            conf = float(data["conf"][i])
+        except (TypeError, ValueError):
+            conf = -1.0
+        spans.append((pos, pos + len(word), conf))
+        text_parts.append(word)
+        pos += len(word)
+    return "".join(text_parts).upper(), spans
+
+
+def _span_conf(spans: List[Tuple[int, int, float]], start: int, end: int) -> float:
+    confs = [c for s, e, c in spans if s < end and e > start and c >= 0]
+    return round(sum(confs) / len(confs), 1) if confs else 0.0
+
+
+def parse_fields(regions: Dict[str, Tuple[str, List[Tuple[int, int, float]]]]) -> Tuple[Dict[str, Any], Dict[str, float]]:
+    """Aplica las heurísticas regex sobre el texto de cada región.
+
+    Busca cada campo primero en su región esperada y luego en el resto.
+    Devuelve (valores_crudos, confianza_por_campo 0-100).
     """
-    base = {
-        "dni": None, "lm": None, "or": None, "clase": None, "libro": None, "folio": None,
-        "apellidos": None, "nombres": None, "fecha_nacimiento": None, "presto_servicio": "NO",
-        "gran_unidad": None, "unidad_alta": None, "unidad_baja": None,
-        "fecha_alta": None, "fecha_baja": None, "grado": None, "motivo_baja": None
-    }
-    return _normalize(base)
+    values: Dict[str, Any] = {}
+    confidence: Dict[str, float] = {}
+    for field, patterns in FIELD_PATTERNS.items():
+        preferred = FIELD_ROI.get(field)
+        order = [preferred] + [r for r in regions if r != preferred] if preferred in regions else list(regions)
+        for roi in order:
+            text, spans = regions[roi]
+            m = None
+            for pat in patterns:
+                m = re.search(pat, text)
+                if m:
+                    break
+            if not m:
+                continue
+            val = re.sub(r"\s+", " ", m.group(1)).strip(" .-")
+            if field in _NUMERIC:
+                val = val.translate(_DIGIT_FIX).replace(" ", "")
+            values[field] = val
+            confidence[field] = _span_conf(spans, m.start(1), m.end(1))
+            break
+    values["presto_servicio"] = "SI" if any(values.get(k) for k in _SERVICE_FIELDS) else "NO"
+    return values, confidence
+
+
+def _finalize(values: Dict[str, Any]) -> Dict[str, Any]:
+    """Pasa los valores por normalize_result (jpg.py) y devuelve la forma estándar."""
+    from jpg import normalize_result
+
+    d = dict(values)
+    d["dni_o_lm"] = d.pop("lm", None)
+    d = normalize_result(d)
+    d["lm"] = d.pop("dni_o_lm", None)
+    return _normalize({k: d.get(k) for k in FIELDS})
+
+
+def extract_tesseract_detailed(path: str, cfg: Optional[OCRConfig] = None,
+                               page: int = 0) -> Tuple[Dict[str, Any], Dict[str, float]]:
+    """Motor local sobre una página (la primera por defecto): (dict normalizado, confianza por campo)."""
+    cfg = cfg or OCRConfig()
+    if cfg.tesseract_cmd:
+        import pytesseract
+        pytesseract.pytesseract.tesseract_cmd = cfg.tesseract_cmd
+
+    return extract_tesseract_page(_load_page(path, cfg.pdf_dpi, page), cfg)
+
+
+def extract_tesseract_page(page, cfg: Optional[OCRConfig] = None) -> Tuple[Dict[str, Any], Dict[str, float]]:
+    """Motor local sobre una página ya cargada (array en gris)."""
+    cfg = cfg or OCRConfig()
+    binary = preprocess_for_tesseract(page)
+    h, w = binary.shape[:2]
+    regions = {}
+    for name, (x0, y0, x1, y1) in ROIS.items():
+        crop = binary[int(y0 * h):int(y1 * h), int(x0 * w):int(x1 * w)]
+        regions[name] = _ocr_region(crop, cfg.tesseract_lang)
+    values, confidence = parse_fields(regions)
+    out = _finalize(values)
+    # Confianza solo para campos que sobrevivieron a la normalización
+    return out, {k: v for k, v in confidence.items() if out.get(k)}
+
+
+def extract_from_file(path: str, cfg: OCRConfig) -> Dict[str, Any]:
+    """Extrae los campos SMV de un PDF/imagen con el motor indicado en `cfg.engine`."""
+    if (cfg.engine or "").lower() == "tesseract":
+        return extract_tesseract_detailed(path, cfg)[0]
+    from utils import extractors
+    if path.lower().endswith(".pdf"):
+        return _normalize(extractors.extract_pdf(path))
+    return _normalize(extractors.extract_image(path))
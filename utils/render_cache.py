@@ -0,0 +1,262 @@
+# utils/render_cache.py
+# -*- coding: utf-8 -*-
+"""Caché de páginas renderizadas para el visor de documentos.
+
+Cada página se rasteriza una sola vez por (hash del archivo, página, zoom):
+  - En memoria: base64 listo para `ft.Image.src_base64`, LRU acotado por
+    RENDER_CACHE_MEM_MB.
+  - En disco: el mismo base64 en `storage/cache/render/<aa>/<clave>.b64`,
+    LRU acotado por RENDER_CACHE_MAX_MB (acceso registrado en el mtime,
+    igual que utils/ocr_cache.py).
+
+`RenderedDocument` mantiene el PDF abierto mientras el visor está abierto y
+prepara en segundo plano las páginas vecinas de la que se muestra.
+"""
+import base64
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, Optional, Tuple
+
+from utils.ocr_cache import file_sha256
+
+try:
+    import fitz  # type: ignore
+except Exception:  # pragma: no cover
+    fitz = None  # type: ignore
+
+CACHE_DIR = os.getenv("RENDER_CACHE_DIR", os.path.join("storage", "cache", "render"))
+CACHE_MAX_BYTES = int(float(os.getenv("RENDER_CACHE_MAX_MB", "512")) * 1024 * 1024)
+MEM_MAX_BYTES = int(float(os.getenv("RENDER_CACHE_MEM_MB", "64")) * 1024 * 1024)
+PREFETCH_PAGES = int(os.getenv("RENDER_PREFETCH_PAGES", "2"))
+
+
+def zoom_bucket(zoom: float) -> int:
+    """Zoom en décimas (1.2 → 12): los pasos del visor son de 0.2."""
+    return int(round(zoom * 10))
+
+
+class RenderCache:
+    def __init__(self, root: str = CACHE_DIR, max_bytes: int = CACHE_MAX_BYTES, mem_bytes: int = MEM_MAX_BYTES):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.mem_bytes = mem_bytes
+        self.mem_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        self._mem: "OrderedDict[str, str]" = OrderedDict()
+        self._mem_total = 0
+        # key -> tamaño en disco, de menos a más reciente
+        self._index: Optional[OrderedDict] = None
+        self._total = 0
+        # ruta -> ((tamaño, mtime), sha256) para no releer el archivo
+        self._hashes: Dict[str, Tuple[Tuple[int, float], str]] = {}
+
+    # ------------------- Claves -------------------
+    def file_hash(self, path: str) -> str:
+        st = os.stat(path)
+        stamp = (st.st_size, st.st_mtime)
+        with self._lock:
+            known = self._hashes.get(path)
+        if known and known[0] == stamp:
+            return known[1]
+        digest = file_sha256(path)
+        with self._lock:
+            self._hashes[path] = (stamp, digest)
+        return digest
+
+    @staticmethod
+    def make_key(file_hash: str, page: int, zoom: float) -> str:
+        return f"{file_hash[:32]}_{page}_{zoom_bucket(zoom)}"
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.root, key[:2], f"{key}.b64")
+
+    # ------------------- Índice en disco -------------------
+    def _load_index(self) -> None:
+        if self._index is not None:
+            return
+        entries = []
+        if os.path.isdir(self.root):
+            for shard in os.listdir(self.root):
+                sdir = os.path.join(self.root, shard)
+                if not os.path.isdir(sdir):
+                    continue
+                for name in os.listdir(sdir):
+                    if not name.endswith(".b64"):
+                        continue
+                    try:
+                        st = os.stat(os.path.join(sdir, name))
+                    except OSError:
+                        continue
+                    entries.append((st.st_mtime, name[:-4], st.st_size))
+        entries.sort()
+        self._index = OrderedDict((k, size) for _, k, size in entries)
+        self._total = sum(self._index.values())
+
+    def _evict(self) -> None:
+        while self._index and self._total > self.max_bytes:
+            key, size = self._index.popitem(last=False)
+            self._total -= size
+            self.evictions += 1
+            try:
+                os.remove(self._path(key))
+            except OSError:
+                pass
+
+    def _remember(self, key: str, b64: str) -> None:
+        self._mem_total += len(b64) - len(self._mem.pop(key, ""))
+        self._mem[key] = b64
+        while self._mem and self._mem_total > self.mem_bytes:
+            _, old = self._mem.popitem(last=False)
+            self._mem_total -= len(old)
+
+    # ------------------- API -------------------
+    def get(self, key: str) -> Optional[str]:
+        with self._lock:
+            b64 = self._mem.get(key)
+            if b64 is not None:
+                self._mem.move_to_end(key)
+                self.mem_hits += 1
+                return b64
+            self._load_index()
+            if key not in self._index:
+                self.misses += 1
+                return None
+            p = self._path(key)
+            try:
+                with open(p, "r", encoding="ascii") as f:
+                    b64 = f.read()
+                os.utime(p, None)
+            except Exception:
+                self._total -= self._index.pop(key, 0)
+                self.misses += 1
+                return None
+            self._index.move_to_end(key)
+            self._remember(key, b64)
+            self.disk_hits += 1
+            return b64
+
+    def put(self, key: str, b64: str) -> None:
+        p = self._path(key)
+        with self._lock:
+            self._remember(key, b64)
+            self._load_index()
+            try:
+                os.makedirs(os.path.dirname(p), exist_ok=True)
+                tmp = f"{p}.{threading.get_ident()}.tmp"
+                with open(tmp, "w", encoding="ascii") as f:
+                    f.write(b64)
+                os.replace(tmp, p)
+            except OSError:
+                return
+            self._total += len(b64) - self._index.pop(key, 0)
+            self._index[key] = len(b64)
+            self._evict()
+
+    def clear(self) -> None:
+        with self._lock:
+            self._mem.clear()
+            self._mem_total = 0
+            self._load_index()
+            for key in list(self._index):
+                try:
+                    os.remove(self._path(key))
+                except OSError:
+                    pass
+            self._index.clear()
+            self._total = 0
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            self._load_index()
+            lookups = self.mem_hits + self.disk_hits + self.misses
+            return {
+                "entries": len(self._index),
+                "bytes": self._total,
+                "mem_entries": len(self._mem),
+                "mem_bytes": self._mem_total,
+                "mem_hits": self.mem_hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": ((self.mem_hits + self.disk_hits) / lookups) if lookups else 0.0,
+            }
+
+
+# Instancia compartida por los visores
+cache = RenderCache()
+
+
+class RenderedDocument:
+    """PDF abierto durante la vida del visor, con páginas servidas desde la caché.
+
+    PyMuPDF no es seguro entre hilos: el documento se usa bajo un lock y las
+    páginas vecinas se rasterizan en un único hilo de fondo.
+    """
+
+    def __init__(self, path: str, render_cache: RenderCache = cache, prefetch_pages: int = PREFETCH_PAGES):
+        if not fitz:
+            raise RuntimeError("PyMuPDF no disponible; instale 'pymupdf'")
+        self.path = path
+        self.cache = render_cache
+        self.prefetch_pages = prefetch_pages
+        self.file_hash = render_cache.file_hash(path)
+        self._doc = fitz.open(path)
+        self.page_count = len(self._doc)
+        self._lock = threading.Lock()
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._queued = set()
+        self._closed = False
+
+    def _rasterize(self, page: int, zoom: float) -> str:
+        with self._lock:
+            if self._closed:
+                raise RuntimeError("Documento cerrado")
+            pix = self._doc.load_page(page).get_pixmap(matrix=fitz.Matrix(zoom, zoom), alpha=False)
+            png = pix.tobytes("png")
+        return base64.b64encode(png).decode("ascii")
+
+    def render(self, page: int, zoom: float) -> str:
+        """Base64 PNG de la página (acotada al rango) al zoom pedido."""
+        page = max(0, min(page, self.page_count - 1))
+        zoom = zoom_bucket(zoom) / 10
+        key = self.cache.make_key(self.file_hash, page, zoom)
+        b64 = self.cache.get(key)
+        if b64 is None:
+            b64 = self._rasterize(page, zoom)
+            self.cache.put(key, b64)
+        return b64
+
+    def prefetch(self, page: int, zoom: float) -> None:
+        """Encola las páginas vecinas (siguientes primero) sin bloquear."""
+        if self._closed or self.prefetch_pages <= 0:
+            return
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="render-prefetch")
+        for d in range(1, self.prefetch_pages + 1):
+            for p in (page + d, page - d):
+                key = (p, zoom_bucket(zoom))
+                if 0 <= p < self.page_count and key not in self._queued:
+                    self._queued.add(key)
+                    self._executor.submit(self._prefetch_one, p, zoom)
+
+    def _prefetch_one(self, page: int, zoom: float) -> None:
+        try:
+            if not self._closed:
+                self.render(page, zoom)
+        except Exception:
+            pass
+
+    def close(self) -> None:
+        self._closed = True
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+        with self._lock:
+            try:
+                self._doc.close()
+            except Exception:
+                pass
@@ -0,0 +1,195 @@
+# utils/thumbnails.py
+# -*- coding: utf-8 -*-
+"""Miniaturas JPEG generadas una sola vez al cargar/guardar archivos.
+
+  - PDF: primera página rasterizada al tamaño de la miniatura.
+  - Imagen: JPEG reducido (Pillow decodifica los JPEG ya escalados con
+    `draft`, sin pasar por la resolución completa).
+
+Los archivos guardados en `storage/data` llevan su miniatura al lado
+(`<archivo>.thumb.jpg`); los que aún no se guardaron (recién elegidos en las
+vistas de digitalización) la tienen en `storage/cache/thumbs` y al copiarse a
+`storage/data` se reutiliza con `adopt`. Las listas solo muestran miniaturas
+existentes: las que faltan se piden al hilo de `thumbnails`.
+"""
+import hashlib
+import os
+import queue
+import shutil
+import threading
+from typing import Callable, Optional
+
+try:
+    import fitz  # type: ignore
+except Exception:  # pragma: no cover
+    fitz = None  # type: ignore
+
+try:
+    from PIL import Image as PILImage
+except Exception:  # pragma: no cover
+    PILImage = None  # type: ignore
+
+THUMB_MAX_PX = int(os.getenv("THUMB_MAX_PX", "240"))
+THUMB_QUALITY = int(os.getenv("THUMB_QUALITY", "80"))
+STORAGE_DIR = os.path.abspath(os.path.join("storage", "data"))
+CACHE_DIR = os.path.abspath(os.getenv("THUMB_CACHE_DIR", os.path.join("storage", "cache", "thumbs")))
+SUFFIX = ".thumb.jpg"
+
+IMAGE_EXTS = (".jpg", ".jpeg", ".png", ".gif", ".bmp", ".webp", ".tif", ".tiff")
+
+
+def is_thumbnail(path: str) -> bool:
+    return path.lower().endswith(SUFFIX)
+
+
+def thumbnail_path(path: str) -> str:
+    """Ruta de la miniatura: junto al archivo si está en storage/data, si no en la caché."""
+    full = os.path.abspath(path)
+    try:
+        if os.path.commonpath([full, STORAGE_DIR]) == STORAGE_DIR:
+            return full + SUFFIX
+    except ValueError:  # otra unidad en Windows
+        pass
+    key = hashlib.sha1(full.encode("utf-8")).hexdigest()
+    return os.path.join(CACHE_DIR, key[:2], f"{key}.jpg")
+
+
+def existing_thumbnail(path: Optional[str]) -> Optional[str]:
+    """Miniatura vigente (no más vieja que el archivo) o None; no genera nada."""
+    if not path:
+        return None
+    thumb = thumbnail_path(path)
+    try:
+        return thumb if os.path.getmtime(thumb) >= os.path.getmtime(path) else None
+    except OSError:
+        return None
+
+
+def _pdf_thumbnail(path: str) -> bytes:
+    if not fitz:
+        raise RuntimeError("PyMuPDF no disponible")
+    with fitz.open(path) as doc:
+        pg = doc.load_page(0)
+        scale = THUMB_MAX_PX / max(pg.rect.width, pg.rect.height)
+        pix = pg.get_pixmap(matrix=fitz.Matrix(scale, scale), alpha=False)
+        return pix.tobytes("jpeg", jpg_quality=THUMB_QUALITY)
+
+
+def _image_thumbnail(path: str, dest: str) -> None:
+    if not PILImage:
+        raise RuntimeError("Pillow no disponible")
+    with PILImage.open(path) as img:
+        img.draft("RGB", (THUMB_MAX_PX, THUMB_MAX_PX))
+        img.thumbnail((THUMB_MAX_PX, THUMB_MAX_PX))
+        img.convert("RGB").save(dest, "JPEG", quality=THUMB_QUALITY)
+
+
+def make_thumbnail(path: str, dest: Optional[str] = None) -> Optional[str]:
+    """Genera la miniatura de `path` (PDF o imagen). Devuelve su ruta o None si el formato no aplica."""
+    lower = path.lower()
+    if not (lower.endswith(".pdf") or lower.endswith(IMAGE_EXTS)) or is_thumbnail(path):
+        return None
+    dest = dest or thumbnail_path(path)
+    os.makedirs(os.path.dirname(dest), exist_ok=True)
+    tmp = f"{dest}.{threading.get_ident()}.tmp"
+    try:
+        if lower.endswith(".pdf"):
+            with open(tmp, "wb") as f:
+                f.write(_pdf_thumbnail(path))
+        else:
+            _image_thumbnail(path, tmp)
+        os.replace(tmp, dest)
+    finally:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+    return dest
+
+
+def ensure_thumbnail(path: str) -> Optional[str]:
+    return existing_thumbnail(path) or make_thumbnail(path)
+
+
+def adopt(original: str, stored: str) -> Optional[str]:
+    """Al copiar `original` a storage/data, deja la miniatura junto a `stored`."""
+    src = existing_thumbnail(original)
+    dest = thumbnail_path(stored)
+    if src and src != dest:
+        try:
+            os.makedirs(os.path.dirname(dest), exist_ok=True)
+            shutil.copyfile(src, dest)
+            return dest
+        except OSError:
+            pass
+    thumbnails.submit(stored)
+    return None
+
+
+def move_with(path: str, new_path: str) -> None:
+    """Acompaña un movimiento de archivo (p. ej. a .trash) con su miniatura."""
+    thumb = path + SUFFIX
+    if os.path.exists(thumb):
+        try:
+            shutil.move(thumb, new_path + SUFFIX)
+        except OSError:
+            pass
+
+
+def discard(path: str) -> None:
+    """Borra la miniatura de un archivo eliminado."""
+    try:
+        os.remove(path + SUFFIX)
+    except OSError:
+        pass
+
+
+class ThumbnailWorker:
+    """Un hilo demonio que genera miniaturas en orden de llegada, sin duplicados."""
+
+    def __init__(self):
+        self._queue: "queue.Queue" = queue.Queue()
+        self._pending = {}  # ruta -> callbacks
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self.generated = 0
+        self.errors = 0
+
+    def submit(self, path: str, on_done: Optional[Callable[[str, Optional[str]], None]] = None) -> None:
+        """Encola `path`; on_done(path, miniatura) se llama desde el hilo del worker."""
+        with self._lock:
+            callbacks = self._pending.get(path)
+            if callbacks is not None:
+                if on_done:
+                    callbacks.append(on_done)
+                return
+            self._pending[path] = [on_done] if on_done else []
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="thumbnails", daemon=True)
+                self._thread.start()
+        self._queue.put(path)
+
+    def pending(self) -> int:
+        with self._lock:
+            return len(self._pending)
+
+    def _run(self) -> None:
+        while True:
+            path = self._queue.get()
+            thumb = None
+            try:
+                thumb = existing_thumbnail(path)
+                if thumb is None:
+                    thumb = make_thumbnail(path)
+                    self.generated += 1
+            except Exception as e:
+                self.errors += 1
+                print(f"[thumbnails] {path}: {e}")
+            with self._lock:
+                callbacks = self._pending.pop(path, [])
+            for on_done in callbacks:
+                try:
+                    on_done(path, thumb)
+                except Exception:
+                    pass
+
+
+thumbnails = ThumbnailWorker()
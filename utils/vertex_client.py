@@ -0,0 +1,143 @@
+# utils/vertex_client.py
+# -*- coding: utf-8 -*-
+"""Cliente de extracción compartido por todo el proceso.
+
+Antes cada documento volvía a leer el JSON de la cuenta de servicio, llamaba
+a `vertexai.init` y construía un `GenerativeModel`. Ahora la inicialización
+ocurre una sola vez (de forma perezosa y protegida con lock, apta para el pool
+de OCR en lote) y los modelos se reutilizan entre llamadas.
+
+El backend es intercambiable: `set_client(StubBackend(...))` permite probar
+el flujo completo sin red ni credenciales. Con `OCR_BACKEND=stub` se activa
+el stub desde el entorno.
+"""
+import json
+import os
+import threading
+import time
+from typing import Any, Dict, Optional
+
+PROJECT_ID = os.getenv("VERTEX_PROJECT", "ormd-476617")
+LOCATION = os.getenv("VERTEX_LOCATION", "us-central1")
+KEY_PATH = os.getenv("VERTEX_KEY_PATH", "ormd-476617-56cca3f6e4a6.json")
+
+
+class ClientInitError(RuntimeError):
+    """Fallo al cargar credenciales o inicializar Vertex AI."""
+
+
+class VertexBackend:
+    """Backend real: credenciales + `vertexai.init` una vez, modelos en caché."""
+
+    name = "vertex"
+
+    def __init__(self, project: str = PROJECT_ID, location: str = LOCATION, key_path: str = KEY_PATH):
+        self.project = project
+        self.location = location
+        self.key_path = key_path
+        self.init_seconds: Optional[float] = None
+        self._ready = False
+        self._models: Dict[str, Any] = {}
+        self._lock = threading.Lock()
+
+    def _ensure_init(self) -> None:
+        if self._ready:
+            return
+        with self._lock:
+            if self._ready:
+                return
+            t0 = time.perf_counter()
+            if not os.path.exists(self.key_path):
+                raise ClientInitError(f"Archivo de clave de servicio no encontrado: {self.key_path}")
+            try:
+                import vertexai
+                from google.oauth2 import service_account
+
+                credentials = service_account.Credentials.from_service_account_file(self.key_path)
+                vertexai.init(project=self.project, location=self.location, credentials=credentials)
+                print(f"[INFO] Vertex AI inicializado con credenciales del service account: {credentials.service_account_email}")
+            except Exception as e:
+                raise ClientInitError(str(e)) from e
+            self.init_seconds = time.perf_counter() - t0
+            self._ready = True
+
+    def _model(self, model_name: str):
+        model = self._models.get(model_name)
+        if model is None:
+            with self._lock:
+                model = self._models.get(model_name)
+                if model is None:
+                    from vertexai.generative_models import GenerativeModel
+                    model = GenerativeModel(model_name)
+                    self._models[model_name] = model
+        return model
+
+    def generate(
+        self,
+        model_name: str,
+        data: bytes,
+        mime_type: str,
+        prompt: str,
+        generation_config: Dict[str, Any],
+        block_none_safety: bool = False,
+    ) -> str:
+        """Envía (documento, prompt) y devuelve el texto de la respuesta."""
+        self._ensure_init()
+        from vertexai.generative_models import Part, HarmCategory, HarmBlockThreshold
+
+        kwargs: Dict[str, Any] = {"generation_config": generation_config}
+        if block_none_safety:
+            kwargs["safety_settings"] = {
+                HarmCategory.HARM_CATEGORY_HATE_SPEECH: HarmBlockThreshold.BLOCK_NONE,
+                HarmCategory.HARM_CATEGORY_DANGEROUS_CONTENT: HarmBlockThreshold.BLOCK_NONE,
+                HarmCategory.HARM_CATEGORY_SEXUALLY_EXPLICIT: HarmBlockThreshold.BLOCK_NONE,
+                HarmCategory.HARM_CATEGORY_HARASSMENT: HarmBlockThreshold.BLOCK_NONE,
+            }
+        part = Part.from_data(data=data, mime_type=mime_type)
+        response = self._model(model_name).generate_content([part, prompt], **kwargs)
+        return response.text
+
+
+class StubBackend:
+    """Backend local para pruebas y benchmarks: respuesta fija, latencia simulada."""
+
+    name = "stub"
+
+    def __init__(self, response: Optional[Dict[str, Any]] = None, latency: float = 0.0):
+        self.response = response or {"dni": None, "lm": None, "apellidos": None, "nombres": None, "presto_servicio": "NO"}
+        self.latency = latency
+        self.init_seconds = 0.0
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def generate(self, model_name: str, data: bytes, mime_type: str, prompt: str,
+                 generation_config: Dict[str, Any], block_none_safety: bool = False) -> str:
+        if self.latency:
+            time.sleep(self.latency)
+        with self._lock:
+            self.calls += 1
+        return json.dumps(self.response, ensure_ascii=False)
+
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_client():
+    """Devuelve el backend del proceso, creándolo la primera vez."""
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                if os.getenv("OCR_BACKEND", "vertex").strip().lower() == "stub":
+                    _client = StubBackend()
+                else:
+                    _client = VertexBackend()
+    return _client
+
+
+def set_client(client) -> None:
+    """Reemplaza el backend (p.ej. por `StubBackend` en pruebas). `None` lo reinicia."""
+    global _client
+    with _client_lock:
+        _client = client